@@ -105,6 +105,11 @@ config.JobStateMachine.maxBulkCommitDocs = 250
 # NOTE: this needs to be in sync with CouchDB couchdb.max_document_size parameter
 # see: https://docs.couchdb.org/en/latest/config/couchdb.html#couchdb/max_document_size
 config.JobStateMachine.fwjrLimitSize = 8 * 1000**2  # default: 8 million bytes (not 8MB!!!)
+# commit the job, FWJR and job summary documents from a background thread of each component,
+# through a bounded queue of couchWriteBehindSize documents spooled to the component directory
+# (JobCreator worker processes use their own CouchWriteBehind.spool.<N> files)
+config.JobStateMachine.couchWriteBehind = False
+config.JobStateMachine.couchWriteBehindSize = 10000
 
 config.section_("ACDC")
 config.ACDC.couchurl = "https://cmsweb.cern.ch/couchdb"
@@ -187,6 +192,7 @@ config.JobAccountant.logLevel = globalLogLevel
 config.JobAccountant.workerThreads = 1
 config.JobAccountant.pollInterval = 300
 config.JobAccountant.specDir = config.General.workDir + "/JobAccountant/SpecCache"
+config.JobAccountant.reportLoaderProcesses = 0
 
 config.component_("JobCreator")
 config.JobCreator.namespace = "WMComponent.JobCreator.JobCreator"
@@ -201,6 +207,10 @@ config.JobCreator.pollInterval = 120
 config.JobCreator.jobCacheDir = config.General.workDir + "/JobCache"
 config.JobCreator.defaultJobType = "Processing"
 config.JobCreator.workerThreads = 1
+# number of processes creating the jobs of different workflows in parallel, 0 to create them serially
+config.JobCreator.creatorProcesses = 0
+# save the jobs in one archive per JobCollection directory, instead of one job.pkl per job directory
+config.JobCreator.jobArchive = False
 # glidein restrictions used for resource estimation (per core)
 config.JobCreator.GlideInRestriction = {"MinWallTimeSecs": 1 * 3600,  # 1h
                                         "MaxWallTimeSecs": 45 * 3600,  # pilot lifetime is usually 48h
@@ -299,6 +309,8 @@ config.TaskArchiver.localWMStatsURL = "%s/%s" % (config.JobStateMachine.couchurl
 config.TaskArchiver.DataKeepDays = 0.125  # couhch history keeping days.
 config.TaskArchiver.cleanCouchInterval = 60 * 20  # 20 min
 config.TaskArchiver.archiveDelayHours = 24  # delay the archiving so monitor can still show. default 24 hours
+# number of concurrent background bulk commits deleting the couch documents, 0 to commit synchronously
+config.TaskArchiver.couchCommitWindow = 0
 
 # Alert framework configuration
 
@@ -334,6 +346,8 @@ config.AnalyticsDataCollector.centralRequestDBURL = "Cental Request DB URL"
 config.AnalyticsDataCollector.summaryLevel = "task"
 config.AnalyticsDataCollector.couchProcessThreshold = 50
 config.AnalyticsDataCollector.pluginName = None
+# number of concurrent background bulk commits uploading to central WMStats, 0 to commit synchronously
+config.AnalyticsDataCollector.couchCommitWindow = 0
 
 config.component_("ArchiveDataReporter")
 config.ArchiveDataReporter.namespace = "WMComponent.ArchiveDataReporter.ArchiveDataReporter"
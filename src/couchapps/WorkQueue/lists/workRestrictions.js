@@ -37,6 +37,19 @@ function(head, req) {
         }
     }
 
+    // if requested, wrap the elements in an object together with the key
+    // and id of the last row evaluated, such that the next page can start
+    // right after it (startkey/startkey_docid) instead of skipping rows
+    var lastRow = false;
+    if (req.query.last_row) {
+        try {
+            lastRow = JSON.parse(req.query.last_row);
+        } catch (ex) {
+            send('"Error parsing last_row" ' + req.query.last_row);
+            return;
+        }
+    }
+
     var wfs = [];
     if (req.query.wfs) {
         try {
@@ -47,9 +60,14 @@ function(head, req) {
         }
     }
 
-    send("[");
+    if (lastRow) {
+        send('{"elements": [');
+    } else {
+        send("[");
+    }
     // loop over elements, applying site restrictions
     var first = true;
+    var last = null;
     while (row = getRow()) {
 
         if (resources.length == 0) {
@@ -59,6 +77,7 @@ function(head, req) {
         if (num_elem <= 0) {
             break;
         }
+        last = [row.key, row.id];
 
         //in case document is already deleted	
         if (!row.doc) {
@@ -149,5 +168,9 @@ function(head, req) {
         } // end resources
     } // end rows
 
-    send("]");
+    if (lastRow) {
+        send('], "last_row": ' + toJSON(last) + '}');
+    } else {
+        send("]");
+    }
 } // end function
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+"""
+_SortedFile_
+
+Disk backed sorted lists of strings: an external merge sort writing a stream
+of strings into a file, one per line, and a read-only sequence over such a
+file, which is memory-mapped and can be searched with the bisect module
+without holding all the strings in memory.
+"""
+
+import heapq
+import mmap
+import os
+import tempfile
+from array import array
+from itertools import islice
+
+
+def _readChunk(fileHandle):
+    """
+    Generator over the lines of a sorted chunk file, without the newlines
+    """
+    for line in fileHandle:
+        yield line[:-1]
+
+
+def sortToFile(lines, fileName, chunkSize=1000000):
+    """
+    _sortToFile_
+
+    Sort an iterable of strings (not containing newlines) into a file, one
+    string per line, holding at most chunkSize strings in memory at a time.
+    Sorted chunks are written to temporary files in the same directory as
+    fileName and merged at the end.
+
+    :param lines: an iterable of strings
+    :param fileName: the name of the file to be written
+    :param chunkSize: maximum number of strings to be sorted in memory
+    :return: the number of lines written
+    """
+    tmpDir = os.path.dirname(os.path.abspath(fileName))
+    lines = iter(lines)
+    chunkFiles = []
+    numLines = 0
+    try:
+        while True:
+            chunk = sorted(islice(lines, chunkSize))
+            if not chunk:
+                break
+            numLines += len(chunk)
+            chunkFile = tempfile.TemporaryFile(mode='w+', encoding='utf-8', dir=tmpDir)
+            chunkFile.writelines(line + '\n' for line in chunk)
+            chunkFile.seek(0)
+            chunkFiles.append(chunkFile)
+            del chunk
+
+        with open(fileName, 'w', encoding='utf-8') as fileHandle:
+            fileHandle.writelines(line + '\n' for line in heapq.merge(*[_readChunk(x) for x in chunkFiles]))
+    finally:
+        for chunkFile in chunkFiles:
+            chunkFile.close()
+    return numLines
+
+
+class SortedLineFile(object):
+    """
+    _SortedLineFile_
+
+    Read-only sequence of the lines of a file (e.g. written by sortToFile),
+    which is memory-mapped. Only the offsets of the lines are kept in memory,
+    the strings are decoded when accessed.
+    """
+
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self._fileHandle = open(fileName, 'rb')
+        self._mmap = None
+        self._offsets = array('Q', [0])
+        if os.fstat(self._fileHandle.fileno()).st_size:
+            self._mmap = mmap.mmap(self._fileHandle.fileno(), 0, access=mmap.ACCESS_READ)
+            pos = self._mmap.find(b'\n')
+            while pos != -1:
+                self._offsets.append(pos + 1)
+                pos = self._mmap.find(b'\n', pos + 1)
+            if self._offsets[-1] != len(self._mmap):
+                # last line without a newline
+                self._offsets.append(len(self._mmap) + 1)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise IndexError("SortedLineFile index out of range")
+        return self._mmap[self._offsets[idx]:self._offsets[idx + 1] - 1].decode('utf-8')
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        _close_
+
+        Release the memory map and the file handle
+        """
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._offsets = array('Q', [0])
+        self._fileHandle.close()
@@ -67,6 +67,10 @@ class AnalyticsPoller(BaseWorkerThread):
         self.centralRequestCouchDB = RequestDBWriter(centralRequestCouchDBURL,
                                                      couchapp=self.config.AnalyticsDataCollector.RequestCouchApp)
         self.centralWMStatsCouchDB = WMStatsWriter(self.config.General.centralWMStatsURL)
+        # optionally, the request documents are uploaded with concurrent background bulk commits
+        commitWindow = getattr(self.config.AnalyticsDataCollector, 'couchCommitWindow', 0)
+        if commitWindow:
+            self.centralWMStatsCouchDB.getDBInstance().startAsyncCommits(commitWindow)
 
         #TODO: change the config to hold couch url
         self.localCouchServer = CouchMonitor(self.config.JobStateMachine.couchurl)
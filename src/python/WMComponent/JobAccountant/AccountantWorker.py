@@ -18,10 +18,10 @@ import os
 import threading
 
 from WMComponent.DBS3Buffer.DBSBufferFile import DBSBufferFile
+from WMComponent.JobAccountant.ReportLoader import createMissingFWKJR, loadJobReport
 from WMCore.ACDC.DataCollectionService import DataCollectionService
 from WMCore.DAOFactory import DAOFactory
 from WMCore.Database.CMSCouch import CouchServer
-from WMCore.FwkJobReport.Report import Report
 from WMCore.JobStateMachine.ChangeState import ChangeState
 from WMCore.Services.WMStats.WMStatsWriter import WMStatsWriter
 from WMCore.WMBS.File import File
@@ -153,40 +153,9 @@ class AccountantWorker(WMConnectionBase):
 
         Given a framework job report on disk, load it and return a
         FwkJobReport instance.  If there is any problem loading or parsing the
-        framework job report return None.
+        framework job report return a failed report instead.
         """
-        # The jobReportPath may be prefixed with "file://" which needs to be
-        # removed so it doesn't confuse the FwkJobReport() parser.
-        if not jobReportPath:
-            logging.error("Bad FwkJobReport Path: %s", jobReportPath)
-            return self.createMissingFWKJR(99999, "FWJR path is empty")
-
-        jobReportPath = jobReportPath.replace("file://", "")
-        if not os.path.exists(jobReportPath):
-            logging.error("Bad FwkJobReport Path: %s", jobReportPath)
-            return self.createMissingFWKJR(99999, 'Cannot find file in jobReport path: %s' % jobReportPath)
-
-        if os.path.getsize(jobReportPath) == 0:
-            logging.error("Empty FwkJobReport: %s", jobReportPath)
-            return self.createMissingFWKJR(99998, 'jobReport of size 0: %s ' % jobReportPath)
-
-        jobReport = Report()
-
-        try:
-            jobReport.load(jobReportPath)
-        except UnicodeDecodeError:
-            logging.error("Hit UnicodeDecodeError exception while loading jobReport: %s", jobReportPath)
-            return self.createMissingFWKJR(99997, 'Found undecodable data in jobReport: {}'.format(jobReportPath))
-        except Exception as ex:
-            msg = "Error loading jobReport: {}\nDetails: {}".format(jobReportPath, str(ex))
-            logging.error(msg)
-            return self.createMissingFWKJR(99997, 'Cannot load jobReport')
-
-        if not jobReport.listSteps():
-            logging.error("FwkJobReport with no steps: %s", jobReportPath)
-            return self.createMissingFWKJR(99997, 'jobReport with no steps: %s ' % jobReportPath)
-
-        return jobReport
+        return loadJobReport(jobReportPath)
 
     def isTaskExistInFWJR(self, jobReport, jobStatus):
         """
@@ -212,21 +181,25 @@ class AccountantWorker(WMConnectionBase):
 
         return
 
-    def __call__(self, parameters):
+    def __call__(self, parameters, jobReports=None):
         """
         __call__
 
         Handle a completed job.  The parameters dictionary will contain the job
-        ID and the path to the framework job report.
+        ID and the path to the framework job report. The reports can also be
+        given already loaded, in the same order as the jobs.
         """
         returnList = []
         self.reset()
 
-        for job in parameters:
+        for i, job in enumerate(parameters):
             logging.info("Handling %s", job["fwjr_path"])
 
             # Load the job and set the ID
-            fwkJobReport = self.loadJobReport(job["fwjr_path"])
+            if jobReports is not None:
+                fwkJobReport = jobReports[i]
+            else:
+                fwkJobReport = self.loadJobReport(job["fwjr_path"])
             fwkJobReport.setJobID(job['id'])
 
             jobSuccess = self.handleJob(jobID=job["id"],
@@ -639,10 +612,7 @@ class AccountantWorker(WMConnectionBase):
         Create a missing FWJR if the report can't be found by the code in the
         path location.
         """
-        report = Report()
-        report.addError("cmsRun1", errorCode, "MissingJobReport", errorDescription)
-        report.data.cmsRun1.status = "Failed"
-        return report
+        return createMissingFWKJR(errorCode, errorDescription)
 
     def createFilesInDBSBuffer(self):
         """
@@ -14,6 +14,7 @@ from WMCore.WorkerThreads.BaseWorkerThread import BaseWorkerThread
 from WMCore.Database.CouchUtils import CouchConnectionError
 from WMCore.DAOFactory import DAOFactory
 from WMComponent.JobAccountant.AccountantWorker import AccountantWorker
+from WMComponent.JobAccountant.ReportLoader import ReportLoader
 from WMCore.WMException import WMException
 
 
@@ -32,9 +33,23 @@ class JobAccountantPoller(BaseWorkerThread):
         BaseWorkerThread.__init__(self)
         self.config = config
         self.accountantWorkSize = getattr(self.config.JobAccountant, 'accountantWorkSize', 100)
+        # number of processes loading the job reports ahead of the accountant worker,
+        # 0 loads them in the accountant thread, and how many slices they get ahead
+        self.reportLoader = ReportLoader(nProcs=getattr(self.config.JobAccountant, 'reportLoaderProcesses', 0),
+                                         prefetch=getattr(self.config.JobAccountant, 'reportLoaderPrefetch', 2))
 
         return
 
+    def terminate(self, parameters):
+        """
+        _terminate_
+
+        Stop the report loader processes
+        """
+        self.reportLoader.close()
+        BaseWorkerThread.terminate(self, parameters)
+        return
+
     def setup(self, parameters=None):
         """
         _setup_
@@ -65,9 +80,10 @@ class JobAccountantPoller(BaseWorkerThread):
             logging.debug("No work to do; exiting")
             return
 
-        for jobsSlice in grouper(completeJobs, self.accountantWorkSize):
+        jobSlices = grouper(completeJobs, self.accountantWorkSize)
+        for jobsSlice, jobReports in self.reportLoader.iterSlices(jobSlices):
             try:
-                self.accountantWorker(jobsSlice)
+                self.accountantWorker(jobsSlice, jobReports)
             except WMException:
                 myThread = threading.currentThread()
                 if getattr(myThread, 'transaction', None) is not None:
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+"""
+_ReportLoader_
+
+Load and validate the framework job reports of the completed jobs for the
+JobAccountant. Unpickling the reports is CPU bound, so it can be done by a
+pool of worker processes, a few slices of jobs ahead of the slice whose
+results are being inserted into WMBS/DBSBuffer by the accountant worker.
+"""
+
+import logging
+import multiprocessing
+import os
+from collections import deque
+
+from WMCore.FwkJobReport.Report import Report
+
+
+def createMissingFWKJR(errorCode=999, errorDescription='Failure of unknown type'):
+    """
+    _createMissingFWKJR_
+
+    Create a failed report for a job whose report can't be loaded
+    """
+    report = Report()
+    report.addError("cmsRun1", errorCode, "MissingJobReport", errorDescription)
+    report.data.cmsRun1.status = "Failed"
+    return report
+
+
+def loadJobReport(jobReportPath):
+    """
+    _loadJobReport_
+
+    Given a framework job report on disk, load it and return a
+    FwkJobReport instance.  If there is any problem loading or parsing the
+    framework job report return a failed report instead.
+    """
+    # The jobReportPath may be prefixed with "file://" which needs to be
+    # removed so it doesn't confuse the FwkJobReport() parser.
+    if not jobReportPath:
+        logging.error("Bad FwkJobReport Path: %s", jobReportPath)
+        return createMissingFWKJR(99999, "FWJR path is empty")
+
+    jobReportPath = jobReportPath.replace("file://", "")
+    if not os.path.exists(jobReportPath):
+        logging.error("Bad FwkJobReport Path: %s", jobReportPath)
+        return createMissingFWKJR(99999, 'Cannot find file in jobReport path: %s' % jobReportPath)
+
+    if os.path.getsize(jobReportPath) == 0:
+        logging.error("Empty FwkJobReport: %s", jobReportPath)
+        return createMissingFWKJR(99998, 'jobReport of size 0: %s ' % jobReportPath)
+
+    jobReport = Report()
+
+    try:
+        jobReport.load(jobReportPath)
+    except UnicodeDecodeError:
+        logging.error("Hit UnicodeDecodeError exception while loading jobReport: %s", jobReportPath)
+        return createMissingFWKJR(99997, 'Found undecodable data in jobReport: {}'.format(jobReportPath))
+    except Exception as ex:
+        msg = "Error loading jobReport: {}\nDetails: {}".format(jobReportPath, str(ex))
+        logging.error(msg)
+        return createMissingFWKJR(99997, 'Cannot load jobReport')
+
+    if not jobReport.listSteps():
+        logging.error("FwkJobReport with no steps: %s", jobReportPath)
+        return createMissingFWKJR(99997, 'jobReport with no steps: %s ' % jobReportPath)
+
+    return jobReport
+
+
+def loadJobReports(jobReportPaths):
+    """
+    _loadJobReports_
+
+    Load a list of framework job reports, in the same order
+    """
+    return [loadJobReport(jobReportPath) for jobReportPath in jobReportPaths]
+
+
+class ReportLoader(object):
+    """
+    _ReportLoader_
+
+    Load the reports of slices of jobs, either in the calling thread (when
+    configured with no processes) or in a pool of worker processes. The
+    pool is started with the spawn method, since the accountant runs in a
+    threaded daemon holding database connections. Spawned processes import
+    the main script again, so it must be guarded by a __main__ check (as
+    bin/wmcoreD is).
+    """
+
+    def __init__(self, nProcs=0, prefetch=2):
+        self.nProcs = nProcs
+        self.prefetch = max(prefetch, 1)
+        self.pool = None
+
+    def setupPool(self):
+        """
+        _setupPool_
+
+        Start the pool of worker processes, if there isn't one yet
+        """
+        if self.pool is None and self.nProcs > 0:
+            self.pool = multiprocessing.get_context("spawn").Pool(processes=self.nProcs)
+        return
+
+    def close(self):
+        """
+        _close_
+
+        Stop the worker processes
+        """
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+        return
+
+    def iterSlices(self, jobSlices):
+        """
+        _iterSlices_
+
+        Generator over a list of slices of jobs (dicts with a fwjr_path key),
+        yielding each slice with the list of its loaded reports, in the same
+        order as the slices were given. With a pool of processes, up to
+        prefetch slices are loaded in the background while the caller
+        processes the current one. A slice which can't be loaded by the pool
+        is loaded in the calling thread instead.
+        """
+        if self.nProcs <= 0:
+            for jobsSlice in jobSlices:
+                yield jobsSlice, loadJobReports([job["fwjr_path"] for job in jobsSlice])
+            return
+
+        self.setupPool()
+        pending = deque()
+        for jobsSlice in jobSlices:
+            pending.append((jobsSlice, self.pool.apply_async(loadJobReports,
+                                                             ([job["fwjr_path"] for job in jobsSlice],))))
+            if len(pending) > self.prefetch:
+                yield self._getResult(*pending.popleft())
+        while pending:
+            yield self._getResult(*pending.popleft())
+        return
+
+    def _getResult(self, jobsSlice, asyncResult):
+        """
+        Return a slice with the reports loaded by the pool
+        """
+        try:
+            return jobsSlice, asyncResult.get()
+        except Exception as ex:
+            logging.error("Failed to load job reports in the worker pool, loading them here. Error: %s", str(ex))
+            return jobsSlice, loadJobReports([job["fwjr_path"] for job in jobsSlice])
@@ -4,16 +4,19 @@ The actual jobArchiver algorithm
 """
 from __future__ import division
 
+import io
 import logging
 import os
 import os.path
 import shutil
 import tarfile
 import threading
+import time
 
 from Utils.IteratorTools import grouper
 from Utils.Timers import timeFunction
 from WMCore.DAOFactory import DAOFactory
+from WMCore.DataStructs.JobArchive import loadJobArchive
 from WMCore.JobStateMachine.ChangeState import ChangeState
 from WMCore.Services.ReqMgrAux.ReqMgrAux import isDrainMode
 from WMCore.WMBS.Fileset import Fileset
@@ -209,18 +212,27 @@ class JobArchiverPoller(BaseWorkerThread):
         regarding those jobs is cleaned up.
         """
 
-        for job in doneList:
-            # print "About to clean cache for job %i" % (job['id'])
-            self.cleanJobCache(job)
+        jobArchives = {}  # JobArchive objects (or None) key'ed by the JobCollection directory
+        try:
+            for job in doneList:
+                # print "About to clean cache for job %i" % (job['id'])
+                self.cleanJobCache(job, jobArchives)
+        finally:
+            for jobArchive in jobArchives.values():
+                if jobArchive is not None:
+                    jobArchive.close()
 
         return
 
-    def cleanJobCache(self, job):
+    def cleanJobCache(self, job, jobArchives=None):
         """
         _cleanJobCache_
 
         Clears out any files still sticking around in the jobCache,
-        tars up the contents and sends them off
+        tars up the contents and sends them off.
+        If the job pickle was saved in the archive of its JobCollection, it is
+        added to the tarball as well; jobArchives is a dictionary caching the
+        archives opened so far.
         """
 
         cacheDir = job['cache_dir']
@@ -232,7 +244,19 @@ class JobArchiverPoller(BaseWorkerThread):
 
         cacheDirList = os.listdir(cacheDir)
 
-        if cacheDirList == []:
+        archivedJob = None
+        if 'job.pkl' not in cacheDirList:
+            jobArchives = {} if jobArchives is None else jobArchives
+            collectionDir = os.path.dirname(os.path.normpath(cacheDir))
+            if collectionDir not in jobArchives:
+                jobArchives[collectionDir] = loadJobArchive(collectionDir)
+            if jobArchives[collectionDir] is not None:
+                try:
+                    archivedJob = jobArchives[collectionDir].getRaw(job['id'])
+                except Exception as ex:
+                    logging.error("Cannot read job %s from the archive in %s: %s", job['id'], collectionDir, str(ex))
+
+        if cacheDirList == [] and archivedJob is None:
             os.rmdir(cacheDir)
             return
 
@@ -265,6 +289,11 @@ class JobArchiverPoller(BaseWorkerThread):
                         tarball.add(name=fullFile, arcname='Job_%i/%s' % (job['id'], fileName))
                     except IOError:
                         logging.error('Cannot read %s, skipping', fullFile)
+                if archivedJob is not None:
+                    tarInfo = tarfile.TarInfo(name='Job_%i/job.pkl' % job['id'])
+                    tarInfo.size = len(archivedJob)
+                    tarInfo.mtime = int(time.time())
+                    tarball.addfile(tarInfo, io.BytesIO(archivedJob))
         except Exception as ex:
             msg = "Exception while opening and adding to a tarfile\n"
             msg += "Tarfile: %s\n" % os.path.join(logDir, tarName)
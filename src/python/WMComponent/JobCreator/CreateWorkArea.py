@@ -24,16 +24,20 @@ from subprocess import Popen, PIPE
 from Utils.IteratorTools import grouper
 from WMCore.DAOFactory import DAOFactory
 from WMCore.WMException import WMException
-from WMCore.WMSpec.WMWorkload import WMWorkload, WMWorkloadHelper
+from WMCore.WMSpec.SpecCache import getSpecCache
 
 
-def createDirectories(dirList):
+def createDirectories(dirList, mode=None):
     """
     Create the directory if everything is sane
+    If mode is given (e.g. '775') the directories are created with it,
+    instead of the default permissions
 
     """
     for sdirList in grouper(dirList, 500):
         cmdArgs = ['mkdir']
+        if mode:
+            cmdArgs.extend(['-m', mode])
         cmdArgs.extend(sdirList)
         pipe = Popen(cmdArgs, stdout=PIPE, stderr=PIPE, shell=False)
         stdout, stderr = pipe.communicate()
@@ -91,10 +95,7 @@ def getMasterName(startDir, wmWorkload=None, workflow=None):
         logging.error(msg)
         raise CreateWorkAreaException(msg)
     else:
-        wmWorkload = WMWorkloadHelper(WMWorkload("workload"))
-        wmWorkload.load(workflow.spec)
-
-        workload = wmWorkload.name()
+        workload = getSpecCache().getSummary(workflow.spec).name
 
     task = workflow.task
     if task.startswith("/" + workload + "/"):
@@ -273,11 +274,8 @@ class CreateWorkArea(object):
                                  conn=self.conn,
                                  transaction=self.transaction)
 
-        createDirectories(nameList)
-
-        # change permissions. See #3623
-        for directory in nameList:
-            os.chmod(directory, 0o775)
+        # create them group writable, without a chmod per directory. See #3623
+        createDirectories(nameList, mode='775')
 
         return
 
@@ -298,7 +296,7 @@ class CreateWorkArea(object):
             return 0
         if os.path.isdir(jobCollDir):
             # This should never happen
-            return len(os.listdir(jobCollDir))
+            return len([x for x in os.listdir(jobCollDir) if x.startswith('job_')])
         elif os.path.isfile(jobCollDir):
             # Well, you're screwed.  Some other file is in the way: IN A DIRECTORY YOU JUST CREATED.
             # Time to freak the hell out
@@ -4,37 +4,50 @@ The JobCreator Poller for the JSM
 """
 
 from builtins import next
+from future.utils import viewitems
 
 __all__ = []
 
+import copy
 import logging
+import multiprocessing
+import multiprocessing.util
 import os
 import os.path
 import threading
+import time
 import pickle
 
 from Utils.Timers import timeFunction
 from Utils.PythonVersion import HIGHEST_PICKLE_PROTOCOL
 from Utils.MathUtils import quantize
 from WMComponent.JobCreator.CreateWorkArea import CreateWorkArea
+from WMCore.Database.CouchWriteBehind import claimSpoolFile, stopCouchWriteBehinds
+from WMCore.DataStructs.JobArchive import appendJobArchive
+from WMCore.DataStructs.JobSubmitIndex import writeJobSubmitIndex
 from WMCore.WorkerThreads.BaseWorkerThread import BaseWorkerThread
 from WMCore.DAOFactory import DAOFactory
 from WMCore.WMException import WMException
 from WMCore.JobSplitting.Generators.GeneratorManager import GeneratorManager
 from WMCore.JobStateMachine.ChangeState import ChangeState
 from WMCore.JobSplitting.SplitterFactory import SplitterFactory
+from WMCore.ProcessPool.ProcessPool import setupLogging
 from WMCore.WMBS.Subscription import Subscription
 from WMCore.WMBS.Workflow import Workflow
-from WMCore.WMSpec.WMWorkload import WMWorkload, WMWorkloadHelper
+from WMCore.WMSpec.SpecCache import getSpecCache
 from WMCore.FwkJobReport.Report import Report
 from WMCore.WMExceptions import WM_JOB_ERROR_CODES
+from WMCore.WMInit import WMInit
 
 
 def retrieveWMSpec(workflow=None, wmWorkloadURL=None):
     """
     _retrieveWMSpec_
 
-    Given a subscription, this function loads the WMSpec associated with that workload
+    Given a subscription, this function loads the WMSpec associated with that workload.
+    Only specs on the local file system are supported. The workload comes from the
+    process-wide spec cache and is shared with the other callers, so it must not be
+    modified: anything handed over to code that may change it has to be copied.
     """
     if not wmWorkloadURL and workflow:
         wmWorkloadURL = workflow.spec
@@ -43,10 +56,7 @@ def retrieveWMSpec(workflow=None, wmWorkloadURL=None):
         logging.error("WMWorkloadURL %s is empty", wmWorkloadURL)
         return None
 
-    wmWorkload = WMWorkloadHelper(WMWorkload("workload"))
-    wmWorkload.load(wmWorkloadURL)
-
-    return wmWorkload
+    return getSpecCache().get(wmWorkloadURL)
 
 
 def retrieveJobSplitParams(wmWorkload, task):
@@ -73,7 +83,9 @@ def retrieveJobSplitParams(wmWorkload, task):
     if not task:
         return {"files_per_job": 5}
     else:
-        return task.jobSplittingParameters()
+        # the parameters share their lists with the cached workload, and the
+        # splitting algorithms are free to modify them
+        return copy.deepcopy(task.jobSplittingParameters())
 
 
 def runSplitter(jobFactory, splitParams):
@@ -121,7 +133,8 @@ def saveJob(job, thisJobNumber, **kwargs):
     """
     _saveJob_
 
-    Actually do the mechanics of saving the job to a pickle file
+    Actually do the mechanics of saving the job to a pickle file,
+    unless the jobs are saved in the archive of their JobCollection
     """
     job['counter'] = thisJobNumber
     job['spec'] = kwargs.get('workflow').spec
@@ -146,6 +159,9 @@ def saveJob(job, thisJobNumber, **kwargs):
     job['gpuRequirements'] = kwargs['gpuRequirements']
     job['requestType'] = kwargs['requestType']
 
+    if kwargs.get('jobArchive', False):
+        return
+
     with open(os.path.join(cacheDir, 'job.pkl'), 'wb') as output:
         pickle.dump(job, output, HIGHEST_PICKLE_PROTOCOL)
 
@@ -183,9 +199,18 @@ def creatorProcess(work, jobCacheDir):
                                    cache=False)
 
         thisJobNumber = work.get('jobNumber', 0)
+        jobsByCollection = {}
         for job in wmbsJobGroup.jobs:
             thisJobNumber += 1
             saveJob(job, thisJobNumber, **work)
+            jobsByCollection.setdefault(os.path.dirname(job['cache_dir']), []).append(job)
+
+        # either the archive replacing the job pickles, or a bulk copy of them read by the JobSubmitter
+        for collectionDir, jobs in viewitems(jobsByCollection):
+            if work.get('jobArchive', False):
+                appendJobArchive(collectionDir, jobs)
+            else:
+                writeJobSubmitIndex(collectionDir, jobs)
     except Exception as ex:
         msg = "Exception in processing wmbsJobGroup %i\n. Error: %s" % (wmbsJobGroup.id, str(ex))
         logging.exception(msg)
@@ -194,6 +219,87 @@ def creatorProcess(work, jobCacheDir):
     return wmbsJobGroup
 
 
+def logSubscriptionTiming(timing):
+    """
+    _logSubscriptionTiming_
+
+    Log the time spent creating the jobs of a subscription
+    """
+    logging.info("Created %i jobs for subscription %i in %.2f secs: load %.2f, split %.2f, "
+                 "work area %.2f, database %.2f, changeState %.2f. Job factory: %s",
+                 timing['jobs'], timing['subscription'], timing['total'], timing['load'], timing['split'],
+                 timing['workArea'], timing['database'], timing['changeState'],
+                 ", ".join("%s %.2f" % (key, timing['factory'][key]) for key in sorted(timing['factory'])))
+    return
+
+
+# JobCreatorPoller instance of a worker process, see initCreatorWorker
+_workerPoller = None
+_workerError = None
+
+
+def initCreatorWorker(config):
+    """
+    _initCreatorWorker_
+
+    Initializer of the JobCreator worker processes: set up the logging,
+    a database connection and a poller to create the jobs with. With the
+    couch write-behind enabled, each worker has its own spool file and
+    commits its queued documents when the pool is closed.
+    """
+    global _workerPoller, _workerError
+    try:
+        setupLogging(config.JobCreator.componentDir)
+        if getattr(config.JobStateMachine, 'couchWriteBehind', False):
+            spoolFile = getattr(config.JobStateMachine, 'couchWriteBehindSpool', None) or \
+                        os.path.join(config.JobCreator.componentDir, "CouchWriteBehind.spool")
+            config.JobStateMachine.couchWriteBehindSpool = claimSpoolFile(spoolFile)
+            # run when the worker exits after the pool is closed, not when it is terminated
+            multiprocessing.util.Finalize(None, stopCouchWriteBehinds, exitpriority=10,
+                                          kwargs={'timeout': getattr(getattr(config, 'Agent', None),
+                                                                         'couchFlushTimeout', 300)})
+        connectUrl = config.CoreDatabase.connectUrl
+        WMInit().setDatabaseConnection(dbConfig=connectUrl,
+                                       dialect=connectUrl.split(":", 1)[0],
+                                       socketLoc=getattr(config.CoreDatabase, 'socket', None))
+        _workerPoller = JobCreatorPoller(config)
+    except Exception as ex:
+        # keep the error, since the pool would restart a worker failing here forever
+        _workerError = "Failed to initialize the JobCreator worker %i. Error: %s" % (os.getpid(), str(ex))
+        logging.exception(_workerError)
+    return
+
+
+def createJobsInWorker(subscriptionIDs):
+    """
+    _createJobsInWorker_
+
+    Create the jobs of a list of subscriptions, one after the other, in a
+    worker process. Each subscription is processed in its own transactions.
+    Return a list with the timing dictionary of each processed subscription,
+    or with a dictionary with the subscription id and an error message for
+    the first subscription which failed (the next ones are not processed).
+    """
+    if _workerError:
+        return [{'subscription': subscriptionIDs[0], 'error': _workerError}]
+
+    results = []
+    for subscriptionID in subscriptionIDs:
+        try:
+            timing = _workerPoller.processSubscription(subscriptionID)
+        except Exception as ex:
+            myThread = threading.currentThread()
+            if getattr(myThread, 'transaction', False) and getattr(myThread.transaction, 'transaction', False):
+                myThread.transaction.rollback()
+            msg = "Failed to create jobs for subscription %i. Error: %s" % (subscriptionID, str(ex))
+            logging.exception(msg)
+            results.append({'subscription': subscriptionID, 'error': msg})
+            break
+        if timing:
+            results.append(timing)
+    return results
+
+
 # This is the code for the multiprocessing based creator
 # It's kept around so I can remember how I arranged the exception tree
 # Keep this until we make a decision about large-scale transactions
@@ -322,6 +428,7 @@ class JobCreatorPoller(BaseWorkerThread):
         self.setBulkCache = self.daoFactory(classname="Jobs.SetCache")
         self.countJobs = self.daoFactory(classname="Jobs.GetNumberOfJobsPerWorkflow")
         self.subscriptionList = self.daoFactory(classname="Subscriptions.ListIncomplete")
+        self.subscriptionsByWorkflow = self.daoFactory(classname="Subscriptions.ListIncompleteByWorkflow")
         self.setFWJRPath = self.daoFactory(classname="Jobs.SetFWJRPath")
 
         # information
@@ -333,6 +440,11 @@ class JobCreatorPoller(BaseWorkerThread):
         self.agentNumber = int(getattr(config.Agent, 'agentNumber', 0))
         self.agentName = getattr(config.Agent, 'hostName', '')
         self.glideinLimits = getattr(config.JobCreator, 'GlideInRestriction', None)
+        # number of worker processes creating the jobs, 0 to create them in the poller thread
+        self.nProcs = getattr(config.JobCreator, 'creatorProcesses', 0)
+        # whether the jobs are saved in one archive per JobCollection instead of one pickle per job
+        self.jobArchive = getattr(config.JobCreator, 'jobArchive', False)
+        self.pool = None
 
         try:
             self.jobCacheDir = getattr(config.JobCreator, 'jobCacheDir',
@@ -401,203 +513,322 @@ class JobCreatorPoller(BaseWorkerThread):
         Kill the code after one final pass when called by the master thread.
         """
         logging.debug("terminating. doing one more pass before we die")
-        self.algorithm(params)
+        try:
+            self.algorithm(params)
+        finally:
+            self.closePool()
+
+    def setupPool(self):
+        """
+        _setupPool_
+
+        Start the pool of worker processes, if there isn't one yet. The pool
+        is started with the spawn method, since the poller runs in a threaded
+        daemon holding database connections. Spawned processes import the
+        main script again, so it must be guarded by a __main__ check (as
+        bin/wmcoreD is).
+        """
+        if self.pool is None:
+            self.pool = multiprocessing.get_context("spawn").Pool(processes=self.nProcs,
+                                                                  initializer=initCreatorWorker,
+                                                                  initargs=(self.config,))
+        return
+
+    def closePool(self):
+        """
+        _closePool_
+
+        Stop the worker processes, once they committed the documents of
+        their couch write-behind queues
+        """
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        return
 
     def pollSubscriptions(self):
         """
         Poller for looking in all active subscriptions for jobs that need to be made.
 
+        With creatorProcesses set, the subscriptions of different workflows are
+        processed in parallel by a pool of worker processes. The subscriptions
+        of a workflow are processed one after the other by the same worker, so
+        that their jobs are numbered in sequence.
+        Return the list of timing dictionaries of the processed subscriptions.
         """
         logging.info("Beginning JobCreator.pollSubscriptions() cycle.")
-        myThread = threading.currentThread()
+        startTime = time.time()
+
+        if self.nProcs > 0:
+            timings = self.pollSubscriptionsInPool()
+        else:
+            timings = []
+            # First, get list of Subscriptions
+            subscriptions = self.subscriptionList.execute()
+
+            # Okay, now we have a list of subscriptions
+            for subscriptionID in subscriptions:
+                timing = self.processSubscription(subscriptionID)
+                if timing:
+                    logSubscriptionTiming(timing)
+                    timings.append(timing)
+
+        logging.info("JobCreator created %i jobs for %i subscriptions in %.2f secs",
+                     sum(x['jobs'] for x in timings), len(timings), time.time() - startTime)
+        return timings
+
+    def pollSubscriptionsInPool(self):
+        """
+        _pollSubscriptionsInPool_
 
-        # First, get list of Subscriptions
-        subscriptions = self.subscriptionList.execute()
+        Create the jobs of the active subscriptions in the pool of worker
+        processes, one task per workflow, and collect their timings. Failures
+        don't stop the other workflows, but are raised at the end of the cycle.
+        """
+        subsByWorkflow = self.subscriptionsByWorkflow.execute()
+        self.setupPool()
 
-        # Okay, now we have a list of subscriptions
-        for subscriptionID in subscriptions:
-            wmbsSubscription = Subscription(id=subscriptionID)
+        # start from the workflows with more subscriptions
+        asyncResults = [self.pool.apply_async(createJobsInWorker, (subscriptionIDs,))
+                        for subscriptionIDs in sorted(subsByWorkflow.values(), key=len, reverse=True)]
+
+        timings = []
+        errors = []
+        for asyncResult in asyncResults:
             try:
-                wmbsSubscription.load()
-            except IndexError:
-                # This happens when the subscription no longer exists
-                # i.e., someone executed a kill() function on the database
-                # while the JobCreator was in cycle
-                # Ignore this subscription
-                msg = "JobCreator cannot load subscription %i" % subscriptionID
+                results = asyncResult.get()
+            except Exception as ex:
+                msg = "Failed to get the results of a JobCreator worker. Error: %s" % str(ex)
                 logging.error(msg)
+                errors.append(msg)
                 continue
+            for result in results:
+                if 'error' in result:
+                    logging.error(result['error'])
+                    errors.append(result['error'])
+                else:
+                    logSubscriptionTiming(result)
+                    timings.append(result)
 
-            workflow = Workflow(id=wmbsSubscription["workflow"].id)
-            workflow.load()
-            wmbsSubscription['workflow'] = workflow
-            wmWorkload = retrieveWMSpec(workflow=workflow)
-
-            if not workflow.task or not wmWorkload:
-                # Then we have a problem
-                # We NEED a sandbox
-                # Abort this subscription!
-                # But do NOT fail
-                # We have no way of marking a subscription as bad per se
-                # We'll have to just keep skipping it
-                msg = "Have no task for workflow %i\n" % (workflow.id)
-                msg += "Aborting Subscription %i" % (subscriptionID)
-                logging.error(msg)
-                continue
+        if errors:
+            msg = "JobCreator failed to create the jobs of %i workflows, first error: %s" % (len(errors), errors[0])
+            raise JobCreatorException(msg)
+        return timings
+
+    def processSubscription(self, subscriptionID):
+        """
+        _processSubscription_
+
+        Split a subscription into jobs, create their work areas and save
+        them in the database, in one transaction per splitting iteration.
+        Return a dictionary with the number of jobs created and the time
+        spent in each step, or None if the subscription was skipped.
+        """
+        myThread = threading.currentThread()
+        timing = {'subscription': subscriptionID, 'jobs': 0, 'load': 0, 'split': 0, 'workArea': 0,
+                  'database': 0, 'changeState': 0}
+        startTime = time.time()
 
-            logging.debug("Have loaded subscription %i with workflow %i\n", subscriptionID, workflow.id)
+        wmbsSubscription = Subscription(id=subscriptionID)
+        try:
+            wmbsSubscription.load()
+        except IndexError:
+            # This happens when the subscription no longer exists
+            # i.e., someone executed a kill() function on the database
+            # while the JobCreator was in cycle
+            # Ignore this subscription
+            msg = "JobCreator cannot load subscription %i" % subscriptionID
+            logging.error(msg)
+            return None
+
+        workflow = Workflow(id=wmbsSubscription["workflow"].id)
+        workflow.load()
+        wmbsSubscription['workflow'] = workflow
+        wmWorkload = retrieveWMSpec(workflow=workflow)
+
+        if not workflow.task or not wmWorkload:
+            # Then we have a problem
+            # We NEED a sandbox
+            # Abort this subscription!
+            # But do NOT fail
+            # We have no way of marking a subscription as bad per se
+            # We'll have to just keep skipping it
+            msg = "Have no task for workflow %i\n" % (workflow.id)
+            msg += "Aborting Subscription %i" % (subscriptionID)
+            logging.error(msg)
+            return None
 
-            # retrieve information from the workload to propagate down to the job configuration
-            allowOpport = wmWorkload.getAllowOpportunistic()
+        logging.debug("Have loaded subscription %i with workflow %i\n", subscriptionID, workflow.id)
 
-            # Set task object
-            wmTask = wmWorkload.getTaskByPath(workflow.task)
+        # retrieve information from the workload to propagate down to the job configuration
+        allowOpport = wmWorkload.getAllowOpportunistic()
 
-            # Get generators
-            # If you fail to load the generators, pass on the job
+        # Set task object
+        wmTask = wmWorkload.getTaskByPath(workflow.task)
+
+        # Get generators
+        # If you fail to load the generators, pass on the job
+        try:
+            if hasattr(wmTask.data, 'generators'):
+                manager = GeneratorManager(wmTask)
+                seederList = manager.getGeneratorList()
+            else:
+                seederList = []
+        except Exception as ex:
+            msg = "Had failure loading generators for subscription %i\n" % (subscriptionID)
+            msg += "Exception: %s\n" % str(ex)
+            msg += "Passing over this error.  It will reoccur next interation!\n"
+            msg += "Please check or remove this subscription!\n"
+            logging.error(msg)
+            return None
+
+        logging.debug("Going to call wmbsJobFactory for sub %i with limit %i", subscriptionID, self.limit)
+
+        splitParams = retrieveJobSplitParams(wmWorkload, workflow.task)
+        logging.debug("Split Params: %s", splitParams)
+
+        # Load the proper job splitting module
+        splitterFactory = SplitterFactory(splitParams.get('algo_package', "WMCore.JobSplitting"))
+        # and return an instance of the splitting algorithm
+        wmbsJobFactory = splitterFactory(package="WMCore.WMBS",
+                                         subscription=wmbsSubscription,
+                                         generators=seederList,
+                                         limit=self.limit)
+
+        # Turn on the jobFactory --> get available files for that subscription, keep result proxies
+        wmbsJobFactory.open()
+
+        # Create a function to hold it, calling __call__ from the JobFactory
+        # which then calls algorithm method of the job splitting algo instance
+        jobSplittingFunction = runSplitter(jobFactory=wmbsJobFactory,
+                                           splitParams=splitParams)
+
+        # Now we get to find out how many jobs there are.
+        jobNumber = self.countJobs.execute(workflow=workflow.id,
+                                           conn=myThread.transaction.conn,
+                                           transaction=True)
+        jobNumber += splitParams.get('initial_lfn_counter', 0)
+        logging.debug("Have %i jobs for workflow %s already in database.", jobNumber, workflow.name)
+        timing['load'] = time.time() - startTime
+
+        while True:
+            # This loop runs over the jobFactory,
+            # using yield statements and a pre-existing proxy to
+            # generate and process new jobs
+
+            # First we need the jobs.
+            myThread.transaction.begin()
+            stepTime = time.time()
             try:
-                if hasattr(wmTask.data, 'generators'):
-                    manager = GeneratorManager(wmTask)
-                    seederList = manager.getGeneratorList()
-                else:
-                    seederList = []
+                wmbsJobGroups = next(jobSplittingFunction)
+                logging.info("Retrieved %i jobGroups from jobSplitter", len(wmbsJobGroups))
+                timing['split'] += time.time() - stepTime
+            except StopIteration:
+                # If you receive a stopIteration, we're done
+                logging.info("Completed iteration over subscription %i", subscriptionID)
+                myThread.transaction.commit()
+                break
+
+            # If we have no jobGroups, we're done
+            if len(wmbsJobGroups) == 0:
+                logging.info("Found end in iteration over subscription %i", subscriptionID)
+                myThread.transaction.commit()
+                break
+
+            # Assemble a dict of all the info
+            processDict = {'workflow': workflow,
+                           'wmWorkload': wmWorkload,
+                           'wmTaskName': wmTask.getPathName(),
+                           'requestType': wmWorkload.getRequestType(),
+                           'jobNumber': jobNumber,
+                           'sandbox': wmTask.data.input.sandbox,
+                           'owner': wmWorkload.getOwner().get('name', None),
+                           'ownerDN': wmWorkload.getOwner().get('dn', None),
+                           'ownerGroup': wmWorkload.getOwner().get('vogroup', ''),
+                           'ownerRole': wmWorkload.getOwner().get('vorole', ''),
+                           'numberOfCores': wmTask.getNumberOfCores(),
+                           'requiresGPU': wmTask.getRequiresGPU(),
+                           'gpuRequirements': wmTask.getGPURequirements(),
+                           'inputDataset': wmTask.getInputDatasetPath(),
+                           'inputPileup': wmTask.getInputPileupDatasets(),
+                           'swVersion': wmTask.getSwVersion(allSteps=True),
+                           'scramArch': wmTask.getScramArch(),
+                           'agentNumber': self.agentNumber,
+                           'agentName': self.agentName,
+                           'allowOpportunistic': allowOpport,
+                           'jobArchive': self.jobArchive}
+
+            tempSubscription = Subscription(id=wmbsSubscription['id'])
+
+            # if we have glideinWMS constraints, then adapt all jobs
+            if self.glideinLimits:
+                capResourceEstimates(wmbsJobGroups, self.glideinLimits)
+
+            stepTime = time.time()
+            nameDictList = []
+            for wmbsJobGroup in wmbsJobGroups:
+                # For each jobGroup, put a dictionary
+                # together and run it with creatorProcess
+                jobsInGroup = len(wmbsJobGroup.jobs)
+                wmbsJobGroup.subscription = tempSubscription
+                tempDict = {}
+                tempDict.update(processDict)
+                tempDict['jobGroup'] = wmbsJobGroup
+                tempDict['jobNumber'] = jobNumber
+                tempDict['inputDatasetLocations'] = wmbsJobGroup.getLocationsForJobs()
+
+                jobGroup = creatorProcess(work=tempDict,
+                                          jobCacheDir=self.jobCacheDir)
+                jobNumber += jobsInGroup
+                timing['jobs'] += jobsInGroup
+
+                # Set jobCache for group
+                for job in jobGroup.jobs:
+                    nameDictList.append({'jobid': job['id'],
+                                         'cacheDir': job['cache_dir']})
+                    job["user"] = wmWorkload.getOwner()["name"]
+                    job["group"] = wmWorkload.getOwner()["group"]
+            timing['workArea'] += time.time() - stepTime
+
+            # Set the caches in the database
+            stepTime = time.time()
+            try:
+                if len(nameDictList) > 0:
+                    self.setBulkCache.execute(jobDictList=nameDictList,
+                                              conn=myThread.transaction.conn,
+                                              transaction=True)
+            except WMException:
+                raise
             except Exception as ex:
-                msg = "Had failure loading generators for subscription %i\n" % (subscriptionID)
-                msg += "Exception: %s\n" % str(ex)
-                msg += "Passing over this error.  It will reoccur next interation!\n"
-                msg += "Please check or remove this subscription!\n"
+                msg = "Unknown exception while setting the bulk cache:\n"
+                msg += str(ex)
                 logging.error(msg)
-                continue
+                logging.debug("Error while setting bulkCache with following values: %s\n", nameDictList)
+                raise JobCreatorException(msg)
 
-            logging.debug("Going to call wmbsJobFactory for sub %i with limit %i", subscriptionID, self.limit)
-
-            splitParams = retrieveJobSplitParams(wmWorkload, workflow.task)
-            logging.debug("Split Params: %s", splitParams)
-
-            # Load the proper job splitting module
-            splitterFactory = SplitterFactory(splitParams.get('algo_package', "WMCore.JobSplitting"))
-            # and return an instance of the splitting algorithm
-            wmbsJobFactory = splitterFactory(package="WMCore.WMBS",
-                                             subscription=wmbsSubscription,
-                                             generators=seederList,
-                                             limit=self.limit)
-
-            # Turn on the jobFactory --> get available files for that subscription, keep result proxies
-            wmbsJobFactory.open()
-
-            # Create a function to hold it, calling __call__ from the JobFactory
-            # which then calls algorithm method of the job splitting algo instance
-            jobSplittingFunction = runSplitter(jobFactory=wmbsJobFactory,
-                                               splitParams=splitParams)
-
-            # Now we get to find out how many jobs there are.
-            jobNumber = self.countJobs.execute(workflow=workflow.id,
-                                               conn=myThread.transaction.conn,
-                                               transaction=True)
-            jobNumber += splitParams.get('initial_lfn_counter', 0)
-            logging.debug("Have %i jobs for workflow %s already in database.", jobNumber, workflow.name)
-
-            while True:
-                # This loop runs over the jobFactory,
-                # using yield statements and a pre-existing proxy to
-                # generate and process new jobs
-
-                # First we need the jobs.
-                myThread.transaction.begin()
-                try:
-                    wmbsJobGroups = next(jobSplittingFunction)
-                    logging.info("Retrieved %i jobGroups from jobSplitter", len(wmbsJobGroups))
-                except StopIteration:
-                    # If you receive a stopIteration, we're done
-                    logging.info("Completed iteration over subscription %i", subscriptionID)
-                    myThread.transaction.commit()
-                    break
-
-                # If we have no jobGroups, we're done
-                if len(wmbsJobGroups) == 0:
-                    logging.info("Found end in iteration over subscription %i", subscriptionID)
-                    myThread.transaction.commit()
-                    break
-
-                # Assemble a dict of all the info
-                processDict = {'workflow': workflow,
-                               'wmWorkload': wmWorkload,
-                               'wmTaskName': wmTask.getPathName(),
-                               'requestType': wmWorkload.getRequestType(),
-                               'jobNumber': jobNumber,
-                               'sandbox': wmTask.data.input.sandbox,
-                               'owner': wmWorkload.getOwner().get('name', None),
-                               'ownerDN': wmWorkload.getOwner().get('dn', None),
-                               'ownerGroup': wmWorkload.getOwner().get('vogroup', ''),
-                               'ownerRole': wmWorkload.getOwner().get('vorole', ''),
-                               'numberOfCores': wmTask.getNumberOfCores(),
-                               'requiresGPU': wmTask.getRequiresGPU(),
-                               'gpuRequirements': wmTask.getGPURequirements(),
-                               'inputDataset': wmTask.getInputDatasetPath(),
-                               'inputPileup': wmTask.getInputPileupDatasets(),
-                               'swVersion': wmTask.getSwVersion(allSteps=True),
-                               'scramArch': wmTask.getScramArch(),
-                               'agentNumber': self.agentNumber,
-                               'agentName': self.agentName,
-                               'allowOpportunistic': allowOpport}
-
-                tempSubscription = Subscription(id=wmbsSubscription['id'])
-
-                # if we have glideinWMS constraints, then adapt all jobs
-                if self.glideinLimits:
-                    capResourceEstimates(wmbsJobGroups, self.glideinLimits)
-
-                nameDictList = []
-                for wmbsJobGroup in wmbsJobGroups:
-                    # For each jobGroup, put a dictionary
-                    # together and run it with creatorProcess
-                    jobsInGroup = len(wmbsJobGroup.jobs)
-                    wmbsJobGroup.subscription = tempSubscription
-                    tempDict = {}
-                    tempDict.update(processDict)
-                    tempDict['jobGroup'] = wmbsJobGroup
-                    tempDict['jobNumber'] = jobNumber
-                    tempDict['inputDatasetLocations'] = wmbsJobGroup.getLocationsForJobs()
-
-                    jobGroup = creatorProcess(work=tempDict,
-                                              jobCacheDir=self.jobCacheDir)
-                    jobNumber += jobsInGroup
-
-                    # Set jobCache for group
-                    for job in jobGroup.jobs:
-                        nameDictList.append({'jobid': job['id'],
-                                             'cacheDir': job['cache_dir']})
-                        job["user"] = wmWorkload.getOwner()["name"]
-                        job["group"] = wmWorkload.getOwner()["group"]
-                # Set the caches in the database
-                try:
-                    if len(nameDictList) > 0:
-                        self.setBulkCache.execute(jobDictList=nameDictList,
-                                                  conn=myThread.transaction.conn,
-                                                  transaction=True)
-                except WMException:
-                    raise
-                except Exception as ex:
-                    msg = "Unknown exception while setting the bulk cache:\n"
-                    msg += str(ex)
-                    logging.error(msg)
-                    logging.debug("Error while setting bulkCache with following values: %s\n", nameDictList)
-                    raise JobCreatorException(msg)
-
-                # Advance the jobGroup in changeState
-                for wmbsJobGroup in wmbsJobGroups:
-                    self.advanceJobGroup(wmbsJobGroup=wmbsJobGroup)
-
-                # Now end the transaction so that everything is wrapped
-                # in a single rollback
-                myThread.transaction.commit()
+            timing['database'] += time.time() - stepTime
 
-            # END: While loop over jobFactory
+            # Advance the jobGroup in changeState
+            stepTime = time.time()
+            for wmbsJobGroup in wmbsJobGroups:
+                self.advanceJobGroup(wmbsJobGroup=wmbsJobGroup)
+            timing['changeState'] += time.time() - stepTime
 
-            # Close the jobFactory
-            wmbsJobFactory.close()
+            # Now end the transaction so that everything is wrapped
+            # in a single rollback
+            stepTime = time.time()
+            myThread.transaction.commit()
+            timing['database'] += time.time() - stepTime
 
-        return
+        # END: While loop over jobFactory
+
+        # Close the jobFactory
+        wmbsJobFactory.close()
+
+        timing['factory'] = dict(wmbsJobFactory.timing)
+        timing['total'] = time.time() - startTime
+        return timing
 
     # This is the code for the multiprocessing based queue retrieval system
     # I'm keeping this here because I hope to go back and re-instate this once
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+"""
+_JobSubmitScheduler_
+
+Data structures used by the JobSubmitterPoller to decide which of the
+cached jobs can be submitted in a cycle.
+
+Jobs are indexed by their final priority and, within a priority, by their
+placement class: the task type and the frozenset of possible sites. All the
+jobs of a class compete for exactly the same site/task thresholds, so as soon
+as one of them can't be placed anywhere, none of the following ones of the
+same class can be placed either, for the rest of the cycle. That holds because
+the pending/running counters only go up within a cycle and the thresholds
+only shrink as the job priority goes down.
+"""
+
+from builtins import object
+from future.utils import viewitems
+
+import heapq
+
+
+class JobSubmitScheduler(object):
+    """
+    _JobSubmitScheduler_
+
+    Priority-indexed queue of the job ids cached by the JobSubmitter.
+    Each (priority, class) keeps a list of job ids sorted in submission order
+    (lowest job id first). Removed jobs are only dropped from those lists in
+    the next call to priorities(), so removals are O(1).
+    """
+
+    def __init__(self):
+        self.jobs = {}  # key'ed by job id, with the (priority, class) of the job
+        self.queues = {}  # key'ed by priority, then by class, with a list of job ids
+        self.unsorted = set()  # (priority, class) whose list of job ids needs sorting
+        self.stale = 0
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def __contains__(self, jobid):
+        return jobid in self.jobs
+
+    def add(self, jobPrio, jobid, jobType, possibleSites):
+        """
+        Add a job to the queue of its priority and placement class
+        """
+        if jobid in self.jobs:
+            return
+        jobClass = (jobType, possibleSites)
+        queue = self.queues.setdefault(jobPrio, {}).setdefault(jobClass, [])
+        if queue and queue[-1] > jobid:
+            self.unsorted.add((jobPrio, jobClass))
+        queue.append(jobid)
+        self.jobs[jobid] = (jobPrio, jobClass)
+
+    def discard(self, jobid):
+        """
+        Remove a job from the scheduler, if it's there
+        """
+        if self.jobs.pop(jobid, None) is not None:
+            self.stale += 1
+
+    def clear(self):
+        """
+        Remove all the jobs
+        """
+        self.jobs = {}
+        self.queues = {}
+        self.unsorted = set()
+        self.stale = 0
+
+    def priorities(self):
+        """
+        Drop the removed jobs from the queues and return the list of
+        priorities with jobs, from the highest to the lowest one.
+        """
+        if self.stale:
+            for jobPrio in list(self.queues):
+                for jobClass in list(self.queues[jobPrio]):
+                    key = (jobPrio, jobClass)
+                    # a removed job might have been added back in the meantime, so
+                    # make sure it's not listed twice
+                    queue = set(x for x in self.queues[jobPrio][jobClass] if self.jobs.get(x) == key)
+                    if queue:
+                        self.queues[jobPrio][jobClass] = sorted(queue)
+                        self.unsorted.discard(key)
+                    else:
+                        del self.queues[jobPrio][jobClass]
+                        self.unsorted.discard(key)
+                if not self.queues[jobPrio]:
+                    del self.queues[jobPrio]
+            self.stale = 0
+
+        for jobPrio, jobClass in self.unsorted:
+            self.queues[jobPrio][jobClass].sort()
+        self.unsorted = set()
+
+        return sorted(self.queues, reverse=True)
+
+    def iterJobs(self, jobPrio, blockedClasses):
+        """
+        Generator over the jobs of a priority in job id order, merging all
+        its classes. It yields tuples with the job class, the job id and
+        the number of jobs left in that class (including the current one).
+        Classes added to blockedClasses while iterating are skipped from
+        then on. The queues must not be modified while iterating, apart
+        from calls to discard.
+        """
+        queues = self.queues.get(jobPrio, {})
+        heap = [(queue[0], 0, jobClass) for jobClass, queue in viewitems(queues)]
+        heapq.heapify(heap)
+        while heap:
+            jobid, index, jobClass = heapq.heappop(heap)
+            if jobClass in blockedClasses:
+                continue
+            queue = queues[jobClass]
+            if index + 1 < len(queue):
+                heapq.heappush(heap, (queue[index + 1], index + 1, jobClass))
+            if self.jobs.get(jobid) == (jobPrio, jobClass):
+                yield jobClass, jobid, len(queue) - index
+
+
+class SiteAvailability(object):
+    """
+    _SiteAvailability_
+
+    Per task type bitmaps of the sites which can't take more jobs of that
+    type in the current cycle, with the reason why. Sites are assigned a bit
+    the first time they are seen, and the bitmap of each set of possible
+    sites is only computed once.
+    """
+
+    def __init__(self):
+        self.siteBits = {}
+        self.sitesMasks = {}
+        self.unavailable = {}  # key'ed by task type, bitmap of unavailable sites
+        self.conditions = {}  # key'ed by (site, task type), reason why it's unavailable
+
+    def sitesMask(self, sites):
+        """
+        Return the bitmap for a set of sites
+        """
+        try:
+            return self.sitesMasks[sites]
+        except KeyError:
+            mask = 0
+            for siteName in sites:
+                mask |= 1 << self.siteBits.setdefault(siteName, len(self.siteBits))
+            self.sitesMasks[sites] = mask
+            return mask
+
+    def setUnavailable(self, siteName, jobType, condition):
+        """
+        Flag a site as unavailable for a task type for the rest of the cycle
+        """
+        self.conditions[(siteName, jobType)] = condition
+        self.unavailable[jobType] = self.unavailable.get(jobType, 0) | self.sitesMask(frozenset([siteName]))
+
+    def getCondition(self, siteName, jobType):
+        """
+        Return the reason why a site is unavailable for a task type, or None
+        """
+        return self.conditions.get((siteName, jobType))
+
+    def allUnavailable(self, jobType, sites):
+        """
+        Check whether all the sites are unavailable for a task type
+        """
+        return self.sitesMask(sites) & ~self.unavailable.get(jobType, 0) == 0
@@ -17,7 +17,6 @@ import threading
 import json
 import time
 from collections import defaultdict, Counter
-import pickle
 
 from Utils.Timers import timeFunction
 from WMCore.DAOFactory import DAOFactory
@@ -27,6 +26,7 @@ from WMCore.JobStateMachine.ChangeState import ChangeState
 from WMCore.WorkerThreads.BaseWorkerThread import BaseWorkerThread
 from WMCore.ResourceControl.ResourceControl import ResourceControl
 from WMCore.DataStructs.JobPackage import JobPackage
+from WMCore.DataStructs.JobArchive import JobCacheReader
 from WMCore.FwkJobReport.Report import Report
 from WMCore.WMException import WMException
 from WMCore.BossAir.BossAirAPI import BossAirAPI
@@ -34,6 +34,7 @@ from WMCore.Services.ReqMgr.ReqMgr import ReqMgr
 from WMCore.Services.ReqMgrAux.ReqMgrAux import ReqMgrAux
 
 from WMComponent.JobSubmitter.JobSubmitAPI import availableScheddSlots
+from WMComponent.JobSubmitter.JobSubmitScheduler import JobSubmitScheduler, SiteAvailability
 
 
 def jobSubmitCondition(jobStats):
@@ -94,7 +95,7 @@ class JobSubmitterPoller(BaseWorkerThread):
         self.enableAllSites = False
 
         # Additions for caching-based JobSubmitter
-        self.jobsByPrio = {}  # key'ed by the final job priority, which contains a set of job ids
+        self.jobsByPrio = JobSubmitScheduler()  # cached job ids indexed by the final job priority
         self.jobDataCache = {}  # key'ed by the job id, containing the whole job info dict
         self.jobsToPackage = {}
         self.locationDict = {}
@@ -273,27 +274,27 @@ class JobSubmitterPoller(BaseWorkerThread):
         timeNow = int(time.time())
         badJobs = dict([(x, []) for x in range(71101, 71106)])
         newJobIds = set()
+        jobCacheReader = JobCacheReader()  # keeps the job archives/indexes of the JobCollections open
 
         logging.info("Refreshing priority cache with currently %i jobs", len(self.jobDataCache))
 
-        newJobs = self.listJobsAction.execute(limitRows=self.maxJobsToCache)
         if self.useReqMgrForCompletionCheck:
             # if reqmgr is used (not Tier0 Agent) get the aborted/forceCompleted record
             abortedAndForceCompleteRequests = self.abortedAndForceCompleteWorkflowCache.getData()
         else:
             abortedAndForceCompleteRequests = []
 
-        logging.info("Found %s new jobs to be submitted.", len(newJobs))
-
         if self.enableAllSites:
             logging.info("Agent is in speed drain mode. Submitting jobs to all possible locations.")
 
         logging.info("Determining possible sites for new jobs...")
+        # stream the jobs from the database instead of loading up to maxJobsToCache rows at once
+        newJobs = self.listJobsAction.execute(limitRows=self.maxJobsToCache, stream=True)
         jobCount = 0
         for newJob in newJobs:
             jobCount += 1
             if jobCount % 5000 == 0:
-                logging.info("Processed %d/%d new jobs.", jobCount, len(newJobs))
+                logging.info("Processed %d new jobs.", jobCount)
 
             # whether newJob belongs to aborted or force-complete workflow, and skip it if it is.
             if newJob['request_name'] in abortedAndForceCompleteRequests and \
@@ -305,20 +306,18 @@ class JobSubmitterPoller(BaseWorkerThread):
             if jobID in self.jobDataCache:
                 continue
 
-            pickledJobPath = os.path.join(newJob["cache_dir"], "job.pkl")
-
-            if not os.path.isfile(pickledJobPath):
-                # Then we have a problem - there's no file
-                logging.warning("Could not find pickled jobObject %s", pickledJobPath)
-                badJobs[71104].append(newJob)
-                continue
+            # look for the job in the archive or the index of its JobCollection, then for its own pickle
             try:
-                with open(pickledJobPath, 'rb') as jobHandle:
-                    loadedJob = pickle.load(jobHandle)
+                loadedJob = jobCacheReader.getJob(jobID, newJob["cache_dir"])
             except Exception as ex:
-                logging.warning("Failed to load job pickle object %s", pickledJobPath)
+                logging.warning("Failed to load job pickle object for job %s in %s", jobID, newJob["cache_dir"])
                 badJobs[71105].append(newJob)
                 continue
+            if loadedJob is None:
+                # Then we have a problem - there's no file
+                logging.warning("Could not find pickled jobObject %s", os.path.join(newJob["cache_dir"], "job.pkl"))
+                badJobs[71104].append(newJob)
+                continue
 
             # figure out possible locations for job
             possibleLocations = loadedJob["possiblePSN"]
@@ -371,8 +370,6 @@ class JobSubmitterPoller(BaseWorkerThread):
 
             # calculate the final job priority such that we can order cached jobs by prio
             jobPrio = newJob['task_prio'] * self.maxTaskPriority + newJob['wf_priority']
-            self.jobsByPrio.setdefault(jobPrio, set())
-            self.jobsByPrio[jobPrio].add(jobID)
 
             # allow job baggage to override numberOfCores
             #       => used for repacking to get more slots/disk
@@ -413,6 +410,10 @@ class JobSubmitterPoller(BaseWorkerThread):
             jobInfo.update(newJob)
 
             self.jobDataCache[jobID] = jobInfo
+            self.jobsByPrio.add(jobPrio, jobID, jobInfo['task_type'], jobInfo['possibleSites'])
+
+        jobCacheReader.close()
+        logging.info("Found %d new jobs to be submitted.", jobCount)
 
         # Register failures in submission
         for errorCode in badJobs:
@@ -470,11 +471,7 @@ class JobSubmitterPoller(BaseWorkerThread):
 
         for jobid in jobIDsToPurge:
             self.jobDataCache.pop(jobid, None)
-            for jobPrio in self.jobsByPrio:
-                if jobid in self.jobsByPrio[jobPrio]:
-                    # then the jobid was found, go to the next one
-                    self.jobsByPrio[jobPrio].discard(jobid)
-                    break
+            self.jobsByPrio.discard(jobid)
         return
 
     def _handleSubmitFailedJobs(self, badJobs, exitCode):
@@ -546,7 +543,7 @@ class JobSubmitterPoller(BaseWorkerThread):
         # refresh is needed, for now it forces a full cache refresh
         if set(newDrainSites.keys()) != self.drainSitesSet or newAbortSites != self.abortSites:
             logging.info("Draining or Aborted sites have changed, the cache will be rebuilt.")
-            self.jobsByPrio = {}
+            self.jobsByPrio.clear()
             self.jobDataCache = {}
 
         self.currentRcThresholds = rcThresholds
@@ -663,51 +660,73 @@ class JobSubmitterPoller(BaseWorkerThread):
         exitLoop = False
         jobSubmitLogBySites = defaultdict(lambda: defaultdict(Counter))
         jobSubmitLogByPriority = defaultdict(lambda: defaultdict(Counter))
+        # sites flagged as unavailable stay like that for the whole cycle,
+        # because the thresholds never grow as we go down in priority
+        siteAvailability = SiteAvailability()
+        # possible sites without 0 task thresholds, key'ed by job class
+        sitesByClass = {}
 
         # iterate over jobs from the highest to the lowest prio
-        for jobPrio in sorted(self.jobsByPrio, reverse=True):
+        for jobPrio in self.jobsByPrio.priorities():
 
             # then we're completely done and have our basket full of jobs to submit
             if exitLoop:
                 break
 
+            # job classes (task type and possible sites) that can't be placed anymore
+            blockedClasses = set()
             # can we assume jobid=1 is older than jobid=3? I think so...
-            for jobid in sorted(self.jobsByPrio[jobPrio]):
-                jobType = self.jobDataCache[jobid]['task_type']
-                possibleSites = self.jobDataCache[jobid]['possibleSites']
-                # remove sites with 0 task thresholds
-                possibleSites = self.checkZeroTaskThresholds(jobType, possibleSites)
+            for jobClass, jobid, jobsLeft in self.jobsByPrio.iterJobs(jobPrio, blockedClasses):
+                jobType = jobClass[0]
+                if jobClass not in sitesByClass:
+                    # remove sites with 0 task thresholds
+                    sitesByClass[jobClass] = tuple(self.checkZeroTaskThresholds(jobType, jobClass[1]))
+                possibleSites = sitesByClass[jobClass]
                 jobSubmitLogByPriority[jobPrio][jobType]['Total'] += 1
-                # now look for sites with free pending slots
-                for siteName in possibleSites:
-                    condition = self._getJobSubmitCondition(jobPrio, siteName, jobType)
-                    if condition != "JobSubmitReady":
-                        jobSubmitLogBySites[siteName][jobType][condition] += 1
-                        logging.debug("Found a job for %s : %s", siteName, condition)
-                        continue
-
-                    # pop the job dictionary object and update it
-                    cachedJob = self.jobDataCache.pop(jobid)
-                    cachedJob['custom'] = {'location': siteName}
-                    cachedJob['possibleSites'] = possibleSites
-
-                    # Sort jobs by jobPackage and get it in place to be submitted by the plugin
-                    package = cachedJob['packageDir']
-                    jobsToSubmit.setdefault(package, [])
-                    jobsToSubmit[package].append(cachedJob)
 
-                    # update site/task thresholds and the component job counter
-                    self.currentRcThresholds[siteName]["total_pending_jobs"] += 1
-                    self.currentRcThresholds[siteName]['thresholds'][jobType]["task_pending_jobs"] += 1
-                    jobsCount += 1
-                    jobSubmitLogBySites[siteName][jobType]["submitted"] += 1
-                    jobSubmitLogByPriority[jobPrio][jobType]['submitted'] += 1
-
-                    # jobs that will be submitted must leave the job data cache
-                    self.jobsByPrio[jobPrio].discard(jobid)
-
-                    # found a site to submit this job, so go to the next job
-                    break
+                # now look for sites with free pending slots
+                if not siteAvailability.allUnavailable(jobType, possibleSites):
+                    for siteName in possibleSites:
+                        condition = siteAvailability.getCondition(siteName, jobType)
+                        if condition is None:
+                            condition = self._getJobSubmitCondition(jobPrio, siteName, jobType)
+                        if condition != "JobSubmitReady":
+                            siteAvailability.setUnavailable(siteName, jobType, condition)
+                            jobSubmitLogBySites[siteName][jobType][condition] += 1
+                            logging.debug("Found a job for %s : %s", siteName, condition)
+                            continue
+
+                        # pop the job dictionary object and update it
+                        cachedJob = self.jobDataCache.pop(jobid)
+                        cachedJob['custom'] = {'location': siteName}
+                        cachedJob['possibleSites'] = list(possibleSites)
+
+                        # Sort jobs by jobPackage and get it in place to be submitted by the plugin
+                        package = cachedJob['packageDir']
+                        jobsToSubmit.setdefault(package, [])
+                        jobsToSubmit[package].append(cachedJob)
+
+                        # update site/task thresholds and the component job counter
+                        self.currentRcThresholds[siteName]["total_pending_jobs"] += 1
+                        self.currentRcThresholds[siteName]['thresholds'][jobType]["task_pending_jobs"] += 1
+                        jobsCount += 1
+                        jobSubmitLogBySites[siteName][jobType]["submitted"] += 1
+                        jobSubmitLogByPriority[jobPrio][jobType]['submitted'] += 1
+
+                        # jobs that will be submitted must leave the job data cache
+                        self.jobsByPrio.discard(jobid)
+
+                        # found a site to submit this job, so go to the next job
+                        break
+
+                if jobid in self.jobsByPrio:
+                    # no site can take this job, nor the remaining jobs of the same class.
+                    # Skip them but account for them in the submission report
+                    blockedClasses.add(jobClass)
+                    jobSubmitLogByPriority[jobPrio][jobType]['Total'] += jobsLeft - 1
+                    for siteName in possibleSites:
+                        condition = siteAvailability.getCondition(siteName, jobType)
+                        jobSubmitLogBySites[siteName][jobType][condition] += jobsLeft - 1
 
                 # set the flag and get out of the job iteration
                 if jobsCount >= self.maxJobsThisCycle:
@@ -93,6 +93,8 @@ class CleanCouchPoller(BaseWorkerThread):
         self.perfDashBoardMaxLumi = getattr(config.TaskArchiver, "perfDashBoardMaxLumi", 9000)
         self.dashBoardUrl = getattr(config.TaskArchiver, "dashBoardUrl", None)
         self.DataKeepDays = getattr(config.TaskArchiver, "DataKeepDays", 0.125)  # 3 hours
+        # number of documents deleted per bulk request when deleting a workflow from couch
+        self.deleteBatchSize = 1000
 
         # Initialise with None all setup defined variables:
         self.teamName = None
@@ -152,6 +154,12 @@ class CleanCouchPoller(BaseWorkerThread):
         statSummaryDBName = self.config.JobStateMachine.summaryStatsDBName
         self.statsumdatabase = self.jobCouchdb.connectDatabase(statSummaryDBName)
 
+        # optionally, the workflow documents are deleted with concurrent background bulk commits
+        commitWindow = getattr(self.config.TaskArchiver, 'couchCommitWindow', 0)
+        if commitWindow:
+            for couchDB in (self.jobsdatabase, self.fwjrdatabase, self.wmstatsCouchDB.getDBInstance()):
+                couchDB.startAsyncCommits(commitWindow)
+
         logging.debug("Using url %s/%s for job",
                       sanitizeURL(self.config.JobStateMachine.couchurl)['url'], jobDBName)
         logging.debug("Writing to  %s/%s for workloadSummary", sanitizeURL(workDBurl)['url'], workDBName)
@@ -303,20 +311,26 @@ class CleanCouchPoller(BaseWorkerThread):
             except CouchNotFoundError as ex:
                 return {'status': 'warning', 'message': "%s: %s" % (workflowName, str(ex))}
         else:
+            # the documents are deleted page by page while the view is read,
+            # the next page starts after the last row read so it is not affected
+            committed = []
             try:
-                jobs = couchDB.loadView(db, view, options=options)['rows']
+                for j in couchDB.iterView(db, view, options=options, prefetch=True):
+                    doc = {}
+                    doc["_id"] = j['value']['id']
+                    doc["_rev"] = j['value']['rev']
+                    couchDB.queueDelete(doc)
+                    if couchDB.getQueueSize() >= self.deleteBatchSize:
+                        if couchDB.asyncCommitter is not None:
+                            couchDB.commitAsync()
+                        else:
+                            committed.extend(couchDB.commit())
+                committed.extend(couchDB.commit() or [])
             except Exception as ex:
-                errorMsg = "Error on loading jobs for %s" % workflowName
+                errorMsg = "Error on loading or deleting jobs for %s" % workflowName
                 logging.warning("%s/n%s", str(ex), errorMsg)
                 return {'status': 'error', 'message': errorMsg}
 
-            for j in jobs:
-                doc = {}
-                doc["_id"] = j['value']['id']
-                doc["_rev"] = j['value']['rev']
-                couchDB.queueDelete(doc)
-            committed = couchDB.commit()
-
         if committed:
             # create the error report
             errorReport = {}
@@ -34,6 +34,7 @@ from WMCore import WMLogging
 from WMCore.Agent.ConfigDBMap import ConfigDBMap
 from WMCore.Agent.Daemon.Create import createDaemon
 from WMCore.Agent.HeartbeatAPI import HeartbeatAPI
+from WMCore.Database.CouchWriteBehind import stopCouchWriteBehinds
 from WMCore.Database.DBFactory import DBFactory
 from WMCore.Database.Transaction import Transaction
 from WMCore.WMException import WMException
@@ -352,6 +353,13 @@ class Harness(object):
             # We may not have a thread manager
             pass
 
+        # Commit the documents still in the CouchDB write-behind queues
+        try:
+            if not stopCouchWriteBehinds(timeout=getattr(self.config.Agent, 'couchFlushTimeout', 300)):
+                logging.warning(">>>Not all the CouchDB documents were committed, they are left in the spool")
+        except Exception as ex:
+            logging.exception(">>>Failed to flush the CouchDB write-behind queues: %s", str(ex))
+
         if wait:
             logging.info(">>>Shut down of component while waiting for threads to finish")
             # check if nr of threads is specified.
@@ -7,6 +7,7 @@ import logging
 import os
 import os.path
 import re
+import stat
 import threading
 import time
 import classad
@@ -126,6 +127,14 @@ class SimpleCondorPlugin(BasePlugin):
         self.acctGroup = getattr(config.BossAir, 'acctGroup', "production")
         self.acctGroupUser = getattr(config.BossAir, 'acctGroupUser', "cmsdataops")
  
+        # Incremental tracking: only query the jobs which changed status since the
+        # previous cycle, with a full query every fullTrackingInterval seconds
+        self.incrementalTracking = getattr(config.BossAir, 'incrementalTracking', False)
+        self.fullTrackingInterval = getattr(config.BossAir, 'fullTrackingInterval', 3600)
+        self.trackingSlack = getattr(config.BossAir, 'trackingSlack', 300)
+        self.lastTrackTime = None
+        self.lastFullTrackTime = None
+
         if hasattr(config.BossAir, 'condorRequirementsString'):
             self.reqStr = config.BossAir.condorRequirementsString
         else:
@@ -196,8 +205,16 @@ class SimpleCondorPlugin(BasePlugin):
         First, the total number of jobs still running
         Second, the jobs that need to be changed
         Third, the jobs that need to be completed
+
+        With incrementalTracking enabled, only the jobs which entered their
+        current status since the previous cycle (minus trackingSlack seconds)
+        are retrieved from the schedd queue, together with the ones which left
+        the queue in the meantime (from the schedd history); the other jobs keep
+        their status. All the jobs are retrieved on the first cycle and every
+        fullTrackingInterval seconds.
         """
         jobInfo = {}
+        leftQueue = set()
         changeList = []
         completeList = []
         runningList = []
@@ -207,10 +224,23 @@ class SimpleCondorPlugin(BasePlugin):
 
         schedd = htcondor.Schedd()
 
+        trackTime = int(time.time())
+        fullTrack = not self.incrementalTracking or self.lastTrackTime is None or \
+                    trackTime - self.lastFullTrackTime >= self.fullTrackingInterval
+        constraint = "WMAgent_AgentName == %s" % classad.quote(self.agent)
+        projection = ['ClusterId', 'ProcId', 'JobStatus', 'MachineAttrGLIDEIN_CMSSite0']
+
         logging.debug("Start: Retrieving classAds using Condor Python XQuery")
         try:
-            itobj = schedd.xquery("WMAgent_AgentName == %s" % classad.quote(self.agent),
-                                  ['ClusterId', 'ProcId', 'JobStatus', 'MachineAttrGLIDEIN_CMSSite0'])
+            if fullTrack:
+                itobj = schedd.xquery(constraint, projection)
+            else:
+                since = self.lastTrackTime - self.trackingSlack
+                changedConstraint = "%s && EnteredCurrentStatus >= %d" % (constraint, since)
+                itobj = schedd.xquery(changedConstraint, projection)
+                for jobAd in schedd.history(changedConstraint, ['ClusterId', 'ProcId'], match=-1,
+                                            since=classad.ExprTree("EnteredCurrentStatus < %d" % since)):
+                    leftQueue.add("%s.%s" % (jobAd['ClusterId'], jobAd['ProcId']))
             for jobAd in itobj:
                 gridId = "%s.%s" % (jobAd['ClusterId'], jobAd['ProcId'])
                 jobStatus = SimpleCondorPlugin.exitCodeMap().get(jobAd.get('JobStatus'), 'Unknown')
@@ -222,17 +252,26 @@ class SimpleCondorPlugin(BasePlugin):
             logging.exception(ex)
             return runningList, changeList, completeList
 
-        logging.debug("Finished retrieving %d classAds from Condor", len(jobInfo))
+        self.lastTrackTime = trackTime
+        if fullTrack:
+            self.lastFullTrackTime = trackTime
+            logging.debug("Finished retrieving %d classAds from Condor", len(jobInfo))
+        else:
+            logging.debug("Finished retrieving %d changed classAds and %d jobs out of the queue from Condor",
+                          len(jobInfo), len(leftQueue))
 
         # now go over the jobs and see what we have
         for job in jobs:
 
-            # if the schedd doesn't know a job, consider it complete
-            # doing any further checks is not cost effective
-            if job['gridid'] not in jobInfo:
+            if job['gridid'] in jobInfo:
+                (newStatus, location) = jobInfo[job['gridid']]
+            elif fullTrack or job['gridid'] in leftQueue:
+                # if the schedd doesn't know a job, consider it complete
+                # doing any further checks is not cost effective
                 (newStatus, location) = ('Completed', None)
             else:
-                (newStatus, location) = jobInfo[job['gridid']]
+                # the job didn't change status since the previous cycle
+                (newStatus, location) = (job['status'], None)
 
             # check for status changes
             if newStatus != job['status']:
@@ -278,10 +317,15 @@ class SimpleCondorPlugin(BasePlugin):
                 continue
 
             reportName = os.path.join(job['cache_dir'], 'Report.%i.pkl' % job['retry_count'])
-            if os.path.isfile(reportName) and os.path.getsize(reportName) > 0:
+            # a single stat per job, this runs for every completed job
+            try:
+                reportStat = os.stat(reportName)
+            except OSError:
+                reportStat = None
+            if reportStat is not None and stat.S_ISREG(reportStat.st_mode) and reportStat.st_size > 0:
                 # everything in order, move on
                 continue
-            elif os.path.isdir(reportName):
+            elif reportStat is not None and stat.S_ISDIR(reportStat.st_mode):
                 # Then something weird has happened. Report error, do nothing
                 logging.error("The job report for job with id %s and gridid %s is a directory", job['id'],
                               job['gridid'])
@@ -289,7 +333,7 @@ class SimpleCondorPlugin(BasePlugin):
             else:
                 logging.error("No job report for job with id %s and gridid %s", job['id'], job['gridid'])
 
-                if os.path.isfile(reportName):
+                if reportStat is not None:
                     os.remove(reportName)
 
                 # create a report from scratch
@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+"""
+_JobArchive_
+
+Append-only, indexed archive of the pickled jobs of a JobCollection
+directory. It can replace the job.pkl file of each job directory, such that
+the JobCreator writes all the jobs of a collection with a single open and
+the other components read them from a single memory mapped file.
+
+File layout (little endian):
+  - header: magic string and format version
+  - records: (job id, length, crc32) followed by a pickled job
+
+Records are only ever appended, a job appended more than once is read from
+its last record. A record truncated by a crash is ignored when reading and
+overwritten by the next append.
+
+Collections written with the previous layouts, a JobSubmitIndex or one
+job.pkl per job directory, are still read by JobCacheReader, and can be
+converted to an archive with migrateJobCollection.
+"""
+
+from builtins import object
+
+import logging
+import mmap
+import os
+import pickle
+import struct
+import zlib
+
+from Utils.PythonVersion import HIGHEST_PICKLE_PROTOCOL
+from WMCore.DataStructs.JobSubmitIndex import INDEX_FILENAME, loadJobSubmitIndex
+from WMCore.WMException import WMException
+
+ARCHIVE_FILENAME = "JobArchive.bin"
+ARCHIVE_MAGIC = b"WMJOBARC"
+ARCHIVE_VERSION = 1
+
+_HEADER = struct.Struct("<8sI")
+_RECORD = struct.Struct("<QQI")
+
+
+class JobArchiveException(WMException):
+    """
+    _JobArchiveException_
+
+    Raised when an archive file is corrupted or written with an unknown version.
+    """
+    pass
+
+
+def _scanRecords(buf, path):
+    """
+    Return a dictionary with the (offset, length, crc32) of the last record
+    of each job id in an archive buffer, and the offset where the complete
+    records end
+    """
+    if len(buf) < _HEADER.size:
+        raise JobArchiveException("Truncated job archive file %s" % path)
+    magic, version = _HEADER.unpack_from(buf, 0)
+    if magic != ARCHIVE_MAGIC or version != ARCHIVE_VERSION:
+        raise JobArchiveException("Unknown job archive format in %s" % path)
+
+    entries = {}
+    offset = _HEADER.size
+    size = len(buf)
+    while offset + _RECORD.size <= size:
+        jobId, length, crc = _RECORD.unpack_from(buf, offset)
+        if offset + _RECORD.size + length > size:
+            break
+        entries[jobId] = (offset + _RECORD.size, length, crc)
+        offset += _RECORD.size + length
+    if offset != size:
+        logging.warning("Ignoring a truncated record at the end of the job archive %s", path)
+    return entries, offset
+
+
+def _appendRecords(directory, records):
+    """
+    Append a list of (job id, pickled job) records to the archive of a
+    directory, creating it if needed. A truncated record left by a crash
+    is overwritten. Return the path to the archive file.
+    """
+    archivePath = os.path.join(directory, ARCHIVE_FILENAME)
+    data = b"".join(_RECORD.pack(int(jobId), len(blob), zlib.crc32(blob)) + blob for jobId, blob in records)
+
+    with open(archivePath, 'ab+') as fileHandle:
+        size = fileHandle.tell()
+        if size == 0:
+            fileHandle.write(_HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION))
+        else:
+            with mmap.mmap(fileHandle.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                _, end = _scanRecords(buf, archivePath)
+            if end != size:
+                fileHandle.truncate(end)
+                fileHandle.seek(end)
+        fileHandle.write(data)
+    return archivePath
+
+
+def appendJobArchive(directory, jobs):
+    """
+    _appendJobArchive_
+
+    Pickle a list of jobs and append them to the archive of the given
+    directory, creating it if needed.
+    Return the path to the archive file.
+    """
+    return _appendRecords(directory, [(job['id'], pickle.dumps(job, protocol=HIGHEST_PICKLE_PROTOCOL))
+                                      for job in jobs])
+
+
+class JobArchive(object):
+    """
+    _JobArchive_
+
+    Read-only access to an archive file written by appendJobArchive
+    """
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, ARCHIVE_FILENAME)
+        self.entries = {}
+        self._mmap = None
+
+        with open(self.path, 'rb') as fileHandle:
+            if os.fstat(fileHandle.fileno()).st_size < _HEADER.size:
+                raise JobArchiveException("Truncated job archive file %s" % self.path)
+            self._mmap = mmap.mmap(fileHandle.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            self.entries, _ = _scanRecords(self._mmap, self.path)
+        except JobArchiveException:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, jobId):
+        return jobId in self.entries
+
+    def close(self):
+        """
+        Release the memory mapped file
+        """
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def getRaw(self, jobId):
+        """
+        Return the pickled job with the given id, or None if the job is not
+        in the archive. Raise a JobArchiveException if the record is corrupted.
+        """
+        if jobId not in self.entries:
+            return None
+        offset, length, crc = self.entries[jobId]
+        blob = self._mmap[offset:offset + length]
+        if zlib.crc32(blob) != crc:
+            raise JobArchiveException("Corrupted record for job %s in the job archive %s" % (jobId, self.path))
+        return blob
+
+    def get(self, jobId, default=None):
+        """
+        Unpickle and return the job with the given id, or default if the job
+        is not in the archive
+        """
+        blob = self.getRaw(jobId)
+        if blob is None:
+            return default
+        return pickle.loads(blob)
+
+
+def loadJobArchive(directory):
+    """
+    _loadJobArchive_
+
+    Return the JobArchive of a directory, or None if there is no archive
+    or if it can't be read, such that callers fall back to other layouts.
+    """
+    if not os.path.isfile(os.path.join(directory, ARCHIVE_FILENAME)):
+        return None
+    try:
+        return JobArchive(directory)
+    except Exception as ex:
+        logging.warning("Failed to load the job archive in %s: %s", directory, str(ex))
+        return None
+
+
+def migrateJobCollection(directory):
+    """
+    _migrateJobCollection_
+
+    Convert a JobCollection directory written with one job.pkl per job
+    directory into the archive layout: the job pickles not in the archive
+    yet are appended to it, then the job.pkl files and the JobSubmitIndex
+    are removed. Return the number of jobs appended to the archive.
+    """
+    archivedIds = set()
+    if os.path.isfile(os.path.join(directory, ARCHIVE_FILENAME)):
+        with JobArchive(directory) as archive:
+            archivedIds.update(archive.entries)
+
+    records = []
+    pickleFiles = []
+    for jobDir in os.listdir(directory):
+        if not jobDir.startswith('job_'):
+            continue
+        pickleFile = os.path.join(directory, jobDir, 'job.pkl')
+        if not os.path.isfile(pickleFile):
+            continue
+        pickleFiles.append(pickleFile)
+        jobId = int(jobDir[len('job_'):])
+        if jobId not in archivedIds:
+            with open(pickleFile, 'rb') as fileHandle:
+                records.append((jobId, fileHandle.read()))
+
+    if records:
+        _appendRecords(directory, sorted(records))
+    for pickleFile in pickleFiles:
+        os.remove(pickleFile)
+    indexPath = os.path.join(directory, INDEX_FILENAME)
+    if os.path.isfile(indexPath):
+        os.remove(indexPath)
+    return len(records)
+
+
+class JobCacheReader(object):
+    """
+    _JobCacheReader_
+
+    Load the pickled jobs from their cache directories, whatever the layout
+    of their JobCollection directory: a JobArchive, a JobSubmitIndex or one
+    job.pkl per job directory, in this order. The archive and the index of
+    each collection are opened once, and kept open until close is called.
+    """
+
+    def __init__(self):
+        self.collections = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        Close the archives and indexes opened so far
+        """
+        for archive, index in self.collections.values():
+            for reader in (archive, index):
+                if reader is not None:
+                    reader.close()
+        self.collections = {}
+
+    def getCollection(self, collectionDir):
+        """
+        Return a tuple with the JobArchive and the JobSubmitIndex of a
+        collection directory, either of them None if not available
+        """
+        if collectionDir not in self.collections:
+            self.collections[collectionDir] = (loadJobArchive(collectionDir), loadJobSubmitIndex(collectionDir))
+        return self.collections[collectionDir]
+
+    def getRaw(self, jobId, cacheDir):
+        """
+        _getRaw_
+
+        Return the pickled job with the given id and cache directory, or None
+        if it can't be found. Errors reading the archive or the index are
+        logged and the next layout is tried, errors reading the job.pkl file
+        are raised.
+        """
+        collectionDir = os.path.dirname(os.path.normpath(cacheDir))
+        for reader in self.getCollection(collectionDir):
+            if reader is None:
+                continue
+            try:
+                blob = reader.getRaw(jobId)
+            except Exception as ex:
+                logging.warning("Failed to load job %s from %s: %s", jobId, reader.path, str(ex))
+                continue
+            if blob is not None:
+                return blob
+
+        pickledJobPath = os.path.join(cacheDir, "job.pkl")
+        if not os.path.isfile(pickledJobPath):
+            return None
+        with open(pickledJobPath, 'rb') as jobHandle:
+            return jobHandle.read()
+
+    def getJob(self, jobId, cacheDir):
+        """
+        _getJob_
+
+        Return the unpickled job with the given id and cache directory, or
+        None if it can't be found. Errors unpickling a found job are raised.
+        """
+        blob = self.getRaw(jobId, cacheDir)
+        if blob is None:
+            return None
+        return pickle.loads(blob)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+"""
+_JobSubmitIndex_
+
+Binary, versioned file holding the pickled jobs of a JobCollection
+directory, keyed by job id. It's written by the JobCreator next to the
+per job pickle files, such that the JobSubmitter can load all the jobs of
+a collection with a single open, instead of one job.pkl per job.
+
+File layout (little endian):
+  - header: magic string, format version and number of jobs
+  - table: (job id, offset, length) entries, sorted by job id
+  - data: one pickled job per table entry
+
+The file is memory mapped when read, so only the jobs actually requested
+get unpickled.
+"""
+
+from builtins import object
+
+import logging
+import mmap
+import os
+import pickle
+import struct
+
+from Utils.PythonVersion import HIGHEST_PICKLE_PROTOCOL
+from WMCore.WMException import WMException
+
+INDEX_FILENAME = "JobSubmitIndex.bin"
+INDEX_MAGIC = b"WMJOBIDX"
+INDEX_VERSION = 1
+
+_HEADER = struct.Struct("<8sII")
+_ENTRY = struct.Struct("<QQQ")
+
+
+class JobSubmitIndexException(WMException):
+    """
+    _JobSubmitIndexException_
+
+    Raised when an index file is corrupted or written with an unknown version.
+    """
+    pass
+
+
+def writeJobSubmitIndex(directory, jobs):
+    """
+    _writeJobSubmitIndex_
+
+    Write the index file for a list of jobs in the given directory.
+    The file is first written under a temporary name and then renamed,
+    such that readers never see a partially written index.
+    Return the path to the index file.
+    """
+    blobs = sorted((int(job['id']), pickle.dumps(job, protocol=HIGHEST_PICKLE_PROTOCOL)) for job in jobs)
+
+    offset = _HEADER.size + _ENTRY.size * len(blobs)
+    table = []
+    for jobId, blob in blobs:
+        table.append(_ENTRY.pack(jobId, offset, len(blob)))
+        offset += len(blob)
+
+    indexPath = os.path.join(directory, INDEX_FILENAME)
+    tmpPath = "%s.%d.tmp" % (indexPath, os.getpid())
+    with open(tmpPath, 'wb') as fileHandle:
+        fileHandle.write(_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, len(blobs)))
+        fileHandle.write(b"".join(table))
+        for _, blob in blobs:
+            fileHandle.write(blob)
+    os.rename(tmpPath, indexPath)
+    return indexPath
+
+
+class JobSubmitIndex(object):
+    """
+    _JobSubmitIndex_
+
+    Read-only access to an index file written by writeJobSubmitIndex
+    """
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, INDEX_FILENAME)
+        self.entries = {}
+        self._mmap = None
+
+        with open(self.path, 'rb') as fileHandle:
+            if os.fstat(fileHandle.fileno()).st_size < _HEADER.size:
+                raise JobSubmitIndexException("Truncated job index file %s" % self.path)
+            self._mmap = mmap.mmap(fileHandle.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, nJobs = _HEADER.unpack_from(self._mmap, 0)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            self.close()
+            raise JobSubmitIndexException("Unknown job index format in %s" % self.path)
+        tableEnd = _HEADER.size + nJobs * _ENTRY.size
+        if len(self._mmap) < tableEnd:
+            self.close()
+            raise JobSubmitIndexException("Truncated job index file %s" % self.path)
+        for jobId, offset, length in _ENTRY.iter_unpack(self._mmap[_HEADER.size:tableEnd]):
+            self.entries[jobId] = (offset, length)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, jobId):
+        return jobId in self.entries
+
+    def close(self):
+        """
+        Release the memory mapped file
+        """
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def getRaw(self, jobId):
+        """
+        Return the pickled job with the given id, or None if the job is not
+        in the index
+        """
+        if jobId not in self.entries:
+            return None
+        offset, length = self.entries[jobId]
+        return self._mmap[offset:offset + length]
+
+    def get(self, jobId, default=None):
+        """
+        Unpickle and return the job with the given id, or default if the job
+        is not in the index
+        """
+        blob = self.getRaw(jobId)
+        if blob is None:
+            return default
+        return pickle.loads(blob)
+
+
+def loadJobSubmitIndex(directory):
+    """
+    _loadJobSubmitIndex_
+
+    Return the JobSubmitIndex of a directory, or None if there is no index
+    or if it can't be read, such that callers fall back to the job pickles.
+    """
+    if not os.path.isfile(os.path.join(directory, INDEX_FILENAME)):
+        return None
+    try:
+        return JobSubmitIndex(directory)
+    except Exception as ex:
+        logging.warning("Failed to load the job index in %s: %s", directory, str(ex))
+        return None
@@ -1,7 +1,7 @@
 #!/usr/bin/env python
 
 """
-This is a direct copy of code in cmssw/FWCore/PythonUtilities/python/LumiList.py
+This began as a direct copy of code in cmssw/FWCore/PythonUtilities/python/LumiList.py
 It can be removed if we ever have a core set of code shared between DMWM and CMSSW
 
 Handle lists of lumi sections. Constuct in several different formats and filter
@@ -9,6 +9,11 @@ Handle lists of lumi sections. Constuct in several different formats and filter
 This class can also handle ranges of events as the structure is identical
 or could be subclassed renaming a function or two.
 
+Internally, the lumi ranges of each run are kept as two sorted arrays of
+range starts and range ends, with no overlapping nor adjacent ranges, such
+that set operations are a linear merge of the sorted ranges and lookups
+are a binary search.
+
 This code began life in COMP/CRAB/python/LumiList.py
 """
 
@@ -20,13 +25,123 @@ from future.utils import viewitems
 from future import standard_library
 standard_library.install_aliases()
 
-import copy
-import itertools
 import json
 import re
 import urllib.request
+from array import array
+from types import MappingProxyType
+from bisect import bisect_right
 from contextlib import closing
 
+# upper lumi boundary used for whole runs
+MAX_LUMI = 0xFFFFFFF
+# internal end of the open ended [first, 0] ranges, given back as 0
+OPEN_LUMI = MAX_LUMI + 1
+
+
+def _outputLast(last):
+    """
+    Return the last lumi of a range as given to the users, i.e. 0 for
+    the open ended ranges
+    """
+    return 0 if last == OPEN_LUMI else last
+
+
+def _mergeRanges(ranges, openEnded=True):
+    """
+    Sort and merge an iterable of [first, last] lumi pairs, joining
+    overlapping and adjacent ranges. If openEnded is True, a last lumi of 0
+    after a non-zero first lumi means that the range extends to the end of
+    the run, otherwise such range is empty.
+
+    Returns a tuple with the arrays of range starts and range ends.
+    """
+    starts = array('q')
+    ends = array('q')
+    for first, last in sorted((int(x[0]), int(x[1])) for x in ranges):
+        if last == 0 and first > 0:
+            if not openEnded:
+                continue
+            last = OPEN_LUMI
+        if starts and first <= ends[-1] + 1:
+            if last > ends[-1]:
+                ends[-1] = last
+        else:
+            starts.append(first)
+            ends.append(last)
+    return starts, ends
+
+
+def _filterLumis(runRanges, lumis):
+    """
+    Return the list of lumis, out of an iterable of lumis, which are in the
+    normalized ranges of a run, keeping their order
+    """
+    starts, ends = runRanges
+    if not starts:
+        return []
+    if len(starts) == 1:
+        first, last = starts[0], ends[0]
+        return [lumi for lumi in lumis if first <= lumi <= last]
+    filtered = []
+    for lumi in lumis:
+        index = bisect_right(starts, lumi) - 1
+        if index >= 0 and lumi <= ends[index]:
+            filtered.append(lumi)
+    return filtered
+
+
+def _intersectRanges(aRanges, bRanges):
+    """
+    Intersect two normalized (sorted, disjoint) pairs of start/end arrays
+    """
+    aStarts, aEnds = aRanges
+    bStarts, bEnds = bRanges
+    starts = array('q')
+    ends = array('q')
+    i, j = 0, 0
+    while i < len(aStarts) and j < len(bStarts):
+        first = max(aStarts[i], bStarts[j])
+        last = min(aEnds[i], bEnds[j])
+        if first <= last:
+            starts.append(first)
+            ends.append(last)
+        if aEnds[i] < bEnds[j]:
+            i += 1
+        else:
+            j += 1
+    return starts, ends
+
+
+def _subtractRanges(aRanges, bRanges):
+    """
+    Subtract the normalized ranges in bRanges from the ones in aRanges
+    """
+    aStarts, aEnds = aRanges
+    bStarts, bEnds = bRanges
+    starts = array('q')
+    ends = array('q')
+    nB = len(bStarts)
+    j = 0
+    for first, last in zip(aStarts, aEnds):
+        current = first
+        while j < nB and bEnds[j] < current:
+            j += 1
+        k = j
+        while k < nB and bStarts[k] <= last:
+            if bStarts[k] > current:
+                starts.append(current)
+                ends.append(bStarts[k] - 1)
+            current = max(current, bEnds[k] + 1)
+            if current > last:
+                break
+            k += 1
+        if current <= last:
+            starts.append(current)
+            ends.append(last)
+    return starts, ends
+
+
 class LumiList(object):
     """
     Deal with lists of lumis in several different forms:
@@ -52,6 +167,10 @@ class LumiList(object):
         '1:1-1:33,1:35,1:37-1:47,2:1-2:45,2:50-2:80'
         The string used by CMSSW in lumisToProcess or lumisToSkip
         is a subset of the compactList example above
+
+    The ranges are stored per run (string keys) in self.ranges, as a tuple
+    of two arrays with the sorted range starts and range ends. The open
+    ended [first, 0] ranges end at OPEN_LUMI, and are given back as [first, 0].
     """
 
     def __init__(self, filename=None, lumis=None, runsAndLumis=None, runs=None, compactList=None, url=None,
@@ -60,16 +179,17 @@ class LumiList(object):
         Constructor takes filename (JSON), a list of run/lumi pairs,
         or a dict with run #'s as the keys and a list of lumis as the values, or just a list of runs
         """
-        self.compactList = {}
+        rangesByRun = {}
+        self.ranges = {}
         self.duplicates = {}
         if filename:
             self.filename = filename
             with open(self.filename,'r') as jsonFile:
-                self.compactList = json.load(jsonFile)
+                rangesByRun = json.load(jsonFile)
         elif url:
             self.url = url
             with closing(urllib.request.urlopen(url)) as jsonFile:
-                self.compactList = json.load(jsonFile)
+                rangesByRun = json.load(jsonFile)
         elif lumis:
             runsAndLumis = {}
             for (run, lumi) in lumis:
@@ -91,27 +211,26 @@ class LumiList(object):
                 lastLumi = -1000
                 lumiList = runsAndLumis[run]
                 if lumiList:
-                    self.compactList[runString] = []
+                    rangesByRun[runString] = []
                     self.duplicates[runString] = []
                     for lumi in sorted(int(l) for l in lumiList):
                         if lumi == lastLumi:
                             self.duplicates[runString].append(lumi)
                         elif lumi != lastLumi + 1: # Break in lumi sequence
-                            self.compactList[runString].append([lumi, lumi])
+                            rangesByRun[runString].append([lumi, lumi])
                         else:
-                            nRange =  len(self.compactList[runString])
-                            self.compactList[runString][nRange-1][1] = lumi
+                            rangesByRun[runString][-1][1] = lumi
                         lastLumi = lumi
         if runs:
             for run in runs:
                 runString = str(run)
-                self.compactList[runString] = [[1, 0xFFFFFFF]]
+                rangesByRun[runString] = [[1, MAX_LUMI]]
 
         if compactList:
             for run in compactList:
                 runString = str(run)
                 if compactList[run]:
-                    self.compactList[runString] = compactList[run]
+                    rangesByRun[runString] = compactList[run]
 
         if wmagentFormat:
             """
@@ -130,8 +249,8 @@ class LumiList(object):
 
             for run, lumiString in zip(runs, lumis):
                 runLumis = lumiString.split(',')
-                if str(run) not in self.compactList:
-                    self.compactList[str(run)] = []
+                if str(run) not in rangesByRun:
+                    rangesByRun[str(run)] = []
                 if len(runLumis) % 2:
                     raise RuntimeError('Improper format for wmagentFormat. Lumis must be in pairs')
 
@@ -139,94 +258,65 @@ class LumiList(object):
                 it = iter(runLumis)
                 for beginLumi in it:
                     endLumi = next(it)
-                    self.compactList[str(run)].append([int(beginLumi), int(endLumi)])
+                    rangesByRun[str(run)].append([int(beginLumi), int(endLumi)])
 
         # Compact each run and make it unique
+        for run in rangesByRun:
+            self.ranges[run] = _mergeRanges(rangesByRun[run])
+
+    @classmethod
+    def _fromRanges(cls, ranges):
+        """
+        Create a LumiList from already normalized start/end arrays,
+        dropping the runs without any lumi range left
+        """
+        result = cls()
+        for run, (starts, ends) in viewitems(ranges):
+            if starts:
+                result.ranges[run] = (starts, ends)
+        return result
+
+    @property
+    def compactList(self):
+        """
+        Read-only snapshot of the compact list representation, built from
+        the lumi ranges arrays. Changes to the object are made by assigning
+        a whole new compact list, use getCompactList for a modifiable copy.
+        """
+        return MappingProxyType(self.getCompactList())
 
-        for run in self.compactList:
-            newLumis = []
-            for lumi in sorted(self.compactList[run]):
-                # If the next lumi starts inside or just after the last just change the endpoint of the first
-                if newLumis and newLumis[-1][0] <= lumi[0] <= newLumis[-1][1] + 1:
-                    newLumis[-1][1] = max(newLumis[-1][1], lumi[1])
-                else:
-                    newLumis.append(lumi)
-            self.compactList[run] = newLumis
+    @compactList.setter
+    def compactList(self, value):
+        self.ranges = {}
+        for run in value:
+            self.ranges[str(run)] = _mergeRanges(value[run])
 
     def __sub__(self, other): # Things from self not in other
         result = {}
-        for run in sorted(self.compactList.keys()):
-            alumis = sorted(self.compactList[run])
-            blumis = sorted(other.compactList.get(run, []))
-            alist = []                    # verified part
-            for alumi in alumis:
-                tmplist = [alumi[0], alumi[1]] # may be part
-                for blumi in blumis:
-                    if blumi[0] <= tmplist[0] and blumi[1] >= tmplist[1]: # blumi has all of alumi
-                        tmplist = []
-                        break # blumi is has all of alumi
-                    if blumi[0] > tmplist[0] and blumi[1] < tmplist[1]: # blumi is part of alumi
-                        alist.append([tmplist[0], blumi[0]-1])
-                        tmplist = [blumi[1]+1, tmplist[1]]
-                    elif blumi[0] <= tmplist[0] and blumi[1] < tmplist[1] and blumi[1]>=tmplist[0]: # overlaps start
-                        tmplist = [blumi[1]+1, tmplist[1]]
-                    elif blumi[0] > tmplist[0] and blumi[1] >= tmplist[1] and blumi[0]<=tmplist[1]: # overlaps end
-                        alist.append([tmplist[0], blumi[0]-1])
-                        tmplist = []
-                        break
-                if tmplist:
-                    alist.append(tmplist)
-            result[run] = alist
-
-        return LumiList(compactList = result)
+        for run, runRanges in viewitems(self.ranges):
+            if run in other.ranges:
+                result[run] = _subtractRanges(runRanges, other.ranges[run])
+            else:
+                result[run] = (array('q', runRanges[0]), array('q', runRanges[1]))
+        return LumiList._fromRanges(result)
 
 
     def __and__(self, other): # Things in both
         result = {}
-        aruns = set(self.compactList.keys())
-        bruns = set(other.compactList.keys())
-        for run in aruns & bruns:
-            lumiList = []                    # List for this run
-            unique = []                    # List for this run
-            for alumi in self.compactList[run]:
-                for blumi in other.compactList[run]:
-                    if blumi[0] <= alumi[0] and blumi[1] >= alumi[1]: # blumi has all of alumi
-                        lumiList.append(alumi)
-                    if blumi[0] > alumi[0] and blumi[1] < alumi[1]: # blumi is part of alumi
-                        lumiList.append(blumi)
-                    elif blumi[0] <= alumi[0] and blumi[1] < alumi[1] and blumi[1] >= alumi[0]: # overlaps start
-                        lumiList.append([alumi[0], blumi[1]])
-                    elif blumi[0] > alumi[0] and blumi[1] >= alumi[1] and blumi[0] <= alumi[1]: # overlaps end
-                        lumiList.append([blumi[0], alumi[1]])
-
-
-            if lumiList:
-                unique = [lumiList[0]]
-            for pair in lumiList[1:]:
-                if pair[0] == unique[-1][1]+1:
-                    unique[-1][1] = copy.deepcopy(pair[1])
-                else:
-                    unique.append(copy.deepcopy(pair))
-
-            result[run] = unique
-        return LumiList(compactList = result)
+        for run in set(self.ranges) & set(other.ranges):
+            result[run] = _intersectRanges(self.ranges[run], other.ranges[run])
+        return LumiList._fromRanges(result)
 
 
     def __or__(self, other):
         result = {}
-        aruns = list(self.compactList)
-        bruns = list(other.compactList)
-        runs = set(aruns + bruns)
-        for run in runs:
-            overlap = sorted(self.compactList.get(run, []) + other.compactList.get(run, []))
-            unique = [overlap[0]]
-            for pair in overlap[1:]:
-                if pair[0] >= unique[-1][0] and pair[0] <= unique[-1][1]+1 and pair[1] > unique[-1][1]:
-                    unique[-1][1] = copy.deepcopy(pair[1])
-                elif pair[0] > unique[-1][1]:
-                    unique.append(copy.deepcopy(pair))
-            result[run] = unique
-        return LumiList(compactList = result)
+        for run in set(self.ranges) | set(other.ranges):
+            ranges = []
+            for lumiList in (self, other):
+                if run in lumiList.ranges:
+                    ranges.extend(zip(*lumiList.ranges[run]))
+            result[run] = _mergeRanges(ranges)
+        return LumiList._fromRanges(result)
 
 
     def __add__(self, other):
@@ -235,7 +325,7 @@ class LumiList(object):
 
     def __len__(self):
         '''Returns number of runs in list'''
-        return len(self.compactList)
+        return len(self.ranges)
 
     def filterLumis(self, lumiList):
         """
@@ -245,25 +335,25 @@ class LumiList(object):
         """
         filteredList = []
         for (run, lumi) in lumiList:
-            runsInLumi = self.compactList.get(str(run), [[0, -1]])
-            for (first, last) in runsInLumi:
-                if lumi >= first and lumi <= last:
-                    filteredList.append((run, lumi))
-                    break
+            if self.contains(run, lumi):
+                filteredList.append((run, lumi))
         return filteredList
 
 
     def __str__ (self):
         doubleBracketRE = re.compile (r']],')
         return doubleBracketRE.sub (']],\n',
-                                    json.dumps (self.compactList,
+                                    json.dumps (self.getCompactList(),
                                                 sort_keys=True))
 
     def getCompactList(self):
         """
         Return the compact list representation
         """
-        return self.compactList
+        compactList = {}
+        for run, (starts, ends) in viewitems(self.ranges):
+            compactList[run] = [[first, _outputLast(last)] for first, last in zip(starts, ends)]
+        return compactList
 
 
     def getDuplicates(self):
@@ -273,18 +363,24 @@ class LumiList(object):
         return LumiList(runsAndLumis = self.duplicates)
 
 
+    def _sortedRanges(self):
+        """
+        Generator of (run, first, last) tuples, sorted by run number and lumi,
+        with a last lumi of 0 for the open ended ranges
+        """
+        for run in sorted(self.ranges, key=int):
+            for first, last in zip(*self.ranges[run]):
+                yield run, first, _outputLast(last)
+
+
     def getLumis(self):
         """
         Return the list of pairs representation
         """
         theList = []
-        runs = list(self.compactList)
-        runs.sort(key=int)
-        for run in runs:
-            lumis = self.compactList[run]
-            for lumiPair in sorted(lumis):
-                for lumi in range(lumiPair[0], lumiPair[1]+1):
-                    theList.append((int(run), lumi))
+        for run, first, last in self._sortedRanges():
+            intRun = int(run)
+            theList.extend((intRun, lumi) for lumi in range(first, last + 1))
 
         return theList
 
@@ -293,7 +389,7 @@ class LumiList(object):
         '''
         return the sorted list of runs contained
         '''
-        return sorted (self.compactList.keys())
+        return sorted (self.ranges.keys())
 
 
     def _getLumiParts(self):
@@ -303,16 +399,11 @@ class LumiList(object):
         """
 
         parts = []
-        runs = list(self.compactList)
-        runs.sort(key=int)
-        for run in runs:
-            lumis = self.compactList[run]
-            for lumiPair in sorted(lumis):
-                if lumiPair[0] == lumiPair[1]:
-                    parts.append("%s:%s" % (run, lumiPair[0]))
-                else:
-                    parts.append("%s:%s-%s:%s" %
-                                 (run, lumiPair[0], run, lumiPair[1]))
+        for run, first, last in self._sortedRanges():
+            if first == last:
+                parts.append("%s:%s" % (run, first))
+            else:
+                parts.append("%s:%s-%s:%s" % (run, first, run, last))
         return parts
 
 
@@ -354,8 +445,8 @@ class LumiList(object):
         '''
         for run in runList:
             run = str(run)
-            if run in self.compactList:
-                del self.compactList[run]
+            if run in self.ranges:
+                del self.ranges[run]
 
         return
 
@@ -365,12 +456,12 @@ class LumiList(object):
         Selects only runs from runList in collection
         '''
         runsToDelete = []
-        for run in list(self.compactList):
+        for run in list(self.ranges):
             if int(run) not in runList and run not in runList:
                 runsToDelete.append(run)
 
         for run in runsToDelete:
-            del self.compactList[run]
+            del self.ranges[run]
 
         return
 
@@ -385,28 +476,20 @@ class LumiList(object):
         if lumiSection is None:
             # if this is an integer or a string, see if the run exists
             if isinstance (run, int) or isinstance (run, str):
-                return str(run) in self.compactList
+                return str(run) in self.ranges
             # if we're here, then run better be a tuple or list
             try:
                 lumiSection = run[1]
                 run         = run[0]
             except:
                 raise RuntimeError("Improper format for run '%s'" % run)
-        lumiRangeList = self.compactList.get( str(run) )
-        if not lumiRangeList:
+        runRanges = self.ranges.get( str(run) )
+        if not runRanges:
             # the run isn't there, so no need to look any further
             return False
-        for lumiRange in lumiRangeList:
-            # we want to make this as found if either the lumiSection
-            # is inside the range OR if the lumi section is greater
-            # than or equal to the lower bound of the lumi range and
-            # the upper bound is 0 (which means extends to the end of
-            # the run)
-            if lumiRange[0] <= lumiSection and \
-               (0 == lumiRange[1] or lumiSection <= lumiRange[1]):
-                # got it
-                return True
-        return False
+        # find the last range starting at or before the lumi section
+        index = bisect_right(runRanges[0], lumiSection) - 1
+        return index >= 0 and lumiSection <= runRanges[1][index]
 
 
     def __contains__ (self, runTuple):
@@ -414,6 +497,70 @@ class LumiList(object):
 
 
 
+class LumiMask(object):
+    """
+    _LumiMask_
+
+    Compiled run/lumi mask, for checking many lumis against the same mask,
+    e.g. a goodRunList {'run': [[first, last], ...]} or the runAndLumis of a
+    job Mask. The runs are integers, and the lumi ranges of each run are
+    kept as sorted arrays of range starts and range ends, with no overlapping
+    nor adjacent ranges, so lumis are looked up with a binary search.
+    A run with an empty list of ranges is in the mask, but none of its lumis.
+    """
+
+    def __init__(self, runsAndRanges=None):
+        self.ranges = {}
+        for run, lumiRanges in viewitems(runsAndRanges or {}):
+            self.ranges[int(run)] = _mergeRanges(lumiRanges, openEnded=False)
+
+    def __len__(self):
+        """
+        Number of runs in the mask
+        """
+        return len(self.ranges)
+
+    def getRuns(self):
+        """
+        _getRuns_
+
+        Return the sorted list of runs in the mask
+        """
+        return sorted(self.ranges)
+
+    def hasRun(self, run):
+        """
+        _hasRun_
+
+        Tell whether a run is in the mask
+        """
+        return int(run) in self.ranges
+
+    def hasLumi(self, run, lumi):
+        """
+        _hasLumi_
+
+        Tell whether a lumi of a run is in the mask
+        """
+        runRanges = self.ranges.get(int(run))
+        if runRanges is None:
+            return False
+        index = bisect_right(runRanges[0], lumi) - 1
+        return index >= 0 and lumi <= runRanges[1][index]
+
+    def filterLumis(self, run, lumis):
+        """
+        _filterLumis_
+
+        Return the list of lumis of a run, out of an iterable of lumis, which
+        are in the mask, in the same order
+        """
+        runRanges = self.ranges.get(int(run))
+        if runRanges is None:
+            return []
+        return _filterLumis(runRanges, lumis)
+
+
 '''
 # Unit test code
 import unittest
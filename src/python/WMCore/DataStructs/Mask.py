@@ -10,7 +10,7 @@ job in two ways:
 
 """
 
-from builtins import range
+from WMCore.DataStructs.LumiList import LumiMask
 from WMCore.DataStructs.Run import Run
 
 
@@ -30,6 +30,20 @@ class Mask(dict):
         self.setdefault("FirstRun", None)
         self.setdefault("LastRun", None)
         self.setdefault("runAndLumis", {})
+        # compiled lumi ranges of the runs looked up with runLumiInMask
+        self._compiledRuns = {}
+
+    def __getstate__(self):
+        """
+        The compiled lumi ranges are not pickled
+        """
+        state = dict(self.__dict__)
+        state.pop('_compiledRuns', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._compiledRuns = {}
 
     def setMaxAndSkipEvents(self, maxEvents, skipEvents):
         """
@@ -171,13 +185,15 @@ class Mask(dict):
         if run not in self['runAndLumis']:
             return False
 
-        for pair in self['runAndLumis'][run]:
-            # Go through each max and min pair
-            if pair[0] <= lumi and pair[1] >= lumi:
-                # Then the lumi is bracketed
-                return True
+        # the lumi ranges of the run are compiled once, and again
+        # only if they are replaced or more ranges are added
+        lumiList = self['runAndLumis'][run]
+        compiled = self._compiledRuns.get(run)
+        if compiled is None or compiled[0] is not lumiList or compiled[1] != len(lumiList):
+            compiled = (lumiList, len(lumiList), LumiMask({run: lumiList}))
+            self._compiledRuns[run] = compiled
 
-        return False
+        return compiled[2].hasLumi(run, lumi)
 
     def filterRunLumisByMask(self, runs):
         """
@@ -202,16 +218,11 @@ class Mask(dict):
         passedRuns = set([r.run for r in runs])
         filteredRuns = maskRuns.intersection(passedRuns)
 
+        lumiMask = LumiMask(dict((runNumber, self["runAndLumis"][runNumber]) for runNumber in filteredRuns))
+
         newRuns = set()
         for runNumber in filteredRuns:
-            maskLumis = set()
-            for pair in self["runAndLumis"][runNumber]:
-                if pair[0] == pair[1]:
-                    maskLumis.add(pair[0])
-                else:
-                    maskLumis = maskLumis.union(list(range(pair[0], pair[1] + 1)))
-
-            filteredLumis = set(runDict[runNumber].lumis).intersection(maskLumis)
+            filteredLumis = lumiMask.filterLumis(runNumber, runDict[runNumber].eventsPerLumi)
             if len(filteredLumis) > 0:
                 filteredLumiEvents = [(lumi, runDict[runNumber].getEventsByLumi(lumi)) for lumi in filteredLumis]
                 newRuns.add(Run(runNumber, *filteredLumiEvents))
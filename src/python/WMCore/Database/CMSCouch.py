@@ -25,13 +25,22 @@ import logging
 import re
 import time
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import partial
 from http.client import HTTPException
+from queue import Queue
 
 from Utils.IteratorTools import grouper, nestedDictUpdate
 from WMCore.Lexicon import sanitizeURL
 from WMCore.Services.Requests import JSONRequests
 
+# view query options which couch expects as plain strings rather than JSON
+RAW_VIEW_OPTIONS = ("stale", "startkey_docid", "endkey_docid")
+# options of a view query selecting a range of rows
+RANGE_VIEW_OPTIONS = ("key", "startkey", "endkey", "startkey_docid", "endkey_docid")
+
 
 def check_name(dbname):
     match = re.match("^[a-z0-9_$()+-/]+$", urllib.parse.unquote_plus(dbname))
@@ -204,6 +213,7 @@ class Database(CouchDBRequests):
         self._queue_size = size
         self.threads = []
         self.last_seq = 0
+        self.asyncCommitter = None
 
     def _reset_queue(self):
         """
@@ -245,10 +255,12 @@ class Database(CouchDBRequests):
         viewlist = viewlist or []
         if timestamp:
             self.timestamp(doc, timestamp)
-        # TODO: Thread this off so that it's non blocking...
         if self.getQueueSize() >= self._queue_size:
-            logging.warning('queue larger than %s records, committing', self._queue_size)
-            self.commit(viewlist=viewlist, callback=callback)
+            if self.asyncCommitter is not None:
+                self.commitAsync(viewlist=viewlist, callback=callback)
+            else:
+                logging.warning('queue larger than %s records, committing', self._queue_size)
+                self.commit(viewlist=viewlist, callback=callback)
         self._queue.append(doc)
 
     def queueDelete(self, doc):
@@ -296,6 +308,10 @@ class Database(CouchDBRequests):
         key, value pairs can be used to pass extra parameters to the bulk doc api
         See https://docs.couchdb.org/en/latest/api/database/bulk-api.html#db-bulk-docs
 
+        If the asynchronous commits are enabled, the queue is handed over to the
+        background threads and the call returns when all the documents handed
+        over so far are committed, with the results of all their bulk commits.
+
         TODO: restore support for returndocs and viewlist
 
         Returns a list of good documents
@@ -305,17 +321,31 @@ class Database(CouchDBRequests):
         if doc:
             self.queue(doc, timestamp, viewlist)
 
+        if self.asyncCommitter is not None:
+            self.commitAsync(timestamp, viewlist, callback, **data)
+            return self.flush()
+
         if not self._queue:
             return
 
         if timestamp:
             self.timestamp(self._queue, timestamp)
-        # TODO: commit in thread to avoid blocking others
-        uri = '/%s/_bulk_docs/' % self.name
 
         data['docs'] = list(self._queue)
-        retval = self.post(uri, data)
+        retval = self._postBulkDocs(data)
         self._reset_queue()
+        return self._commitCallbacks(data, retval, viewlist, callback)
+
+    def _postBulkDocs(self, data):
+        """
+        Post the documents of a bulk commit
+        """
+        return self.post('/%s/_bulk_docs/' % self.name, data)
+
+    def _commitCallbacks(self, data, retval, viewlist, callback):
+        """
+        Refresh the views and resolve the conflicts of a bulk commit
+        """
         for v in viewlist:
             design, view = v.split('/')
             self.loadView(design, view, {'limit': 0})
@@ -326,6 +356,68 @@ class Database(CouchDBRequests):
 
         return retval
 
+    def startAsyncCommits(self, window=2):
+        """
+        _startAsyncCommits_
+
+        Commit the queue in the background from now on. The bulk commits
+        triggered by queue, commit and commitAsync are posted by up to window
+        threads, each with its own connection, and the conflict callbacks are
+        called by these threads. Handing over more than window bulk commits
+        blocks until one of them is done.
+        Return the AsyncCommitter, which provides the commit statistics.
+        """
+        if self.asyncCommitter is None:
+            self.asyncCommitter = AsyncCommitter(self, window)
+        return self.asyncCommitter
+
+    def commitAsync(self, timestamp=False, viewlist=None, callback=None, **data):
+        """
+        _commitAsync_
+
+        Hand over the queued documents to the asynchronous commit threads,
+        the options are the same as for commit. Returns without waiting for
+        the documents to be committed, call flush to wait for them.
+        """
+        if self.asyncCommitter is None:
+            raise RuntimeError("Asynchronous commits are not enabled for database %s" % self.name)
+        if not self._queue:
+            return
+        if timestamp:
+            self.timestamp(self._queue, timestamp)
+        docs = list(self._queue)
+        self._reset_queue()
+        self.asyncCommitter.submit(docs, viewlist, callback, data)
+
+    def flush(self):
+        """
+        _flush_
+
+        Wait until all the documents handed over to the asynchronous commit
+        threads are committed. Return the results of the bulk commits done
+        since the previous flush. If some of them failed, their documents are
+        queued again and the first error is raised.
+        """
+        if self.asyncCommitter is None:
+            return []
+        return self.asyncCommitter.flush()
+
+    def join(self):
+        """
+        _join_
+
+        Flush the asynchronous commits, then stop the commit threads, the
+        following commits are done synchronously.
+        Return the results of the bulk commits done since the previous flush.
+        """
+        if self.asyncCommitter is None:
+            return []
+        try:
+            return self.asyncCommitter.flush()
+        finally:
+            self.asyncCommitter.stop()
+            self.asyncCommitter = None
+
     def document(self, id, rev=None):
         """
         Load a document identified by id. You can specify a rev to see an older revision
@@ -564,8 +656,8 @@ class Database(CouchDBRequests):
         encodedOptions = {}
         for k, v in viewitems(options):
             # We can't encode the stale option, as it will be converted to '"ok"'
-            # which couch barfs on.
-            if k == "stale":
+            # which couch barfs on, and the same goes for document ids.
+            if k in RAW_VIEW_OPTIONS:
                 encodedOptions[k] = v
             else:
                 encodedOptions[k] = self.encode(v)
@@ -598,7 +690,10 @@ class Database(CouchDBRequests):
         keys = keys or []
         encodedOptions = {}
         for k, v in viewitems(options):
-            encodedOptions[k] = self.encode(v)
+            if k in RAW_VIEW_OPTIONS:
+                encodedOptions[k] = v
+            else:
+                encodedOptions[k] = self.encode(v)
 
         if keys:
             if encodedOptions:
@@ -653,6 +748,169 @@ class Database(CouchDBRequests):
         else:
             return self.get('/%s/_all_docs' % self.name, encodedOptions)
 
+    def iterView(self, design, view, options=None, keys=None, pageSize=1000, prefetch=False):
+        """
+        _iterView_
+
+        Generator over the rows of a view, supporting the same options and keys
+        as loadView. The rows are loaded and decoded in pages of pageSize rows,
+        such that only one page is held in memory. Pages are selected with the
+        startkey and startkey_docid options (never skip), with startkey alone
+        for reduced/grouped views, or, when keys are given, with chunks of
+        pageSize keys. If prefetch is True the next page is loaded by a
+        background thread, using its own connection, while the rows of the
+        current page are consumed.
+
+        Note that views emitting the same key more than once per document can
+        yield duplicated rows at the page boundaries.
+        """
+        def query(database, queryOptions, queryKeys):
+            return database.loadView(design, view, queryOptions, queryKeys)
+
+        return self._iterPages(query, options, keys, pageSize, prefetch, docidPaging=True)
+
+    def iterAllDocs(self, options=None, keys=None, pageSize=1000, prefetch=False):
+        """
+        _iterAllDocs_
+
+        Generator over the rows of _all_docs, supporting the same options and
+        keys as allDocs, loaded in pages of pageSize rows like iterView.
+        """
+        def query(database, queryOptions, queryKeys):
+            return database.allDocs(queryOptions, queryKeys)
+
+        return self._iterPages(query, options, keys, pageSize, prefetch, docidPaging=False)
+
+    def iterList(self, design, list, view, options=None, keys=None, pageSize=1000):
+        """
+        _iterList_
+
+        Generator over the output of a list function, loaded in pages of up
+        to pageSize view rows. The view rows are first scanned with iterView,
+        without documents, then the list function is called for the key and
+        document id range of each page. As for loadList, the output of each
+        page is returned without decoding it.
+        """
+        options = options or {}
+        listOptions = dict((k, v) for k, v in viewitems(options) if k not in RANGE_VIEW_OPTIONS)
+        scanOptions = dict((k, v) for k, v in viewitems(options)
+                           if k in RANGE_VIEW_OPTIONS or k in ("stale", "descending"))
+        scanOptions['reduce'] = False
+        if keys:
+            scans = [dict(scanOptions, key=key) for key in keys]
+        else:
+            scans = [scanOptions]
+
+        for scan in scans:
+            firstRow = lastRow = None
+            numRows = 0
+            for row in self.iterView(design, view, scan, pageSize=pageSize):
+                # rows of the same document and key must be in the same page
+                if numRows >= pageSize and (row['key'], row['id']) != (lastRow['key'], lastRow['id']):
+                    yield self._loadListRange(design, list, view, listOptions, firstRow, lastRow)
+                    firstRow = None
+                    numRows = 0
+                if firstRow is None:
+                    firstRow = row
+                lastRow = row
+                numRows += 1
+            if firstRow is not None:
+                yield self._loadListRange(design, list, view, listOptions, firstRow, lastRow)
+
+    def _loadListRange(self, design, list, view, options, firstRow, lastRow):
+        """
+        Call a list function for the view rows between two rows, included
+        """
+        options = dict(options, startkey=firstRow['key'], startkey_docid=firstRow['id'],
+                       endkey=lastRow['key'], endkey_docid=lastRow['id'])
+        return self.loadList(design, list, view, options)
+
+    @staticmethod
+    def _loadKeysPage(query, options, database, page):
+        """
+        Load the rows of a chunk of keys.
+        Return a tuple with the rows and the next page, None if this is the last one.
+        """
+        chunks, index = page
+        rows = query(database, options, chunks[index])['rows']
+        if index + 1 == len(chunks):
+            return rows, None
+        return rows, (chunks, index + 1)
+
+    @staticmethod
+    def _loadRangePage(query, docidPaging, database, page):
+        """
+        Load the rows of a range of keys, one extra row is requested to know
+        where the next page starts.
+        Return a tuple with the rows and the next page, None if this is the last one.
+        """
+        options, count, remaining = page
+        if remaining is not None:
+            count = min(count, remaining)
+            remaining -= count
+        rows = query(database, dict(options, limit=count + 1), None)['rows']
+        if len(rows) <= count or remaining == 0:
+            return rows[:count], None
+
+        nextRow = rows[count]
+        nextOptions = dict(options, startkey=nextRow['key'])
+        nextOptions.pop('skip', None)
+        # reduced rows have no document id, but their keys are unique
+        if docidPaging and 'id' in nextRow:
+            nextOptions['startkey_docid'] = nextRow['id']
+        return rows[:count], (nextOptions, page[1], remaining)
+
+    def _iterPages(self, query, options, keys, pageSize, prefetch, docidPaging):
+        """
+        Generator over the rows of a view or _all_docs query, loaded in pages
+        with query(database, options, keys)
+        """
+        options = dict(options or {})
+        if keys:
+            chunks = [list(chunk) for chunk in grouper(keys, pageSize)]
+            loadPage = partial(self._loadKeysPage, query, options)
+            page = (chunks, 0)
+        else:
+            # a single key is a range with the same start and end keys
+            if 'key' in options:
+                options['startkey'] = options['endkey'] = options.pop('key')
+            loadPage = partial(self._loadRangePage, query, docidPaging)
+            page = (options, pageSize, options.pop('limit', None))
+            if page[2] == 0:
+                return
+
+        executor = None
+        database = self
+        try:
+            rows, page = loadPage(database, page)
+            while True:
+                future = None
+                if page is not None and prefetch:
+                    if executor is None:
+                        executor = ThreadPoolExecutor(max_workers=1)
+                        # the curl handles of this connection must not be shared with the thread
+                        database = self.clone()
+                    future = executor.submit(loadPage, database, page)
+                for row in rows:
+                    yield row
+                if page is None:
+                    break
+                rows, page = future.result() if future is not None else loadPage(database, page)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True)
+
+    def clone(self):
+        """
+        _clone_
+
+        Return a new connection to the same database, with the same credentials
+        """
+        database = Database(urllib.parse.unquote_plus(self.name), url=self['host'],
+                            size=self._queue_size, ckey=self['key'], cert=self['cert'])
+        database.additionalHeaders.update(self.additionalHeaders)
+        return database
+
     def info(self):
         """
         Return information about the databaes (size, number of documents etc).
@@ -731,6 +989,156 @@ class Database(CouchDBRequests):
         return self.commit()
 
 
+class AsyncCommitter(object):
+    """
+    _AsyncCommitter_
+
+    Post the bulk commits of a Database from a pool of window threads, such
+    that the caller doesn't wait on CouchDB and up to window bulk commits are
+    in flight at the same time. Each thread uses its own connection to the
+    database. Submitting a bulk commit while window of them are in flight
+    blocks until one of them is done (backpressure).
+
+    Since bulk commits are posted concurrently, a document should not be
+    handed over again before the previous bulk commit with it is flushed.
+    """
+
+    def __init__(self, database, window=2):
+        self.database = database
+        self.window = window
+        self._batches = Queue()
+        self._slots = threading.Semaphore(window)
+        self._lock = threading.Condition()
+        self._inFlight = 0
+        self._results = []
+        self._failed = []
+        self._startTime = None
+        self._lastCommit = None
+        self.stats = {"batches": 0, "docs": 0, "failures": 0, "conflicts": 0,
+                      "blocked": 0, "blockedTime": 0.0, "latency": 0.0, "maxLatency": 0.0}
+
+        self._threads = []
+        for i in range(window):
+            thread = threading.Thread(target=self._run, name="CouchCommitter-%s-%d" % (database.name, i))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, docs, viewlist=None, callback=None, data=None):
+        """
+        _submit_
+
+        Hand over a list of documents to be posted with a bulk commit, blocks
+        while window bulk commits are in flight
+        """
+        if not self._slots.acquire(False):
+            startTime = time.time()
+            self._slots.acquire()
+            self.stats["blocked"] += 1
+            self.stats["blockedTime"] += time.time() - startTime
+        with self._lock:
+            self._inFlight += 1
+            if self._startTime is None:
+                self._startTime = time.time()
+        self._batches.put((docs, viewlist or [], callback, data or {}))
+
+    def flush(self):
+        """
+        _flush_
+
+        Wait until all the submitted bulk commits are done. Return their
+        results, the documents of the failed ones are queued again in the
+        database and the first error is raised.
+        """
+        with self._lock:
+            while self._inFlight:
+                self._lock.wait()
+            results, self._results = self._results, []
+            failed, self._failed = self._failed, []
+        if failed:
+            self.database._queue[:0] = [doc for docs, _ in failed for doc in docs]
+            raise failed[0][1]
+        return results
+
+    def stop(self):
+        """
+        _stop_
+
+        Stop the commit threads once the submitted bulk commits are done
+        """
+        for _ in self._threads:
+            self._batches.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        logging.info("Asynchronous commits to %s stopped, statistics: %s", self.database.name, self.getStats())
+
+    def getStats(self):
+        """
+        _getStats_
+
+        Return a dictionary with the number of bulk commits, documents,
+        failures and conflicts, the number of submissions blocked on a full
+        window and the time spent blocked, the number of bulk commits in
+        flight, the average and maximum bulk commit latency and the number
+        of documents committed per second.
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            stats["inFlight"] = self._inFlight
+            elapsed = (self._lastCommit or 0) - (self._startTime or 0)
+        stats["avgLatency"] = stats["latency"] / stats["batches"] if stats["batches"] else 0.0
+        stats["docsPerSecond"] = stats["docs"] / elapsed if elapsed > 0 else 0.0
+        return stats
+
+    def _run(self):
+        """
+        Body of the commit threads: post the submitted bulk commits until stopped
+        """
+        database = self.database.clone()
+        while True:
+            batch = self._batches.get()
+            if batch is None:
+                break
+            docs, viewlist, callback, data = batch
+            data = dict(data, docs=docs)
+            retval = None
+            error = None
+            startTime = time.time()
+            try:
+                retval = database._postBulkDocs(data)
+            except Exception as ex:
+                logging.error("Failed to commit %d documents to CouchDB database %s. Error: %s",
+                              len(docs), database.name, str(ex))
+                error = ex
+            latency = time.time() - startTime
+
+            conflicts = 0
+            if retval is not None:
+                conflicts = len([row for row in retval if row.get('error', None) == 'conflict'])
+                try:
+                    retval = database._commitCallbacks(data, retval, viewlist, callback)
+                except Exception as ex:
+                    logging.error("Failed to handle the commit results of CouchDB database %s. Error: %s",
+                                  database.name, str(ex))
+
+            with self._lock:
+                if error is not None:
+                    self.stats["failures"] += 1
+                    self._failed.append((docs, error))
+                else:
+                    self._results.extend(retval)
+                    self.stats["batches"] += 1
+                    self.stats["docs"] += len(docs)
+                    self.stats["conflicts"] += conflicts
+                    self.stats["latency"] += latency
+                    self.stats["maxLatency"] = max(self.stats["maxLatency"], latency)
+                    self._lastCommit = time.time()
+                self._inFlight -= 1
+                self._lock.notify_all()
+            self._slots.release()
+
+
 class RotatingDatabase(Database):
     """
     A rotating database is actually multiple databases:
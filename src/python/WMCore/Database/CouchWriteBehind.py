@@ -0,0 +1,394 @@
+#!/usr/bin/env python
+"""
+_CouchWriteBehind_
+
+Write-behind queue of CouchDB documents. Documents are appended to a local
+spool file and to a bounded in-memory queue, which is drained by a background
+thread committing them with bulk writes, so that the caller doesn't wait on
+CouchDB. Documents queued in different calls are committed together, in
+batches of up to batchSize documents per database.
+
+The spool file is truncated whenever all the spooled documents have been
+committed, so documents left in it by a crashed (or stopped before draining
+the queue) process are committed again once their database is added to the
+queue by the next process using the same spool file. Concurrent processes
+must not share a spool file, see claimSpoolFile. The replayed documents are
+committed without the conflict callback of their database: other writers may
+have updated them meanwhile, so replayed documents in conflict are dropped.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+from queue import Queue, Empty, Full
+
+from WMCore.WMException import WMException
+
+
+class CouchWriteBehindException(WMException):
+    """
+    _CouchWriteBehindException_
+
+    Raised when documents are queued for a database unknown to the queue
+    """
+
+
+class CouchWriteBehind(object):
+    """
+    _CouchWriteBehind_
+
+    Bounded write-behind queue of documents for a set of CouchDB databases,
+    with a background thread committing them. When the queue is full the
+    callers block until there is room for their documents (backpressure).
+    """
+
+    def __init__(self, spoolFile, maxSize=10000, batchSize=250, retryDelay=30, statsInterval=300):
+        self.spoolFile = spoolFile
+        self.maxSize = maxSize
+        self.batchSize = batchSize
+        self.retryDelay = retryDelay
+        self.statsInterval = statsInterval
+
+        self._databases = {}
+        self._queue = Queue(maxsize=maxSize)
+        self._lock = threading.Condition()
+        # documents spooled but not yet committed, by database name and id
+        self._pending = Counter()
+        self._numPending = 0
+        self._stopping = threading.Event()
+        self._abort = threading.Event()
+        self._thread = None
+        self._lastStats = time.time()
+        self.stats = {"queued": 0, "committed": 0, "batches": 0, "failures": 0, "replayed": 0,
+                      "blocked": 0, "blockedTime": 0.0, "maxDepth": 0}
+
+        self._spooled = self._readSpool()
+        self._spool = open(self.spoolFile, 'a')
+        return
+
+    def _readSpool(self):
+        """
+        Load the documents left in the spool file by a previous process,
+        by database name
+        """
+        spooled = defaultdict(list)
+        if not os.path.exists(self.spoolFile):
+            return spooled
+        with open(self.spoolFile) as fileHandle:
+            for line in fileHandle:
+                try:
+                    dbName, doc = json.loads(line)
+                except ValueError:
+                    # the last line can be incomplete after a crash
+                    logging.warning("Skipping corrupted line in the CouchDB spool file %s", self.spoolFile)
+                    continue
+                spooled[dbName].append(doc)
+        if spooled:
+            logging.info("Found %d documents not committed to CouchDB in %s",
+                         sum(len(x) for x in spooled.values()), self.spoolFile)
+        return spooled
+
+    def addDatabase(self, dbName, database, callback=None, commitFunc=None):
+        """
+        _addDatabase_
+
+        Register a database the documents can be queued for. The database
+        instance is used only by the background thread, so it must not be
+        shared with the caller. Documents are committed with
+        commitFunc(database, callback=callback) if given, otherwise with
+        database.commit(callback=callback). Documents of this database left in
+        the spool file are queued again, to be committed without the callback:
+        the ones conflicting with the current revision are dropped.
+        """
+        if dbName in self._databases:
+            return
+        self._databases[dbName] = {"database": database, "callback": callback, "commitFunc": commitFunc}
+        with self._lock:
+            replay = self._spooled.pop(dbName, [])
+            for doc in replay:
+                self._addPending(dbName, doc)
+        for doc in replay:
+            self._queue.put((dbName, doc, True))
+        self.stats["replayed"] += len(replay)
+        return
+
+    def hasDatabase(self, dbName):
+        """
+        _hasDatabase_
+
+        Whether a database was registered with addDatabase
+        """
+        return dbName in self._databases
+
+    def start(self):
+        """
+        _start_
+
+        Start the background thread committing the documents
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="CouchWriteBehind")
+            self._thread.daemon = True
+            self._thread.start()
+        return
+
+    def isRunning(self):
+        """
+        _isRunning_
+
+        Whether documents are committed by the background thread
+        """
+        return self._thread is not None and self._thread.is_alive() and not self._stopping.is_set()
+
+    def stop(self, timeout=None):
+        """
+        _stop_
+
+        Commit all the queued documents and stop the background thread,
+        waiting at most timeout seconds. Documents which couldn't be
+        committed in time are left in the spool file.
+        Return True if all the documents were committed.
+        """
+        if self._thread is not None:
+            self._stopping.set()
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                self._abort.set()
+                self._thread.join()
+        self._thread = None
+        self._spool.close()
+        logging.info("CouchDB write-behind stopped, statistics: %s", self.getStats())
+        return self._numPending == 0
+
+    def getStats(self):
+        """
+        _getStats_
+
+        Return a dictionary with the queue statistics: number of documents
+        queued, committed and replayed from the spool file, number of batches
+        and of failed commits, number of calls blocked on a full queue and
+        total time spent blocked, current and maximum queue depth.
+        """
+        stats = dict(self.stats)
+        stats["depth"] = self._queue.qsize()
+        stats["pending"] = self._numPending
+        return stats
+
+    def put(self, dbName, doc, timestamp=False):
+        """
+        _put_
+
+        Queue a document to be committed to the database named dbName. If
+        timestamp is True a timestamp field is set in the document, as done
+        by the CMSCouch Database.queue method. Blocks if the queue is full.
+        Once the queue is stopped the document is committed right away.
+        """
+        if dbName not in self._databases:
+            raise CouchWriteBehindException("Database %s not added to the write-behind queue" % dbName)
+        if timestamp:
+            doc['timestamp'] = int(time.time())
+        if not self.isRunning():
+            self._commitDatabase(dbName, [doc], retry=False)
+            return
+
+        with self._lock:
+            self._spool.write(json.dumps([dbName, doc]) + '\n')
+            self._spool.flush()
+            self._addPending(dbName, doc)
+            self.stats["queued"] += 1
+        try:
+            self._queue.put_nowait((dbName, doc, False))
+        except Full:
+            startTime = time.time()
+            self._queue.put((dbName, doc, False))
+            self.stats["blocked"] += 1
+            self.stats["blockedTime"] += time.time() - startTime
+        self.stats["maxDepth"] = max(self.stats["maxDepth"], self._queue.qsize())
+        return
+
+    def waitFor(self, dbName, docIds, timeout=None):
+        """
+        _waitFor_
+
+        Wait until none of the documents with the given ids is waiting to be
+        committed to the database named dbName, so that they can be read back
+        from CouchDB. Return False if they are still pending after timeout secs.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._lock:
+            while any(self._pending[(dbName, docId)] for docId in docIds):
+                if not self.isRunning():
+                    return False
+                remaining = 1 if deadline is None else min(deadline - time.time(), 1)
+                if remaining <= 0:
+                    return False
+                self._lock.wait(remaining)
+        return True
+
+    def _addPending(self, dbName, doc):
+        """
+        Count a spooled document as pending, must be called holding the lock
+        """
+        self._pending[(dbName, doc.get('_id'))] += 1
+        self._numPending += 1
+
+    def _run(self):
+        """
+        Body of the background thread: take the queued documents, in batches
+        of up to batchSize documents, and commit them until stopped
+        """
+        while not self._abort.is_set():
+            try:
+                batch = [self._queue.get(timeout=1)]
+            except Empty:
+                if self._stopping.is_set():
+                    break
+                continue
+            while len(batch) < self.batchSize:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except Empty:
+                    break
+
+            docsByDb = OrderedDict()
+            for dbName, doc, replayed in batch:
+                docsByDb.setdefault((dbName, replayed), []).append(doc)
+            for (dbName, replayed), docs in docsByDb.items():
+                if self._commitDatabase(dbName, docs, retry=True, replayed=replayed):
+                    self._committed(dbName, docs)
+
+            if time.time() - self._lastStats > self.statsInterval:
+                logging.info("CouchDB write-behind statistics: %s", self.getStats())
+                self._lastStats = time.time()
+        return
+
+    def _commitDatabase(self, dbName, docs, retry, replayed=False):
+        """
+        Commit a list of documents to a database. If retry is True, failed
+        commits are retried every retryDelay seconds until aborted. Documents
+        replayed from the spool file are committed without the conflict callback.
+        Return True if the documents were committed.
+        """
+        dbInfo = self._databases[dbName]
+        database = dbInfo["database"]
+        callback = None if replayed else dbInfo["callback"]
+        for doc in docs:
+            database.queue(doc, callback=callback)
+        while True:
+            try:
+                if dbInfo["commitFunc"] is not None:
+                    results = dbInfo["commitFunc"](database, callback=callback)
+                else:
+                    results = database.commit(callback=callback)
+                self.stats["batches"] += 1
+                break
+            except Exception as ex:
+                self.stats["failures"] += 1
+                logging.error("Failed to commit %d documents to CouchDB database %s. Error: %s",
+                              len(docs), dbName, str(ex))
+                if not retry or self._abort.wait(self.retryDelay):
+                    return False
+
+        errors = [row for row in results or [] if isinstance(row, dict) and row.get('error')]
+        if replayed:
+            conflicts = [row.get('id') for row in errors if row.get('error') == 'conflict']
+            if conflicts:
+                logging.warning("Dropped %d replayed documents updated meanwhile in CouchDB database %s: %s",
+                                len(conflicts), dbName, conflicts)
+            errors = [row for row in errors if row.get('error') != 'conflict']
+        if errors:
+            logging.warning("%d documents were not committed to CouchDB database %s. First error: %s",
+                            len(errors), dbName, errors[0])
+        return True
+
+    def _committed(self, dbName, docs):
+        """
+        Remove committed documents from the pending ones and truncate the
+        spool file when nothing is pending anymore
+        """
+        with self._lock:
+            for doc in docs:
+                key = (dbName, doc.get('_id'))
+                self._pending[key] -= 1
+                if self._pending[key] <= 0:
+                    del self._pending[key]
+            self._numPending -= len(docs)
+            self.stats["committed"] += len(docs)
+            if self._numPending == 0:
+                self._spool.seek(0)
+                self._spool.truncate()
+                # keep the spooled documents of databases not added yet
+                for spooledDb, spooledDocs in self._spooled.items():
+                    self._spool.writelines(json.dumps([spooledDb, doc]) + '\n' for doc in spooledDocs)
+                self._spool.flush()
+            self._lock.notify_all()
+        return
+
+
+_writeBehinds = {}
+_writeBehindsLock = threading.Lock()
+# lock files of the spool files claimed by this process
+_spoolLocks = {}
+
+
+def claimSpoolFile(spoolFile):
+    """
+    _claimSpoolFile_
+
+    Return the first of the spool files spoolFile.0, spoolFile.1, ... not
+    used by another process, for processes running side by side (e.g. the
+    workers of a pool), which must not share a spool file. The spool file is
+    locked until this process exits, so the documents left by a dead process
+    are committed by the next process claiming its spool file.
+    """
+    index = 0
+    while True:
+        claimedFile = "%s.%i" % (spoolFile, index)
+        if claimedFile in _spoolLocks:
+            return claimedFile
+        lockFile = open(claimedFile + ".lock", 'a')
+        try:
+            fcntl.flock(lockFile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except (IOError, OSError):
+            lockFile.close()
+            index += 1
+            continue
+        _spoolLocks[claimedFile] = lockFile
+        return claimedFile
+
+
+def getCouchWriteBehind(spoolFile, **kwargs):
+    """
+    _getCouchWriteBehind_
+
+    Return the running write-behind queue of this process using spoolFile,
+    creating and starting it if needed. Extra arguments are passed to the
+    CouchWriteBehind constructor.
+    """
+    with _writeBehindsLock:
+        if spoolFile not in _writeBehinds:
+            writeBehind = CouchWriteBehind(spoolFile, **kwargs)
+            writeBehind.start()
+            _writeBehinds[spoolFile] = writeBehind
+        return _writeBehinds[spoolFile]
+
+
+def stopCouchWriteBehinds(timeout=None):
+    """
+    _stopCouchWriteBehinds_
+
+    Flush and stop all the write-behind queues of this process, to be called
+    when the process is shutting down.
+    Return True if all the queued documents were committed.
+    """
+    with _writeBehindsLock:
+        writeBehinds = list(_writeBehinds.values())
+        _writeBehinds.clear()
+    allCommitted = True
+    for writeBehind in writeBehinds:
+        allCommitted &= writeBehind.stop(timeout)
+    return allCommitted
@@ -6,12 +6,13 @@ Core Database APIs
 
 
 """
+import re
 from copy import copy
 
 from Utils.IteratorTools import grouper
 import WMCore.WMLogging
 from WMCore.DataStructs.WMObject import WMObject
-from WMCore.Database.ResultSet import ResultSet
+from WMCore.Database.ResultSet import ResultSet, StreamingResultSet
 
 class DBInterface(WMObject):
     """
@@ -36,6 +37,9 @@ class DBInterface(WMObject):
         self.logger.info ("Instantiating base WM DBInterface")
         self.engine = engine
         self.maxBindsPerQuery = 500
+        self.streamBatchSize = 1000
+        # Oracle does not accept more than 1000 expressions in an IN list
+        self.maxInListSize = 1000
 
     def buildbinds(self, sequence, thename, therest=[{}]):
         """
@@ -113,6 +117,72 @@ class DBInterface(WMObject):
         result = connection.execute(s, b)
         return self.makelist(result)
 
+    def inlistbind(self, s, b):
+        """
+        _inlistbind_
+
+        Check whether a SELECT statement executed for a list of binds can be
+        rewritten as an IN list query. That's only the case when every bind
+        dictionary has the same single key and that bind variable is used
+        exactly once in the statement, in an equality comparison.
+
+        Returns the name of the bind variable, or None if it can't be rewritten.
+        """
+        if not s.strip().lower().startswith('select') or not b:
+            return None
+        bindNames = set()
+        for bind in b:
+            if not isinstance(bind, dict) or len(bind) != 1:
+                return None
+            bindNames.update(bind)
+        if len(bindNames) != 1:
+            return None
+        bindName = bindNames.pop()
+        if len(re.findall(r":%s\b" % re.escape(bindName), s, re.IGNORECASE)) != 1:
+            return None
+        if not re.search(r"=\s*:%s\b" % re.escape(bindName), s, re.IGNORECASE):
+            return None
+        return bindName
+
+    def executeinlistbinds(self, s=None, b=None, connection=None,
+                           returnCursor=False):
+        """
+        _executeinlistbinds_
+
+        Execute a SELECT statement for a list of single-key binds by replacing
+        the "= :bind" comparison with "IN (:bind_0, :bind_1, ...)" lists of at
+        most self.maxInListSize elements, instead of one query per bind.
+
+        Duplicate bind values are only queried once and rows are returned in
+        the database order, so callers must correlate the rows to their binds
+        through a selected column. Use inlistbind to check if s and b are
+        supported.
+
+        Returns a list with a single ResultSet (or a list of result proxies,
+        one per IN list chunk, if returnCursor is True).
+        """
+        bindName = self.inlistbind(s, b)
+        values = list(dict.fromkeys(bind[bindName] for bind in b))
+        bindRegex = re.compile(r"=\s*:%s\b" % re.escape(bindName), re.IGNORECASE)
+
+        result = [] if returnCursor else ResultSet()
+        for chunk in grouper(values, self.maxInListSize):
+            chunkBinds = {}
+            for i, value in enumerate(chunk):
+                chunkBinds["%s_%i" % (bindName, i)] = value
+            inList = "IN (%s)" % ", ".join([":%s" % x for x in chunkBinds])
+            sql = bindRegex.sub(lambda _match: inList, s)
+            chunkResult = self.executebinds(sql, chunkBinds, connection=connection,
+                                            returnCursor=returnCursor)
+            if returnCursor:
+                result.append(chunkResult)
+            else:
+                if not result.keys:
+                    result.keys.extend(chunkResult.keys)
+                result.data.extend(chunkResult.data)
+
+        return self.makelist(result)
+
     def connection(self):
         """
         Return a connection to the engine (from the connection pool)
@@ -120,13 +190,53 @@ class DBInterface(WMObject):
         return self.engine.connect()
 
 
+    def streamData(self, sqlstmt, binds=None, conn=None):
+        """
+        _streamData_
+
+        Execute a single SELECT statement with a server side cursor and
+        return a list with one StreamingResultSet, which fetches rows in
+        batches of self.streamBatchSize while it is iterated.
+
+        If conn is not provided, a connection is taken from the pool and
+        it's only released once the StreamingResultSet is exhausted or closed.
+        Note that MySQL does not allow other statements on the same
+        connection until the streamed result has been fully consumed.
+        """
+        sqlstmt = self.makelist(sqlstmt)
+        binds = [b for b in self.makelist(binds) if b]
+        if len(sqlstmt) != 1 or len(binds) > 1:
+            raise Exception("""DBInterface.streamData only supports one statement with at most one set of binds
+            Got sql (%i) and binds (%i)""" % (len(sqlstmt), len(binds)))
+
+        connection = conn or self.connection()
+        try:
+            streamConn = connection.execution_options(stream_results=True)
+            resultProxy = self.executebinds(sqlstmt[0], binds[0] if binds else None,
+                                            connection=streamConn, returnCursor=True)
+        except Exception:
+            if not conn:
+                connection.close()
+            raise
+
+        return [StreamingResultSet(resultProxy, batchSize=self.streamBatchSize,
+                                   connection=None if conn else connection)]
+
     def processData(self, sqlstmt, binds={}, conn=None,
-                    transaction=False, returnCursor=False):
+                    transaction=False, returnCursor=False, stream=False,
+                    bulkSelect=False):
         """
         set conn if you already have an active connection to reuse
         set transaction = True if you already have an active transaction
+        set bulkSelect = True to run a SELECT with a list of single-key binds
+        as chunked IN list queries (see executeinlistbinds)
+        set stream = True to get the rows of a single SELECT statement
+        lazily through a server side cursor (see streamData)
 
         """
+        if stream:
+            return self.streamData(sqlstmt, binds, conn=conn)
+
         connection = None
         try:
             if not conn:
@@ -155,9 +265,13 @@ class DBInterface(WMObject):
                 #Run single SQL statement for a list of binds - use execute_many()
                 if not transaction:
                     trans = connection.begin()
-                for subBinds in grouper(binds, self.maxBindsPerQuery):
-                    result.extend(self.executemanybinds(sqlstmt[0], subBinds,
-                                                        connection=connection, returnCursor=returnCursor))
+                if bulkSelect and self.inlistbind(sqlstmt[0], binds):
+                    result.extend(self.executeinlistbinds(sqlstmt[0], binds, connection=connection,
+                                                          returnCursor=returnCursor))
+                else:
+                    for subBinds in grouper(binds, self.maxBindsPerQuery):
+                        result.extend(self.executemanybinds(sqlstmt[0], subBinds,
+                                                            connection=connection, returnCursor=returnCursor))
 
                 if not transaction:
                     trans.commit()
@@ -94,6 +94,31 @@ class DBFormatter(WMObject):
 
         return dictOut
 
+    def formatDictIter(self, result):
+        """
+        Generator version of formatDict, yields one dictionary per row.
+        The lowercased key names are computed only once per result set,
+        which makes it suitable for StreamingResultSet objects. The result
+        sets are closed even if the generator is not exhausted.
+        """
+        for r in result:
+            try:
+                keyNames = []
+                for keyName in r.keys:
+                    if isinstance(keyName, (str, bytes)):
+                        keyName = decodeBytesToUnicodeConditional(keyName, condition=PY3)
+                    keyNames.append(keyName.lower())
+                keyNames = tuple(keyNames)
+                for i in r:
+                    entry = {}
+                    for keyName, value in zip(keyNames, i):
+                        if isinstance(value, (str, bytes)):
+                            value = decodeBytesToUnicodeConditional(value, condition=PY3)
+                        entry[keyName] = value
+                    yield entry
+            finally:
+                r.close()
+
     def formatList(self, result):
         """
         Returns a flat array with the results.
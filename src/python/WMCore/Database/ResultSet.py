@@ -15,6 +15,9 @@ class ResultSet(object):
         self.data = []
         self.keys = []
 
+    def __iter__(self):
+        return iter(self.data)
+
     def close(self):
         return
 
@@ -42,3 +45,93 @@ class ResultSet(object):
                 self.data.append(r)
 
         return
+
+
+class StreamingResultSet(ResultSet):
+    """
+    _StreamingResultSet_
+
+    A ResultSet that does not drain the SQLAlchemy result proxies up front.
+    Rows are pulled from the (server side) cursors in fetchmany batches while
+    the object is iterated, so only one batch is held in memory at a time.
+    Result proxies added with add are streamed one after the other, each
+    cursor being closed once it has been exhausted or when close is called.
+
+    If an owned connection is provided, it's returned to the pool on close.
+    """
+
+    def __init__(self, resultproxy, batchSize=1000, connection=None):
+        super(StreamingResultSet, self).__init__()
+        self.resultproxy = None
+        self.pending = []
+        self.batchSize = batchSize
+        self.connection = connection
+        self.add(resultproxy)
+        if self.resultproxy is None:
+            self.close()
+
+    def __iter__(self):
+        while self.resultproxy is not None:
+            rows = self.resultproxy.fetchmany(self.batchSize)
+            if not rows:
+                self._nextProxy()
+                continue
+            for row in rows:
+                yield row
+
+    def _nextProxy(self):
+        """
+        Close the exhausted cursor and move on to the next one, closing
+        the result set when there are no more
+        """
+        self.resultproxy.close()
+        if self.pending:
+            self.resultproxy = self.pending.pop(0)
+        else:
+            self.close()
+        return
+
+    def close(self):
+        """
+        Close the underlying cursors and release the owned connection, if any
+        """
+        for resultproxy in [self.resultproxy] + self.pending:
+            if resultproxy is not None and not resultproxy.closed:
+                resultproxy.close()
+        self.resultproxy = None
+        self.pending = []
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+        return
+
+    def fetchone(self):
+        while self.resultproxy is not None:
+            row = self.resultproxy.fetchone()
+            if row is not None:
+                return row
+            self._nextProxy()
+        return []
+
+    def fetchall(self):
+        """
+        Drain the remaining rows of the cursors into a list
+        """
+        self.data = list(self)
+        return self.data
+
+    def add(self, resultproxy):
+        """
+        Add a result proxy, whose rows are streamed after the rows of the
+        result proxies added before
+        """
+        if resultproxy.closed or not resultproxy.returns_rows:
+            return
+        if len(self.keys) == 0:
+            # do not modernize next line, RMKeyView is not a list
+            self.keys.extend(resultproxy.keys())
+        if self.resultproxy is None:
+            self.resultproxy = resultproxy
+        else:
+            self.pending.append(resultproxy)
+        return
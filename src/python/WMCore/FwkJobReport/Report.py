@@ -9,14 +9,17 @@ from __future__ import print_function
 from builtins import str as newstr, bytes, range, object
 from future.utils import viewitems, listitems
 
+import json
 import logging
 import math
 import re
+import struct
 import sys
 import time
 import traceback
+import zlib
 
-from Utils.PythonVersion import PY3
+from Utils.PythonVersion import PY3, HIGHEST_PICKLE_PROTOCOL
 from Utils.Utilities import decodeBytesToUnicode, encodeUnicodeToBytes
 from WMCore.Configuration import ConfigSection
 from WMCore.DataStructs.File import File
@@ -27,6 +30,14 @@ from WMCore.WMExceptions import WM_JOB_ERROR_CODES
 
 import pickle
 
+# Reports are saved with a small header followed by a JSON index with the
+# summary most consumers need (steps, exit codes, task name, etc), and the
+# compressed pickle of the report data, only decoded when it's accessed.
+FWJR_MAGIC = b"WMFWJR"
+FWJR_FORMAT_VERSION = 1
+FWJR_ZLIB_LEVEL = 3
+_FWJR_HEADER = struct.Struct("<6sBI")
+
 
 class FwkJobReportException(WMException):
     """
@@ -101,6 +112,8 @@ class Report(object):
     """
 
     def __init__(self, reportname=None):
+        self._body = None
+        self._index = None
         self.data = ConfigSection("FrameworkJobReport")
         self.data.steps = []
         self.data.workload = "Unknown"
@@ -115,12 +128,75 @@ class Report(object):
     def __str__(self):
         return str(self.data)
 
+    def __setstate__(self, state):
+        # reports pickled before the lazy loading of the data
+        if "data" in state:
+            state["_data"] = state.pop("data")
+        state.setdefault("_body", None)
+        state.setdefault("_index", None)
+        self.__dict__.update(state)
+
+    @property
+    def data(self):
+        """
+        The ConfigSection with the report, decoded the first time
+        it's accessed if the report was loaded with an index. A job ID
+        set before the decoding is kept in the index and applied here.
+        """
+        if self._body is not None:
+            self._data = pickle.loads(zlib.decompress(self._body))
+            if self._index.get("jobID") is not None:
+                self._data.jobID = self._index["jobID"]
+            self._body = None
+            self._index = None
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+        self._body = None
+        self._index = None
+
+    def _indexed(self, key, stepName=None):
+        """
+        _indexed_
+
+        Check whether a value can be served from the index of a report
+        whose data has not been decoded yet.
+        """
+        if self._index is None or key not in self._index:
+            return False
+        return stepName is None or stepName in self._index[key]
+
+    def buildIndex(self):
+        """
+        _buildIndex_
+
+        Return the summary of the report saved in the index
+        """
+        index = {"steps": list(self.listSteps()),
+                 "task": self.getTaskName(),
+                 "jobID": self.getJobID(),
+                 "siteName": self.getSiteName(),
+                 "outputFileCount": self.getOutputFileCount(),
+                 "stepExitCodes": {}, "stepExitCode": {}, "stepSuccess": {}, "stepTimes": {}}
+        for stepName in index["steps"]:
+            if self.retrieveStep(stepName) is None:
+                continue
+            index["stepExitCodes"][stepName] = sorted(self.getStepExitCodes(stepName))
+            index["stepExitCode"][stepName] = self.getStepExitCodeAndMessage(stepName)
+            index["stepSuccess"][stepName] = self.stepSuccessful(stepName)
+            index["stepTimes"][stepName] = self.getTimes(stepName)
+        return index
+
     def listSteps(self):
         """
         _listSteps_
 
         List the names of all the steps in the report.
         """
+        if self._indexed("steps"):
+            return list(self._index["steps"])
         return self.data.steps
 
     def setStepStatus(self, stepName, status):
@@ -276,6 +352,8 @@ class Report(object):
 
         Returns the site name attribute (no step specific)
         """
+        if self._indexed("siteName"):
+            return self._index["siteName"]
         return getattr(self.data, 'siteName', {})
 
 
@@ -307,6 +385,8 @@ class Report(object):
 
         Returns a list of all non-zero exit codes in the step
         """
+        if self._indexed("stepExitCodes", stepName):
+            return set(self._index["stepExitCodes"][stepName])
         returnCodes = set()
         reportStep = self.retrieveStep(stepName)
         errorCount = getattr(reportStep.errors, "errorCount", 0)
@@ -356,6 +436,8 @@ class Report(object):
         Get the exit code and message for a particular step
         Return (0, None)  if there were no errors.
         """
+        if self._indexed("stepExitCode", stepName):
+            return tuple(self._index["stepExitCode"][stepName])
         returnCode = 0
         returnMessage = None
         reportStep = self.retrieveStep(stepName)
@@ -370,13 +452,26 @@ class Report(object):
 
         return returnCode, returnMessage
 
-    def persist(self, filename):
+    def persist(self, filename, legacy=False):
         """
         _persist_
 
-        Pickle this object and save it to disk.
-        """
-        if PY3:
+        Save this report to disk, with an index and its compressed data.
+        If legacy is True, save it as a plain pickle instead.
+        """
+        if PY3 and not legacy:
+            try:
+                index = json.dumps(self.buildIndex()).encode("utf-8")
+            except Exception as ex:
+                # an empty index just means the data is decoded for everything
+                logging.warning("Failed to build the index of job report %s: %s", filename, str(ex))
+                index = b"{}"
+            body = zlib.compress(pickle.dumps(self.data, protocol=HIGHEST_PICKLE_PROTOCOL), FWJR_ZLIB_LEVEL)
+            with open(filename, 'wb') as handle:
+                handle.write(_FWJR_HEADER.pack(FWJR_MAGIC, FWJR_FORMAT_VERSION, len(index)))
+                handle.write(index)
+                handle.write(body)
+        elif PY3:
             with open(filename, 'wb') as handle:
                 pickle.dump(encodeUnicodeToBytes(self.data), handle)
         else:
@@ -388,11 +483,26 @@ class Report(object):
         """
         _unpersist_
 
-        Load a pickled FWJR from disk.
+        Load a FWJR from disk, either saved with an index or as a plain
+        pickle. With an index, the report data is only decoded when needed.
         """
         if PY3:
             with open(filename, 'rb') as handle:
-                self.data = decodeBytesToUnicode(pickle.load(handle))
+                blob = handle.read()
+            if blob.startswith(FWJR_MAGIC):
+                if len(blob) < _FWJR_HEADER.size:
+                    raise FwkJobReportException("Truncated job report %s" % filename)
+                _, version, indexLength = _FWJR_HEADER.unpack_from(blob)
+                if version != FWJR_FORMAT_VERSION:
+                    raise FwkJobReportException("Unsupported job report format version %s in %s" %
+                                                (version, filename))
+                bodyStart = _FWJR_HEADER.size + indexLength
+                index = json.loads(blob[_FWJR_HEADER.size:bodyStart].decode("utf-8"))
+                self._data = None
+                self._body = blob[bodyStart:]
+                self._index = index
+            else:
+                self.data = decodeBytesToUnicode(pickle.loads(blob))
         else:
             with open(filename, 'r') as handle:
                 self.data = pickle.load(handle)
@@ -865,6 +975,23 @@ class Report(object):
 
         return listOfFiles
 
+    def getOutputFileCount(self):
+        """
+        _getOutputFileCount_
+
+        Return the number of output files in all the steps
+        """
+        if self._indexed("outputFileCount"):
+            return self._index["outputFileCount"]
+        fileCount = 0
+        for step in self.listSteps():
+            stepReport = self.retrieveStep(step=step)
+            for module in getattr(stepReport, 'outputModules', None) or []:
+                outputMod = self.getOutputModule(step=step, outputModule=module)
+                if outputMod:
+                    fileCount += getattr(outputMod.files, 'fileCount', 0)
+        return fileCount
+
     def getAllInputFiles(self):
         """
         _getAllInputFiles_
@@ -1057,6 +1184,8 @@ class Report(object):
 
         Determine wether or not a step was successful.
         """
+        if self._indexed("stepSuccess", stepName):
+            return self._index["stepSuccess"][stepName]
         stepReport = self.retrieveStep(step=stepName)
         status = getattr(stepReport, 'status', 1)
         # We have too many possibilities
@@ -1219,6 +1348,8 @@ class Report(object):
 
         Return a dictionary with the start and stop times
         """
+        if self._indexed("stepTimes", stepName):
+            return dict(self._index["stepTimes"][stepName])
         reportStep = self.retrieveStep(stepName)
 
         startTime = getattr(reportStep, 'startTime', None)
@@ -1269,14 +1400,20 @@ class Report(object):
 
         Return the task name
         """
+        if self._indexed("task"):
+            return self._index["task"]
         return getattr(self.data, 'task', None)
 
     def setJobID(self, jobID):
         """
         _setJobID_
 
-        Set the WMBS jobID
+        Set the WMBS jobID, in the index if the report data
+        has not been decoded yet
         """
+        if self._body is not None:
+            self._index["jobID"] = jobID
+            return
 
         self.data.jobID = jobID
         return
@@ -1287,7 +1424,8 @@ class Report(object):
 
         Get the WMBS job ID if attached
         """
-
+        if self._indexed("jobID"):
+            return self._index["jobID"]
         return getattr(self.data, 'jobID', None)
 
     def getAllFileRefs(self):
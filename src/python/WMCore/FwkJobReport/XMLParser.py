@@ -8,8 +8,9 @@ from __future__ import division, print_function
 
 import logging
 import re
+import xml.parsers.expat
 
-from WMCore.Algorithms.ParseXMLFile import coroutine, xmlFileToNode
+from WMCore.Algorithms.ParseXMLFile import Node, coroutine
 from WMCore.DataStructs.Run import Run
 from WMCore.FwkJobReport import Report
 
@@ -25,6 +26,18 @@ def reportBuilder(nodeStruct, report, target):
         target.send((report, node))
 
 
+def dispatchReportNode(report, subnode, targets):
+    """
+    _dispatchReportNode_
+
+    Send a top level part of the job report to its handler
+    """
+    if subnode.name in targets:
+        targets[subnode.name].send((report, subnode))
+    else:
+        setattr(report.report.parameters, subnode.name, subnode.text)
+
+
 @coroutine
 def reportDispatcher(targets):
     """
@@ -41,24 +54,98 @@ def reportDispatcher(targets):
             continue
 
         for subnode in node.children:
-            if subnode.name == "File":
-                targets['File'].send((report, subnode))
-            elif subnode.name == "InputFile":
-                targets['InputFile'].send((report, subnode))
-            elif subnode.name == "AnalysisFile":
-                targets['AnalysisFile'].send((report, subnode))
-            elif subnode.name == "PerformanceReport":
-                targets['PerformanceReport'].send((report, subnode))
-            elif subnode.name == "FrameworkError":
-                targets['FrameworkError'].send((report, subnode))
-            elif subnode.name == "SkippedFile":
-                targets['SkippedFile'].send((report, subnode))
-            elif subnode.name == "FallbackAttempt":
-                targets['FallbackAttempt'].send((report, subnode))
-            elif subnode.name == "SkippedEvent":
-                targets['SkippedEvent'].send((report, subnode))
-            else:
-                setattr(report.report.parameters, subnode.name, subnode.text)
+            dispatchReportNode(report, subnode, targets)
+
+
+def parseLumiSection(attrs):
+    """
+    _parseLumiSection_
+
+    Return the (lumi, events) tuple for the attributes of a LumiSection,
+    or None if it has no lumi number
+    """
+    if "ID" not in attrs:
+        return None
+    nEvents = attrs.get("NEvents", None)
+    if nEvents is not None:
+        try:
+            nEvents = int(nEvents)
+        except ValueError:
+            nEvents = None
+    return int(attrs['ID']), nEvents
+
+
+class ReportStreamBuilder(object):
+    """
+    _ReportStreamBuilder_
+
+    Single pass replacement of xmlFileToNode and reportDispatcher, with the
+    expat events handled directly. The top level elements are kept as Node
+    structures and only dispatched to the handlers once the whole document
+    is parsed, so a truncated or corrupt report leaves the Report instance
+    untouched. Lumi sections are not built as nodes, they're accumulated
+    as a list of (lumi, events) tuples in the lumis attribute of their Run
+    node. Branch names are skipped altogether.
+    """
+
+    def __init__(self, report, targets):
+        self.report = report
+        self.targets = targets
+        self.nodeStack = []
+        self.charCache = []
+        self.topNodes = []
+
+    def parse(self, fileHandle):
+        """
+        _parse_
+
+        Parse the XML job report from an open file, and fill the report
+        with it only if the whole document could be parsed
+        """
+        parser = xml.parsers.expat.ParserCreate()
+        parser.buffer_text = True
+        parser.StartElementHandler = self.startElement
+        parser.EndElementHandler = self.endElement
+        parser.CharacterDataHandler = self.charCache.append
+        parser.ParseFile(fileHandle)
+
+        topNodes, self.topNodes = self.topNodes, []
+        for node in topNodes:
+            dispatchReportNode(self.report, node, self.targets)
+
+    def startElement(self, name, attrs):
+        """
+        Build the node for an element, unless it's a lumi section or a branch
+        """
+        del self.charCache[:]
+        nodeStack = self.nodeStack
+        parent = nodeStack[-1] if nodeStack else None
+        if len(nodeStack) > 1 and (parent is None or parent.name in ("Run", "Branches")):
+            # lumi sections and branches (ignored by the branchHandler) are
+            # not built as nodes, nor anything under them
+            if parent is not None and parent.name == "Run":
+                parent.lumis.append(parseLumiSection(attrs))
+            nodeStack.append(None)
+            return
+        newnode = Node(name, attrs)
+        if name == "Run":
+            newnode.lumis = []
+        if len(nodeStack) > 1:
+            parent.children.append(newnode)
+        elif parent is None and name != "FrameworkJobReport":
+            print("Not Handling: ", name)
+        nodeStack.append(newnode)
+
+    def endElement(self, name):
+        """
+        Set the node text and queue it if it's a top level element
+        """
+        node = self.nodeStack.pop()
+        if node is not None:
+            node.text = ''.join(self.charCache).strip()
+            if len(self.nodeStack) == 1 and self.nodeStack[0].name == "FrameworkJobReport":
+                self.topNodes.append(node)
+        del self.charCache[:]
 
 
 @coroutine
@@ -230,17 +317,12 @@ def runHandler():
                 if runId is None:
                     continue
 
-                lumis = []
-                for lumi in subnode.children:
-                    if "ID" in lumi.attrs:
-                        lumiNumber = int(lumi.attrs['ID'])
-                        nEvents = lumi.attrs.get("NEvents", None)
-                        if nEvents is not None:
-                            try:
-                                nEvents = int(nEvents)
-                            except ValueError:
-                                nEvents = None
-                        lumis.append((lumiNumber, nEvents))
+                if hasattr(subnode, "lumis"):
+                    # already parsed by the ReportStreamBuilder
+                    lumis = [x for x in subnode.lumis if x is not None]
+                else:
+                    lumis = [parseLumiSection(lumi.attrs) for lumi in subnode.children]
+                    lumis = [x for x in lumis if x is not None]
                 runInfo = Run(runNumber=runId)
                 runInfo.extendLumis(lumis)
 
@@ -487,20 +569,13 @@ def perfStoreHandler():
             logging.error("Not adding any storage performance info to report.")
 
 
-def xmlToJobReport(reportInstance, xmlFile):
+def reportDispatchers():
     """
-    _xmlToJobReport_
-
-    parse the XML file and insert the information into the
-    Report instance provided
+    _reportDispatchers_
 
+    Set up the coroutine pipeline handling the top level parts of the
+    job report, key'ed by their element name
     """
-    # read XML, build node structure
-    node = xmlFileToNode(xmlFile)
-
-    #  //
-    # // Set up coroutine pipeline
-    # //
     fileDispatchers = {
         "Runs": runHandler(),
         "Branches": branchHandler(),
@@ -524,14 +599,19 @@ def xmlToJobReport(reportInstance, xmlFile):
         "FallbackAttempt": fallbackAttemptHandler(),
         "SkippedEvent": skippedEventHandler(),
     }
+    return dispatchers
+
 
-    #  //
-    # // Feed pipeline with node structure and report result instance
-    # //
-    reportBuilder(
-        node, reportInstance,
-        reportDispatcher(dispatchers)
-    )
+def xmlToJobReport(reportInstance, xmlFile):
+    """
+    _xmlToJobReport_
+
+    parse the XML file and insert the information into the
+    Report instance provided, in a single pass over the file
+
+    """
+    with open(xmlFile, 'rb') as fileHandle:
+        ReportStreamBuilder(reportInstance, reportDispatchers()).parse(fileHandle)
 
     return
 
@@ -19,9 +19,10 @@ import logging
 import math
 import operator
 
+from WMCore.DataStructs.LumiList import LumiMask
 from WMCore.DataStructs.Run import Run
 from WMCore.JobSplitting.JobFactory import JobFactory
-from WMCore.JobSplitting.LumiBased import isGoodLumi, isGoodRun, LumiChecker
+from WMCore.JobSplitting.LumiBased import isGoodRun, LumiChecker
 from WMCore.WMBS.File import File
 from WMCore.WMSpec.WMTask import buildLumiMask
 
@@ -102,6 +103,7 @@ class EventAwareLumiBased(JobFactory):
                 msg += "Refusing to create any jobs.\nDetails: %s" % str(ex)
                 logging.exception(msg)
                 return
+        goodRunList = LumiMask(goodRunList)
 
         lDict = self.getFilesSortedByLocation(avgEventsPerJob)
         if not lDict:
@@ -215,8 +217,9 @@ class EventAwareLumiBased(JobFactory):
                         stopJob = True
 
                     # Now loop over the lumis
+                    goodLumis = set(goodRunList.filterLumis(run.run, run)) if goodRunList else None
                     for lumi in run:
-                        if (not isGoodLumi(goodRunList, run=run.run, lumi=lumi) or
+                        if ((goodLumis is not None and lumi not in goodLumis) or
                                 self.lumiChecker.isSplitLumi(run.run, lumi, f)):
                             # Kill the chain of good lumis
                             # Skip this lumi
@@ -8,6 +8,7 @@ from builtins import range
 
 import logging
 import threading
+import time
 import operator
 
 from WMCore.DAOFactory import DAOFactory
@@ -42,7 +43,8 @@ class JobFactory(WMObject):
         self.proxies = []
         self.grabByProxy = False
         self.daoFactory = None
-        self.timing = {'jobInstance': 0, 'sortByLocation': 0, 'acquireFiles': 0, 'jobGroup': 0}
+        # seconds spent by the factory in each step, summed over all the calls
+        self.timing = {'jobInstance': 0, 'sortByLocation': 0, 'acquireFiles': 0, 'jobGroup': 0, 'algorithm': 0}
         self.siteWhitelist = []
         self.siteBlacklist = []
         self.trustSitelists = False
@@ -94,8 +96,12 @@ class JobFactory(WMObject):
         list([x.start() for x in self.generators])
 
         self.limit = int(kwargs.get("file_load_limit", self.limit))
+        startTime = time.time()
         self.algorithm(*args, **kwargs)
+        self.timing['algorithm'] += time.time() - startTime
+        startTime = time.time()
         self.commit()
+        self.timing['jobGroup'] += time.time() - startTime
 
         list([x.finish() for x in self.generators])
         return self.jobGroups
@@ -127,6 +133,7 @@ class JobFactory(WMObject):
         """
         if name is None:
             name = self.getJobName()
+        startTime = time.time()
         self.currentJob = self.jobInstance(name, files)
         self.currentJob["task"] = self.subscription.taskName()
         self.currentJob["workflow"] = self.subscription.workflowName()
@@ -153,6 +160,7 @@ class JobFactory(WMObject):
         for gen in self.generators:
             gen(self.currentJob)
         self.currentGroup.add(self.currentJob)
+        self.timing['jobInstance'] += time.time() - startTime
         return
 
     def appendJobGroup(self):
@@ -237,6 +245,7 @@ class JobFactory(WMObject):
 
         fileDict = {}
 
+        startTime = time.time()
         if self.grabByProxy:
             logging.debug("About to load files by proxy")
             fileset = self.loadFiles(size=self.limit)
@@ -244,6 +253,8 @@ class JobFactory(WMObject):
         else:
             logging.debug("About to load files by DAO")
             fileset = self.subscription.availableFiles(limit=self.limit, doingJobSplitting=True)
+        self.timing['acquireFiles'] += time.time() - startTime
+        startTime = time.time()
 
         # Reverse sorting this set by location is required to match how sorting was done in py2
         # Unittests that rely on this sorting method
@@ -264,6 +275,7 @@ class JobFactory(WMObject):
             else:
                 fileDict[locSet] = [fileInfo]
 
+        self.timing['sortByLocation'] += time.time() - startTime
         return fileDict
 
     def getJobName(self, length=None):
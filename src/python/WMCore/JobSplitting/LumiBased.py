@@ -12,8 +12,10 @@ from future.utils import viewitems, viewvalues
 
 import logging
 import operator
+from bisect import bisect_right
 
 from Utils.IteratorTools import flattenList
+from WMCore.DataStructs.LumiList import LumiMask
 from WMCore.DataStructs.Run import Run
 from WMCore.JobSplitting.JobFactory import JobFactory
 from WMCore.WMBS.File import File
@@ -24,12 +26,15 @@ def isGoodLumi(goodRunList, run, lumi):
     """
     _isGoodLumi_
 
-    Checks to see if runs match a run-lumi combination in the goodRunList
-    This is a pain in the ass.
+    Checks to see if runs match a run-lumi combination in the goodRunList,
+    either a dictionary or a compiled LumiMask
     """
-    if goodRunList is None or goodRunList == {}:
+    if not goodRunList:
         return True
 
+    if isinstance(goodRunList, LumiMask):
+        return goodRunList.hasLumi(run, lumi)
+
     if not isGoodRun(goodRunList=goodRunList, run=run):
         return False
 
@@ -50,9 +55,12 @@ def isGoodRun(goodRunList, run):
 
     Tell if this is a good run
     """
-    if goodRunList is None or goodRunList == {}:
+    if not goodRunList:
         return True
 
+    if isinstance(goodRunList, LumiMask):
+        return goodRunList.hasRun(run)
+
     if str(run) in goodRunList:
         # @e can find a run
         return True
@@ -70,10 +78,11 @@ class LumiChecker(object):
     """
 
     def __init__(self, applyLumiCorrection):
-        # This is a dictionary that contains (run, lumis) pairs as keys, and job ojects as values
-        # The run/lumi keys are added as soon as the lumi is processed by the splitting algorithm
-        # The job value is added when the newJob method is invoked
-        self.lumiJobs = {}
+        # This is a dictionary with the runs as keys and the set of their lumis processed so far as values
+        # The lumis are added as soon as they are processed by the splitting algorithm
+        self.seenLumis = {}
+        # The jobs closed so far, the lumis of each job are in its mask
+        self.closedJobs = []
         # This dictionary contains (run, lumis) pairs as keys, and a list of files as values
         # The logic is that as soon as a split lumi is seen we add its input file here
         self.splitLumiFiles = {}
@@ -83,16 +92,15 @@ class LumiChecker(object):
         """ Check if a lumi has already been processed, and return True if it is the case.
             Also saves the input file containing the lumi if this happens.
 
-            The method adds the (run, lumi) pair key to lumiJobs, and it sets its value to None.
-            This value will be set from None to the job object as soon as the splitting algorithm
-            switch to a new job.
+            The method adds the lumi to the seenLumis of the run.
             If a split lumi is encountered we add its input file to the self.splitLumiFiles dict
         """
         if not self.applyLumiCorrection:  # if we don't have to apply the correction simply exit
             return False
 
-        # This means the lumi has already been processed and the job has changed
-        isSplit = (run, lumi) in self.lumiJobs
+        # This means the lumi has already been processed
+        runLumis = self.seenLumis.setdefault(run, set())
+        isSplit = lumi in runLumis
 
         if isSplit:
             self.splitLumiFiles.setdefault((run, lumi), []).append(file_)
@@ -100,36 +108,65 @@ class LumiChecker(object):
                             "Will add %s to the input files of the job processing the lumi", run,
                             lumi, file_['lfn'])
         else:
-            self.lumiJobs[(run, lumi)] = None
+            runLumis.add(lumi)
 
         return isSplit
 
     def closeJob(self, job):
-        """ Go through the list of lumis of the job and add an entry to "lumiJobs"
+        """ Keep track of a job whose lumis are all in its mask
 
-            For each (run,lumi) pair in the job I create an entry in the dictionary so we know if the lumi
-            has already been added to another job, and we know to which job (so later we can add files to this
-            job if duplicated lumis are found)
+            The lumi ranges of the job masks are only looked at if split lumis are found,
+            to know to which job a lumi was added (so later we can add files to this job)
         """
         if not self.applyLumiCorrection:
             return
         if job:  # the first time you call "newJob" in the splitting algorithm currentJob is None
+            self.closedJobs.append(job)
+
+    def findJob(self, run, lumi, jobIndex=None):
+        """ Return the closed job whose mask contains a lumi, or None
+
+            jobIndex is a dictionary with the runs as keys and the lists of (first lumi, last lumi, job)
+            tuples of the closed jobs, sorted, as values. It is built from the closed jobs if not given
+        """
+        if jobIndex is None:
+            jobIndex = self._buildJobIndex()
+        runIndex = jobIndex.get(run, [])
+        index = bisect_right(runIndex, (lumi, float('inf'))) - 1
+        if index >= 0 and lumi <= runIndex[index][1]:
+            return runIndex[index][2]
+        return None
+
+    def _buildJobIndex(self):
+        """ Index the lumi ranges of the closed jobs by run, see findJob
+        """
+        jobIndex = {}
+        for jobNumber, job in enumerate(self.closedJobs):
             for run, lumiIntervals in viewitems(job['mask']['runAndLumis']):
                 for startLumi, endLumi in lumiIntervals:
-                    for lumi in range(startLumi, endLumi + 1):
-                        self.lumiJobs[(run, lumi)] = job
+                    jobIndex.setdefault(run, []).append((startLumi, endLumi, jobNumber))
+        for run, runIndex in viewitems(jobIndex):
+            runIndex.sort()
+            jobIndex[run] = [(startLumi, endLumi, self.closedJobs[jobNumber])
+                             for startLumi, endLumi, jobNumber in runIndex]
+        return jobIndex
 
     def fixInputFiles(self):
         """ Called at the end. Iterates over the split lumis, and add their input files to the first job where the lumi
             was seen.
         """
         # Just a cosmetic "if": self.splitLumiFiles is empty when applyLumiCorrection is not enabled
-        if not self.applyLumiCorrection:
+        if not self.applyLumiCorrection or not self.splitLumiFiles:
             return
 
+        jobIndex = self._buildJobIndex()
         for (run, lumi), files in viewitems(self.splitLumiFiles):
+            job = self.findJob(run, lumi, jobIndex)
+            if job is None:
+                logging.error("No job found for the split lumi (%s, %s), not adding its files", run, lumi)
+                continue
             for file_ in files:
-                self.lumiJobs[(run, lumi)].addFile(file_)
+                job.addFile(file_)
 
 
 class LumiBased(JobFactory):
@@ -201,6 +238,7 @@ class LumiBased(JobFactory):
                 msg += "Refusing to create any jobs.\nDetails: %s" % str(ex)
                 logging.exception(msg)
                 return
+        goodRunList = LumiMask(goodRunList)
 
         lDict = self.getFilesSortedByLocation(lumisPerJob)
         if not lDict:
@@ -274,9 +312,10 @@ class LumiBased(JobFactory):
                         stopJob = True
 
                     # Now loop over the lumis
+                    goodLumis = set(goodRunList.filterLumis(run.run, run)) if goodRunList else None
                     for lumi in run:
                         # splitLumi checks if the lumi is split across jobs
-                        if (not isGoodLumi(goodRunList, run=run.run, lumi=lumi)
+                        if ((goodLumis is not None and lumi not in goodLumis)
                             or self.lumiChecker.isSplitLumi(run.run, lumi, f)):
                             # Kill the chain of good lumis
                             # Skip this lumi
@@ -5,20 +5,25 @@ _ChangeState_
 Propagate a job from one state to another.
 """
 import json
+import os
 import sys
 from builtins import str
 import logging
 import re
 import time
+from functools import partial
+from urllib.parse import unquote_plus
 
+from Utils.IteratorTools import grouper
 from WMCore.DataStructs.WMObject import WMObject
 from WMCore.Database.CMSCouch import CouchNotFoundError, CouchError, CouchRequestTooLargeError
 from WMCore.Database.CMSCouch import CouchServer
+from WMCore.Database.CouchWriteBehind import getCouchWriteBehind
 from WMCore.JobStateMachine.SummaryDB import updateSummaryDB
 from WMCore.JobStateMachine.Transitions import Transitions
 from WMCore.Lexicon import sanitizeURL
 from WMCore.WMConnectionBase import WMConnectionBase
-from WMCore.WMSpec.WMWorkload import WMWorkloadHelper
+from WMCore.WMSpec.SpecCache import getSpecCache
 
 CMSSTEP = re.compile(r'^cmsRun[0-9]+$')
 
@@ -60,6 +65,31 @@ def discardConflictingDocument(couchDbInstance, data, result):
         return result
 
 
+def appendStateTransition(doc, transition):
+    """
+    _appendStateTransition_
+
+    Add a state transition to a job document, the same way the
+    JobDump/stateTransition couch update handler does.
+    """
+    states = doc.setdefault("states", {})
+    maxKey = max([int(key) for key in states] + [0])
+    states[str(maxKey + 1)] = transition
+
+
+def appendSummaryTransition(doc, transition):
+    """
+    _appendSummaryTransition_
+
+    Update the state of a job summary document and add the transition to its
+    history, the same way the WMStatsAgent jobSummaryState and
+    jobStateTransition couch update handlers do.
+    """
+    doc["state"] = transition["newstate"]
+    doc["timestamp"] = transition["timestamp"]
+    doc.setdefault("state_history", []).append(transition)
+
+
 def shrinkLargeFJR(couchDbInstance, sizeLimit):
     """
     Look at the CouchDB database queue and empty documents
@@ -82,13 +112,34 @@ def shrinkLargeFJR(couchDbInstance, sizeLimit):
     return
 
 
+def commitFWJRs(couchDbInstance, sizeLimit, callback=discardConflictingDocument):
+    """
+    Commit the framework job reports queued in a CouchDB database instance.
+    If the bulk request is too large, the too large reports are emptied
+    and the commit is retried.
+    :param couchDbInstance: couchdb database instance
+    :param sizeLimit: integer with the limit number of bytes of a document
+    :param callback: the conflict callback of the commit
+    :return: the result of the bulk commit
+    """
+    try:
+        # TODO: CouchDB bulk insert may fail at any given document. That means, only by
+        # parsing the response object we can actually see which documents succeeded or not.
+        # https://docs.couchdb.org/en/stable/api/database/bulk-api.html#updating-documents-in-bulk
+        return couchDbInstance.commit(callback=callback)
+    except CouchRequestTooLargeError as exc:
+        msg = "Failed to commit bulk of framework job report to CouchDB."
+        msg += f" Details: {str(exc)}"
+        logging.warning(msg)
+        shrinkLargeFJR(couchDbInstance, sizeLimit)
+        # now all the documents should fit in
+        return couchDbInstance.commit(callback=callback)
+
+
 def getDataFromSpecFile(specFile):
-    workload = WMWorkloadHelper()
-    workload.load(specFile)
-    campaign = workload.getCampaign()
-    result = {"Campaign": campaign}
-    for task in workload.taskIterator():
-        result[task.getPathName()] = task.getPrepID()
+    summary = getSpecCache().getSummary(specFile)
+    result = {"Campaign": summary.campaign}
+    result.update(summary.prepIDs)
     return result
 
 
@@ -114,6 +165,7 @@ class ChangeState(WMObject, WMConnectionBase):
         # max total number of documents to be committed in the same Couch operation
         self.maxBulkCommit = getattr(self.config.JobStateMachine, 'maxBulkCommitDocs', 250)
         self.couchdb = CouchServer(self.config.JobStateMachine.couchurl)
+        self.writeBehind = None
         self._connectDatabases()
 
         self.getCouchDAO = self.daofactory("Jobs.GetCouchID")
@@ -126,7 +178,62 @@ class ChangeState(WMObject, WMConnectionBase):
 
         self.maxUploadedInputFiles = getattr(self.config.JobStateMachine, 'maxFWJRInputFiles', 1000)
         self.fwjrLimitSize = getattr(self.config.JobStateMachine, 'fwjrLimitSize', 8 * 1000**2)
-        self.workloadCache = {}
+        # spec file of each task, the specs themselves are in the process-wide cache
+        self.specByTask = {}
+
+        # optionally, the documents are committed to couch by a background thread
+        if getattr(self.config.JobStateMachine, 'couchWriteBehind', False):
+            self.writeBehind = getCouchWriteBehind(self._getSpoolFile(),
+                                                   maxSize=getattr(self.config.JobStateMachine,
+                                                                   'couchWriteBehindSize', 10000),
+                                                   batchSize=self.maxBulkCommit)
+            self._connectDatabases()
+        return
+
+    def _getSpoolFile(self):
+        """
+        Return the name of the spool file of the couch write-behind queue, by
+        default in the directory of the component using this object
+        """
+        spoolFile = getattr(self.config.JobStateMachine, 'couchWriteBehindSpool', None)
+        if spoolFile:
+            return spoolFile
+        compName = getattr(getattr(self.config, 'Agent', None), 'componentName', None)
+        spoolDir = getattr(getattr(self.config, compName, None), 'componentDir', None) if compName else None
+        if not spoolDir:
+            spoolDir = self.config.General.workDir
+        return os.path.join(spoolDir, "CouchWriteBehind.spool")
+
+    def _addWriteBehindDatabases(self):
+        """
+        Add the databases the job, FWJR and job summary documents are written
+        to to the write-behind queue, with their own connections
+        """
+        if self.writeBehind is None:
+            return True
+        commitArgs = [(self.jobsdatabase, {"callback": discardConflictingDocument}),
+                      (self.fwjrdatabase, {"callback": discardConflictingDocument,
+                                           "commitFunc": partial(commitFWJRs, sizeLimit=self.fwjrLimitSize)}),
+                      (self.jsumdatabase, {})]
+        for couchDb, kwargs in commitArgs:
+            if self.writeBehind.hasDatabase(couchDb.name):
+                continue
+            dbName = unquote_plus(couchDb.name)
+            try:
+                database = self.couchdb.connectDatabase(dbName, size=self.maxBulkCommit)
+            except Exception as ex:
+                logging.error("Error connecting to couch db '%s': %s", dbName, str(ex))
+                return False
+            self.writeBehind.addDatabase(couchDb.name, database, **kwargs)
+        return True
+
+    def _waitForWrites(self, couchDb, docIds):
+        """
+        Wait for the documents still in the write-behind queue to be committed,
+        before reading them from couch
+        """
+        if self.writeBehind is not None:
+            self.writeBehind.waitFor(couchDb.name, docIds)
         return
 
     def _connectDatabases(self):
@@ -171,7 +278,7 @@ class ChangeState(WMObject, WMConnectionBase):
                 self.jsumdatabase = None
                 return False
 
-        return True
+        return self._addWriteBehindDatabases()
 
     def propagate(self, jobs, newstate, oldstate, updatesummary=False):
         """
@@ -242,22 +349,22 @@ class ChangeState(WMObject, WMConnectionBase):
         timestamp = int(time.time())
         couchRecordsToUpdate = []
 
+        if newstate == "new":
+            oldstate = "none"
+
+        # jobs already in couch get their transitions appended in bulk
+        self.recordTransitionsInCouch(jobs, newstate, oldstate, timestamp, updatesummary)
+
         countDocs = 0
         for job in jobs:
             couchDocID = job.get("couch_record", None)
 
-            if newstate == "new":
-                oldstate = "none"
-
-            if job.get("site_cms_name", None):
-                if newstate == "executing":
+            if couchDocID is None:
+                if job.get("site_cms_name", None) and newstate == "executing":
                     jobLocation = job["site_cms_name"]
                 else:
                     jobLocation = "Agent"
-            else:
-                jobLocation = "Agent"
 
-            if couchDocID is None:
                 jobDocument = {}
                 jobDocument["_id"] = str(job["id"])
                 job["couch_record"] = jobDocument["_id"]
@@ -304,53 +411,20 @@ class ChangeState(WMObject, WMConnectionBase):
 
                 couchRecordsToUpdate.append({"jobid": job["id"],
                                              "couchid": jobDocument["_id"]})
-                if countDocs >= self.jobsdatabase.getQueueSize():
-                    self.jobsdatabase.commit(callback=discardConflictingDocument)
-                self.jobsdatabase.queue(jobDocument, callback=discardConflictingDocument)
-            else:
-                # We send a PUT request to the stateTransition update handler.
-                # Couch expects the parameters to be passed as arguments to in
-                # the URI while the Requests class will only encode arguments
-                # this way for GET requests.  Changing the Requests class to
-                # encode PUT arguments as couch expects broke a bunch of code so
-                # we'll just do our own encoding here.
-                updateUri = "/" + self.jobsdatabase.name + "/_design/JobDump/_update/stateTransition/" + couchDocID
-                updateUri += "?oldstate=%s&newstate=%s&location=%s&timestamp=%s" % (oldstate,
-                                                                                    newstate,
-                                                                                    jobLocation,
-                                                                                    timestamp)
-                self.jobsdatabase.makeRequest(uri=updateUri, type="PUT", decode=False)
-
-            # updating the status of the summary doc only when it is explicitely requested
-            # doc is already in couch
-            if updatesummary:
-                jobSummaryId = job["name"]
-                updateUri = "/" + self.jsumdatabase.name + "/_design/WMStatsAgent/_update/jobSummaryState/" + jobSummaryId
-                # map retrydone state to jobfailed state for monitoring
-                if newstate == "retrydone":
-                    monitorState = "jobfailed"
+                if self.writeBehind is not None:
+                    self.writeBehind.put(self.jobsdatabase.name, jobDocument)
                 else:
-                    monitorState = newstate
-                updateUri += "?newstate=%s&timestamp=%s" % (monitorState, timestamp)
-                self.jsumdatabase.makeRequest(uri=updateUri, type="PUT", decode=False)
-                logging.debug("Updated job summary status for job %s", jobSummaryId)
-
-                updateUri = "/" + self.jsumdatabase.name + "/_design/WMStatsAgent/_update/jobStateTransition/" + jobSummaryId
-                updateUri += "?oldstate=%s&newstate=%s&location=%s&timestamp=%s" % (oldstate,
-                                                                                    monitorState,
-                                                                                    job["location"],
-                                                                                    timestamp)
-                self.jsumdatabase.makeRequest(uri=updateUri, type="PUT", decode=False)
-                logging.debug("Updated job summary state history for job %s", jobSummaryId)
+                    if countDocs >= self.jobsdatabase.getQueueSize():
+                        self.jobsdatabase.commit(callback=discardConflictingDocument)
+                    self.jobsdatabase.queue(jobDocument, callback=discardConflictingDocument)
 
             if job.get("fwjr", None):
 
-                cachedByWorkflow = self.workloadCache.setdefault(job['workflow'],
-                                                                 getDataFromSpecFile(
-                                                                     self.getWorkflowSpecDAO.execute(job['task'])[
-                                                                         job['task']]['spec']))
-                job['fwjr'].setCampaign(cachedByWorkflow.get('Campaign', ''))
-                job['fwjr'].setPrepID(cachedByWorkflow.get(job['task'], ''))
+                if job['task'] not in self.specByTask:
+                    self.specByTask[job['task']] = self.getWorkflowSpecDAO.execute(job['task'])[job['task']]['spec']
+                specSummary = getSpecCache().getSummary(self.specByTask[job['task']])
+                job['fwjr'].setCampaign(specSummary.campaign)
+                job['fwjr'].setPrepID(specSummary.prepIDs.get(job['task'], ''))
                 # If there are too many input files, strip them out
                 # of the FWJR, as they should already
                 # be in the database
@@ -387,21 +461,12 @@ class ChangeState(WMObject, WMConnectionBase):
                                 "archivestatus": archStatus,
                                 "fwjr": jsonFWJR,
                                 "type": "fwjr"}
-                if countDocs >= self.fwjrdatabase.getQueueSize():
-                    try:
-                        # TODO: CouchDB bulk insert may fail at any given document. That means, only by
-                        # parsing the response object we can actually see which documents succeeded or not.
-                        # https://docs.couchdb.org/en/stable/api/database/bulk-api.html#updating-documents-in-bulk
-                        self.fwjrdatabase.commit(callback=discardConflictingDocument)
-                    except CouchRequestTooLargeError as exc:
-                        msg = "Failed to commit bulk of framework job report to CouchDB."
-                        msg += f" Details: {str(exc)}"
-                        logging.warning(msg)
-                        shrinkLargeFJR(self.fwjrdatabase, self.fwjrLimitSize)
-                        # now all the documents should fit in
-                        self.fwjrdatabase.commit(callback=discardConflictingDocument)
-
-                self.fwjrdatabase.queue(fwjrDocument, timestamp=True, callback=discardConflictingDocument)
+                if self.writeBehind is not None:
+                    self.writeBehind.put(self.fwjrdatabase.name, fwjrDocument, timestamp=True)
+                else:
+                    if countDocs >= self.fwjrdatabase.getQueueSize():
+                        commitFWJRs(self.fwjrdatabase, self.fwjrLimitSize)
+                    self.fwjrdatabase.queue(fwjrDocument, timestamp=True, callback=discardConflictingDocument)
 
                 updateSummaryDB(self.statsumdatabase, job)
 
@@ -482,6 +547,7 @@ class ChangeState(WMObject, WMConnectionBase):
                                   "agent_name": self.config.Agent.hostName,
                                   "output": outputs}
                     if couchDocID is not None:
+                        self._waitForWrites(self.jsumdatabase, [jobSummaryId])
                         try:
                             currentJobDoc = self.jsumdatabase.document(id=jobSummaryId)
                             jobSummary['_rev'] = currentJobDoc['_rev']
@@ -499,26 +565,90 @@ class ChangeState(WMObject, WMConnectionBase):
                                 jobSummary[prop] = jobSummary[prop] if jobSummary[prop] else currentJobDoc.get(prop, [])
                         except CouchNotFoundError:
                             pass
-                    if countDocs >= self.fwjrdatabase.getQueueSize():
-                        self.jsumdatabase.commit()
-                    self.jsumdatabase.queue(jobSummary, timestamp=True)
+                    if self.writeBehind is not None:
+                        self.writeBehind.put(self.jsumdatabase.name, jobSummary, timestamp=True)
+                    else:
+                        if countDocs >= self.fwjrdatabase.getQueueSize():
+                            self.jsumdatabase.commit()
+                        self.jsumdatabase.queue(jobSummary, timestamp=True)
 
         if len(couchRecordsToUpdate) > 0:
             self.setCouchDAO.execute(bulkList=couchRecordsToUpdate,
                                      conn=self.getDBConn(),
                                      transaction=self.existingTransaction())
 
-        try:
-            self.fwjrdatabase.commit(callback=discardConflictingDocument)
-        except CouchRequestTooLargeError as exc:
-            msg = "Failed to commit bulk of framework job report to CouchDB."
-            msg += f" Error: {str(exc)}"
-            logging.warning(msg)
-            shrinkLargeFJR(self.fwjrdatabase, self.fwjrLimitSize)
-            # now all the documents should fit in
-            self.fwjrdatabase.commit(callback=discardConflictingDocument)
-        self.jobsdatabase.commit(callback=discardConflictingDocument)
-        self.jsumdatabase.commit()
+        if self.writeBehind is None:
+            commitFWJRs(self.fwjrdatabase, self.fwjrLimitSize)
+            self.jobsdatabase.commit(callback=discardConflictingDocument)
+            self.jsumdatabase.commit()
+        return
+
+    def recordTransitionsInCouch(self, jobs, newstate, oldstate, timestamp, updatesummary=False):
+        """
+        _recordTransitionsInCouch_
+
+        Append the state transition to the couch documents of the jobs that
+        already have one and, if requested, to their job summary documents.
+        Documents are fetched in bulk, updated locally and written back with
+        a bulk commit, instead of calling the update handlers once per job.
+        """
+        stateTransitions = {}
+        summaryTransitions = {}
+        # map retrydone state to jobfailed state for monitoring
+        monitorState = "jobfailed" if newstate == "retrydone" else newstate
+        for job in jobs:
+            couchDocID = job.get("couch_record", None)
+            if couchDocID is not None:
+                if job.get("site_cms_name", None) and newstate == "executing":
+                    jobLocation = job["site_cms_name"]
+                else:
+                    jobLocation = "Agent"
+                stateTransitions.setdefault(couchDocID, []).append({"oldstate": oldstate,
+                                                                    "newstate": newstate,
+                                                                    "location": jobLocation,
+                                                                    "timestamp": timestamp})
+
+            # updating the status of the summary doc only when it is explicitely requested
+            if updatesummary:
+                summaryTransitions.setdefault(job["name"], []).append({"oldstate": oldstate,
+                                                                       "newstate": monitorState,
+                                                                       "location": job["location"],
+                                                                       "timestamp": timestamp})
+
+        self._bulkUpdateDocuments(self.jobsdatabase, stateTransitions, appendStateTransition)
+        self._bulkUpdateDocuments(self.jsumdatabase, summaryTransitions, appendSummaryTransition,
+                                  createMissing=False)
+        logging.debug("Updated the state of %d job and %d job summary documents",
+                      len(stateTransitions), len(summaryTransitions))
+        return
+
+    def _bulkUpdateDocuments(self, couchDb, transitions, updateFunc, createMissing=True):
+        """
+        _bulkUpdateDocuments_
+
+        Fetch the documents in the transitions dictionary keys, in batches of
+        maxBulkCommit documents, apply updateFunc to each of them with every one
+        of its transitions and commit them back. Conflicts are resolved with
+        discardConflictingDocument. Missing documents are either created or skipped.
+        """
+        for docIds in grouper(list(transitions), self.maxBulkCommit):
+            self._waitForWrites(couchDb, docIds)
+            rows = couchDb.allDocs(options={"include_docs": True}, keys=docIds)['rows']
+            for row in rows:
+                doc = row.get("doc")
+                if doc is None:
+                    if not createMissing:
+                        logging.warning("Document %s not found in %s, not updating it", row["key"], couchDb.name)
+                        continue
+                    doc = {"_id": row["key"]}
+                for transition in transitions[row["key"]]:
+                    updateFunc(doc, transition)
+                if self.writeBehind is not None:
+                    self.writeBehind.put(couchDb.name, doc)
+                else:
+                    couchDb.queue(doc, callback=discardConflictingDocument)
+        if self.writeBehind is None:
+            couchDb.commit(callback=discardConflictingDocument)
         return
 
     def persist(self, jobs, newstate, oldstate):
@@ -629,6 +759,7 @@ class ChangeState(WMObject, WMConnectionBase):
             couchIDs = self.getCouchDAO.execute(jobIDs, conn=self.getDBConn(),
                                                 transaction=self.existingTransaction())
             locationCache = dict((x['jobid'], x['location']) for x in jobs)
+            self._waitForWrites(self.jobsdatabase, [entry['couch_record'] for entry in couchIDs])
             for entry in couchIDs:
                 couchRecord = entry['couch_record']
                 location = locationCache[entry['jobid']]
@@ -12,6 +12,7 @@ RSE basis.
 # futures
 from __future__ import division, print_function
 
+from bisect import bisect_left
 from pprint import pformat
 from time import time
 
@@ -20,6 +21,7 @@ import re
 import os
 import errno
 import stat
+import tempfile
 try:
     import gfal2
 except ImportError:
@@ -41,6 +43,7 @@ from WMCore.WMException import WMException
 from Utils.Pipeline import Pipeline, Functor
 from Utils.TwPrint import twFormat
 from Utils.IteratorTools import grouper
+from Utils.SortedFile import SortedLineFile, sortToFile
 
 # from memory_profiler import profile
 
@@ -64,6 +67,22 @@ class MSUnmergedPlineExit(MSUnmergedException):
         super(MSUnmergedPlineExit, self).__init__(self.message)
 
 
+def filesUnderDir(dirName, sortedFiles):
+    """
+    A generator over all the files from a sorted list of files which start
+    with a given directory name. The files sharing that prefix are contiguous
+    in the sorted list, so the first one is found with a binary search and the
+    scan stops at the first file not matching it.
+    :param dirName:     The directory name (LFN) to look for
+    :param sortedFiles: A sorted list of file LFNs
+    :return:            A generator over the matching file LFNs
+    """
+    idx = bisect_left(sortedFiles, dirName)
+    while idx < len(sortedFiles) and sortedFiles[idx].startswith(dirName):
+        yield sortedFiles[idx]
+        idx += 1
+
+
 def createGfal2Context(logLevel="normal", emulate=False):
     """
     Create a gfal2 context object
@@ -105,6 +124,11 @@ class MSUnmerged(MSCore):
         self.msConfig.setdefault("dirFilterExcl", [])
         self.msConfig.setdefault("emulateGfal2", False)
         self.msConfig.setdefault("filesToDeleteSliceSize", 100)
+        # stream the zipped list of unmerged files into a sorted file on disk,
+        # instead of keeping all of them in memory. Not compatible with fullRSEToDB:
+        # the full RSE dumps record an empty files.allUnmerged list in that case
+        self.msConfig.setdefault("streamUnmergedFiles", False)
+        self.msConfig.setdefault("unmergedFilesDir", None)
 
         self.msConfig.setdefault("mongoDBRetryCount", 3)
         self.msConfig.setdefault("mongoDBReplicaSet", None)
@@ -557,53 +581,70 @@ class MSUnmerged(MSCore):
         /ver2_HIPM_UL2016_MiniAODv2-v2         - processing string + processing version
         /140000/388E3DEF-...-7DD036D9DD33.root - to be cut off
 
+        If the streamUnmergedFiles option is enabled, the files are streamed from
+        the zipped Rucio Consistency Monitor API into a sorted file on disk, and
+        rse['files']['allUnmerged'] is a (memory-mapped) SortedLineFile.
+
         :param rse: The RSE to work on
         :return:    rse
         """
-        rse['files']['allUnmerged'] = self.rucioConMon.getRSEUnmerged(rse['name'])
-        for filePath in rse['files']['allUnmerged']:
-            # Check if what we start with is under /store/unmerged/*
-            if self.regStoreUnmergedLfn.match(filePath):
-                # Cut the path to the deepest level known to WMStats protected LFNs
-                dirPath = self._cutPath(filePath)
-                # Check if what is left is still under /store/unmerged/*
-                if self.regStoreUnmergedLfn.match(dirPath):
-                    # Add it to the set of allUnmerged
-                    rse['dirs']['allUnmerged'].add(dirPath)
+        if self.msConfig['streamUnmergedFiles']:
+            def unmergedFiles():
+                for filePath in self.rucioConMon.iterRSEUnmerged(rse['name']):
+                    self._addUnmergedDir(rse, filePath)
+                    yield filePath
+
+            fileDesc, fileName = tempfile.mkstemp(prefix="%s." % rse['name'], suffix=".unmerged",
+                                                  dir=self.msConfig['unmergedFilesDir'])
+            os.close(fileDesc)
+            try:
+                sortToFile(unmergedFiles(), fileName)
+                rse['files']['allUnmerged'] = SortedLineFile(fileName)
+            finally:
+                # the file stays available through the open memory map
+                os.remove(fileName)
+        else:
+            rse['files']['allUnmerged'] = self.rucioConMon.getRSEUnmerged(rse['name'])
+            for filePath in rse['files']['allUnmerged']:
+                self._addUnmergedDir(rse, filePath)
 
         rse['counters']['totalNumFiles'] = len(rse['files']['allUnmerged'])
         rse['counters']['totalNumDirs'] = len(rse['dirs']['allUnmerged'])
         return rse
 
+    def _addUnmergedDir(self, rse, filePath):
+        """
+        Adds the directory of an unmerged file, cut to the deepest level known to
+        WMStats protected LFNs, to the set of all unmerged directories of the RSE
+        :param rse:      The RSE to work on
+        :param filePath: The full (absolute) file path together with the file name
+        """
+        # Check if what we start with is under /store/unmerged/*
+        if self.regStoreUnmergedLfn.match(filePath):
+            # Cut the path to the deepest level known to WMStats protected LFNs
+            dirPath = self._cutPath(filePath)
+            # Check if what is left is still under /store/unmerged/*
+            if self.regStoreUnmergedLfn.match(dirPath):
+                # Add it to the set of allUnmerged
+                rse['dirs']['allUnmerged'].add(dirPath)
+
     def _cutPath(self, filePath):
         """
         Cuts a file path to the deepest level known to WMStats protected LFNs
         :param filePath:   The full (absolute) file path together with the file name
         :return finalPath: The final path cut the to correct level
         """
-        # pylint: disable=E1120
-        # This is a known issue when when passing an unpacked list to a method expecting
-        # at least one variable. In this case the signature of the method breaking the
-        # rule is:
-        # os.path.join(*newPath) != os.path.join(a, *p)
-
-        # Split the initial filePath into chunks and fill it into a dictionary
-        # containing only directory names and the root of the path e.g.
-        # ['/', 'store', 'unmerged', 'RunIISummer20UL17SIM', ...]
-        newPath = []
-        root = filePath
-        while True:
-            root, tail = os.path.split(root)
-            if tail:
-                newPath.append(tail)
-            else:
-                newPath.append(root)
-                break
-        newPath.reverse()
-        # Cut/slice the path to the level/element required.
-        newPath = newPath[:7]
-        # Build the path out of all that is found up to the deepest level in the LFN tree
-        finalPath = os.path.join(*newPath)
+        # Paths ending with a slash are directories already, just drop the slash(es)
+        if filePath.endswith('/'):
+            return filePath.rstrip('/') or '/'
+
+        # Split the initial filePath on the first 7 slashes only, e.g.:
+        # ['', 'store', 'unmerged', 'RunIISummer20UL17SIM', ..., 'rest/of/the/path']
+        # and keep the root plus the 6 directory levels following it
+        newPath = filePath.split('/', 7)
+        if len(newPath) <= 7:
+            return filePath
+        finalPath = '/'.join(newPath[:7])
         return finalPath
 
     # @profile
@@ -626,17 +667,15 @@ class MSUnmerged(MSCore):
         # Get rid of 'allUnmerged' directories
         rse['dirs']['allUnmerged'].clear()
 
-        # NOTE: Here we may want to filter out all protected files from allUnmerged and leave just those
-        #       eligible for deletion. This will minimize the iteration time of the filters
-        #       from toDelete later on.
-        # while rse['files']['allUnmerged'
+        # Sort the unmerged files (in place, if possible) such that all the files
+        # under a given directory are contiguous and can be found with a binary
+        # search, instead of scanning the whole list of files for every directory
+        if isinstance(rse['files']['allUnmerged'], list):
+            rse['files']['allUnmerged'].sort()
+        elif not isinstance(rse['files']['allUnmerged'], SortedLineFile):
+            rse['files']['allUnmerged'] = sorted(rse['files']['allUnmerged'])
 
         # Now create the filters for rse['files']['toDelete'] - those should be pure generators
-        # A simple generator:
-        def genFunc(pattern, iterable):
-            for i in iterable:
-                if i.startswith(pattern):
-                    yield i
 
         # NOTE: If the 'dirFilterIncl' is non empty then the cleaning process will
         #       be enclosed only in this part of the tree and will ignore anything
@@ -650,7 +689,7 @@ class MSUnmerged(MSCore):
         # Update directory/files with no service filters
         if not dirFilterIncl and not dirFilterExcl:
             for dirName in rse['dirs']['toDelete']:
-                rse['files']['toDelete'][dirName] = genFunc(dirName, rse['files']['allUnmerged'])
+                rse['files']['toDelete'][dirName] = filesUnderDir(dirName, rse['files']['allUnmerged'])
             rse['counters']['dirsToDelete'] = len(rse['files']['toDelete'])
             self.logger.info("RSE: %s: %s", rse['name'], twFormat(rse, maxLength=8))
             return rse
@@ -666,13 +705,13 @@ class MSUnmerged(MSCore):
                 continue
             if not dirFilterIncl:
                 # there is no inclusion filter, simply add this directory/files
-                rse['files']['toDelete'][dirName] = genFunc(dirName, rse['files']['allUnmerged'])
+                rse['files']['toDelete'][dirName] = filesUnderDir(dirName, rse['files']['allUnmerged'])
                 continue
 
             # apply inclusion filter
             for pathIncl in dirFilterIncl:
                 if dirName.startswith(pathIncl):
-                    rse['files']['toDelete'][dirName] = genFunc(dirName, rse['files']['allUnmerged'])
+                    rse['files']['toDelete'][dirName] = filesUnderDir(dirName, rse['files']['allUnmerged'])
                     break
 
         # Now apply the filters back to the set in rse['dirs']['toDelete']
@@ -723,6 +762,8 @@ class MSUnmerged(MSCore):
             self.logger.debug(msg, pformat(rse))
         else:
             self.logger.debug(msg, twFormat(rse, maxLength=8))
+        if isinstance(rse['files']['allUnmerged'], SortedLineFile):
+            rse['files']['allUnmerged'].close()
         rse.clear()
         return rse
 
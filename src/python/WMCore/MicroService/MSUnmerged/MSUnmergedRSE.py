@@ -6,6 +6,8 @@ Description: Provides a document Template for the MSUnmerged MicroServices
 from pymongo.errors  import NotPrimaryError
 # from pymongo.results import results as MongoResults
 
+from Utils.SortedFile import SortedLineFile
+
 
 class MSUnmergedRSE(dict):
     """
@@ -126,6 +128,9 @@ class MSUnmergedRSE(dict):
                                      during this write operation but will preserver their values.
                                      To completely refresh and RSE record in the database use
                                      self.purgeRSEAtMongoDB first.
+                               NOTE: a streamed (SortedLineFile) `files.allUnmerged` listing is
+                                     written as an empty list, since the whole RSE dump would
+                                     bring it back to memory (see the streamUnmergedFiles option)
         :param overwrite:      A flag to note if the currently existing document into
                                the database is about to be completely replaced or just
                                fields update is to happen.
@@ -153,7 +158,10 @@ class MSUnmergedRSE(dict):
                 elif field == 'files':
                     updateFields[field] = {}
                     for fileKey, fileSet in self[field].items():
-                        if isinstance(fileSet, set):
+                        if isinstance(fileSet, SortedLineFile):
+                            # the streamed listing is kept on disk, too large for the database record
+                            updateFields[field][fileKey] = []
+                        elif isinstance(fileSet, set):
                             updateFields[field][fileKey] = list(fileSet)
                         elif isinstance(fileSet, dict):
                             # Iterating through the filterNames here, and recording only empty lists for filter values
@@ -3,20 +3,29 @@
 """
 _ProcessPool_
 
+Pool of slave processes running a worker class, fed through ZMQ sockets.
+Work can be transported either JSON encoded, one item per message, over TCP
+sockets, or pickled with protocol 5 (large buffers sent out-of-band, without
+copies), in batches of items per multi-part message, over ipc sockets.
 """
 from __future__ import print_function
 
 from builtins import range, object
 
 import zmq
+from zmq.utils.monitor import recv_monitor_message
 import subprocess
 import sys
 import logging
 import os
+import tempfile
 import threading
+import time
 import traceback
 import pickle
+from collections import deque
 
+from Utils.IteratorTools import grouper
 from Utils.PythonVersion import PY3
 
 from logging.handlers import RotatingFileHandler
@@ -39,6 +48,29 @@ class ProcessPoolException(WMException):
     """
 
 
+def pickleEncode(obj):
+    """
+    _pickleEncode_
+
+    Pickle an object with protocol 5 into a list of message frames: the
+    pickle stream followed by the out-of-band buffers of the object
+    """
+    buffers = []
+    frames = [pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)]
+    frames.extend(buf.raw() for buf in buffers)
+    return frames
+
+
+def pickleDecode(frames):
+    """
+    _pickleDecode_
+
+    Unpickle an object from a list of message frames (bytes or zmq.Frame)
+    """
+    frames = [getattr(frame, 'buffer', frame) for frame in frames]
+    return pickle.loads(frames[0], buffers=frames[1:])
+
+
 class ProcessPoolWorker(object):
     """
     _ProcessPoolWorker_
@@ -65,7 +97,9 @@ class ProcessPoolWorker(object):
 class ProcessPool(object):
     def __init__(self, slaveClassName, totalSlaves, componentDir,
                  config, namespace='WMComponent', inPort='5555',
-                 outPort='5558'):
+                 outPort='5558', transport='json', batchSize=100,
+                 minSlaves=None, maxSlaves=None, slaveQueueDepth=10,
+                 idleTimeout=600):
         """
         __init__
 
@@ -79,10 +113,32 @@ class ProcessPool(object):
         parameters.  It is not passed to the slave class.  The slaveInit
         parameter will be serialized and passed to the slave class's
         constructor.
+
+        With the 'json' transport work is sent one item per message over TCP
+        sockets on inPort and outPort. With the 'pickle' transport it is sent
+        in batches of batchSize items over ipc sockets in the component dir.
+
+        The number of slaves starts at totalSlaves and, if minSlaves and/or
+        maxSlaves are given, is adjusted between them when work is enqueued:
+        one slave for every slaveQueueDepth items of running work, while
+        extra slaves are stopped once the pool has been idle for idleTimeout
+        seconds.
         """
+        if transport not in ('json', 'pickle'):
+            raise ProcessPoolException("Unknown ProcessPool transport: %s" % transport)
+
         self.enqueueIndex = 0
         self.dequeueIndex = 0
         self.runningWork = 0
+        self.transport = transport
+        self.batchSize = max(batchSize, 1)
+        self.minSlaves = totalSlaves if minSlaves is None else minSlaves
+        self.maxSlaves = totalSlaves if maxSlaves is None else maxSlaves
+        self.slaveQueueDepth = max(slaveQueueDepth, 1)
+        self.idleTimeout = idleTimeout
+        self.idleSince = None
+        # results received but not dequeued yet
+        self.results = deque()
 
         # Use the Services.Requests JSONizer, which handles __to_json__ calls
         self.jsonHandler = JSONRequests()
@@ -101,7 +157,18 @@ class ProcessPool(object):
         self.namespace = namespace
         self.inPort = inPort
         self.outPort = outPort
-
+        self.socketFiles = []
+        if self.transport == 'pickle':
+            socketPrefix = os.path.join(componentDir, "%s.%s.%x" % (slaveClassName, os.getpid(), id(self)))
+            if len(socketPrefix) > 90:
+                # unix socket paths are limited to ~100 characters
+                socketPrefix = os.path.join(tempfile.mkdtemp(prefix="ProcessPool"), "%x" % id(self))
+            self.socketFiles = [socketPrefix + "_in.ipc", socketPrefix + "_out.ipc"]
+            self.inAddress = "ipc://%s_in.ipc" % socketPrefix
+            self.outAddress = "ipc://%s_out.ipc" % socketPrefix
+        else:
+            self.inAddress = "tcp://*:%s" % inPort
+            self.outAddress = "tcp://*:%s" % outPort
 
         # Pickle the config
         self.configPath = os.path.join(componentDir, '%s_config.pkl' % slaveClassName)
@@ -116,9 +183,9 @@ class ProcessPool(object):
         try:
             context = zmq.Context()
             self.sender = context.socket(zmq.PUSH)
-            self.sender.bind("tcp://*:%s" % inPort)
+            self.sender.bind(self.inAddress)
             self.sink = context.socket(zmq.PULL)
-            self.sink.bind("tcp://*:%s" % outPort)
+            self.sink.bind(self.outAddress)
         except zmq.ZMQError:
             # Try this again in a moment to see
             # if it's just being held by something pre-existing
@@ -128,9 +195,9 @@ class ProcessPool(object):
             try:
                 context = zmq.Context()
                 self.sender = context.socket(zmq.PUSH)
-                self.sender.bind("tcp://*:%s" % inPort)
+                self.sender.bind(self.inAddress)
                 self.sink = context.socket(zmq.PULL)
-                self.sink.bind("tcp://*:%s" % outPort)
+                self.sink.bind(self.outAddress)
             except Exception as ex:
                 msg = "Error attempting to open TCP sockets\n"
                 msg += str(ex)
@@ -139,6 +206,10 @@ class ProcessPool(object):
                 print(traceback.format_exc())
                 raise ProcessPoolException(msg)
 
+        # Follow the slaves connecting to and disconnecting from the pool
+        self.monitor = self.sender.get_monitor_socket(zmq.EVENT_HANDSHAKE_SUCCEEDED | zmq.EVENT_DISCONNECTED)
+        self.connectedSlaves = 0
+
         # Now actually create the slaves
         self.createSlaves()
 
@@ -153,17 +224,19 @@ class ProcessPool(object):
         all of them.
         """
 
-        totalSlaves = self.nSlaves
-        slaveClassName = self.slaveClassName
-        config = self.config
-        namespace = self.namespace
-        inPort = self.inPort
-        outPort = self.outPort
+        self.startSlaves(self.nSlaves)
+        return
 
-        slaveArgs = [self.versionString, __file__, self.slaveClassName, inPort,
-                     outPort, self.configPath, self.componentDir, self.namespace]
+    def startSlaves(self, totalSlaves):
+        """
+        _startSlaves_
+
+        Start a number of slave processes
+        """
+        slaveArgs = [self.versionString, __file__, self.slaveClassName,
+                     self.inAddress.replace("*", "localhost"), self.outAddress.replace("*", "localhost"),
+                     self.configPath, self.componentDir, self.namespace, self.transport]
 
-        count = 0
         while totalSlaves > 0:
             # For each worker you want create a slave process
             # That process calls this code (WMCore.ProcessPool) and opens
@@ -172,10 +245,120 @@ class ProcessPool(object):
                                             stdout=subprocess.PIPE)
             self.workers.append(slaveProcess)
             totalSlaves -= 1
-            count += 1
 
         return
 
+    def resize(self, newWork=0):
+        """
+        _resize_
+
+        Adjust the number of slaves between minSlaves and maxSlaves to the
+        running work plus newWork items about to be enqueued. Slaves are
+        only stopped when no work is running, and waited for, so that no
+        work can be sent to a slave which is about to exit.
+        """
+        self.workers = [worker for worker in self.workers if worker.poll() is None]
+        wanted = -(-(self.runningWork + newWork) // self.slaveQueueDepth)
+        wanted = min(max(wanted, self.minSlaves), self.maxSlaves)
+
+        if wanted > len(self.workers):
+            logging.info("Starting %d ProcessPool slaves, %d items of work running",
+                         wanted - len(self.workers), self.runningWork + newWork)
+            self.startSlaves(wanted - len(self.workers))
+            # work is only distributed to the slaves already connected
+            if not self.waitForSlaves(wanted):
+                logging.warning("Only %d out of %d ProcessPool slaves connected", self.connectedSlaves, wanted)
+        elif wanted < len(self.workers) and self.runningWork == 0 and self.idleSince is not None \
+                and time.time() - self.idleSince >= self.idleTimeout:
+            logging.info("Stopping %d idle ProcessPool slaves", len(self.workers) - wanted)
+            self.waitForSlaves(len(self.workers), timeout=0)
+            # one at a time, so that the next STOP can't be sent to a slave already stopping
+            for _ in range(len(self.workers) - wanted):
+                self._send("STOP")
+                if not self.waitForSlaves(self.connectedSlaves - 1, timeout=30):
+                    logging.warning("ProcessPool slave did not stop")
+                    break
+            deadline = time.time() + 30
+            while len(self.workers) > wanted and time.time() < deadline:
+                time.sleep(0.1)
+                self.workers = [worker for worker in self.workers if worker.poll() is None]
+        self.nSlaves = len(self.workers)
+        return
+
+    def waitForSlaves(self, nSlaves, timeout=60):
+        """
+        _waitForSlaves_
+
+        Wait at most timeout seconds for the number of slaves connected to the
+        pool to be nSlaves. Return whether it is.
+        """
+        deadline = time.time() + timeout
+        while True:
+            while self.monitor.poll(0):
+                event = recv_monitor_message(self.monitor)
+                if event['event'] == zmq.EVENT_HANDSHAKE_SUCCEEDED:
+                    self.connectedSlaves += 1
+                elif event['event'] == zmq.EVENT_DISCONNECTED:
+                    self.connectedSlaves -= 1
+            remaining = deadline - time.time()
+            if self.connectedSlaves == nSlaves or remaining <= 0:
+                return self.connectedSlaves == nSlaves
+            self.monitor.poll(min(remaining, 1) * 1000)
+
+    def _send(self, work):
+        """
+        _send_
+
+        Send a piece of work (a batch of items with the pickle transport)
+        """
+        if self.transport == 'pickle':
+            self.sender.send_multipart(pickleEncode(work), copy=False)
+            return
+        encodedWork = self.jsonHandler.encode(work)
+        if PY3:
+            self.sender.send_string(encodedWork)
+        else:
+            self.sender.send(encodedWork)
+        return
+
+    def _receive(self, timeout=None):
+        """
+        _receive_
+
+        Receive the next message of results from the slaves, waiting at most
+        timeout seconds (forever if None). Return False if nothing arrived.
+        """
+        if timeout is not None and not self.sink.poll(timeout * 1000):
+            return False
+        if self.transport == 'pickle':
+            results = pickleDecode(self.sink.recv_multipart(copy=False))
+        else:
+            results = [self.jsonHandler.decode(self.sink.recv())]
+        for result in results:
+            if isinstance(result, dict) and result.get('type', None) == 'ERROR':
+                # Then we had some kind of error
+                msg = result.get('msg', 'Unknown Error in ProcessPool')
+                logging.error("Received Error Message from ProcessPool Slave")
+                logging.error(msg)
+                self.close()
+                raise ProcessPoolException(msg)
+        self.results.extend(results)
+        return True
+
+    def _nextResult(self, timeout=None):
+        """
+        _nextResult_
+
+        Return a tuple of a flag telling whether a result was received in
+        timeout seconds and the result itself
+        """
+        if not self.results and not self._receive(timeout):
+            return False, None
+        self.runningWork -= 1
+        if self.runningWork <= 0:
+            self.idleSince = time.time()
+        return True, self.results.popleft()
+
     def _subProcessName(self, slaveClassName, sequence):
         """ subProcessName for heartbeat
             could change to use process ID as a suffix
@@ -202,19 +385,20 @@ class ProcessPool(object):
         b) Closing the pipes
         c) Shutting down the workers themselves
         """
-        for i in range(self.nSlaves):
+        for i in range(len(self.workers)):
             try:
-                encodedWork = self.jsonHandler.encode('STOP')
-                if PY3:
-                    self.sender.send_string(encodedWork)
-                else:
-                    self.sender.send(encodedWork)
+                self._send('STOP')
             except Exception as ex:
                 # Might be already failed.  Nothing you can
                 # really do about that.
                 logging.error("Failure killing running process: %s" % str(ex))
                 pass
 
+        try:
+            self.sender.disable_monitor()
+            self.monitor.close()
+        except Exception:
+            pass
         try:
             self.sender.close()
         except:
@@ -239,6 +423,12 @@ class ProcessPool(object):
                     logging.error(str(ex2))
                     continue
         self.workers = []
+        for socketFile in self.socketFiles:
+            try:
+                os.remove(socketFile)
+            except OSError:
+                pass
+        self.socketFiles = []
         return
 
     def enqueue(self, work, list=False):
@@ -246,9 +436,15 @@ class ProcessPool(object):
         __enqeue__
 
         Assign work to the workers processes.  The work parameters must be a
-        list where each item in the list can be serialized into JSON.
+        list where each item in the list can be serialized into JSON (or
+        pickled, with the pickle transport).
 
         If list is True, the entire list is sent as one piece of work
+
+        The pool is resized before sending the work (see resize), also with
+        the default configuration (minSlaves == maxSlaves == totalSlaves):
+        dead slaves are restarted, which blocks for up to 60 seconds waiting
+        for them to connect.
         """
         if len(self.workers) < 1:
             # Someone's shut down the system
@@ -256,21 +452,19 @@ class ProcessPool(object):
             logging.error(msg)
             raise ProcessPoolException(msg)
 
-        if not list:
+        if list:
+            work = [work]
+        self.resize(len(work))
+        self.idleSince = None
+
+        if self.transport == 'pickle':
+            for batch in grouper(work, self.batchSize):
+                self._send(batch)
+                self.runningWork += len(batch)
+        else:
             for w in work:
-                encodedWork = self.jsonHandler.encode(w)
-                if PY3:
-                    self.sender.send_string(encodedWork)
-                else:
-                    self.sender.send(encodedWork)
+                self._send(w)
                 self.runningWork += 1
-        else:
-            encodedWork = self.jsonHandler.encode(work)
-            if PY3:
-                self.sender.send_string(encodedWork)
-            else:
-                self.sender.send(encodedWork)
-            self.runningWork += 1
 
         return
 
@@ -291,17 +485,7 @@ class ProcessPool(object):
 
         while totalItems > 0:
             try:
-                output = self.sink.recv()
-                decode = self.jsonHandler.decode(output)
-                if isinstance(decode, dict) and decode.get('type', None) == 'ERROR':
-                    # Then we had some kind of error
-                    msg = decode.get('msg', 'Unknown Error in ProcessPool')
-                    logging.error("Received Error Message from ProcessPool Slave")
-                    logging.error(msg)
-                    self.close()
-                    raise ProcessPoolException(msg)
-                completedWork.append(decode)
-                self.runningWork -= 1
+                completedWork.append(self._nextResult()[1])
                 totalItems -= 1
             except Exception as ex:
                 msg = "Exception while getting slave outputin ProcessPool.\n"
@@ -311,6 +495,22 @@ class ProcessPool(object):
 
         return completedWork
 
+    def iterDequeue(self, timeout=None):
+        """
+        __iterDequeue__
+
+        Generator over the completed work, yielding the results as they
+        arrive from the slaves until no work is running. It stops early if
+        no result arrives within timeout seconds: with timeout=0 it only
+        yields the results already available, without blocking.
+        """
+        while self.runningWork > 0:
+            received, result = self._nextResult(timeout)
+            if not received:
+                return
+            yield result
+        return
+
     def restart(self):
         """
         _restart_
@@ -362,6 +562,41 @@ def setupDB(config, wmInit):
     return
 
 
+def runPickleSlave(slaveClass, receiver, sender):
+    """
+    _runPickleSlave_
+
+    Main loop of a slave process with the pickle transport: receive batches
+    of work, run the slave class on each item and send back the outputs of
+    the whole batch in a single message, until a STOP is received.
+    """
+    while True:
+        inputs = pickleDecode(receiver.recv_multipart(copy=False))
+        if inputs == "STOP":
+            break
+
+        outputs = []
+        try:
+            for input in inputs:
+                output = slaveClass(input)
+                if isinstance(output, list):
+                    outputs.extend(output)
+                elif output is not None:
+                    outputs.append(output)
+        except Exception as ex:
+            crashMessage = "Slave process crashed with exception: " + str(ex)
+            crashMessage += "\nStacktrace:\n"
+            crashMessage += "".join(traceback.format_tb(sys.exc_info()[2], None))
+            logging.error(crashMessage)
+            sender.send_multipart(pickleEncode([{'type': 'ERROR', 'msg': crashMessage}]), copy=False)
+            logging.error("Sent error message and now breaking")
+            break
+
+        if outputs:
+            sender.send_multipart(pickleEncode(outputs), copy=False)
+    return
+
+
 if __name__ == "__main__":
     """
     __main__
@@ -372,16 +607,18 @@ if __name__ == "__main__":
     in through stdin as a JSON object.
 
     Input variables:
-    className, input port, output port, path to pickled config, component dir, namespace
+    className, input address, output address, path to pickled config, component dir,
+    namespace, transport
     """
 
     # Get variables passed in
     slaveClassName = sys.argv[1]
-    inPort = sys.argv[2]
-    outPort = sys.argv[3]
+    inAddress = sys.argv[2]
+    outAddress = sys.argv[3]
     configPath = sys.argv[4]
     componentDir = sys.argv[5]
     namespace = sys.argv[6]
+    transport = sys.argv[7] if len(sys.argv) > 7 else 'json'
 
     # Set up logging
     setupLogging(componentDir)
@@ -389,10 +626,10 @@ if __name__ == "__main__":
     # Build ZMQ link
     context = zmq.Context()
     receiver = context.socket(zmq.PULL)
-    receiver.connect("tcp://localhost:%s" % inPort)
+    receiver.connect(inAddress)
 
     sender = context.socket(zmq.PUSH)
-    sender.connect("tcp://localhost:%s" % outPort)
+    sender.connect(outAddress)
 
     # Build config
     if not os.path.exists(configPath):
@@ -416,6 +653,11 @@ if __name__ == "__main__":
 
     logging.info("Have slave class")
 
+    if transport == 'pickle':
+        runPickleSlave(slaveClass, receiver, sender)
+        logging.info("Process with PID %s finished" % (os.getpid()))
+        sys.exit(0)
+
     while (True):
         encodedInput = receiver.recv()
 
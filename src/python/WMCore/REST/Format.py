@@ -22,6 +22,51 @@ try:
 except ImportError:
     from cherrypy.lib import http as httputil
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+def _orjson_dumps(obj):
+    """Encode `obj` with orjson, falling back to the standard library for
+    objects orjson cannot represent (e.g. integers larger than 64 bits)."""
+    try:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    except TypeError:
+        return json.dumps(obj)
+
+def _ujson_dumps(obj):
+    """Encode `obj` with ujson, falling back to the standard library for
+    objects ujson cannot represent."""
+    try:
+        return ujson.dumps(obj, escape_forward_slashes=False)
+    except (TypeError, OverflowError):
+        return json.dumps(obj)
+
+# : JSON encoders available to `JSONFormat`, by name. The optional ones are
+# : registered only if the corresponding module can be imported.
+json_encoders = {'json': json.dumps}
+if orjson:
+    json_encoders['orjson'] = _orjson_dumps
+if ujson:
+    json_encoders['ujson'] = _ujson_dumps
+
+def configure_json_format(encoder='json', chunk_size=0):
+    """Select the JSON encoder and output chunk size used by all the
+    `JSONFormat` objects. Falls back to the standard library encoder if
+    `encoder` is not available, and returns the name of the encoder used."""
+    if encoder not in json_encoders:
+        cherrypy.log("WARNING: JSON encoder '%s' not available, using 'json'" % encoder)
+        encoder = 'json'
+    JSONFormat.json_encoder = encoder
+    JSONFormat.chunk_size = chunk_size
+    return encoder
+
 def vary_by(header):
     """Add 'Vary' header for `header`."""
     varies = cherrypy.response.headers.get('Vary', '')
@@ -210,9 +255,13 @@ class JSONFormat(RESTFormat):
     must inspect the X-REST-Status trailer header to find out if it got the
     complete output. No ETag header is generated in case of an exception.
 
-    The ETag generation is deterministic only if `cjson.encode()` output is
+    The ETag generation is deterministic only if the JSON encoder output is
     deterministic for the input. Beware in particular the key order for a
     dict is arbitrary and may differ for two semantically identical dicts.
+    The encoder is selected by name among `json_encoders` with the class
+    attribute `json_encoder`, normally via `configure_json_format()`; the
+    optional third-party encoders produce more compact output than the
+    standard library one, so the ETag value depends on the encoder used.
 
     A X-REST-Status trailer header is added only in case of error. There is
     normally 'X-REST-Status: 100' in normal response headers, and it remains
@@ -233,14 +282,26 @@ class JSONFormat(RESTFormat):
     dictionary and an array ("``{key: [``"), one line of JSON rendering of
     each object in `stream`, with the first line starting with exactly one
     space and second and subsequent lines starting with a comma, and one
-    final trailer line consisting of "``]}``". Each line is generated as a
-    HTTP transfer chunk. This format is fixed so readers can be constructed
-    to read and parse the stream incrementally one line at a time,
-    facilitating maximum throughput processing of the response."""
+    final trailer line consisting of "``]}``". By default each line is
+    generated as a HTTP transfer chunk; if the class attribute `chunk_size`
+    is positive, lines are instead coalesced into chunks of about that many
+    characters. This format is fixed so readers can be constructed to read
+    and parse the stream incrementally one line at a time, facilitating
+    maximum throughput processing of the response."""
+
+    # : Name of the encoder in `json_encoders` used to render the objects.
+    json_encoder = 'json'
+
+    # : Approximate size of the output chunks, zero for one chunk per object.
+    chunk_size = 0
 
     def stream_chunked(self, stream, etag, preamble, trailer):
         """Generator for actually producing the output."""
         comma = " "
+        dumps = json_encoders[self.json_encoder]
+        chunk_size = self.chunk_size
+        pending = []
+        npending = 0
 
         try:
             if preamble:
@@ -250,21 +311,36 @@ class JSONFormat(RESTFormat):
             obj = None
             try:
                 for obj in stream:
-                    chunk = comma + json.dumps(obj) + "\n"
-                    etag.update(chunk)
-                    yield chunk
+                    chunk = comma + dumps(obj) + "\n"
                     comma = ","
+                    if chunk_size <= 0:
+                        etag.update(chunk)
+                        yield chunk
+                        continue
+                    pending.append(chunk)
+                    npending += len(chunk)
+                    if npending >= chunk_size:
+                        chunk = "".join(pending)
+                        pending = []
+                        npending = 0
+                        etag.update(chunk)
+                        yield chunk
             except cherrypy.HTTPError:
                 raise
             except GeneratorExit:
                 etag.invalidate()
                 trailer = None
+                pending = []
                 raise
             except Exception as exp:
-                print("ERROR, json.dumps failed to serialize %s, type %s\nException: %s" \
-                        % (obj, type(obj), str(exp)))
+                print("ERROR, %s failed to serialize %s, type %s\nException: %s" \
+                        % (self.json_encoder, obj, type(obj), str(exp)))
                 raise
             finally:
+                if pending:
+                    chunk = "".join(pending)
+                    etag.update(chunk)
+                    yield chunk
                 if trailer:
                     etag.update(trailer)
                     yield trailer
@@ -635,8 +711,7 @@ def stream_maybe_etag(size_limit, etag, reply):
     res.headers['Content-Length'] = size
     # TODO investigate why `result` is a list of bytes strings in py3
     # The current solution seems to work in both py2 and py3
-    resp = b"" if PY3 else ""
-    for item in result:
-        resp += encodeUnicodeToBytesConditional(item, condition=PY3)
+    resp = (b"" if PY3 else "").join(encodeUnicodeToBytesConditional(item, condition=PY3)
+                                     for item in result)
     assert len(resp) == size
     return resp
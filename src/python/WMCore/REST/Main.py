@@ -37,6 +37,7 @@ from cherrypy.lib import profiler
 
 ### Tools is needed for CRABServer startup: it sets up the tools attributes
 import WMCore.REST.Tools
+from WMCore.REST.Format import JSONFormat, configure_json_format
 from WMCore.Configuration import ConfigSection, loadConfigurationFile
 from Utils.Utilities import lowerCmsHeaders
 from Utils.PythonVersion import PY2
@@ -192,7 +193,14 @@ class RESTMain(object):
         python's ``sys.setcheckinterval``; the default is to increase this
         to avoid unnecessarily frequent checks for python's GIL, global
         interpreter lock. In general we want each thread to complete as
-        quickly as possible without making unnecessary checks."""
+        quickly as possible without making unnecessary checks.
+
+        Finally applies ``json_encoder`` (default: 'json') and
+        ``json_chunk_size`` (default: 0) to all the JSON formatters: the
+        former selects the encoder among the standard library 'json' and,
+        if installed, 'orjson' or 'ujson'; the latter, if positive, makes
+        the JSON output rows be coalesced into HTTP chunks of about that
+        many characters instead of sending one chunk per row."""
         cpconfig = cherrypy.config
 
         # Determine server local base.
@@ -249,6 +257,10 @@ class RESTMain(object):
 
         if hasattr(self.srvconfig, 'authz_policy'):
             cpconfig.update({'tools.cms_auth.policy': self.srvconfig.authz_policy})
+        encoder = configure_json_format(getattr(self.srvconfig, 'json_encoder', 'json'),
+                                        getattr(self.srvconfig, 'json_chunk_size', 0))
+        if not self.silent:
+            cherrypy.log("INFO: JSON encoder: %s, chunk size: %s" % (encoder, JSONFormat.chunk_size))
         cherrypy.log("INFO: final CherryPy configuration: %s" % pformat(cpconfig))
 
     def install_application(self):
@@ -89,7 +89,9 @@ class Requests(dict):
         self.pycurl = idict.get('pycurl', True)
         self.capath = idict.get('capath', None)
         if self.pycurl:
-            self.reqmgr = RequestHandler()
+            # curl handles (and their connections) are reused among requests,
+            # unless the 'curlpool' parameter is set to False
+            self.reqmgr = RequestHandler(config={'curlpool': idict.get('curlpool', True)})
 
         # set up defaults
         self.setdefault("accept_type", 'text/html')
@@ -203,6 +205,44 @@ class Requests(dict):
                                                ckey=ckey, cert=cert, capath=capath)
         return result, response
 
+    def makeRequestMulti(self, requests, verb='GET', incoming_headers=None, encoder=True,
+                         decoder=True, contentType=None, maxConcurrent=10, retries=0):
+        """
+        Make many requests to this host concurrently, with at most maxConcurrent
+        of them in flight. Only supported with pycurl, otherwise the requests
+        are made one after the other.
+
+        :param requests: iterable of (key, uri, data) tuples
+        :return: generator of (key, result, error) tuples in completion order,
+            where result is the decoded result (None on errors) and error the
+            exception raised by the request, if any
+        """
+        if not self.pycurl:
+            for key, uri, data in requests:
+                try:
+                    result = self.makeRequest(uri, data, verb, dict(incoming_headers or {}),
+                                              encoder, decoder, contentType)[0]
+                    yield key, result, None
+                except (IOError, ServerNotFoundError, HTTPException) as ex:
+                    yield key, None, ex
+            return
+
+        ckey, cert = self.getKeyCert()
+        capath = self.getCAPath()
+
+        def encodedRequests():
+            for key, uri, data in requests:
+                encoded, headers = self.encodeParams(data or {}, verb, dict(incoming_headers or {}),
+                                                     encoder, contentType)
+                headers["Accept-Encoding"] = "gzip,deflate,identity"
+                yield key, self['host'] + uri, encoded, headers, verb
+
+        for key, _, result, error in self.reqmgr.concurrentRequests(encodedRequests(), maxConcurrent, retries,
+                                                                    ckey=ckey, cert=cert, capath=capath):
+            if error is None:
+                result = self.decodeResult(result, decoder)
+            yield key, result, error
+
     def makeRequest_httplib(self, uri, data, verb, headers):
         """
         Make a request to the remote database. for a give URI. The type of
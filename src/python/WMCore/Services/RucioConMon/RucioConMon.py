@@ -94,6 +94,32 @@ class RucioConMon(Service):
         data = decodeBytesToUnicode(data)
         return [f for f in data.split('\n') if f]
 
+    def _iterResultZipped(self, uri, callname="", clearCache=True, args=None):
+        """
+        Same as _getResultZipped, but decompressing the zipped file from the
+        cache file incrementally, one line at a time
+        :param uri: The endpoint uri
+        :param callname: alias for caller function
+        :param clearCache: parameter to control the cache behavior
+        :param args: additional parameters to HTTP request call
+        :return:    a generator over the LFNs
+        """
+        cachedApi = "%s.json" % callname
+        apiUrl = uri
+
+        self['logger'].debug('Streaming data from %s, with args %s', apiUrl, args)
+        if args:
+            apiUrl = "%s&%s" % (apiUrl, urlencode(args, doseq=True))
+
+        if clearCache:
+            self.clearCache(cachedApi, args)
+        with self.refreshCache(cachedApi, apiUrl, decoder=False, binary=True) as istream:
+            with gzip.open(istream, 'rt', encoding='utf-8') as lines:
+                for line in lines:
+                    line = line.rstrip('\n')
+                    if line:
+                        yield line
+
     def getRSEStats(self):
         """
         Gets the latest statistics from the RucioConMon, together with the last
@@ -126,3 +152,15 @@ class RucioConMon(Service):
             callname = '{}.zipped'.format(rseName)
             rseUnmerged = self._getResultZipped(uri,  callname=callname, clearCache=True)
             return rseUnmerged
+
+    def iterRSEUnmerged(self, rseName):
+        """
+        Generator over all the unmerged files in an RSE, using the zipped API,
+        which is streamed from the cache file without holding the whole list
+        of files in memory
+        :param rseName: The RSE whose list of unmerged files to be retrieved
+        :return:        A generator over the unmerged files for the RSE in question
+        """
+        uri = "files?rse=%s&format=raw" % rseName
+        callname = '{}.zipped'.format(rseName)
+        return self._iterResultZipped(uri, callname=callname, clearCache=True)
@@ -61,6 +61,7 @@ from io import BytesIO, StringIO
 from http.client import HTTPException
 
 from Utils.PythonVersion import PY3
+from Utils.Utilities import encodeUnicodeToBytes
 from WMCore.Services.Requests import Requests, JSONRequests
 from WMCore.WMException import WMException
 
@@ -391,6 +392,74 @@ class Service(dict):
                     self['logger'].warning(msg)
                     raise he
 
+    def getDataMulti(self, requests, verb='GET', incoming_headers=None, encoder=True, decoder=True,
+                     contentType=None, maxConcurrent=10, retries=2):
+        """
+        Fetch the data for many requests concurrently, through the curl multi
+        interface, with at most maxConcurrent requests in flight. Requests
+        failing with a transfer error or a 5xx status code are retried.
+
+        Each request is a (url, inputdata, cachefile) tuple (or just (url, inputdata)
+        to skip the cache). As for refreshCache, the data is taken from the cache
+        file if it has not expired, otherwise it is fetched and written to it.
+        If a request fails and the cache can't be used instead (see getData),
+        the exception is raised.
+
+        :param requests: iterable of (url, inputdata[, cachefile]) tuples
+        :param verb: HTTP method, string
+        :param incoming_headers: set of HTTP headers, dict
+        :param encoder: flag to use encoder, boolean
+        :param decoder: flag to use decode, boolean
+        :param contentType: HTTP content type value, string
+        :param maxConcurrent: maximum number of concurrent requests
+        :param retries: number of retries of each failed request
+        :return: generator of (url, inputdata, data) tuples in completion order
+        """
+        verb = self._verbCheck(verb)
+        cacheFiles = {}
+        toFetch = []
+        for idx, request in enumerate(requests):
+            url, inputdata = request[0], request[1] or self["inputdata"]
+            cachefile = request[2] if len(request) > 2 else None
+            if cachefile and self['cachepath']:
+                cachefile = self.cacheFileName(cachefile, verb, inputdata)
+                cacheFiles[idx] = cachefile
+                if not cache_expired(cachefile, self["cacheduration"]):
+                    self['logger'].debug('Data is from the Service cache')
+                    yield url, inputdata, self._readCacheFile(cachefile, decoder)
+                    continue
+            toFetch.append((idx, url, inputdata))
+
+        urlData = dict((idx, (url, inputdata)) for idx, url, inputdata in toFetch)
+        results = self["requests"].makeRequestMulti(toFetch, verb, incoming_headers, encoder=encoder,
+                                                    decoder=False, contentType=contentType,
+                                                    maxConcurrent=maxConcurrent, retries=retries)
+        for idx, result, error in results:
+            url, inputdata = urlData[idx]
+            cachefile = cacheFiles.get(idx)
+            if error is None:
+                if cachefile:
+                    with open(cachefile, 'wb') as fd:
+                        fd.write(encodeUnicodeToBytes(result))
+                yield url, inputdata, self["requests"].decodeResult(result, decoder)
+                continue
+
+            if cachefile and os.path.exists(cachefile) and self.get('usestalecache', False) and \
+                    not cache_expired(cachefile, delta=self["cacheduration"]):
+                self['logger'].warning('Returning stale cache data from %s, the service at %s raised: %s',
+                                       cachefile, url, str(error))
+                yield url, inputdata, self._readCacheFile(cachefile, decoder)
+                continue
+            self['logger'].warning('The service at %s is unavailable for data %s: %s', url, inputdata, str(error))
+            raise error
+
+    def _readCacheFile(self, cachefile, decoder):
+        """
+        Read and decode the content of a cache file written by getDataMulti
+        """
+        with open(cachefile, 'rb') as fd:
+            return self["requests"].decodeResult(fd.read(), decoder)
+
     def _verbCheck(self, verb='GET'):
         if verb.upper() in self.supportVerbList:
             return verb.upper()
@@ -106,13 +106,22 @@ class WMStatsReader(object):
             jobInfoByRequestAndAgent = self.getLatestJobInfoByRequests(list(requestInfo))
             self._combineRequestAndJobData(requestInfo, jobInfoByRequestAndAgent)
 
-    def _getCouchView(self, view, options, keys=None):
+    def _iterCouchView(self, view, options, keys=None):
+        """
+        Return a generator over the rows of a view, loaded page by page
+        """
         keys = keys or []
         options = self.setDefaultStaleOptions(options)
 
         if keys and isinstance(keys, str):
             keys = [keys]
-        return self.couchDB.loadView(self.couchapp, view, options, keys)
+        return self.couchDB.iterView(self.couchapp, view, options, keys, prefetch=True)
+
+    def _getCouchView(self, view, options, keys=None):
+        """
+        Return a dictionary with the list of rows of a view
+        """
+        return {'rows': list(self._iterCouchView(view, options, keys))}
 
     def _formatCouchData(self, data, key="id"):
         result = {}
@@ -188,12 +197,12 @@ class WMStatsReader(object):
         options = {}
         options["reduce"] = True
         options["group"] = True
-        result = self._getCouchView("requestAgentUrl", options)
+        rows = self._iterCouchView("requestAgentUrl", options)
 
         if filterRequest is None:
-            keys = [row['key'] for row in result["rows"]]
+            keys = [row['key'] for row in rows]
         else:
-            keys = [row['key'] for row in result["rows"] if row['key'][0] in filterRequest]
+            keys = [row['key'] for row in rows if row['key'][0] in filterRequest]
         return keys
 
     def _getLatestJobInfo(self, keys):
@@ -347,7 +356,7 @@ class WMStatsReader(object):
 
         options = {"group_level": 1, "reduce": True}
 
-        results = self._getCouchView("allWorkflows", options)['rows']
+        results = self._iterCouchView("allWorkflows", options)
         requestNames = [x['key'] for x in results]
 
         workflowDict = self.reqDB.getStatusAndTypeByRequest(requestNames)
@@ -374,9 +383,9 @@ class WMStatsReader(object):
 
         options = {'reduce': True, 'group_level': 5, 'startkey': [requestName],
                    'endkey': [requestName, {}]}
-        results = self._getCouchView("jobsByStatusWorkflow", options)
+        results = self._iterCouchView("jobsByStatusWorkflow", options)
         jobDetails = {}
-        for row in results['rows']:
+        for row in results:
             # row["key"] = ['workflow', 'task', 'jobstatus', 'exitCode', 'site']
             startKey = row["key"][:4]
             endKey = []
@@ -420,9 +429,9 @@ class WMStatsReader(object):
 
     def getAllAgentRequestRevByID(self, agentURL):
         options = {"reduce": False}
-        results = self._getCouchView("byAgentURL", options, keys=[agentURL])
+        results = self._iterCouchView("byAgentURL", options, keys=[agentURL])
         idRevMap = {}
-        for row in results['rows']:
+        for row in results:
             idRevMap[row['id']] = row['value']['rev']
 
         return idRevMap
@@ -102,7 +102,11 @@ class WMStatsWriter(WMStatsReader):
                 self.couchDB.queue(doc)
 
             logging.info("Committing bulk of %i docs ...", len(chunk))
-            self.couchDB.commit(new_edits=False)
+            if self.couchDB.asyncCommitter is not None:
+                self.couchDB.commitAsync(new_edits=False)
+            else:
+                self.couchDB.commit(new_edits=False)
+        self.couchDB.flush()
         return
 
     def insertRequest(self, schema):
@@ -36,16 +36,17 @@ data = getdata(urls, ckey, cert, cookie=cookie)
 for row in data:
     print(row)
 """
-from __future__ import print_function
+from __future__ import print_function, division
 from future import standard_library
 standard_library.install_aliases()
 
 from builtins import str, range, object
 from past.builtins import basestring
-from future.utils import viewitems
+from future.utils import viewitems, viewvalues
 
 
 # system modules
+import collections
 import copy
 import json
 import gzip
@@ -53,10 +54,12 @@ import logging
 import os
 import re
 import subprocess
+import threading
+import time
 import pycurl
 from io import BytesIO
 import http.client
-from urllib.parse import urlencode
+from urllib.parse import urlencode, urlparse
 
 from Utils.Utilities import encodeUnicodeToBytes, decodeBytesToUnicode
 from Utils.PortForward import portForward, PortForward
@@ -170,10 +173,171 @@ class ResponseHeader(object):
                 return valHea
 
 
+class CurlHandlePool(object):
+    """
+    Thread-safe pool of reusable pycurl handles, keyed by scheme, host and
+    client credentials (ckey, cert and capath).
+
+    libcurl keeps the connection cache inside each curl handle, so reusing
+    the handles means reusing the TCP/TLS connections to the same host
+    (keep-alive). The handles using the same credentials are attached to a
+    CurlShare object, sharing the DNS, TLS session and (when supported)
+    connection caches among them. At most maxPerHost idle handles are kept
+    for each key, the others are closed when released. Released handles are
+    reset and their cookies are cleared, since reset keeps them.
+    The pool is reset after a fork, since the child process must not reuse
+    the connections of its parent.
+    """
+
+    def __init__(self, maxPerHost=10):
+        self.maxPerHost = maxPerHost
+        self._lock = threading.Lock()
+        self._init()
+
+    def _init(self):
+        """
+        Create the share object and empty the pool
+        """
+        self._pid = os.getpid()
+        self._idle = {}
+        self._shares = {}
+        self._stats = {'requests': 0, 'handles_created': 0, 'handles_reused': 0,
+                       'connections': 0, 'handshake_time': 0.0}
+
+    @staticmethod
+    def poolKey(url, ckey=None, cert=None, capath=None):
+        """
+        Return the pool key for the given url and client credentials
+        """
+        urlParts = urlparse(url)
+        return ("%s://%s" % (urlParts.scheme, urlParts.netloc), ckey, cert, capath)
+
+    @staticmethod
+    def _makeShare():
+        """
+        Return a share object for the DNS, TLS session and connection caches
+        """
+        share = pycurl.CurlShare()
+        for lockData in ('LOCK_DATA_DNS', 'LOCK_DATA_SSL_SESSION', 'LOCK_DATA_CONNECT'):
+            if hasattr(pycurl, lockData):
+                try:
+                    share.setopt(pycurl.SH_SHARE, getattr(pycurl, lockData))
+                except pycurl.error:
+                    # not supported by this libcurl version
+                    pass
+        return share
+
+    @staticmethod
+    def _prepare(curl):
+        """
+        Set the options that are not supposed to change among requests
+        """
+        curl.setopt(pycurl.TCP_KEEPALIVE, 1)
+
+    def acquire(self, url, ckey=None, cert=None, capath=None):
+        """
+        Return an idle handle for the host of the url and the credentials,
+        or a new one
+        """
+        key = self.poolKey(url, ckey, cert, capath)
+        with self._lock:
+            if self._pid != os.getpid():
+                self._init()
+            self._stats['requests'] += 1
+            idle = self._idle.get(key)
+            if idle:
+                self._stats['handles_reused'] += 1
+                return idle.pop()
+            self._stats['handles_created'] += 1
+            # the caches are only shared among handles using the same credentials
+            share = self._shares.get(key[1:])
+            if share is None:
+                share = self._shares[key[1:]] = self._makeShare()
+        curl = pycurl.Curl()
+        # the share object is kept by the handle even after a reset
+        curl.setopt(pycurl.SHARE, share)
+        self._prepare(curl)
+        return curl
+
+    def release(self, url, curl, discard=False, ckey=None, cert=None, capath=None):
+        """
+        Give a handle back to the pool, once its request is done, with the
+        credentials it was acquired with. The handle is closed instead if
+        discard is True (e.g. after a transfer error) or if there are already
+        enough idle handles for that host and credentials.
+        """
+        try:
+            numConnects = curl.getinfo(pycurl.NUM_CONNECTS)
+            handshakeTime = curl.getinfo(pycurl.APPCONNECT_TIME) or curl.getinfo(pycurl.CONNECT_TIME)
+        except pycurl.error:
+            numConnects, handshakeTime = 0, 0.0
+
+        key = self.poolKey(url, ckey, cert, capath)
+        with self._lock:
+            self._stats['connections'] += numConnects
+            if numConnects:
+                self._stats['handshake_time'] += handshakeTime
+            idle = self._idle.setdefault(key, [])
+            if discard or self._pid != os.getpid() or len(idle) >= self.maxPerHost:
+                curl.close()
+                return
+            # reset keeps the cookies, write them to the cookie jar (if any) and drop them
+            curl.setopt(pycurl.COOKIELIST, "FLUSH")
+            curl.setopt(pycurl.COOKIELIST, "ALL")
+            curl.reset()
+            self._prepare(curl)
+            idle.append(curl)
+
+    def stats(self):
+        """
+        Return the pool statistics: number of requests, handles created and
+        reused, new connections opened and the total time spent opening them
+        (including the TLS handshake), as well as the connection reuse ratio.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle_handles'] = sum(len(idle) for idle in viewvalues(self._idle))
+        if stats['requests']:
+            stats['reuse_ratio'] = 1.0 - min(stats['connections'], stats['requests']) / stats['requests']
+        else:
+            stats['reuse_ratio'] = 0.0
+        return stats
+
+    def close(self):
+        """
+        Close all the idle handles
+        """
+        with self._lock:
+            for idle in viewvalues(self._idle):
+                for curl in idle:
+                    curl.close()
+            self._idle = {}
+
+
+_CURL_POOL = None
+_CURL_POOL_LOCK = threading.Lock()
+
+
+def getCurlHandlePool():
+    """
+    Return the curl handle pool shared by all the RequestHandler
+    objects of this process
+    """
+    global _CURL_POOL
+    with _CURL_POOL_LOCK:
+        if _CURL_POOL is None:
+            _CURL_POOL = CurlHandlePool()
+        return _CURL_POOL
+
+
 class RequestHandler(object):
     """
     RequestHandler provides APIs to fetch single/multiple
-    URL requests based on pycurl library
+    URL requests based on pycurl library.
+    By default, single requests use curl handles from the process wide
+    CurlHandlePool, such that connections are kept alive and reused among
+    requests to the same host. It can be disabled with the `curlpool`
+    configuration parameter, or a specific pool can be provided with it.
     """
 
     def __init__(self, config=None, logger=None):
@@ -192,6 +356,11 @@ class RequestHandler(object):
             self.tmgr = TokenManager(self.tokenLocation)
         else:
             self.tmgr = None
+        curlPool = config.get('curlpool', True)
+        if curlPool is True:
+            self.curlPool = getCurlHandlePool()
+        else:
+            self.curlPool = curlPool or None
 
     def encode_params(self, params, verb, doseq, encode):
         """ Encode request parameters for usage with the 4 verbs.
@@ -332,10 +501,19 @@ class RequestHandler(object):
                 verbose=0, ckey=None, cert=None, capath=None,
                 doseq=True, encode=False, decode=False, cainfo=None, cookie=None):
         """Fetch data for given set of parameters"""
-        curl = pycurl.Curl()
-        bbuf, hbuf = self.set_opts(curl, url, params, headers, ckey, cert, capath,
-                                   verbose, verb, doseq, encode, cainfo, cookie)
-        curl.perform()
+        if self.curlPool:
+            curl = self.curlPool.acquire(url, ckey, cert, capath)
+        else:
+            curl = pycurl.Curl()
+        discard = True
+        try:
+            bbuf, hbuf = self.set_opts(curl, url, params, headers, ckey, cert, capath,
+                                       verbose, verb, doseq, encode, cainfo, cookie)
+            curl.perform()
+            discard = False
+        finally:
+            if self.curlPool:
+                self.curlPool.release(url, curl, discard=discard, ckey=ckey, cert=cert, capath=capath)
         if verbose:
             print(verb, url, params, headers)
         header = self.parse_header(hbuf.getvalue())
@@ -356,6 +534,74 @@ class RequestHandler(object):
         hbuf.flush()
         return header, data
 
+    def concurrentRequests(self, requests, maxConcurrent=10, retries=0,
+                           ckey=None, cert=None, capath=None, cainfo=None):
+        """
+        Execute many requests concurrently through the curl multi interface.
+
+        :param requests: iterable of (key, url, params, headers, verb) tuples,
+            params are passed as they are to set_opts (i.e. already encoded)
+        :param maxConcurrent: maximum number of transfers in flight
+        :param retries: number of times a request is retried after a transfer
+            error or a HTTP status code >= 500
+        :return: generator of (key, header, data, error) tuples in completion
+            order, where header is a ResponseHeader (None on transfer errors),
+            data the (decompressed) body and error None or the exception
+        """
+        portForwarder = PortForward(8443)
+        pending = collections.deque((req, 0) for req in requests)
+        active = {}
+        multi = pycurl.CurlMulti()
+        try:
+            while pending or active:
+                while pending and len(active) < maxConcurrent:
+                    (key, url, params, headers, verb), attempt = pending.popleft()
+                    url = portForwarder(url)
+                    curl = self.curlPool.acquire(url, ckey, cert, capath) if self.curlPool else pycurl.Curl()
+                    bbuf, hbuf = self.set_opts(curl, url, params, headers, ckey, cert, capath,
+                                               verb=verb, cainfo=cainfo)
+                    multi.add_handle(curl)
+                    active[curl] = ((key, url, params, headers, verb), attempt, bbuf, hbuf)
+
+                while True:
+                    ret, _ = multi.perform()
+                    if ret != pycurl.E_CALL_MULTI_PERFORM:
+                        break
+
+                done = []
+                while True:
+                    numq, okList, errList = multi.info_read()
+                    done.extend((curl, None) for curl in okList)
+                    done.extend((curl, pycurl.error(errno, errmsg)) for curl, errno, errmsg in errList)
+                    if numq == 0:
+                        break
+
+                for curl, error in done:
+                    multi.remove_handle(curl)
+                    req, attempt, bbuf, hbuf = active.pop(curl)
+                    if self.curlPool:
+                        self.curlPool.release(req[1], curl, discard=error is not None,
+                                              ckey=ckey, cert=cert, capath=capath)
+                    header, data = None, None
+                    if error is None:
+                        header = self.parse_header(hbuf.getvalue())
+                        data = decompress(bbuf.getvalue(), header.header)
+                        if header.status >= 300:
+                            error = getException(req[1], req[2], req[3], header, data)
+                    if error is not None and attempt < retries and (header is None or header.status >= 500):
+                        self.logger.warning("Retrying request to %s after error: %s", req[1], str(error))
+                        pending.append((req, attempt + 1))
+                        continue
+                    yield req[0], header, data, error
+
+                if active:
+                    multi.select(1.0)
+        finally:
+            for curl in active:
+                multi.remove_handle(curl)
+                curl.close()
+            multi.close()
+
     def getdata(self, url, params, headers=None, verb='GET',
                 verbose=0, ckey=None, cert=None, doseq=True,
                 encode=False, decode=False, cookie=None):
@@ -38,12 +38,19 @@ class ListForSubmitter(DBFormatter):
 
     limit_sql = " limit %d"
 
-    def execute(self, conn=None, transaction=False, limitRows=None):
+    def execute(self, conn=None, transaction=False, limitRows=None, stream=False):
+        """
+        Return the list of jobs to be submitted or, if stream is True, an
+        iterator over them fetching the rows in batches from a server side
+        cursor (the connection is held until the iterator is exhausted)
+        """
         if limitRows:
             extraSql = self.limit_sql % limitRows
         else:
             extraSql = ""
 
         result = self.dbi.processData(self.sql + extraSql, conn=conn,
-                                      transaction=transaction)
+                                      transaction=transaction, stream=stream)
+        if stream:
+            return self.formatDictIter(result)
         return self.formatDict(result)
@@ -57,7 +57,7 @@ class LoadForErrorHandler(DBFormatter):
             return
 
         lumiResult = self.dbi.processData(self.runLumiSQL, fileBinds, conn=conn,
-                                          transaction=transaction)
+                                          transaction=transaction, bulkSelect=True)
         lumiList = self.formatDict(lumiResult)
 
         lumiDict = {}
@@ -102,11 +102,11 @@ class LoadForErrorHandler(DBFormatter):
             binds = [{"jobid": jobID}]
 
         result = self.dbi.processData(self.sql, binds, conn=conn,
-                                      transaction=transaction)
+                                      transaction=transaction, bulkSelect=True)
         jobList = self.formatDict(result)
 
         filesResult = self.dbi.processData(self.fileSQL, binds, conn=conn,
-                                           transaction=transaction)
+                                           transaction=transaction, bulkSelect=True)
         fileList = self.formatDict(filesResult)
 
         # special case for skipped files
@@ -127,7 +127,7 @@ class LoadForErrorHandler(DBFormatter):
         parentList = []
         if fileBinds:
             parentResult = self.dbi.processData(self.parentSQL, fileBinds, conn=conn,
-                                                transaction=transaction)
+                                                transaction=transaction, bulkSelect=True)
             parentList = self.formatDict(parentResult)
 
         filesForJobs = {}
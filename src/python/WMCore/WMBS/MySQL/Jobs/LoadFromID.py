@@ -63,5 +63,5 @@ class LoadFromID(DBFormatter):
             binds = {"jobid": jobID}
 
         result = self.dbi.processData(self.sql, binds, conn=conn,
-                                      transaction=transaction)
+                                      transaction=transaction, bulkSelect=True)
         return self.formatDict(result)
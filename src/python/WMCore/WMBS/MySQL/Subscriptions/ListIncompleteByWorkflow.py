@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+"""
+_ListIncompleteByWorkflow_
+
+MySQL implementation of Subscription.ListIncompleteByWorkflow
+"""
+
+from WMCore.Database.DBFormatter import DBFormatter
+
+
+class ListIncompleteByWorkflow(DBFormatter):
+    """
+    List the subscriptions with available files, grouped by workflow.
+    Returns a dictionary with the workflow ids as keys and the sorted
+    lists of their subscription ids as values.
+    """
+    sql = """SELECT DISTINCT wmbs_sub_files_available.subscription AS id,
+                    wmbs_subscription.workflow AS workflow
+               FROM wmbs_sub_files_available
+               INNER JOIN wmbs_subscription ON
+                 wmbs_subscription.id = wmbs_sub_files_available.subscription"""
+
+    def format(self, result):
+        results = DBFormatter.format(self, result)
+
+        subsByWorkflow = {}
+        for row in results:
+            subsByWorkflow.setdefault(row[1], []).append(row[0])
+        for subIDs in subsByWorkflow.values():
+            subIDs.sort()
+
+        return subsByWorkflow
+
+    def execute(self, conn=None, transaction=False):
+        result = self.dbi.processData(self.sql, conn=conn, transaction=transaction)
+        return self.format(result)
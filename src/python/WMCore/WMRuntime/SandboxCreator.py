@@ -132,9 +132,10 @@ class SandboxCreator(object):
                     fetcher.setWorkingDirectory(taskPath)
                     fetcher(task)
 
-        # pickle up the workload for storage in the sandbox
+        # pickle up the workload for storage in the sandbox, in the versioned
+        # format since it's loaded by the WMCore shipped with the sandbox
         workload.setSpecUrl(workloadFile)
-        workload.save(workloadFile)
+        workload.save(workloadFile, legacy=False)
 
         # now, tar everything up and put it somewhere special
 
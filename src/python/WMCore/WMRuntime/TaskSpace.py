@@ -12,8 +12,8 @@ from builtins import object
 import os
 import sys
 import inspect
-import pickle
 
+from WMCore.WMSpec.Persistency import loadSpecFile
 from WMCore.WMSpec.WMWorkload import WMWorkloadHelper
 
 
@@ -73,8 +73,7 @@ class TaskSpace(object):
         wmsandboxLoc = inspect.getsourcefile(WMSandbox)
         workloadPcl = wmsandboxLoc.replace("__init__.py","WMWorkload.pkl")
 
-        with open(workloadPcl, 'rb') as handle:
-            wmWorkload = pickle.load(handle)
+        wmWorkload = loadSpecFile(workloadPcl)
         self.workload = WMWorkloadHelper(wmWorkload)
         return
 
@@ -5,8 +5,16 @@ _PersistencyHelper_
 Util class to provide a common persistency layer for ConfigSection derived
 objects, with options to save in different formats
 
-Placeholder for ideas at present....
-
+Specs are saved in a versioned format: a small header (magic string, format
+version and compression codec) followed by the compressed pickle of the
+ConfigSection tree, using the highest pickle protocol supported by all the
+Python 3 clients. Legacy (protocol 0, uncompressed) pickles are recognized
+by the missing header and are still loaded transparently.
+
+Specs shared with other services and agents (CouchDB, local spec files) are
+still saved as legacy pickles by default, until all their readers are aware
+of the versioned format; it is used where the reader ships with the writer,
+such as the job sandbox.
 """
 from __future__ import print_function
 
@@ -16,35 +24,97 @@ from future.moves.urllib.request import urlopen, Request
 from builtins import object
 
 import pickle
+import struct
+import zlib
+
+from Utils.PythonVersion import HIGHEST_PICKLE_PROTOCOL
+
+SPEC_MAGIC = b"WMSPEC"
+SPEC_FORMAT_VERSION = 1
+SPEC_CODEC_NONE = 0
+SPEC_CODEC_ZLIB = 1
+# a low compression level is way faster and compresses pickles almost as well
+SPEC_ZLIB_LEVEL = 3
+
+_SPEC_HEADER = struct.Struct("<6sBB")
+
+
+def dumpSpecData(data, legacy=False):
+    """
+    _dumpSpecData_
+
+    Serialize a ConfigSection tree in the versioned spec format, or as a
+    protocol 0 pickle if legacy is True (for readers not aware of the format).
+    Return the serialized bytes.
+    """
+    if legacy:
+        return pickle.dumps(data, protocol=0)
+    payload = zlib.compress(pickle.dumps(data, protocol=HIGHEST_PICKLE_PROTOCOL), SPEC_ZLIB_LEVEL)
+    return _SPEC_HEADER.pack(SPEC_MAGIC, SPEC_FORMAT_VERSION, SPEC_CODEC_ZLIB) + payload
+
+
+def specPickleData(blob):
+    """
+    _specPickleData_
+
+    Return the pickle bytes out of the bytes written by dumpSpecData,
+    sniffing the header to tell the versioned format from legacy pickles.
+    """
+    if not blob.startswith(SPEC_MAGIC):
+        return blob
+
+    _, version, codec = _SPEC_HEADER.unpack_from(blob)
+    if version != SPEC_FORMAT_VERSION:
+        raise ValueError("Unsupported spec format version: %s" % version)
+    payload = memoryview(blob)[_SPEC_HEADER.size:]
+    if codec == SPEC_CODEC_ZLIB:
+        payload = zlib.decompress(payload)
+    elif codec != SPEC_CODEC_NONE:
+        raise ValueError("Unsupported spec compression codec: %s" % codec)
+    return payload
+
+
+def loadSpecData(blob):
+    """
+    _loadSpecData_
+
+    Deserialize the bytes written by dumpSpecData, in any format.
+    """
+    return pickle.loads(specPickleData(blob))
+
+
+def loadSpecFile(filename):
+    """
+    _loadSpecFile_
+
+    Load the ConfigSection tree saved in a local spec file, in any format.
+    """
+    with open(filename, 'rb') as handle:
+        return loadSpecData(handle.read())
 
 
 class PersistencyHelper(object):
     """
     _PersistencyHelper_
 
-    Save a WMSpec object to a file using pickle
+    Save a WMSpec object to a file, see dumpSpecData for the format
 
     Future ideas:
-    - pickle mode: read/write using pickle
     - python mode: write using pythonise, read using import
        Needs work to preserve tree information
-    - gzip mode: also gzip/unzip content if set to True
     - json mode: read/write using json
 
     """
 
-    def save(self, filename):
+    def save(self, filename, legacy=True):
         """
         _save_
 
-        Save data to a file
-        Saved format is defined depending on the extension
+        Save data to a file, as a legacy protocol 0 pickle unless legacy
+        is False (see dumpSpecData)
         """
         with open(filename, 'wb') as handle:
-            # TODO: use different encoding scheme for different extension
-            # extension = filename.split(".")[-1].lower()
-            # FIXME: once both central services and WMAgent are in Py3, we can remove protocol=0
-            pickle.dump(self.data, handle, protocol=0)
+            handle.write(dumpSpecData(self.data, legacy=legacy))
         return
 
     def load(self, filename):
@@ -62,23 +132,26 @@ class PersistencyHelper(object):
         if not urlparse(filename)[0]:
             filename = 'file:' + filename
             handle = urlopen(Request(filename, headers={"Accept": "*/*"}))
-            self.data = pickle.load(handle)
+            self.data = loadSpecData(handle.read())
             handle.close()
         elif filename.startswith('file:'):
             handle = urlopen(Request(filename, headers={"Accept": "*/*"}))
-            self.data = pickle.load(handle)
+            self.data = loadSpecData(handle.read())
             handle.close()
         else:
             # use own request class so we get authentication if needed
             from WMCore.Services.Requests import Requests
             request = Requests(filename)
             data = request.makeRequest('', incoming_headers={"Accept": "*/*"}, decoder=False)
-            self.data = pickle.loads(data[0])
+            self.data = loadSpecData(data[0])
 
         return
 
-    def saveCouch(self, couchUrl, couchDBName, metadata=None):
-        """ Save this spec in CouchDB.  Returns URL """
+    def saveCouch(self, couchUrl, couchDBName, metadata=None, legacy=True):
+        """
+        Save this spec in CouchDB, as a legacy protocol 0 pickle unless
+        legacy is False. Returns URL
+        """
         from WMCore.Database.CMSCouch import CouchServer, CouchInternalServerError
         metadata = metadata or {}
         server = CouchServer(couchUrl)
@@ -97,8 +170,7 @@ class PersistencyHelper(object):
             rev = doc['_rev']
 
         # specuriwrev = specuri + '?rev=%s' % rev
-        # FIXME: once both central services and WMAgent are in Py3, we can remove protocol=0
-        workloadString = pickle.dumps(self.data, protocol=0)
+        workloadString = dumpSpecData(self.data, legacy=legacy)
         # result = database.put(specuriwrev, workloadString, contentType='application/text')
         retval = database.addAttachment(name, rev, workloadString, 'spec')
         if retval.get('ok', False) is not True:
@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+"""
+_SpecCache_
+
+Process-wide cache of the workload specs loaded from the local file system,
+such that the agent components don't unpickle the same spec over and over
+again (once per subscription, per job group or per job).
+
+Entries are keyed by the real path of the spec file and validated against
+its modification time and size, so a spec rewritten on disk (e.g. by a
+workflow update) is loaded again the next time it's requested. The cache
+is a LRU bounded both by the number of entries and by the size of their
+pickled data.
+
+The WMWorkloadHelper objects returned are shared by all the callers of the
+cache, so they must be treated as read-only.
+"""
+from __future__ import division
+
+from builtins import object
+
+import os
+import pickle
+import threading
+from collections import OrderedDict, namedtuple
+
+from WMCore.WMSpec.Persistency import specPickleData
+from WMCore.WMSpec.WMWorkload import WMWorkloadHelper
+
+SpecSummary = namedtuple("SpecSummary", ["name", "campaign", "prepIDs", "taskPaths"])
+
+
+class _SpecEntry(object):
+    """
+    _SpecEntry_
+
+    A cached spec, with the file signature it was loaded from
+    """
+
+    __slots__ = ("signature", "weight", "workload", "summary")
+
+    def __init__(self, signature, weight, workload):
+        self.signature = signature
+        self.weight = weight
+        self.workload = workload
+        self.summary = None
+
+
+class SpecCache(object):
+    """
+    _SpecCache_
+
+    Thread-safe LRU cache of WMWorkloadHelper objects loaded from spec files
+    """
+
+    def __init__(self, maxEntries=100, maxBytes=512 * 1024 * 1024):
+        self.maxEntries = maxEntries
+        self.maxBytes = maxBytes
+        self.entries = OrderedDict()
+        self.totalBytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, specPath):
+        return os.path.realpath(specPath) in self.entries
+
+    @staticmethod
+    def _signature(realPath):
+        """
+        Return the signature used to detect a spec file changed on disk
+        """
+        fileStat = os.stat(realPath)
+        return (fileStat.st_mtime_ns, fileStat.st_size)
+
+    def _getEntry(self, specPath):
+        """
+        Return the up-to-date cache entry for a spec file, loading it if needed
+        """
+        realPath = os.path.realpath(specPath)
+        signature = self._signature(realPath)
+        with self.lock:
+            entry = self.entries.get(realPath)
+            if entry is not None and entry.signature == signature:
+                self.entries.move_to_end(realPath)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # unpickle outside of the lock, a concurrent load of the same spec is
+        # harmless, the last one loaded is kept
+        with open(realPath, 'rb') as fileHandle:
+            data = specPickleData(fileHandle.read())
+        workload = WMWorkloadHelper()
+        workload.data = pickle.loads(data)
+        entry = _SpecEntry(signature, len(data), workload)
+
+        with self.lock:
+            oldEntry = self.entries.pop(realPath, None)
+            if oldEntry is not None:
+                self.totalBytes -= oldEntry.weight
+            self.entries[realPath] = entry
+            self.totalBytes += entry.weight
+            self._evict()
+        return entry
+
+    def _evict(self):
+        """
+        Drop the least recently used entries until the cache is within its
+        limits. The most recent entry is always kept, even if it's too large.
+        """
+        while len(self.entries) > 1 and (len(self.entries) > self.maxEntries or
+                                         self.totalBytes > self.maxBytes):
+            _, entry = self.entries.popitem(last=False)
+            self.totalBytes -= entry.weight
+            self.evictions += 1
+
+    def get(self, specPath):
+        """
+        _get_
+
+        Return the WMWorkloadHelper for a spec file. It's shared with the other
+        callers of the cache, so it must not be modified.
+        """
+        return self._getEntry(specPath).workload
+
+    def getSummary(self, specPath):
+        """
+        _getSummary_
+
+        Return a SpecSummary for a spec file, with the workload name, its
+        campaign, the PrepID of each top level task (key'ed by task path) and
+        the list of all the task paths.
+        """
+        entry = self._getEntry(specPath)
+        if entry.summary is None:
+            workload = entry.workload
+            prepIDs = dict((task.getPathName(), task.getPrepID()) for task in workload.taskIterator())
+            entry.summary = SpecSummary(workload.name(), workload.getCampaign(),
+                                        prepIDs, tuple(workload.listAllTaskPathNames()))
+        return entry.summary
+
+    def invalidate(self, specPath=None):
+        """
+        _invalidate_
+
+        Drop a spec file from the cache, or all of them if no path is given
+        """
+        with self.lock:
+            if specPath is None:
+                self.entries.clear()
+                self.totalBytes = 0
+                return
+            entry = self.entries.pop(os.path.realpath(specPath), None)
+            if entry is not None:
+                self.totalBytes -= entry.weight
+
+    def stats(self):
+        """
+        _stats_
+
+        Return a dictionary with the cache counters
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {"entries": len(self.entries),
+                    "bytes": self.totalBytes,
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "evictions": self.evictions,
+                    "hit_ratio": self.hits / lookups if lookups else 0.0}
+
+
+_specCache = None
+_specCacheLock = threading.Lock()
+
+
+def getSpecCache():
+    """
+    _getSpecCache_
+
+    Return the process-wide SpecCache instance
+    """
+    global _specCache
+    with _specCacheLock:
+        if _specCache is None:
+            _specCache = SpecCache()
+        return _specCache
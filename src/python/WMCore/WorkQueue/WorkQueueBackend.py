@@ -6,6 +6,7 @@ Interface to WorkQueue persistent storage
 """
 
 from builtins import object
+from bisect import bisect_right
 from math import ceil
 
 from future.utils import viewitems
@@ -51,6 +52,86 @@ def sortAvailableElements(elementsList):
     elementsList.sort(key=lambda element: element['Priority'], reverse=True)
 
 
+class SiteJobCounter(object):
+    """
+    Keep track of the number of jobs per site and priority, answering how
+    many jobs a site has at a priority equal or higher than a given one in
+    logarithmic time, with a Fenwick (binary indexed) tree per site over the
+    priorities sorted in descending order.
+
+    The siteJobCounts dictionary-of-dictionaries (key'ed by site name and
+    then by priority) is updated in place as jobs are added.
+    """
+
+    def __init__(self, siteJobCounts, priorities=None):
+        """
+        :param siteJobCounts: a dictionary-of-dictionaries key'ed by the site name; value
+            is a dictionary with the number of jobs running at a given priority.
+        :param priorities: optional list of priorities expected to be added later on
+        """
+        self.siteJobCounts = siteJobCounts
+        self._setPriorities(priorities or [])
+
+    def _setPriorities(self, priorities):
+        """
+        Index all the known priorities, dropping the trees built so far
+        """
+        allPrios = set(priorities)
+        for jobsByPrio in self.siteJobCounts.values():
+            allPrios.update(jobsByPrio)
+        self.priorities = sorted(allPrios, reverse=True)
+        self.negPriorities = [-prio for prio in self.priorities]
+        self.prioIndex = dict((prio, idx) for idx, prio in enumerate(self.priorities))
+        self.trees = {}
+
+    def _getTree(self, site):
+        """
+        Return the tree for a site, building it in linear time if needed
+        """
+        tree = self.trees.get(site)
+        if tree is None:
+            size = len(self.priorities)
+            tree = [0] * (size + 1)
+            for prio, jobs in viewitems(self.siteJobCounts.get(site, {})):
+                tree[self.prioIndex[prio] + 1] += jobs
+            for idx in range(1, size + 1):
+                parent = idx + (idx & -idx)
+                if parent <= size:
+                    tree[parent] += tree[idx]
+            self.trees[site] = tree
+        return tree
+
+    def countJobs(self, site, prio):
+        """
+        Return the number of jobs at a site with priority equal or higher than prio
+        """
+        tree = self._getTree(site)
+        idx = bisect_right(self.negPriorities, -prio)
+        total = 0
+        while idx > 0:
+            total += tree[idx]
+            idx -= idx & -idx
+        return total
+
+    def addJobs(self, site, prio, jobs):
+        """
+        Add a number of jobs at a given priority to a site
+        """
+        jobsByPrio = self.siteJobCounts.setdefault(site, {})
+        jobsByPrio[prio] = jobsByPrio.get(prio, 0) + jobs
+        if prio not in self.prioIndex:
+            # new priority, re-index and let the trees be built again
+            self._setPriorities([prio])
+            return
+        tree = self.trees.get(site)
+        if tree is None:
+            return
+        idx = self.prioIndex[prio] + 1
+        while idx < len(tree):
+            tree[idx] += jobs
+            idx += idx & -idx
+
+
 class WorkQueueBackend(object):
     """
     Represents persistent storage for WorkQueue
@@ -237,11 +318,16 @@ class WorkQueueBackend(object):
             if WorkflowName:
                 options['filter']['RequestName'] = WorkflowName
 
-            view = db.loadList('WorkQueue', 'filter', filterName, options, key)
-            view = json.loads(view)
+            # load the elements page by page, such that the whole list output isn't held in memory
+            elements = []
+            for page in db.iterList('WorkQueue', 'filter', filterName, options, key):
+                view = json.loads(page)
+                if returnIdOnly:
+                    elements.extend(view)
+                else:
+                    elements.extend(CouchWorkQueueElement.fromDocument(db, row) for row in view)
             if returnIdOnly:
-                return view
-            elements = [CouchWorkQueueElement.fromDocument(db, row) for row in view]
+                return elements
 
         if loadSpec:
             specs = {}  # cache as may have multiple elements for same spec
@@ -381,6 +467,7 @@ class WorkQueueBackend(object):
             sortedElements.append(element)
         sortAvailableElements(sortedElements)
 
+        jobCounter = SiteJobCounter(siteJobCounts, [element['Priority'] for element in sortedElements])
         for element in sortedElements:
             commonSites = possibleSites(element)
             prio = element['Priority']
@@ -391,7 +478,7 @@ class WorkQueueBackend(object):
                 if site in thresholds:
                     # Count the number of jobs currently running of greater priority, if they
                     # are less than the site thresholds, then accept this element
-                    curJobCount = sum([x[1] if x[0] >= prio else 0 for x in viewitems(siteJobCounts.get(site, {}))])
+                    curJobCount = jobCounter.countJobs(site, prio)
                     self.logger.debug("Job Count: %s, site: %s thresholds: %s", curJobCount, site, thresholds[site])
                     if curJobCount < thresholds[site]:
                         possibleSite = site
@@ -401,9 +488,7 @@ class WorkQueueBackend(object):
                 self.logger.debug("Meant to accept workflow: %s, with prio: %s, element id: %s, for site: %s",
                                   element['RequestName'], prio, element.id, possibleSite)
                 elements.append(element)
-                siteJobCounts.setdefault(possibleSite, {})
-                siteJobCounts[possibleSite][prio] = siteJobCounts[possibleSite].setdefault(prio, 0) + \
-                                                    element['Jobs'] * element.get('blowupFactor', 1.0)
+                jobCounter.addJobs(possibleSite, prio, element['Jobs'] * element.get('blowupFactor', 1.0))
             else:
                 self.logger.debug("No available resources for %s with localdoc id %s",
                                   element['RequestName'], element.id)
@@ -459,26 +544,43 @@ class WorkQueueBackend(object):
         # FIXME: num_elem option can likely be deprecated, but it needs synchronization
         # between agents and global workqueue... for now, make sure it can return the slice size
         options['num_elem'] = rowsPerSlice
+        # ask the list to return the key and id of the last row evaluated
+        options['last_row'] = True
         if team:
             options['team'] = team
 
-        # Fetch workqueue elements in slices, using the CouchDB "limit" and "skip"
-        # options for couch views. Conditions to stop this loop are:
+        # Fetch workqueue elements in slices, using the CouchDB "limit" option and
+        # starting each slice right after the last row of the previous one (startkey
+        # and startkey_docid), such that couch doesn't scan the skipped rows again.
+        # Conditions to stop this loop are:
         #  a) stop once total_rows is reached (exhausted all available elements)
         #  b) hit maximum allowed elements/rows to be considered for data acquisition (maxRows)
         #  c) or, once the targeted number of elements has been accepted (numElems)
         numSlices = ceil(numAvail / rowsPerSlice)
         numSlices = min(numSlices, int(maxRows / rowsPerSlice))
+        keysetPaging = True
         for sliceNum in range(numSlices):
-            # documents to skip as a function of the slice number
-            options['skip'] = sliceNum * rowsPerSlice
-            self.logger.info("  for slice: %s, with rows range [%s - %s]",
-                             sliceNum, options['skip'], options['skip'] + options['limit'])
-
-            result = self.db.loadList('WorkQueue', 'workRestrictions', 'availableByPriority', options)
+            if keysetPaging and sliceNum:
+                self.logger.info("  for slice: %s, starting after priority %s and doc id %s",
+                                 sliceNum, options['startkey'], options['startkey_docid'])
+            else:
+                # documents to skip as a function of the slice number
+                options['skip'] = sliceNum * rowsPerSlice
+                self.logger.info("  for slice: %s, with rows range [%s - %s]",
+                                 sliceNum, options['skip'], options['skip'] + options['limit'])
+
+            result = json.loads(self.db.loadList('WorkQueue', 'workRestrictions', 'availableByPriority', options))
+            if isinstance(result, dict):
+                listElems = result['elements']
+                lastRow = result['last_row']
+            else:
+                # workRestrictions list not supporting the last_row option, skip rows instead
+                keysetPaging = False
+                listElems = result
+                lastRow = None
             # now check the remaining restrictions and priority
             wqeSlots = numElems - len(acceptedElems)
-            elems = self._evalAvailableWork(json.loads(result), thresholds, siteJobCounts,
+            elems = self._evalAvailableWork(listElems, thresholds, siteJobCounts,
                                             excludeWorkflows, wqeSlots)
             acceptedElems.extend(elems)
             if len(acceptedElems) >= numElems:
@@ -486,6 +588,12 @@ class WorkQueueBackend(object):
                 msg += f"configured to: {numElems}, from queue: {self.queueUrl}"
                 self.logger.info(msg)
                 break
+            if keysetPaging:
+                if not lastRow:
+                    # no more rows in the view
+                    break
+                options['startkey'], options['startkey_docid'] = lastRow
+                options['skip'] = 1
 
         self.logger.info("Total of %d elements passed location and siteJobCounts restrictions for: %s",
                          len(acceptedElems), self.queueUrl)
@@ -525,6 +633,7 @@ class WorkQueueBackend(object):
                 sortedElements.append(element)
         sortAvailableElements(sortedElements)
 
+        jobCounter = SiteJobCounter(siteJobCounts, [element['Priority'] for element in sortedElements])
         for element in sortedElements:
             if numElems <= 0:
                 # it means we accepted the configured number of elements
@@ -538,7 +647,7 @@ class WorkQueueBackend(object):
                 if site in thresholds:
                     # Count the number of jobs currently running of greater priority, if they
                     # are less than the site thresholds, then accept this element
-                    curJobCount = sum([x[1] if x[0] >= prio else 0 for x in viewitems(siteJobCounts.get(site, {}))])
+                    curJobCount = jobCounter.countJobs(site, prio)
                     self.logger.debug("Job Count: %s, site: %s thresholds: %s",
                                       curJobCount, site, thresholds[site])
                     if curJobCount < thresholds[site]:
@@ -550,9 +659,7 @@ class WorkQueueBackend(object):
                                  element['RequestName'], prio, element.id, possibleSite)
                 numElems -= 1
                 elems.append(element)
-                siteJobCounts.setdefault(possibleSite, {})
-                siteJobCounts[possibleSite][prio] = siteJobCounts[possibleSite].setdefault(prio, 0) + \
-                                                    element['Jobs'] * element.get('blowupFactor', 1.0)
+                jobCounter.addJobs(possibleSite, prio, element['Jobs'] * element.get('blowupFactor', 1.0))
             else:
                 self.logger.debug("No available resources for %s with doc id %s",
                                   element['RequestName'], element.id)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+_SortedFile_t_
+
+Unit tests for the disk backed sorted lists of strings
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from bisect import bisect_left
+
+from Utils.SortedFile import SortedLineFile, sortToFile
+
+
+class SortedFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.testDir = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.testDir, "sorted.txt")
+
+    def tearDown(self):
+        shutil.rmtree(self.testDir)
+
+    def testSortToFile(self):
+        """
+        Test strings are sorted in chunks and merged into a file
+        """
+        random.seed(1)
+        lines = ["/store/unmerged/%d/%s/file.root" % (random.randint(0, 1000), u"é" * (i % 3))
+                 for i in range(1000)]
+        lines.extend(["/store", "/store/unmerged", "/store/unmerged"])
+        for chunkSize in (1, 7, 100, 5000):
+            self.assertEqual(sortToFile(iter(lines), self.fileName, chunkSize=chunkSize), len(lines))
+            with open(self.fileName, encoding='utf-8') as fileHandle:
+                self.assertEqual(fileHandle.read().split('\n')[:-1], sorted(lines))
+        # the temporary chunk files are gone
+        self.assertEqual(os.listdir(self.testDir), ["sorted.txt"])
+
+        self.assertEqual(sortToFile([], self.fileName), 0)
+        self.assertEqual(os.path.getsize(self.fileName), 0)
+
+    def testSortedLineFile(self):
+        """
+        Test the lines of a file can be accessed and searched as a sequence
+        """
+        lines = ["/store/a", "/store/b/1", "/store/b/2", u"/store/é/3", "/store/c"]
+        sortToFile(lines, self.fileName, chunkSize=2)
+        with SortedLineFile(self.fileName) as sortedFile:
+            self.assertEqual(len(sortedFile), 5)
+            self.assertEqual(list(sortedFile), sorted(lines))
+            self.assertEqual(sortedFile[-1], u"/store/é/3")
+            self.assertRaises(IndexError, sortedFile.__getitem__, 5)
+            self.assertEqual(bisect_left(sortedFile, "/store/b"), 1)
+            self.assertEqual(bisect_left(sortedFile, "/store/bb"), 3)
+        self.assertEqual(len(sortedFile), 0)
+
+        # no trailing newline
+        with open(self.fileName, 'w') as fileHandle:
+            fileHandle.write("a\nb")
+        with SortedLineFile(self.fileName) as sortedFile:
+            self.assertEqual(list(sortedFile), ["a", "b"])
+
+        open(self.fileName, 'w').close()
+        with SortedLineFile(self.fileName) as sortedFile:
+            self.assertEqual(len(sortedFile), 0)
+            self.assertEqual(list(sortedFile), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
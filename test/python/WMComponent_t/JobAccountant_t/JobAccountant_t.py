@@ -760,6 +760,45 @@ class JobAccountantTest(EmulatedUnitTestCase):
                                                 "MergedSkimSuccess.pkl"))
         return
 
+    def testReportLoaderPool(self):
+        """
+        _testReportLoaderPool_
+
+        Run the accountant with the job reports loaded by a pool of processes,
+        one job per slice, and verify the jobs are accounted as succeeded or
+        failed according to their reports.
+        """
+        self.setupDBForSplitJobSuccess()
+        fwjrBasePath = os.path.join(WMCore.WMBase.getTestBase(),
+                                    "WMComponent_t/JobAccountant_t/fwjrs/")
+        self.setFWJRAction.execute(jobID=self.testJobC["id"],
+                                   fwjrPath=fwjrBasePath + "EmptyJobReport.pkl")
+        self.testJobC["state"] = "complete"
+        self.stateChangeAction.execute(jobs=[self.testJobC])
+
+        config = self.createConfig()
+        config.JobAccountant.reportLoaderProcesses = 2
+        config.JobAccountant.reportLoaderPrefetch = 1
+        config.JobAccountant.accountantWorkSize = 1
+
+        accountant = JobAccountantPoller(config)
+        accountant.setup()
+        try:
+            accountant.algorithm()
+        finally:
+            accountant.terminate({})
+        self.assertIsNone(accountant.reportLoader.pool)
+
+        self.verifyJobSuccess(self.testJobA["id"])
+        testJob = Job(id=self.testJobC["id"])
+        testJob.load()
+        self.assertEqual(testJob["state"], "jobfailed")
+        self.assertEqual(testJob["outcome"], "failure")
+        testJob = Job(id=self.testJobB["id"])
+        testJob.load()
+        self.assertEqual(testJob["state"], "executing")
+        return
+
     def testMergedSkim(self):
         """
         _testMergedSkim_
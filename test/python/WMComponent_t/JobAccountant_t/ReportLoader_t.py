@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+"""
+_ReportLoader_t_
+
+Unit tests for the JobAccountant report loader
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from nose.plugins.attrib import attr
+
+from Utils.IteratorTools import grouper
+from WMComponent.JobAccountant.ReportLoader import ReportLoader, loadJobReport
+from WMCore.WMBase import getTestBase
+
+
+class ReportLoaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fwjrDir = os.path.join(getTestBase(), "WMComponent_t/JobAccountant_t/fwjrs")
+        self.testDir = tempfile.mkdtemp()
+        self.loader = None
+
+    def tearDown(self):
+        if self.loader is not None:
+            self.loader.close()
+        shutil.rmtree(self.testDir)
+
+    def makeJobs(self):
+        """
+        Return a list of jobs pointing to good and bad reports
+        """
+        reports = sorted(x for x in os.listdir(self.fwjrDir) if x.endswith(".pkl"))
+        jobs = [{"id": i, "fwjr_path": os.path.join(self.fwjrDir, x)} for i, x in enumerate(reports)]
+        emptyFile = os.path.join(self.testDir, "Report.0.pkl")
+        open(emptyFile, "w").close()
+        jobs.append({"id": len(jobs), "fwjr_path": emptyFile})
+        jobs.append({"id": len(jobs), "fwjr_path": "file://" + os.path.join(self.testDir, "missing.pkl")})
+        jobs.append({"id": len(jobs), "fwjr_path": None})
+        return jobs
+
+    def testLoadJobReport(self):
+        """
+        Test the reports which can't be loaded are replaced by failed reports
+        """
+        report = loadJobReport(os.path.join(self.fwjrDir, "MergeSuccess.pkl"))
+        self.assertTrue(report.taskSuccessful())
+
+        jobs = self.makeJobs()
+        for job, errorCode in zip(jobs[-3:], (99998, 99999, 99999)):
+            report = loadJobReport(job["fwjr_path"])
+            self.assertFalse(report.taskSuccessful())
+            self.assertEqual(report.getExitCode(), errorCode)
+        return
+
+    def testIterSlices(self):
+        """
+        Test the reports loaded by the pool are the same, and in the same
+        order, as the ones loaded in the calling thread
+        """
+        jobs = self.makeJobs()
+        serial = list(ReportLoader().iterSlices(grouper(jobs, 7)))
+        self.assertEqual(sum(len(x[1]) for x in serial), len(jobs))
+
+        self.loader = ReportLoader(nProcs=2, prefetch=2)
+        parallel = list(self.loader.iterSlices(grouper(jobs, 7)))
+        self.assertEqual(len(parallel), len(serial))
+        for (serialSlice, serialReports), (jobsSlice, jobReports) in zip(serial, parallel):
+            self.assertEqual(jobsSlice, serialSlice)
+            self.assertEqual([x.data.dictionary_whole_tree_() for x in jobReports],
+                             [x.data.dictionary_whole_tree_() for x in serialReports])
+
+        # the pool is kept between calls
+        pool = self.loader.pool
+        self.assertEqual(len(list(self.loader.iterSlices(grouper(jobs[:5], 2)))), 3)
+        self.assertTrue(self.loader.pool is pool)
+        return
+
+    @attr('performance', 'integration')
+    def testPerformance(self):
+        """
+        Compare loading 10k reports in the calling thread and in a pool
+        """
+        reports = [os.path.join(self.fwjrDir, x) for x in os.listdir(self.fwjrDir) if x.endswith(".pkl")]
+        jobs = [{"id": i, "fwjr_path": reports[i % len(reports)]} for i in range(10000)]
+        for nProcs in (0, 2, 4, 8):
+            self.loader = ReportLoader(nProcs=nProcs)
+            self.loader.setupPool()
+            start = time.time()
+            for _ in self.loader.iterSlices(grouper(jobs, 100)):
+                pass
+            print("Loaded %d reports with %d processes in %.2f secs" % (len(jobs), nProcs, time.time() - start))
+            self.loader.close()
+        return
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -24,6 +24,8 @@ from nose.plugins.attrib import attr
 from WMComponent.JobCreator.JobCreatorPoller import JobCreatorPoller, capResourceEstimates
 from WMCore.Agent.HeartbeatAPI import HeartbeatAPI
 from WMCore.DAOFactory import DAOFactory
+from WMCore.DataStructs.JobArchive import ARCHIVE_FILENAME, JobCacheReader
+from WMCore.DataStructs.JobSubmitIndex import INDEX_FILENAME, JobSubmitIndex
 from WMCore.DataStructs.Run import Run
 from WMCore.ResourceControl.ResourceControl import ResourceControl
 from WMCore.Services.UUIDLib import makeUUID
@@ -284,7 +286,8 @@ class JobCreatorTest(EmulatedUnitTestCase):
         self.assertTrue('job_1' in listOfDirs)
         self.assertTrue('job_2' in listOfDirs)
         self.assertTrue('job_3' in listOfDirs)
-        jobDir = os.listdir(groupDirectory)[0]
+        self.assertTrue(os.path.isfile(os.path.join(groupDirectory, INDEX_FILENAME)))
+        jobDir = [x for x in os.listdir(groupDirectory) if x.startswith('job_')][0]
         jobFile = os.path.join(groupDirectory, jobDir, 'job.pkl')
         self.assertTrue(os.path.isfile(jobFile))
         f = open(jobFile, 'rb')
@@ -298,6 +301,100 @@ class JobCreatorTest(EmulatedUnitTestCase):
         self.assertEqual(len(job['input_files']), 1)
         self.assertEqual(os.path.basename(job['sandbox']), 'TestWorkload-Sandbox.tar.bz2')
 
+        # the same job is available from the JobCollection index
+        with JobSubmitIndex(groupDirectory) as jobIndex:
+            indexedJob = jobIndex.get(job['id'])
+        self.assertEqual(indexedJob['workflow'], job['workflow'])
+        self.assertEqual(indexedJob['cache_dir'], job['cache_dir'])
+
+        return
+
+    def testJobArchive(self):
+        """
+        _JobArchive_
+
+        Test the jobs are saved in the archive of their JobCollection
+        instead of one pickle per job
+        """
+        config = self.getConfig()
+        config.JobCreator.jobArchive = True
+
+        name = makeUUID()
+        nSubs = 2
+        nFiles = 10
+        self.createWorkload(workloadName='TestWorkload')
+        workloadPath = os.path.join(self.testDir, 'workloadTest', 'TestWorkload', 'WMSandbox', 'WMWorkload.pkl')
+        self.createJobCollection(name=name, nSubs=nSubs, nFiles=nFiles, workflowURL=workloadPath)
+
+        testJobCreator = JobCreatorPoller(config=config)
+        testJobCreator.algorithm()
+
+        getJobsAction = self.daoFactory(classname="Jobs.GetAllJobs")
+        jobIds = getJobsAction.execute(state='Created', jobType="Processing")
+        self.assertEqual(len(jobIds), nSubs * nFiles)
+
+        testDirectory = os.path.join(self.testDir, 'jobCacheDir', 'TestWorkload', 'ReReco')
+        with JobCacheReader() as reader:
+            for collectionDir in os.listdir(testDirectory):
+                collectionDir = os.path.join(testDirectory, collectionDir)
+                self.assertTrue(os.path.isfile(os.path.join(collectionDir, ARCHIVE_FILENAME)))
+                self.assertFalse(os.path.isfile(os.path.join(collectionDir, INDEX_FILENAME)))
+                for jobDir in [x for x in os.listdir(collectionDir) if x.startswith('job_')]:
+                    self.assertEqual(os.listdir(os.path.join(collectionDir, jobDir)), [])
+                    job = reader.getJob(int(jobDir[4:]), os.path.join(collectionDir, jobDir))
+                    self.assertEqual(job['workflow'], name)
+                    self.assertTrue(job['id'] in jobIds)
+            self.assertEqual(len(reader.collections), nSubs)
+
+        return
+
+    def testParallelCreation(self):
+        """
+        _ParallelCreation_
+
+        Test the jobs of different workflows are created by a pool of worker
+        processes, and those of the same workflow are numbered in sequence
+        """
+        config = self.getConfig()
+        config.JobCreator.creatorProcesses = 2
+
+        nSubs = 3
+        nFiles = 10
+        self.createWorkload(workloadName='TestWorkload')
+        workloadPath = os.path.join(self.testDir, 'workloadTest', 'TestWorkload', 'WMSandbox', 'WMWorkload.pkl')
+        names = [makeUUID() for _ in range(3)]
+        for name in names:
+            self.createJobCollection(name=name, nSubs=nSubs, nFiles=nFiles, workflowURL=workloadPath)
+
+        testJobCreator = JobCreatorPoller(config=config)
+        try:
+            timings = testJobCreator.pollSubscriptions()
+        finally:
+            testJobCreator.closePool()
+
+        self.assertEqual(len(timings), len(names) * nSubs)
+        self.assertEqual(sum(x['jobs'] for x in timings), len(names) * nSubs * nFiles)
+        for timing in timings:
+            self.assertTrue(timing['total'] >= timing['split'])
+            self.assertTrue('acquireFiles' in timing['factory'])
+
+        getJobsAction = self.daoFactory(classname="Jobs.GetAllJobs")
+        result = getJobsAction.execute(state='Created', jobType="Processing")
+        self.assertEqual(len(result), len(names) * nSubs * nFiles)
+
+        counters = {}
+        testDirectory = os.path.join(self.testDir, 'jobCacheDir', 'TestWorkload', 'ReReco')
+        for collectionDir in os.listdir(testDirectory):
+            for jobDir in os.listdir(os.path.join(testDirectory, collectionDir)):
+                if not jobDir.startswith('job_'):
+                    continue
+                with open(os.path.join(testDirectory, collectionDir, jobDir, 'job.pkl'), 'rb') as f:
+                    job = pickle.load(f)
+                counters.setdefault(job['workflow'], []).append(job['counter'])
+        self.assertItemsEqual(list(counters), names)
+        for name in names:
+            self.assertEqual(sorted(counters[name]), list(range(1, nSubs * nFiles + 1)))
+
         return
 
     @attr('performance', 'integration')
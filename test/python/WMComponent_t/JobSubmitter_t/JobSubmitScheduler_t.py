@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+"""
+_JobSubmitScheduler_t_
+
+Unit tests for the JobSubmitter scheduler data structures and for the
+job location assignment built on top of them.
+"""
+from __future__ import print_function, division
+
+from builtins import range
+import logging
+import random
+import time
+import unittest
+
+from nose.plugins.attrib import attr
+
+from WMComponent.JobSubmitter.JobSubmitScheduler import JobSubmitScheduler, SiteAvailability
+from WMComponent.JobSubmitter.JobSubmitterPoller import JobSubmitterPoller
+
+
+def legacyAssignJobLocations(poller, jobsByPrio):
+    """
+    Job location assignment as done before the JobSubmitScheduler, where
+    jobsByPrio is a dict of priority to set of job ids
+    """
+    jobsToSubmit = {}
+    jobsCount = 0
+    for jobPrio in sorted(jobsByPrio, reverse=True):
+        for jobid in sorted(jobsByPrio[jobPrio]):
+            jobType = poller.jobDataCache[jobid]['task_type']
+            possibleSites = poller.checkZeroTaskThresholds(jobType, poller.jobDataCache[jobid]['possibleSites'])
+            for siteName in possibleSites:
+                if poller._getJobSubmitCondition(jobPrio, siteName, jobType) != "JobSubmitReady":
+                    continue
+                cachedJob = poller.jobDataCache.pop(jobid)
+                cachedJob['custom'] = {'location': siteName}
+                jobsToSubmit.setdefault(cachedJob['packageDir'], []).append(cachedJob)
+                poller.currentRcThresholds[siteName]["total_pending_jobs"] += 1
+                poller.currentRcThresholds[siteName]['thresholds'][jobType]["task_pending_jobs"] += 1
+                jobsCount += 1
+                jobsByPrio[jobPrio].discard(jobid)
+                break
+            if jobsCount >= poller.maxJobsThisCycle:
+                return jobsToSubmit
+    return jobsToSubmit
+
+
+def makePoller(numSites, numJobs, seed=1234):
+    """
+    Build a JobSubmitterPoller with its job cache and thresholds filled,
+    without any database or configuration behind it
+    """
+    rand = random.Random(seed)
+    taskTypes = ["Processing", "Production", "Merge", "LogCollect"]
+    sites = ["T2_XX_Site%03d" % i for i in range(numSites)]
+
+    poller = JobSubmitterPoller.__new__(JobSubmitterPoller)
+    poller.maxJobsThisCycle = numJobs
+    poller.condorOverflowFraction = 0.2
+    poller.ioboundTypes = ('LogCollect', 'Merge', 'Cleanup', 'Harvesting')
+    poller.jobDataCache = {}
+    poller.jobsByPrio = JobSubmitScheduler()
+    poller.currentRcThresholds = {}
+    for site in sites:
+        poller.currentRcThresholds[site] = {"total_pending_slots": rand.randint(0, 200),
+                                            "total_running_slots": rand.randint(0, 2000),
+                                            "total_pending_jobs": 0, "total_running_jobs": 0,
+                                            "thresholds": {}}
+        for taskType in taskTypes:
+            poller.currentRcThresholds[site]['thresholds'][taskType] = {"pending_slots": rand.randint(0, 100),
+                                                                        "max_slots": rand.randint(0, 1000),
+                                                                        "task_pending_jobs": 0,
+                                                                        "task_running_jobs": 0,
+                                                                        "wf_highest_priority": rand.choice([None, 5000])}
+
+    # equal sets of sites must iterate in the same order, as they do within a job class
+    siteGroups = [frozenset(sorted(rand.sample(sites, rand.randint(1, 10)))) for _ in range(500)]
+    legacyJobsByPrio = {}
+    for jobid in range(1, numJobs + 1):
+        jobPrio = rand.choice([100000, 200000, 300000]) + rand.choice([1000, 5000, 9000])
+        jobType = rand.choice(taskTypes)
+        poller.jobDataCache[jobid] = {'id': jobid, 'task_type': jobType, 'packageDir': "pkg%d" % (jobid % 7),
+                                      'possibleSites': rand.choice(siteGroups)}
+        poller.jobsByPrio.add(jobPrio, jobid, jobType, poller.jobDataCache[jobid]['possibleSites'])
+        legacyJobsByPrio.setdefault(jobPrio, set()).add(jobid)
+    return poller, legacyJobsByPrio
+
+
+def placements(jobsToSubmit):
+    """
+    Return the set of (job id, site) out of the jobs to be submitted
+    """
+    return set((job['id'], job['custom']['location']) for jobs in jobsToSubmit.values() for job in jobs)
+
+
+class JobSubmitSchedulerTest(unittest.TestCase):
+    """
+    _JobSubmitSchedulerTest_
+
+    Test the JobSubmitScheduler and SiteAvailability classes
+    """
+
+    def setUp(self):
+        logging.getLogger().setLevel(logging.CRITICAL)
+
+    def tearDown(self):
+        logging.getLogger().setLevel(logging.INFO)
+
+    def testScheduler(self):
+        """
+        Test jobs are returned by priority and job id, across all classes
+        """
+        scheduler = JobSubmitScheduler()
+        siteA = frozenset(["T1_US_FNAL"])
+        siteB = frozenset(["T2_CH_CERN", "T1_US_FNAL"])
+        scheduler.add(10, 5, "Processing", siteA)
+        scheduler.add(10, 3, "Processing", siteA)
+        scheduler.add(10, 4, "Merge", siteB)
+        scheduler.add(20, 7, "Processing", siteB)
+        scheduler.add(20, 7, "Processing", siteB)
+        self.assertEqual(len(scheduler), 4)
+        self.assertIn(4, scheduler)
+
+        self.assertEqual(scheduler.priorities(), [20, 10])
+        jobs = [(jobClass, jobid, left) for jobClass, jobid, left in scheduler.iterJobs(10, set())]
+        self.assertEqual(jobs, [(("Processing", siteA), 3, 2), (("Merge", siteB), 4, 1),
+                                (("Processing", siteA), 5, 1)])
+
+        # blocking a class skips its remaining jobs
+        blocked = set()
+        jobIds = []
+        for jobClass, jobid, _ in scheduler.iterJobs(10, blocked):
+            jobIds.append(jobid)
+            blocked.add(jobClass)
+        self.assertEqual(jobIds, [3, 4])
+
+        # discarding jobs, also while iterating
+        jobIds = []
+        for _, jobid, _ in scheduler.iterJobs(10, set()):
+            jobIds.append(jobid)
+            scheduler.discard(jobid)
+            scheduler.discard(4)
+        self.assertEqual(jobIds, [3, 5])
+        self.assertEqual(len(scheduler), 1)
+        scheduler.add(10, 5, "Processing", siteA)
+        self.assertEqual(scheduler.priorities(), [20, 10])
+        self.assertEqual([x[1] for x in scheduler.iterJobs(10, set())], [5])
+        scheduler.discard(5)
+        scheduler.discard(7)
+        self.assertEqual(scheduler.priorities(), [])
+        self.assertEqual(list(scheduler.iterJobs(10, set())), [])
+
+        scheduler.add(1, 1, "Merge", siteA)
+        scheduler.clear()
+        self.assertEqual(len(scheduler), 0)
+        self.assertEqual(scheduler.priorities(), [])
+        return
+
+    def testSiteAvailability(self):
+        """
+        Test the site availability bitmaps
+        """
+        availability = SiteAvailability()
+        sites = frozenset(["T1_US_FNAL", "T2_CH_CERN"])
+        self.assertFalse(availability.allUnavailable("Processing", sites))
+        self.assertIsNone(availability.getCondition("T1_US_FNAL", "Processing"))
+
+        availability.setUnavailable("T1_US_FNAL", "Processing", "NoPendingSlot")
+        self.assertEqual(availability.getCondition("T1_US_FNAL", "Processing"), "NoPendingSlot")
+        self.assertFalse(availability.allUnavailable("Processing", sites))
+        self.assertTrue(availability.allUnavailable("Processing", frozenset(["T1_US_FNAL"])))
+        self.assertFalse(availability.allUnavailable("Merge", frozenset(["T1_US_FNAL"])))
+
+        availability.setUnavailable("T2_CH_CERN", "Processing", "NoTaskPendingSlot")
+        self.assertTrue(availability.allUnavailable("Processing", sites))
+        self.assertTrue(availability.allUnavailable("Processing", ()))
+        return
+
+    def testAssignJobLocations(self):
+        """
+        Test the job locations are the same ones the old, per job, loop assigned
+        """
+        poller, legacyJobsByPrio = makePoller(20, 5000)
+        legacyPoller, _ = makePoller(20, 5000)
+        jobsToSubmit = poller.assignJobLocations()
+        self.assertEqual(placements(jobsToSubmit), placements(legacyAssignJobLocations(legacyPoller,
+                                                                                       legacyJobsByPrio)))
+        self.assertEqual(poller.currentRcThresholds, legacyPoller.currentRcThresholds)
+        self.assertEqual(set(poller.jobDataCache), set(legacyPoller.jobDataCache))
+        self.assertEqual(len(poller.jobsByPrio), len(poller.jobDataCache))
+
+        # and nothing else can be submitted in the next call
+        self.assertEqual(poller.assignJobLocations(), {})
+        return
+
+    def testMaxJobsThisCycle(self):
+        """
+        Test the submission stops at the maximum number of jobs per cycle
+        """
+        poller, _ = makePoller(20, 5000)
+        poller.maxJobsThisCycle = 10
+        jobsToSubmit = poller.assignJobLocations()
+        self.assertEqual(len(placements(jobsToSubmit)), 10)
+        self.assertEqual(len(poller.jobsByPrio), 4990)
+        return
+
+    @attr('performance', 'integration')
+    def testPerformance(self):
+        """
+        Compare the job location assignment with 500k cached jobs and 200 sites
+        """
+        numSites, numJobs = 200, 500000
+        poller, _ = makePoller(numSites, numJobs)
+        legacyPoller, legacyJobsByPrio = makePoller(numSites, numJobs)
+
+        start = time.time()
+        legacyJobs = legacyAssignJobLocations(legacyPoller, legacyJobsByPrio)
+        legacyTime = time.time() - start
+
+        start = time.time()
+        jobsToSubmit = poller.assignJobLocations()
+        newTime = time.time() - start
+
+        self.assertEqual(placements(jobsToSubmit), placements(legacyJobs))
+        print("Assigned %d jobs out of %d to %d sites: legacy %.2f secs, scheduler %.2f secs" %
+              (len(placements(jobsToSubmit)), numJobs, numSites, legacyTime, newTime))
+        return
+
+
+if __name__ == '__main__':
+    unittest.main()
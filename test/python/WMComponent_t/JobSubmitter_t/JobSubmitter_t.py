@@ -630,6 +630,8 @@ class JobSubmitterTest(EmulatedUnitTestCase):
         # retrieve all 15 Merge jobs created so far
         result = getJobsAction.execute(limitRows=15)
         self.assertItemsEqual([int(j['task_prio']) for j in result], [4] * 15)
+        # the same jobs, in the same order, streamed from a server side cursor
+        self.assertEqual(list(getJobsAction.execute(limitRows=15, stream=True)), result)
         # merge prio 2, merge prio 2, merge prio 1
         self.assertItemsEqual([int(j['wf_priority']) for j in result], [2] * 10 + [1] * 5)
         # merge id 7, merge id 4, merge id 2
@@ -16,6 +16,9 @@ import time
 import unittest
 from subprocess import Popen, PIPE
 
+import classad
+from mock import mock
+
 from WMCore_t.BossAir_t.BossAir_t import BossAirTest, getCondorRunningJobs
 from nose.plugins.attrib import attr
 
@@ -23,10 +26,57 @@ from WMComponent.JobSubmitter.JobSubmitterPoller import JobSubmitterPoller
 from WMComponent.JobTracker.JobTrackerPoller import JobTrackerPoller
 from WMCore.BossAir.BossAirAPI import BossAirAPI
 from WMCore.BossAir.StatusPoller import StatusPoller
-from WMCore.BossAir.Plugins.SimpleCondorPlugin import activityToType
+from WMCore.BossAir.Plugins.SimpleCondorPlugin import SimpleCondorPlugin, activityToType
 from WMCore.JobStateMachine.ChangeState import ChangeState
 
 
+class FakeSchedd(object):
+    """
+    Local stand-in for a condor schedd: jobs change status through an event
+    log, which is applied to the job queue and history, and the queries are
+    evaluated against them with the classad library.
+    """
+
+    def __init__(self, agentName):
+        self.agentName = agentName
+        self.queue = {}
+        self.historyAds = []
+        self.eventLog = []
+        self.adsReturned = 0
+
+    def logEvent(self, gridId, jobStatus, eventTime, leaveQueue=False):
+        """
+        Record a job entering a new status, optionally leaving the queue
+        """
+        self.eventLog.append((gridId, jobStatus, eventTime, leaveQueue))
+        clusterId, procId = [int(x) for x in gridId.split(".")]
+        jobAd = self.queue.setdefault(gridId, {'ClusterId': clusterId, 'ProcId': procId,
+                                               'WMAgent_AgentName': self.agentName})
+        jobAd['JobStatus'] = jobStatus
+        jobAd['EnteredCurrentStatus'] = eventTime
+        if jobStatus == 2:
+            jobAd['MachineAttrGLIDEIN_CMSSite0'] = "T2_XX_Site"
+        if leaveQueue:
+            self.historyAds.append(self.queue.pop(gridId))
+
+    def _match(self, constraint, jobAds, projection):
+        for jobAd in jobAds:
+            if classad.ExprTree(constraint).eval(classad.ClassAd(jobAd)) is True:
+                self.adsReturned += 1
+                yield dict((attr, jobAd[attr]) for attr in projection if attr in jobAd)
+
+    def xquery(self, constraint, projection):
+        return self._match(constraint, list(self.queue.values()), projection)
+
+    def history(self, constraint, projection, match=-1, since=None):
+        jobAds = []
+        for jobAd in reversed(self.historyAds):
+            if since is not None and since.eval(classad.ClassAd(jobAd)) is True:
+                break
+            jobAds.append(jobAd)
+        return self._match(constraint, jobAds, projection)
+
+
 class SimpleCondorPluginTest(BossAirTest):
     """
     _SimpleCondorPluginTest_
@@ -433,6 +483,76 @@ class SimpleCondorPluginTest(BossAirTest):
 
         return
 
+    def testIncrementalTracking(self):
+        """
+        _testIncrementalTracking_
+
+        Test the incremental tracking mode gives the same results as the full
+        one, for jobs changing status through the fake schedd event log
+        """
+        config = self.getConfig()
+        config.BossAir.incrementalTracking = True
+        config.BossAir.fullTrackingInterval = 3600
+        config.BossAir.trackingSlack = 10
+        fullPlugin = SimpleCondorPlugin(config)
+        fullPlugin.incrementalTracking = False
+        plugin = SimpleCondorPlugin(config)
+
+        schedd = FakeSchedd(config.Agent.agentName)
+        now = int(time.time())
+        jobs = []
+        for i in range(20):
+            gridId = "100.%d" % i
+            schedd.logEvent(gridId, 1, now - 7200)
+            jobs.append({'jobid': i, 'gridid': gridId, 'status': 'Idle', 'location': None})
+
+        def track(trackPlugin, trackTime):
+            with mock.patch('WMCore.BossAir.Plugins.SimpleCondorPlugin.htcondor.Schedd', return_value=schedd), \
+                 mock.patch('WMCore.BossAir.Plugins.SimpleCondorPlugin.time.time', return_value=trackTime):
+                schedd.adsReturned = 0
+                return trackPlugin.track([dict(job) for job in jobs])
+
+        def summary(result):
+            return [sorted((x['gridid'], x['status']) for x in jobList) for jobList in result]
+
+        # first cycle is a full one
+        result = track(plugin, now - 3600)
+        self.assertEqual(schedd.adsReturned, 20)
+        self.assertEqual(summary(result), summary(track(fullPlugin, now - 3600)))
+        self.assertEqual(len(result[0]), 20)
+
+        # some jobs start running, complete or leave the queue
+        for i in range(5):
+            schedd.logEvent("100.%d" % i, 2, now - 1800)
+        schedd.logEvent("100.5", 4, now - 1800)
+        schedd.logEvent("100.6", 4, now - 1800, leaveQueue=True)
+        schedd.logEvent("100.7", 5, now - 1800)
+        result = track(plugin, now)
+        self.assertEqual(schedd.adsReturned, 8)
+        self.assertEqual(summary(result), summary(track(fullPlugin, now)))
+        self.assertEqual(len(result[1]), 8)
+        self.assertEqual(sorted(x['gridid'] for x in result[2]), ["100.5", "100.6", "100.7"])
+        self.assertEqual(set(x['location'] for x in result[1] if x['status'] == 'Running'), {"T2_XX_Site"})
+        for job in jobs:
+            newJob = [x for x in result[0] + result[2] if x['gridid'] == job['gridid']][0]
+            job['status'] = newJob['status']
+
+        # nothing changed
+        result = track(plugin, now + 60)
+        self.assertEqual(schedd.adsReturned, 0)
+        self.assertEqual(result[1], [])
+        self.assertEqual(len(result[0]), 17)
+
+        # a job disappearing from the queue without any event is only noticed
+        # by the next full query
+        schedd.queue.pop("100.10")
+        result = track(plugin, now + 120)
+        self.assertEqual(len(result[0]), 17)
+        result = track(plugin, now + 3600)
+        self.assertEqual(schedd.adsReturned, 18)
+        self.assertEqual([x['gridid'] for x in result[1]], ["100.10"])
+        self.assertEqual(summary(result), summary(track(fullPlugin, now + 3600)))
+
     def test_CMSGroupsRegex(self):
         """
         _test_CMSGroupsRegex_
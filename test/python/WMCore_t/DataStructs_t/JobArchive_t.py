@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+"""
+_JobArchive_t_
+
+Unit tests for the JobArchive module
+"""
+
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from WMCore.DataStructs.Job import Job
+from WMCore.DataStructs.JobArchive import (ARCHIVE_FILENAME, JobArchive, JobArchiveException, JobCacheReader,
+                                           appendJobArchive, loadJobArchive, migrateJobCollection)
+from WMCore.DataStructs.JobSubmitIndex import INDEX_FILENAME, writeJobSubmitIndex
+
+
+class JobArchiveTest(unittest.TestCase):
+    """
+    _JobArchiveTest_
+
+    Write and read back job archive files
+    """
+
+    def setUp(self):
+        self.testDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.testDir)
+
+    def makeJobs(self, firstId, nJobs):
+        """
+        Create a list of jobs with consecutive ids
+        """
+        jobs = []
+        for i in range(firstId, firstId + nJobs):
+            job = Job(name="job_%d" % i)
+            job['id'] = i
+            job['possiblePSN'] = set(["T2_CH_CERN", "T1_US_FNAL"])
+            job['cache_dir'] = os.path.join(self.testDir, "job_%d" % i)
+            jobs.append(job)
+        return jobs
+
+    def testAppendAndRead(self):
+        """
+        Jobs appended to the archive can be read back by id, the last
+        record of a job wins
+        """
+        archivePath = appendJobArchive(self.testDir, self.makeJobs(1, 20))
+        self.assertEqual(archivePath, os.path.join(self.testDir, ARCHIVE_FILENAME))
+        newJobs = self.makeJobs(15, 10)
+        newJobs[0]['possiblePSN'] = set(["T2_US_UCSD"])
+        appendJobArchive(self.testDir, newJobs)
+
+        with JobArchive(self.testDir) as jobArchive:
+            self.assertEqual(len(jobArchive), 24)
+            self.assertTrue(24 in jobArchive)
+            self.assertFalse(25 in jobArchive)
+            self.assertIsNone(jobArchive.get(25))
+            self.assertEqual(jobArchive.get(1)['name'], "job_1")
+            self.assertEqual(jobArchive.get(15)['possiblePSN'], set(["T2_US_UCSD"]))
+            self.assertEqual(pickle.loads(jobArchive.getRaw(16))['name'], "job_16")
+
+        appendJobArchive(self.testDir, [])
+        with JobArchive(self.testDir) as jobArchive:
+            self.assertEqual(len(jobArchive), 24)
+
+    def testCorruptedArchive(self):
+        """
+        Truncated records are ignored and overwritten, corrupted records and
+        unknown files are reported
+        """
+        self.assertIsNone(loadJobArchive(self.testDir))
+        archivePath = appendJobArchive(self.testDir, self.makeJobs(1, 3))
+        with open(archivePath, 'ab') as fileHandle:
+            fileHandle.write(b"\x04\x00\x00\x00\x00\x00\x00\x00\xff\xff")
+        with JobArchive(self.testDir) as jobArchive:
+            self.assertEqual(sorted(jobArchive.entries), [1, 2, 3])
+
+        appendJobArchive(self.testDir, self.makeJobs(4, 1))
+        with JobArchive(self.testDir) as jobArchive:
+            self.assertEqual(sorted(jobArchive.entries), [1, 2, 3, 4])
+            self.assertEqual(jobArchive.get(4)['name'], "job_4")
+
+        # flip the last byte of the last pickle
+        with open(archivePath, 'r+b') as fileHandle:
+            fileHandle.seek(-1, os.SEEK_END)
+            lastByte = fileHandle.read(1)
+            fileHandle.seek(-1, os.SEEK_END)
+            fileHandle.write(bytes([lastByte[0] ^ 0xff]))
+        with JobArchive(self.testDir) as jobArchive:
+            self.assertRaises(JobArchiveException, jobArchive.get, 4)
+            self.assertEqual(jobArchive.get(3)['name'], "job_3")
+
+        with open(archivePath, 'wb') as fileHandle:
+            fileHandle.write(b"not an archive file at all")
+        self.assertRaises(JobArchiveException, JobArchive, self.testDir)
+        self.assertIsNone(loadJobArchive(self.testDir))
+
+    def testReaderAndMigration(self):
+        """
+        Jobs are read whatever the layout of their collection, and
+        collections with job pickles are migrated to an archive
+        """
+        jobs = self.makeJobs(1, 6)
+        for job in jobs:
+            os.mkdir(job['cache_dir'])
+        # job 1 only in a pickle, jobs 2-3 in the index too, jobs 4-6 only in the archive
+        with open(os.path.join(jobs[0]['cache_dir'], 'job.pkl'), 'wb') as fileHandle:
+            pickle.dump(jobs[0], fileHandle)
+        for job in jobs[1:3]:
+            with open(os.path.join(job['cache_dir'], 'job.pkl'), 'wb') as fileHandle:
+                pickle.dump(job, fileHandle)
+        writeJobSubmitIndex(self.testDir, jobs[1:3])
+        appendJobArchive(self.testDir, jobs[3:])
+
+        with JobCacheReader() as reader:
+            for job in jobs:
+                self.assertEqual(reader.getJob(job['id'], job['cache_dir'])['name'], job['name'])
+            self.assertIsNone(reader.getJob(7, os.path.join(self.testDir, "job_7")))
+            self.assertEqual(len(reader.collections), 1)
+
+        with open(os.path.join(jobs[0]['cache_dir'], 'job.pkl'), 'wb') as fileHandle:
+            fileHandle.write(b"garbage")
+        with JobCacheReader() as reader:
+            self.assertRaises(Exception, reader.getJob, 1, jobs[0]['cache_dir'])
+
+        with open(os.path.join(jobs[0]['cache_dir'], 'job.pkl'), 'wb') as fileHandle:
+            pickle.dump(jobs[0], fileHandle)
+        self.assertEqual(migrateJobCollection(self.testDir), 3)
+        self.assertFalse(os.path.exists(os.path.join(self.testDir, INDEX_FILENAME)))
+        for job in jobs:
+            self.assertEqual(os.listdir(job['cache_dir']), [])
+        with JobCacheReader() as reader:
+            for job in jobs:
+                self.assertEqual(reader.getJob(job['id'], job['cache_dir'])['name'], job['name'])
+        self.assertEqual(migrateJobCollection(self.testDir), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
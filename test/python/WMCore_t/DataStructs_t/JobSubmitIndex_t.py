@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""
+_JobSubmitIndex_t_
+
+Unit tests for the JobSubmitIndex module
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from WMCore.DataStructs.Job import Job
+from WMCore.DataStructs.JobSubmitIndex import (INDEX_FILENAME, JobSubmitIndex, JobSubmitIndexException,
+                                               loadJobSubmitIndex, writeJobSubmitIndex)
+
+
+class JobSubmitIndexTest(unittest.TestCase):
+    """
+    _JobSubmitIndexTest_
+
+    Write and read back job index files
+    """
+
+    def setUp(self):
+        self.testDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.testDir)
+
+    def makeJobs(self, nJobs):
+        """
+        Create a list of jobs with ids in decreasing order
+        """
+        jobs = []
+        for i in range(nJobs, 0, -1):
+            job = Job(name="job_%d" % i)
+            job['id'] = i
+            job['possiblePSN'] = set(["T2_CH_CERN", "T1_US_FNAL"])
+            job['sandbox'] = "/some/sandbox_%d.tar.bz2" % i
+            jobs.append(job)
+        return jobs
+
+    def testWriteAndRead(self):
+        """
+        Jobs written to the index can be read back by id
+        """
+        jobs = self.makeJobs(50)
+        indexPath = writeJobSubmitIndex(self.testDir, jobs)
+        self.assertEqual(indexPath, os.path.join(self.testDir, INDEX_FILENAME))
+        self.assertEqual(os.listdir(self.testDir), [INDEX_FILENAME])
+
+        with JobSubmitIndex(self.testDir) as jobIndex:
+            self.assertEqual(len(jobIndex), 50)
+            self.assertTrue(25 in jobIndex)
+            self.assertFalse(51 in jobIndex)
+            self.assertIsNone(jobIndex.get(51))
+            for job in jobs:
+                loadedJob = jobIndex.get(job['id'])
+                self.assertEqual(loadedJob['name'], job['name'])
+                self.assertEqual(loadedJob['possiblePSN'], job['possiblePSN'])
+                self.assertEqual(loadedJob['sandbox'], job['sandbox'])
+
+        writeJobSubmitIndex(self.testDir, [])
+        with JobSubmitIndex(self.testDir) as jobIndex:
+            self.assertEqual(len(jobIndex), 0)
+
+    def testBadIndex(self):
+        """
+        Missing or corrupted index files are reported as None by loadJobSubmitIndex
+        """
+        self.assertIsNone(loadJobSubmitIndex(self.testDir))
+
+        with open(os.path.join(self.testDir, INDEX_FILENAME), 'wb') as fileHandle:
+            fileHandle.write(b"not an index file at all")
+        self.assertRaises(JobSubmitIndexException, JobSubmitIndex, self.testDir)
+        self.assertIsNone(loadJobSubmitIndex(self.testDir))
+
+        indexPath = writeJobSubmitIndex(self.testDir, self.makeJobs(10))
+        with open(indexPath, 'rb') as fileHandle:
+            data = fileHandle.read()
+        with open(indexPath, 'wb') as fileHandle:
+            fileHandle.write(data[:30])
+        self.assertRaises(JobSubmitIndexException, JobSubmitIndex, self.testDir)
+
+        with open(indexPath, 'wb') as fileHandle:
+            fileHandle.write(b"")
+        self.assertIsNone(loadJobSubmitIndex(self.testDir))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,10 +3,74 @@
 from builtins import zip, str, range
 from future.utils import viewitems
 
+import os
+import random
+import shutil
+import tempfile
+import time
 import unittest
 
+from nose.plugins.attrib import attr
+
 # import FWCore.ParameterSet.Config as cms
-from WMCore.DataStructs.LumiList import LumiList
+from WMCore.DataStructs.LumiList import LumiList, LumiMask, MAX_LUMI
+
+
+def legacySubtract(aCompact, bCompact):
+    """
+    Lumi ranges subtraction as implemented by the previous, list based, LumiList
+    """
+    result = {}
+    for run in sorted(aCompact):
+        blumis = sorted(bCompact.get(run, []))
+        alist = []
+        for alumi in sorted(aCompact[run]):
+            tmplist = [alumi[0], alumi[1]]
+            for blumi in blumis:
+                if blumi[0] <= tmplist[0] and blumi[1] >= tmplist[1]:
+                    tmplist = []
+                    break
+                if blumi[0] > tmplist[0] and blumi[1] < tmplist[1]:
+                    alist.append([tmplist[0], blumi[0] - 1])
+                    tmplist = [blumi[1] + 1, tmplist[1]]
+                elif blumi[0] <= tmplist[0] and blumi[1] < tmplist[1] and blumi[1] >= tmplist[0]:
+                    tmplist = [blumi[1] + 1, tmplist[1]]
+                elif blumi[0] > tmplist[0] and blumi[1] >= tmplist[1] and blumi[0] <= tmplist[1]:
+                    alist.append([tmplist[0], blumi[0] - 1])
+                    tmplist = []
+                    break
+            if tmplist:
+                alist.append(tmplist)
+        result[run] = alist
+    return result
+
+
+def legacyContains(compactList, run, lumi):
+    """
+    Run/lumi lookup as implemented by the previous, list based, LumiList
+    """
+    for lumiRange in compactList.get(str(run), []):
+        if lumiRange[0] <= lumi and (0 == lumiRange[1] or lumi <= lumiRange[1]):
+            return True
+    return False
+
+
+def makeCompactList(nRuns, nLumis, seed):
+    """
+    Create a synthetic compact list with nRuns runs of up to nLumis lumis,
+    with random holes in the lumi ranges
+    """
+    rng = random.Random(seed)
+    compactList = {}
+    for run in range(1, nRuns + 1):
+        ranges = []
+        first = 1
+        while first <= nLumis:
+            last = min(first + rng.randint(0, 20), nLumis)
+            ranges.append([first, last])
+            first = last + rng.randint(2, 5)
+        compactList[str(run)] = ranges
+    return compactList
 
 
 class LumiListTest(unittest.TestCase):
@@ -16,10 +80,15 @@ class LumiListTest(unittest.TestCase):
     """
 
     def setUp(self):
-        jsonFile = open('lumiTest.json', 'w')
+        self.testDir = tempfile.mkdtemp()
+        self.jsonFileName = os.path.join(self.testDir, 'lumiTest.json')
+        jsonFile = open(self.jsonFileName, 'w')
         jsonFile.write('{"1": [[1, 33], [35, 35], [37, 47]], "2": [[49, 75], [77, 130], [133, 136]]}')
         jsonFile.close()
 
+    def tearDown(self):
+        shutil.rmtree(self.testDir)
+
     def notestRead(self):
         """
         Test reading from JSON
@@ -29,7 +98,7 @@ class LumiListTest(unittest.TestCase):
                   '2': [[49, 75], [77, 130], [133, 136]]}
         exVLBR = cms.VLuminosityBlockRange('1:1-1:33', '1:35', '1:37-1:47', '2:49-2:75', '2:77-2:130', '2:133-2:136')
 
-        jsonList = LumiList(filename='lumiTest.json')
+        jsonList = LumiList(filename=self.jsonFileName)
         lumiString = jsonList.getCMSSWString()
         lumiList = jsonList.getCompactList()
         lumiVLBR = jsonList.getVLuminosityBlockRange(True)
@@ -47,7 +116,7 @@ class LumiListTest(unittest.TestCase):
         listLs2 = list(range(49, 76)) + list(range(77, 131)) + list(range(133, 137))
         lumis = list(zip([1] * 100, listLs1)) + list(zip([2] * 100, listLs2))
 
-        jsonLister = LumiList(filename='lumiTest.json')
+        jsonLister = LumiList(filename=self.jsonFileName)
         jsonString = jsonLister.getCMSSWString()
         jsonList = jsonLister.getCompactList()
 
@@ -75,7 +144,7 @@ class LumiListTest(unittest.TestCase):
             '2': []
         }
 
-        jsonLister = LumiList(filename='lumiTest.json')
+        jsonLister = LumiList(filename=self.jsonFileName)
         jsonString = jsonLister.getCMSSWString()
         jsonList = jsonLister.getCompactList()
 
@@ -295,7 +364,9 @@ class LumiListTest(unittest.TestCase):
                   '4': list(range(1, 100)),
                   }
         a = LumiList(runsAndLumis=alumis)
-        a.writeJSON('newFile.json')
+        a.writeJSON(os.path.join(self.testDir, 'newFile.json'))
+        self.assertEqual(LumiList(filename=os.path.join(self.testDir, 'newFile.json')).getCompactList(),
+                         a.getCompactList())
 
     def testCompact(self):
         acl = {'1': [[1, 2], [3, 4], [8, 9]]}
@@ -369,6 +440,145 @@ class LumiListTest(unittest.TestCase):
 
         self.assertEqual(c1.getCMSSWString(), w2.getCMSSWString())
 
+    def testContains(self):
+        """
+        Test the run and lumi lookups
+        """
+        lumiList = LumiList(compactList={'1': [[1, 33], [35, 35], [37, 47]], '2': [[49, 75]], '3': [[10, 0]]})
+        self.assertTrue(lumiList.contains(1))
+        self.assertTrue(lumiList.contains('2'))
+        self.assertFalse(lumiList.contains(4))
+        for lumi in [1, 20, 33, 35, 37, 47]:
+            self.assertTrue(lumiList.contains(1, lumi))
+            self.assertTrue((1, lumi) in lumiList)
+        for lumi in [0, 34, 36, 48, 100]:
+            self.assertFalse(lumiList.contains(1, lumi))
+        self.assertFalse(lumiList.contains(2, 48))
+        self.assertTrue(lumiList.contains([2, 75]))
+        self.assertFalse(lumiList.contains(5, 1))
+        # a last lumi of 0 means the range goes up to the end of the run
+        self.assertTrue(lumiList.contains(3, 10))
+        self.assertTrue(lumiList.contains(3, 123456))
+        self.assertFalse(lumiList.contains(3, 9))
+        self.assertEqual(lumiList.getCompactList()['3'], [[10, 0]])
+        self.assertEqual(lumiList.getCMSSWString(), '1:1-1:33,1:35,1:37-1:47,2:49-2:75,3:10-3:0')
+        self.assertEqual(LumiList(compactList={'1': [[5, 0]]}).getCompactList(), {'1': [[5, 0]]})
+        self.assertEqual(LumiList(runs=[1]).getCompactList(), {'1': [[1, MAX_LUMI]]})
+        self.assertEqual((LumiList(compactList={'1': [[5, 0]]}) - LumiList(compactList={'1': [[10, 20]]})).getCompactList(),
+                         {'1': [[5, 9], [21, 0]]})
+        with self.assertRaises(RuntimeError):
+            lumiList.contains(1.5)
+
+    def testCompactListReadOnly(self):
+        """
+        Test that the compactList property can only be replaced as a whole
+        """
+        lumiList = LumiList(compactList={'1': [[1, 10]]})
+        with self.assertRaises(TypeError):
+            lumiList.compactList['2'] = [[1, 5]]
+        self.assertEqual(dict(lumiList.compactList), {'1': [[1, 10]]})
+        lumiList.compactList = {'1': [[1, 10]], '2': [[1, 5]]}
+        self.assertEqual(lumiList.getCompactList(), {'1': [[1, 10]], '2': [[1, 5]]})
+        self.assertTrue(lumiList.contains(2, 3))
+
+    def testOperandsUnchanged(self):
+        """
+        Make sure that set operations do not modify the operands and that
+        the compact list round trips
+        """
+        acl = {'1': [[1, 10], [20, 30]], '2': [[5, 8]]}
+        bcl = {'1': [[5, 25]], '3': [[1, 2]]}
+        a = LumiList(compactList=acl)
+        b = LumiList(compactList=bcl)
+
+        self.assertEqual((a | b).getCompactList(), {'1': [[1, 30]], '2': [[5, 8]], '3': [[1, 2]]})
+        self.assertEqual((a & b).getCompactList(), {'1': [[5, 10], [20, 25]]})
+        self.assertEqual((a - b).getCompactList(), {'1': [[1, 4], [26, 30]], '2': [[5, 8]]})
+        self.assertEqual((b - a).getCompactList(), {'1': [[11, 19]], '3': [[1, 2]]})
+        self.assertEqual(a.getCompactList(), acl)
+        self.assertEqual(b.getCompactList(), bcl)
+        self.assertEqual(LumiList(compactList=a.getCompactList()).getCMSSWString(), a.getCMSSWString())
+        self.assertEqual(len(a - a), 0)
+
+    def testLegacyEquivalence(self):
+        """
+        Compare the interval based operations against the previous implementation
+        """
+        aCompact = makeCompactList(5, 500, seed=1)
+        bCompact = makeCompactList(5, 500, seed=2)
+        a = LumiList(compactList=aCompact)
+        b = LumiList(compactList=bCompact)
+
+        self.assertEqual((a - b).getCMSSWString(),
+                         LumiList(compactList=legacySubtract(aCompact, bCompact)).getCMSSWString())
+        self.assertEqual((a & b).getCMSSWString(), (a - (a - b)).getCMSSWString())
+        for run in range(0, 7):
+            for lumi in range(0, 510):
+                self.assertEqual(a.contains(run, lumi), legacyContains(aCompact, run, lumi))
+
+    def testLumiMask(self):
+        """
+        Test the compiled run/lumi mask against the goodRunList semantics
+        """
+        goodRunList = {'1': [[10, 20], [5, 8], [21, 21], [40, 0]], '2': [], 3: [[1, 1]]}
+        lumiMask = LumiMask(goodRunList)
+        self.assertEqual(len(lumiMask), 3)
+        self.assertEqual(lumiMask.getRuns(), [1, 2, 3])
+        self.assertTrue(lumiMask.hasRun(1))
+        self.assertTrue(lumiMask.hasRun('3'))
+        self.assertFalse(lumiMask.hasRun(4))
+        # a [first, 0] range is empty, as in the dictionary based checks
+        self.assertEqual([lumi for lumi in range(0, 50) if lumiMask.hasLumi(1, lumi)],
+                         [5, 6, 7, 8] + list(range(10, 22)))
+        self.assertFalse(lumiMask.hasLumi(2, 1))
+        self.assertTrue(lumiMask.hasLumi('3', 1))
+        self.assertFalse(lumiMask.hasLumi(4, 1))
+
+        self.assertEqual(lumiMask.filterLumis(1, [30, 21, 9, 5, 15]), [21, 5, 15])
+        self.assertEqual(lumiMask.filterLumis(3, [2, 1, 1]), [1, 1])
+        self.assertEqual(lumiMask.filterLumis(2, [1]), [])
+        self.assertEqual(lumiMask.filterLumis(4, [1]), [])
+        self.assertFalse(LumiMask())
+        self.assertFalse(LumiMask({}))
+
+    @attr('performance', 'integration')
+    def testPerformance(self):
+        """
+        Benchmark the interval based LumiList on 10M lumis inputs and compare it
+        against the previous implementation on a fraction of the runs, since the
+        latter does not finish in reasonable time for the full input
+        """
+        nRuns, nLumis = 200, 50000
+        aCompact = makeCompactList(nRuns, nLumis, seed=1)
+        bCompact = makeCompactList(nRuns, nLumis, seed=2)
+
+        startTime = time.time()
+        a = LumiList(compactList=aCompact)
+        b = LumiList(compactList=bCompact)
+        print("  Construction from compact lists: %.2f secs" % (time.time() - startTime))
+        for label, func in [("a - b", lambda: a - b), ("a & b", lambda: a & b), ("a | b", lambda: a | b),
+                            ("getCompactList", a.getCompactList)]:
+            startTime = time.time()
+            func()
+            print("  %s on %d lumis: %.2f secs" % (label, nRuns * nLumis, time.time() - startTime))
+
+        lookups = [(random.randint(1, nRuns), random.randint(1, nLumis)) for _ in range(100000)]
+        startTime = time.time()
+        for run, lumi in lookups:
+            a.contains(run, lumi)
+        print("  100k contains: %.2f secs" % (time.time() - startTime))
+
+        sampleRuns = [str(run) for run in range(1, 6)]
+        aSample = {run: aCompact[run] for run in sampleRuns}
+        bSample = {run: bCompact[run] for run in sampleRuns}
+        startTime = time.time()
+        legacySubtract(aSample, bSample)
+        print("  legacy a - b on %d runs: %.2f secs" % (len(sampleRuns), time.time() - startTime))
+        startTime = time.time()
+        for run, lumi in lookups[:1000]:
+            legacyContains(aCompact, run, lumi)
+        print("  legacy 1k contains: %.2f secs" % (time.time() - startTime))
+
 
 if __name__ == '__main__':
     unittest.main()
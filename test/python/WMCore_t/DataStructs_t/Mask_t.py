@@ -11,6 +11,7 @@ Unittest for the WMCore.DataStructs.Mask class
 # -mnorman
 
 
+import pickle
 import unittest
 
 from WMCore.DataStructs.Mask import Mask
@@ -140,6 +141,33 @@ class MaskTest(unittest.TestCase):
         # Note, this may break if the TODO in Mask.addRunAndLumis() is addressed
         self.assertEqual(runMask.getRunAndLumis(), runAndLumisMask.getRunAndLumis())
 
+    def testRunLumiInMask(self):
+        """
+        Test the lookup of lumis in the mask, also after the mask is changed
+        or pickled
+        """
+        mask = Mask()
+        mask.addRunWithLumiRanges(run=1, lumiList=[[1, 9], [12, 12], [31, 31]])
+        self.assertTrue(mask.runLumiInMask(1, 1))
+        self.assertTrue(mask.runLumiInMask(1, 12))
+        self.assertFalse(mask.runLumiInMask(1, 10))
+        self.assertFalse(mask.runLumiInMask(1, 40))
+        self.assertFalse(mask.runLumiInMask(2, 1))
+
+        mask.addRunAndLumis(run=1, lumis=[40, 41])
+        self.assertTrue(mask.runLumiInMask(1, 40))
+        mask.addRunWithLumiRanges(run=1, lumiList=[[10, 11]])
+        self.assertTrue(mask.runLumiInMask(1, 10))
+        self.assertFalse(mask.runLumiInMask(1, 1))
+
+        newMask = pickle.loads(pickle.dumps(mask))
+        self.assertEqual(newMask, mask)
+        self.assertTrue(newMask.runLumiInMask(1, 10))
+        self.assertFalse(newMask.runLumiInMask(1, 12))
+
+        # without a mask all the lumis are good
+        self.assertTrue(Mask().runLumiInMask(1, 1))
+
     def testFilter(self):
         """
         Test filtering of a set(run) object
@@ -9,6 +9,8 @@ import unittest
 import os
 import hashlib
 import base64
+import json
+import threading
 import time
 from Utils.Utilities import encodeUnicodeToBytes
 from WMCore.Database.CMSCouch import (CouchServer, CouchMonitor, Document, Database,
@@ -385,6 +387,101 @@ class CMSCouchTest(unittest.TestCase):
         self.assertEqual(1, len(self.db.allDocs({'limit':1}, ["1", "3"])['rows']))
         self.assertTrue('error' in self.db.allDocs(keys = ["1", "4"])['rows'][1])
 
+    def testIterView(self):
+        """
+        Test views, all docs and lists are loaded page by page
+        """
+        ddoc = {
+            '_id': '_design/foo',
+            'language': 'javascript',
+            'views': {
+                'byValue': {
+                    'map': 'function(doc) {if (doc.value !== undefined) {emit(doc.value % 3, null)}}'
+                },
+                'countByValue': {
+                    'map': 'function(doc) {if (doc.value !== undefined) {emit([doc.value % 3, doc.value], null)}}',
+                    'reduce': '_count'
+                },
+            },
+            'lists': {
+                'ids': 'function(head, req) {var ids = []; while (row = getRow()) {ids.push(row.id)}; '
+                       'send(toJSON(ids))}',
+            }
+        }
+        self.db.commit(ddoc)
+        for i in range(25):
+            self.db.queue(Document(id="%02d" % i, inputDict={'value': i}))
+        self.db.commit()
+
+        expected = self.db.loadView('foo', 'byValue', {'reduce': False})['rows']
+        self.assertEqual(len(expected), 25)
+        for pageSize in (1, 4, 25, 100):
+            for prefetch in (False, True):
+                self.assertEqual(list(self.db.iterView('foo', 'byValue', pageSize=pageSize, prefetch=prefetch)),
+                                 expected)
+        options = {'startkey': 1, 'limit': 7, 'descending': True}
+        self.assertEqual(list(self.db.iterView('foo', 'byValue', options, pageSize=3)),
+                         self.db.loadView('foo', 'byValue', options)['rows'])
+        self.assertEqual(list(self.db.iterView('foo', 'byValue', keys=[2, 0], pageSize=1)),
+                         self.db.loadView('foo', 'byValue', keys=[2, 0])['rows'])
+        self.assertEqual(list(self.db.iterView('foo', 'byValue', {'key': 1}, pageSize=2)),
+                         [row for row in expected if row['key'] == 1])
+
+        # grouped rows have no document id, they are paged on the key only
+        for options in ({'group': True}, {'group_level': 1}, {}):
+            expected = self.db.loadView('foo', 'countByValue', options)['rows']
+            self.assertEqual(list(self.db.iterView('foo', 'countByValue', options, pageSize=2)), expected)
+        self.assertEqual(len(expected), 1)
+        self.assertEqual(len(self.db.loadView('foo', 'countByValue', {'group': True})['rows']), 25)
+
+        allDocs = self.db.allDocs()['rows']
+        self.assertEqual(list(self.db.iterAllDocs(pageSize=4, prefetch=True)), allDocs)
+        self.assertEqual(list(self.db.iterAllDocs({'startkey': "10", 'limit': 5}, pageSize=2)),
+                         self.db.allDocs({'startkey': "10", 'limit': 5})['rows'])
+        self.assertEqual(list(self.db.iterAllDocs(keys=["03", "01"], pageSize=1)),
+                         self.db.allDocs(keys=["03", "01"])['rows'])
+
+        pages = list(self.db.iterList('foo', 'ids', 'byValue', pageSize=4))
+        self.assertEqual(len(pages), 7)
+        self.assertEqual([docId for page in pages for docId in json.loads(page)],
+                         [row['id'] for row in expected])
+        pages = list(self.db.iterList('foo', 'ids', 'byValue', keys=[2], pageSize=4))
+        self.assertEqual([docId for page in pages for docId in json.loads(page)],
+                         [row['id'] for row in expected if row['key'] == 2])
+
+    def testAsyncCommits(self):
+        """
+        Test the queue is committed by the background threads
+        """
+        db = self.server.connectDatabase(self.testdbname, size=10)
+        committer = db.startAsyncCommits(window=3)
+        self.assertTrue(db.startAsyncCommits() is committer)
+        db.commitOne({'_id': "5", 'foo': 0})
+
+        def resolveConflict(database, data, result):
+            return {'id': result['id'], 'resolvedBy': threading.current_thread().name}
+
+        for i in range(45):
+            db.queue({'_id': str(i), 'foo': i}, callback=resolveConflict)
+        self.assertTrue(db.getQueueSize() < 10)
+        results = db.commit(callback=resolveConflict)
+        self.assertEqual(len(results), 45)
+        self.assertTrue(results[5]['resolvedBy'].startswith("CouchCommitter"))
+        self.assertEqual(len(self.db.allDocs()['rows']), 45)
+
+        stats = committer.getStats()
+        self.assertEqual(stats['docs'], 45)
+        self.assertEqual(stats['conflicts'], 1)
+        self.assertEqual(stats['inFlight'], 0)
+        self.assertTrue(stats['docsPerSecond'] > 0)
+
+        db.queue({'_id': "45"})
+        db.commitAsync()
+        self.assertEqual([row['id'] for row in db.join()], ["45"])
+        self.assertEqual(db.flush(), [])
+        self.assertRaises(RuntimeError, db.commitAsync)
+        self.assertEqual(db.commit({'_id': "46"})[0]['id'], "46")
+
     def testUpdateBulkDocuments(self):
         """
         Test AllDocs with options
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+"""
+_CouchWriteBehind_t_
+
+Unit tests for the CouchDB write-behind queue
+"""
+
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from WMCore.Database.CouchWriteBehind import (CouchWriteBehind, CouchWriteBehindException, claimSpoolFile,
+                                              getCouchWriteBehind, stopCouchWriteBehinds)
+
+
+class FakeDatabase(object):
+    """
+    Database with the queue/commit interface of CMSCouch.Database, keeping
+    the committed documents in memory
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._queue = []
+        self.docs = {}
+        self.commits = []
+        self.failures = 0
+        # ids of the documents with a newer revision in the database
+        self.conflicts = set()
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def queue(self, doc, timestamp=False, viewlist=None, callback=None):
+        self._queue.append(doc)
+
+    def commit(self, callback=None):
+        self.gate.wait()
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("CouchDB is down")
+        self.commits.append(len(self._queue))
+        results = []
+        for doc in self._queue:
+            if doc["_id"] in self.conflicts:
+                result = {"id": doc["_id"], "error": "conflict"}
+                if callback:
+                    result = callback(self, {"docs": self._queue}, result)
+                results.append(result)
+                continue
+            self.docs[doc["_id"]] = doc
+            results.append({"id": doc["_id"], "rev": "1-abc"})
+        self._queue = []
+        return results
+
+
+class CouchWriteBehindTest(unittest.TestCase):
+
+    def setUp(self):
+        self.testDir = tempfile.mkdtemp()
+        self.spoolFile = os.path.join(self.testDir, "couch.spool")
+
+    def tearDown(self):
+        stopCouchWriteBehinds(timeout=5)
+        shutil.rmtree(self.testDir)
+
+    def testCommit(self):
+        """
+        Test documents are committed in batches by the background thread
+        """
+        jobs, fwjrs = FakeDatabase("jobs"), FakeDatabase("fwjrs")
+        writeBehind = CouchWriteBehind(self.spoolFile, maxSize=100, batchSize=10)
+        writeBehind.addDatabase("jobs", jobs)
+        writeBehind.addDatabase("fwjrs", fwjrs, commitFunc=lambda db, callback: db.commit(callback=callback))
+        self.assertRaises(CouchWriteBehindException, writeBehind.put, "summaries", {"_id": "1"})
+        writeBehind.start()
+
+        # hold the commits, so that the documents are queued and batched
+        jobs.gate.clear()
+        for i in range(25):
+            writeBehind.put("jobs", {"_id": str(i)})
+            writeBehind.put("fwjrs", {"_id": "%d-0" % i}, timestamp=True)
+        with open(self.spoolFile) as fileHandle:
+            self.assertEqual(len(fileHandle.readlines()), 50)
+        self.assertFalse(writeBehind.waitFor("jobs", ["20"], timeout=0.1))
+        jobs.gate.set()
+        self.assertTrue(writeBehind.waitFor("jobs", ["20", "24"]))
+        self.assertTrue(writeBehind.waitFor("fwjrs", ["24-0"]))
+
+        self.assertEqual(len(jobs.docs), 25)
+        self.assertEqual(len(fwjrs.docs), 25)
+        self.assertTrue("timestamp" in fwjrs.docs["0-0"])
+        self.assertTrue(max(jobs.commits) <= 10)
+        self.assertTrue(len(jobs.commits) < 25)
+        self.assertEqual(os.path.getsize(self.spoolFile), 0)
+
+        stats = writeBehind.getStats()
+        self.assertEqual(stats["queued"], 50)
+        self.assertEqual(stats["committed"], 50)
+        self.assertEqual(stats["pending"], 0)
+        self.assertTrue(writeBehind.stop(timeout=5))
+
+        # once stopped, documents are committed right away
+        writeBehind.put("jobs", {"_id": "25"})
+        self.assertTrue("25" in jobs.docs)
+        return
+
+    def testBackpressure(self):
+        """
+        Test callers block when the queue is full
+        """
+        jobs = FakeDatabase("jobs")
+        writeBehind = CouchWriteBehind(self.spoolFile, maxSize=2, batchSize=1)
+        writeBehind.addDatabase("jobs", jobs)
+        writeBehind.start()
+        jobs.gate.clear()
+        releaser = threading.Timer(0.2, jobs.gate.set)
+        releaser.start()
+        for i in range(5):
+            writeBehind.put("jobs", {"_id": str(i)})
+        releaser.join()
+        self.assertTrue(writeBehind.stop(timeout=5))
+
+        stats = writeBehind.getStats()
+        self.assertTrue(stats["blocked"] >= 1)
+        self.assertTrue(stats["blockedTime"] > 0)
+        self.assertEqual(stats["maxDepth"], 2)
+        self.assertEqual(sorted(jobs.docs), ["0", "1", "2", "3", "4"])
+        return
+
+    def testSpoolReplay(self):
+        """
+        Test documents not committed before stopping are committed by the next
+        queue using the same spool file, even after a failed commit
+        """
+        jobs = FakeDatabase("jobs")
+        jobs.failures = 100
+        writeBehind = CouchWriteBehind(self.spoolFile, retryDelay=0.01)
+        writeBehind.addDatabase("jobs", jobs)
+        writeBehind.start()
+        for i in range(3):
+            writeBehind.put("jobs", {"_id": str(i)})
+        self.assertFalse(writeBehind.stop(timeout=0.1))
+        self.assertEqual(jobs.docs, {})
+        self.assertTrue(writeBehind.getStats()["failures"] > 0)
+
+        # simulate a crash in the middle of a write, plus documents of another database
+        with open(self.spoolFile, 'a') as fileHandle:
+            fileHandle.write(json.dumps(["fwjrs", {"_id": "0-0"}]) + '\n')
+            fileHandle.write('["jobs", {"_id"')
+
+        # a replayed document updated meanwhile is not overwritten by the conflict callback
+        overwritten = []
+
+        def overwrite(database, data, result):
+            overwritten.append(result["id"])
+            return result
+
+        jobs = FakeDatabase("jobs")
+        jobs.conflicts.add("1")
+        writeBehind = getCouchWriteBehind(self.spoolFile)
+        self.assertTrue(getCouchWriteBehind(self.spoolFile) is writeBehind)
+        writeBehind.addDatabase("jobs", jobs, callback=overwrite)
+        self.assertTrue(writeBehind.waitFor("jobs", ["0", "1", "2"]))
+        self.assertEqual(sorted(jobs.docs), ["0", "2"])
+        self.assertEqual(overwritten, [])
+        self.assertEqual(writeBehind.getStats()["replayed"], 3)
+
+        # while new documents still get the callback
+        writeBehind.put("jobs", {"_id": "1"})
+        self.assertTrue(writeBehind.waitFor("jobs", ["1"]))
+        self.assertEqual(overwritten, ["1"])
+
+        # the documents of the database not added yet are kept in the spool
+        with open(self.spoolFile) as fileHandle:
+            self.assertEqual([json.loads(line) for line in fileHandle], [["fwjrs", {"_id": "0-0"}]])
+        self.assertTrue(stopCouchWriteBehinds(timeout=5))
+        return
+
+    def testClaimSpoolFile(self):
+        """
+        Test processes running side by side get their own spool file
+        """
+        spoolFile = claimSpoolFile(self.spoolFile)
+        self.assertEqual(spoolFile, self.spoolFile + ".0")
+        self.assertEqual(claimSpoolFile(self.spoolFile), spoolFile)
+
+        pool = multiprocessing.get_context("spawn").Pool(processes=1)
+        try:
+            self.assertEqual(pool.apply(claimSpoolFile, (self.spoolFile,)), self.spoolFile + ".1")
+        finally:
+            pool.close()
+            pool.join()
+        # the spool file of the exited process can be claimed again
+        pool = multiprocessing.get_context("spawn").Pool(processes=1)
+        try:
+            self.assertEqual(pool.apply(claimSpoolFile, (self.spoolFile,)), self.spoolFile + ".1")
+        finally:
+            pool.close()
+            pool.join()
+        return
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -285,6 +285,45 @@ class DBCoreTest(unittest.TestCase):
 
         return
 
+    def testProcessDataBulkSelect(self):
+        """
+        _testProcessDataBulkSelect_
+
+        Verify that a select with a list of single-key binds is executed as
+        IN list queries and returns the same rows as one query per bind.
+        """
+        insertSQL = "INSERT INTO test_tablea VALUES (:one, :two, :three)"
+        selectSQL = "SELECT column1, column2, column3 FROM test_tablea WHERE column1 = :one"
+
+        myThread = threading.currentThread()
+        myThread.dbi.processData(insertSQL, [{"one": i, "two": i * 2, "three": str(i * 3)} for i in range(2500)])
+
+        self.assertEqual(myThread.dbi.inlistbind(selectSQL, [{"one": 1}, {"one": 2}]), "one")
+        self.assertIsNone(myThread.dbi.inlistbind(selectSQL, [{"one": 1, "two": 2}]))
+        self.assertIsNone(myThread.dbi.inlistbind(insertSQL, [{"one": 1}]))
+        self.assertIsNone(myThread.dbi.inlistbind("SELECT column1 FROM test_tablea WHERE column1 > :one",
+                                                  [{"one": 1}]))
+
+        binds = [{"one": i} for i in range(0, 2400, 2)]
+        binds.append({"one": 10})
+        binds.append({"one": 5000})
+        resultSets = myThread.dbi.processData(selectSQL, binds, bulkSelect=True)
+        self.assertEqual(len(resultSets), 1)
+        results = resultSets[0].fetchall()
+        self.assertEqual(len(results), 1200)
+        self.assertEqual(sorted([x[0] for x in results]), list(range(0, 2400, 2)))
+        for result in results:
+            self.assertEqual(result[1], result[0] * 2)
+
+        # same results with the one query per bind path
+        resultSets = myThread.dbi.processData(selectSQL, binds[:-2])
+        results = []
+        for resultSet in resultSets:
+            results.extend(resultSet.fetchall())
+        self.assertEqual(len(results), 1200)
+
+        return
+
     def testInsertHugeNumber(self):
         """
         _testInsertHugeNumber_
@@ -82,6 +82,32 @@ class DBFormatterTest(unittest.TestCase):
         output = dbformatter.formatOneDict(result)
         self.assertEqual(output, {'column3': 'value2a', 'column2': 1, 'column1': 'value1a'})
 
+    def testFormatDictIter(self):
+        """
+        Test the generator formatting, with and without a streamed result
+        """
+        self.stuffDB()
+
+        myThread = threading.currentThread()
+        dbformatter = DBFormatter(myThread.logger, myThread.dbi)
+        expected = [{'column3': 'value2a', 'column2': 1, 'column1': 'value1a'},
+                    {'column3': 'value2b', 'column2': 2, 'column1': 'value1b'},
+                    {'column3': 'value2d', 'column2': 3, 'column1': 'value1c'}]
+
+        result = myThread.dbi.processData(self.selectSQL)
+        self.assertEqual(list(dbformatter.formatDictIter(result)), expected)
+
+        myThread.dbi.streamBatchSize = 2
+        result = myThread.dbi.processData(self.selectSQL, stream=True)
+        output = dbformatter.formatDictIter(result)
+        self.assertEqual(next(output), expected[0])
+        self.assertEqual(list(output), expected[1:])
+        self.assertIsNone(result[0].resultproxy)
+
+        result = myThread.dbi.processData(self.selectSQL + " WHERE column2 > :value",
+                                          {'value': 1}, stream=True)
+        self.assertEqual(list(dbformatter.formatDictIter(result)), expected[1:])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -16,7 +16,7 @@ import unittest
 import threading
 
 from WMCore.WMFactory import WMFactory
-from WMCore.Database.ResultSet import ResultSet
+from WMCore.Database.ResultSet import ResultSet, StreamingResultSet
 from WMQuality.TestInit import TestInit
 
 
@@ -116,6 +116,42 @@ class ResultSetTest(unittest.TestCase):
 
         return
 
+    def testStreamingResultSet(self):
+        """
+        Test that the StreamingResultSet yields all the rows in batches
+        and closes the cursor once exhausted
+        """
+        binds = [{'column1': 'value1%s' % i, 'column2': 'value2%s' % i} for i in range(25)]
+        self.myThread.dbi.processData("insert into test_tablec (column1, column2) values (:column1, :column2)", binds)
+
+        testProxy = self.myThread.dbi.connection().execute("select column1, column2 from test_tablec")
+        testSet = StreamingResultSet(testProxy, batchSize=10)
+        self.assertEqual([str(x).lower() for x in testSet.keys], ['column1', 'column2'])
+
+        rows = [row for row in testSet]
+        self.assertEqual(len(rows), 25)
+        self.assertIsNone(testSet.resultproxy)
+        self.assertEqual(testSet.fetchall(), [])
+        self.assertEqual(testSet.fetchone(), [])
+
+        # the rows of added result proxies are streamed one after the other
+        testSet = StreamingResultSet(self.myThread.dbi.connection().execute("select column1 from test_tablec"),
+                                     batchSize=10)
+        testSet.add(self.myThread.dbi.connection().execute("select column1 from test_tablec where column2 = 'value20'"))
+        self.assertEqual(len(testSet.keys), 1)
+        rows = testSet.fetchall()
+        self.assertEqual(len(rows), 26)
+        self.assertEqual(rows[-1][0], 'value10')
+        self.assertIsNone(testSet.resultproxy)
+
+        result = self.myThread.dbi.processData("select column1 from test_tablec", stream=True)
+        self.assertEqual(len(result), 1)
+        self.assertEqual(len(result[0].fetchall()), 25)
+
+        self.assertRaises(Exception, self.myThread.dbi.processData,
+                          ["select column1 from test_tablec"] * 2, stream=True)
+        return
+
 
 
 if __name__ == "__main__":
@@ -10,14 +10,18 @@ from future.utils import viewvalues
 from Utils.Utilities import encodeUnicodeToBytes, decodeBytesToUnicode
 
 import os
+import pickle
 import time
 import unittest
 
+from nose.plugins.attrib import attr
+
 from Utils import FileTools
 from Utils.PythonVersion import PY3
 
 from WMCore.Configuration import ConfigSection
-from WMCore.FwkJobReport.Report import Report
+from WMCore.DataStructs.Run import Run
+from WMCore.FwkJobReport.Report import Report, FWJR_MAGIC
 from WMCore.WMBase import getTestBase
 from WMQuality.TestInitCouchApp import TestInitCouchApp
 
@@ -1029,5 +1033,104 @@ class ReportTest(unittest.TestCase):
         self.assertEqual(fileList[1]['outputModule'], "logArchive")
 
 
+    def testPersistIndex(self):
+        """
+        _testPersistIndex_
+
+        Test reports are saved with an index serving the summary accessors
+        without decoding the report data, and that plain pickles still load.
+        """
+        myReport = Report("cmsRun1")
+        myReport.parse(self.xmlPath)
+        myReport.addError("cmsRun1", 8001, "CMSException", "Something bad")
+        myReport.addStep("stageOut1", status=0)
+        myReport.setTaskName("/Workflow/Task")
+        myReport.setJobID(12)
+        myReport._setSiteName("T1_US_FNAL")
+        reportPath = os.path.join(self.testDir, "Report.pkl")
+        legacyPath = os.path.join(self.testDir, "Report.legacy.pkl")
+        myReport.save(reportPath)
+        myReport.persist(legacyPath, legacy=True)
+        with open(reportPath, 'rb') as handle:
+            self.assertTrue(handle.read().startswith(FWJR_MAGIC))
+
+        summary = lambda x: (x.listSteps(), x.getExitCode(), x.getExitCodes(), x.getTaskName(), x.getJobID(),
+                             x.getSiteName(), x.getFirstStartLastStop(), x.taskSuccessful(),
+                             x.stepSuccessful("stageOut1"), x.getStepExitCodeAndMessage("cmsRun1"),
+                             x.getOutputFileCount())
+        expected = summary(myReport)
+        self.assertEqual(expected[1], 8001)
+        self.assertEqual(expected[-1], len(myReport.getAllFiles()))
+
+        newReport = Report()
+        newReport.load(reportPath)
+        self.assertEqual(summary(newReport), expected)
+        self.assertIsNone(newReport._data)
+
+        # the data is decoded when it's accessed, and the index dropped
+        self.assertEqual(newReport.data.dictionary_whole_tree_(), myReport.data.dictionary_whole_tree_())
+        self.assertIsNone(newReport._index)
+        self.assertEqual(summary(newReport), expected)
+        newReport.setTaskName("/Workflow/Other")
+        self.assertEqual(newReport.getTaskName(), "/Workflow/Other")
+
+        # the job ID is set without decoding the data, and kept once it's decoded
+        newReport = Report()
+        newReport.load(reportPath)
+        newReport.setJobID(34)
+        self.assertIsNone(newReport._data)
+        self.assertEqual(newReport.getJobID(), 34)
+        self.assertEqual(newReport.data.jobID, 34)
+        self.assertEqual(newReport.getJobID(), 34)
+
+        # pickled while the data is still encoded
+        newReport = Report()
+        newReport.load(reportPath)
+        newReport = pickle.loads(pickle.dumps(newReport))
+        self.assertEqual(summary(newReport), expected)
+        self.assertEqual(len(newReport.getAllFiles()), expected[-1])
+
+        legacyReport = Report()
+        legacyReport.load(legacyPath)
+        self.assertIsNone(legacyReport._index)
+        self.assertEqual(summary(legacyReport), expected)
+        self.assertEqual(legacyReport.data.dictionary_whole_tree_(), myReport.data.dictionary_whole_tree_())
+        return
+
+    @attr('performance', 'integration')
+    def testPerformance(self):
+        """
+        _testPerformance_
+
+        Compare the size and the time to save and load a report with
+        thousands of input files as a plain pickle and with an index
+        """
+        myReport = Report("cmsRun1")
+        myReport.parse(self.xmlPath)
+        myReport.addInputSource("PoolSource")
+        for i in range(5000):
+            myReport.addInputFile("PoolSource", lfn="/store/data/file%d.root" % i, pfn="file%d.root" % i,
+                                  runs=[Run(1, *range(i, i + 20))], events=1000)
+        reportPath = os.path.join(self.testDir, "Report.pkl")
+        for legacy in (True, False):
+            start = time.time()
+            myReport.persist(reportPath, legacy=legacy)
+            saveTime = time.time() - start
+            start = time.time()
+            for _ in range(10):
+                newReport = Report()
+                newReport.load(reportPath)
+                newReport.getExitCode()
+            summaryTime = (time.time() - start) / 10
+            start = time.time()
+            for _ in range(10):
+                newReport = Report()
+                newReport.load(reportPath)
+                newReport.getAllInputFiles()
+            fullTime = (time.time() - start) / 10
+            print("%s format: %d bytes, save %.3f secs, load for exit code %.4f secs, load for input files %.3f secs"
+                  % ("Legacy" if legacy else "Indexed", os.path.getsize(reportPath), saveTime, summaryTime, fullTime))
+        return
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+"""
+_XMLParser_t_
+
+Unit tests for the cmsRun XML job report parser
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from xml.parsers.expat import ExpatError
+
+from nose.plugins.attrib import attr
+
+from WMCore.Algorithms.ParseXMLFile import xmlFileToNode
+from WMCore.FwkJobReport.Report import Report, FwkJobReportException
+from WMCore.FwkJobReport.XMLParser import reportBuilder, reportDispatcher, reportDispatchers
+from WMCore.WMBase import getTestBase
+
+
+def legacyParse(xmlFile):
+    """
+    Parse a job report building the whole node structure first, as done
+    before the ReportStreamBuilder
+    """
+    report = Report("cmsRun1")
+    reportBuilder(xmlFileToNode(xmlFile), report, reportDispatcher(reportDispatchers()))
+    return report
+
+
+def streamParse(xmlFile):
+    """
+    Parse a job report with the current parser
+    """
+    report = Report("cmsRun1")
+    report.parse(xmlFile)
+    return report
+
+
+def writeLargeReport(xmlFile, numFiles, numRuns, numLumis):
+    """
+    Write a synthetic job report with numFiles input and output files,
+    each with numRuns runs of numLumis lumi sections
+    """
+    runs = []
+    for run in range(numRuns):
+        runs.append('<Run ID="%d">' % (100000 + run))
+        runs.extend('   <LumiSection NEvents="%d" ID="%d"/>' % (lumi % 7, lumi) for lumi in range(1, numLumis + 1))
+        runs.append('</Run>')
+    runs = "<Runs>\n%s\n</Runs>" % "\n".join(runs)
+    branches = "<Branches>\n%s\n</Branches>" % "\n".join("  <Branch>Branch%d_RECO.</Branch>" % i for i in range(200))
+
+    with open(xmlFile, 'w') as handle:
+        handle.write("<FrameworkJobReport>\n")
+        for i in range(numFiles):
+            handle.write("""<InputFile>
+<State  Value="closed"/>
+<LFN>/store/data/Run2024A/RAW/v1/000/%(i)d/input.root</LFN>
+<PFN>root://cms-xrd-global.cern.ch//store/data/Run2024A/RAW/v1/000/%(i)d/input.root</PFN>
+<Catalog></Catalog>
+<ModuleLabel>source</ModuleLabel>
+<GUID>%(i)08d-C5D6-DE11-945D-000423D94494</GUID>
+%(branches)s
+<InputType>primaryFiles</InputType>
+<InputSourceClass>PoolSource</InputSourceClass>
+<EventsRead>1000</EventsRead>
+%(runs)s
+</InputFile>
+""" % {'i': i, 'runs': runs, 'branches': branches})
+        for i in range(numFiles):
+            handle.write("""<File>
+<State  Value="closed"/>
+<LFN></LFN>
+<PFN>output%(i)d.root</PFN>
+<Catalog></Catalog>
+<ModuleLabel>output%(i)d</ModuleLabel>
+<GUID>%(i)08d-222E-DF11-B2B0-001731230E47</GUID>
+%(branches)s
+<OutputModuleClass>PoolOutputModule</OutputModuleClass>
+<TotalEvents>1000</TotalEvents>
+<DataType>Data</DataType>
+<BranchHash>8b4ca1a3d2e5f0c7</BranchHash>
+%(runs)s
+<Inputs>
+  <Input>
+    <LFN>/store/data/Run2024A/RAW/v1/000/%(i)d/input.root</LFN>
+    <PFN>root://cms-xrd-global.cern.ch//store/data/Run2024A/RAW/v1/000/%(i)d/input.root</PFN>
+    <FastCopying>0</FastCopying>
+  </Input>
+</Inputs>
+</File>
+""" % {'i': i, 'runs': runs, 'branches': branches})
+        handle.write('<FrameworkError ExitStatus="8001" Type="CMSException">Fatal error</FrameworkError>\n')
+        handle.write('<SkippedEvent Run="100000" Event="17"/>\n')
+        handle.write("<ReadBranches>\n</ReadBranches>\n")
+        handle.write("</FrameworkJobReport>\n")
+    return
+
+
+class XMLParserTest(unittest.TestCase):
+
+    def setUp(self):
+        self.testData = os.path.join(getTestBase(), "WMCore_t/FwkJobReport_t")
+        self.testDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.testDir)
+
+    def testSameReports(self):
+        """
+        Test the single pass parser fills the report in the same way the
+        node structure based one did, for all the test job reports
+        """
+        xmlFiles = [os.path.join(self.testData, x) for x in sorted(os.listdir(self.testData)) if x.endswith(".xml")]
+        largeFile = os.path.join(self.testDir, "Large.xml")
+        writeLargeReport(largeFile, 3, 2, 50)
+        xmlFiles.append(largeFile)
+        for xmlFile in xmlFiles:
+            try:
+                legacyReport = legacyParse(xmlFile)
+            except ExpatError:
+                # corrupted reports must fail as well
+                self.assertRaises(FwkJobReportException, streamParse, xmlFile)
+                continue
+            self.assertEqual(streamParse(xmlFile).data.dictionary_whole_tree_(),
+                             legacyReport.data.dictionary_whole_tree_(), xmlFile)
+
+        report = streamParse(largeFile)
+        inputFiles = report.getAllInputFiles()
+        self.assertEqual(len(inputFiles), 3)
+        self.assertEqual(sorted(r.run for r in inputFiles[0]['runs']), [100000, 100001])
+        self.assertEqual([len(r.eventsPerLumi) for r in inputFiles[0]['runs']], [50, 50])
+        self.assertEqual(len(report.getAllFiles()), 3)
+        self.assertEqual(report.getExitCode(), 8001)
+        return
+
+    def testTruncatedReport(self):
+        """
+        Test a truncated job report fails without filling the report with
+        the elements parsed before the error
+        """
+        largeFile = os.path.join(self.testDir, "Large.xml")
+        writeLargeReport(largeFile, 3, 2, 50)
+        with open(largeFile) as handle:
+            content = handle.read()
+        truncatedFile = os.path.join(self.testDir, "Truncated.xml")
+        with open(truncatedFile, 'w') as handle:
+            handle.write(content[:content.index("<File>") + 100])
+
+        report = Report("cmsRun1")
+        emptyReport = report.data.dictionary_whole_tree_()
+        self.assertRaises(FwkJobReportException, report.parse, truncatedFile)
+        self.assertEqual(report.data.dictionary_whole_tree_(), emptyReport)
+        self.assertEqual(report.getAllInputFiles(), [])
+        return
+
+    @attr('performance', 'integration')
+    def testPerformance(self):
+        """
+        Compare the parsing time of a large job report
+        """
+        largeFile = os.path.join(self.testDir, "Large.xml")
+        writeLargeReport(largeFile, 20, 5, 2000)
+        start = time.time()
+        legacyReport = legacyParse(largeFile)
+        legacyTime = time.time() - start
+        start = time.time()
+        report = streamParse(largeFile)
+        streamTime = time.time() - start
+        self.assertEqual(report.data.dictionary_whole_tree_(), legacyReport.data.dictionary_whole_tree_())
+        print("Parsed %d bytes: node structure %.2f secs, single pass %.2f secs" %
+              (os.path.getsize(largeFile), legacyTime, streamTime))
+        return
+
+
+if __name__ == '__main__':
+    unittest.main()
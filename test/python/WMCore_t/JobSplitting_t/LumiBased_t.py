@@ -6,19 +6,27 @@ Lumi based splitting tests, using the DataStructs classes.
 See WMCore/WMBS/JobSplitting/ for the WMBS (SQL database) version.
 """
 
+from __future__ import print_function
+
 from builtins import next, range
 
+import time
 import unittest
 
+from nose.plugins.attrib import attr
+
 from WMCore.DataStructs.File import File
 from WMCore.DataStructs.Fileset import Fileset
 from WMCore.DataStructs.Job import Job
 from WMCore.DataStructs.Subscription import Subscription
 from WMCore.DataStructs.Workflow import Workflow
 from WMCore.DataStructs.Run import Run
+from WMCore.DataStructs.LumiList import LumiMask
 
+from WMCore.JobSplitting.LumiBased import isGoodLumi
 from WMCore.JobSplitting.SplitterFactory import SplitterFactory
 from WMCore.Services.UUIDLib import makeUUID
+from WMCore.WMSpec.WMTask import buildLumiMask
 
 class LumiBasedTest(unittest.TestCase):
     """
@@ -302,6 +310,69 @@ class LumiBasedTest(unittest.TestCase):
         self.assertEqual(len(jobGroups), 1)
         jobs = jobGroups[0].jobs
         self.assertEqual(len(jobs), 3)
+    def testD_LumiMask(self):
+        """
+        _LumiMask_
+
+        Test that only the lumis in the run/lumi mask are assigned to jobs
+        """
+        splitter = SplitterFactory()
+        testSubscription = self.createSubscription(nFiles=3, lumisPerFile=10)
+        jobFactory = splitter(package="WMCore.DataStructs",
+                              subscription=testSubscription)
+        jobGroups = jobFactory(lumis_per_job=4,
+                               halt_job_on_file_boundaries=False,
+                               splitOnRun=False,
+                               performance=self.performanceParams,
+                               runs=['0', '2', '5'],
+                               lumis=['2,3,6,20', '205,205,207,215', '1,10'])
+        self.assertEqual(len(jobGroups), 1)
+        jobs = jobGroups[0].jobs
+        self.assertEqual([job['mask'].getRunAndLumis() for job in jobs],
+                         [{0: [[2, 3], [6, 7]]}, {0: [[8, 9]], 2: [[205, 205], [207, 207]]},
+                          {2: [[208, 209]]}])
+        self.assertEqual([len(job['input_files']) for job in jobs], [1, 2, 1])
+        return
+
+    @attr('performance', 'integration')
+    def testE_LumiMaskPerformance(self):
+        """
+        _LumiMaskPerformance_
+
+        Time the splitting of a subscription with 1M lumis and a lumi mask
+        with many ranges, and the lookup of its lumis in the mask
+        """
+        nFiles, lumisPerFile = 1000, 1000
+        testFileset = Fileset(name=makeUUID())
+        for i in range(nFiles):
+            newFile = File(lfn='/store/data/%d/file.root' % i, size=1000, events=lumisPerFile)
+            newFile.addRun(Run(1 + i // 100, *range((i % 100) * lumisPerFile + 1, (i % 100 + 1) * lumisPerFile + 1)))
+            newFile.setLocation('blenheim')
+            testFileset.addFile(newFile)
+        testSubscription = Subscription(fileset=testFileset, workflow=self.testWorkflow,
+                                        split_algo="LumiBased", type="Processing")
+        # every run has its lumis in 5000 ranges, one every other 10 lumis
+        runs = [str(run) for run in range(1, nFiles // 100 + 1)]
+        lumis = [",".join("%d,%d" % (lumi, lumi + 9) for lumi in range(1, 100 * lumisPerFile, 20))] * len(runs)
+
+        jobFactory = SplitterFactory()(package="WMCore.DataStructs", subscription=testSubscription)
+        startTime = time.time()
+        jobGroups = jobFactory(lumis_per_job=100, halt_job_on_file_boundaries=False,
+                               performance=self.performanceParams, runs=runs, lumis=lumis)
+        print("  Splitting %d lumis with a lumi mask: %.2f secs, %d jobs" %
+              (nFiles * lumisPerFile, time.time() - startTime, len(jobGroups[0].jobs)))
+
+        goodRunList = buildLumiMask(runs, lumis)
+        allLumis = [(run.run, lumi) for fileObj in testFileset.getFiles() for run in fileObj['runs'] for lumi in run]
+        startTime = time.time()
+        numGood = sum(1 for run, lumi in allLumis[:100000] if isGoodLumi(goodRunList, run, lumi))
+        legacyTime = time.time() - startTime
+        lumiMask = LumiMask(goodRunList)
+        startTime = time.time()
+        self.assertEqual(sum(1 for run, lumi in allLumis[:100000] if lumiMask.hasLumi(run, lumi)), numGood)
+        print("  100k lumi lookups: dictionary %.2f secs, LumiMask %.2f secs" % (legacyTime, time.time() - startTime))
+        return
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -16,6 +16,7 @@ from WMCore.Database.CMSCouch import CouchServer
 from WMCore.FwkJobReport.Report import Report
 from WMCore.JobSplitting.SplitterFactory import SplitterFactory
 from WMCore.JobStateMachine.ChangeState import ChangeState, Transitions
+from WMCore.JobStateMachine.ChangeState import appendStateTransition, appendSummaryTransition
 from WMCore.WMBS.File import File
 from WMCore.WMBS.Fileset import Fileset
 from WMCore.WMBS.Subscription import Subscription
@@ -84,6 +85,33 @@ class TestChangeState(unittest.TestCase):
                 self.assertRaises(AssertionError, change.check, dest, state)
         return
 
+    def testAppendTransitions(self):
+        """
+        _testAppendTransitions_
+
+        Verify the transitions are appended to the job and job summary documents
+        the same way the couch update handlers do.
+        """
+        transition = {"oldstate": "new", "newstate": "created", "location": "Agent", "timestamp": 1}
+        jobDoc = {"_id": "1", "states": {"0": {"oldstate": "none", "newstate": "new",
+                                               "location": "Agent", "timestamp": 0}}}
+        appendStateTransition(jobDoc, transition)
+        appendStateTransition(jobDoc, dict(transition, oldstate="created", newstate="executing"))
+        self.assertEqual(sorted(jobDoc["states"]), ["0", "1", "2"])
+        self.assertEqual(jobDoc["states"]["1"], transition)
+        self.assertEqual(jobDoc["states"]["2"]["newstate"], "executing")
+
+        emptyDoc = {"_id": "2"}
+        appendStateTransition(emptyDoc, transition)
+        self.assertEqual(emptyDoc["states"], {"1": transition})
+
+        summaryDoc = {"_id": "someJob", "state": "jobfailed", "timestamp": 0}
+        appendSummaryTransition(summaryDoc, dict(transition, oldstate="jobfailed", newstate="jobcooloff"))
+        self.assertEqual(summaryDoc["state"], "jobcooloff")
+        self.assertEqual(summaryDoc["timestamp"], 1)
+        self.assertEqual(len(summaryDoc["state_history"]), 1)
+        return
+
     def testRecordInCouch(self):
         """
         _testRecordInCouch_
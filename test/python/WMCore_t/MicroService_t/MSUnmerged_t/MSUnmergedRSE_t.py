@@ -6,11 +6,14 @@ from __future__ import division, print_function
 
 import json
 import os
+import shutil
+import tempfile
 import unittest
 import mongomock
 
 from pymongo import IndexModel
 
+from Utils.SortedFile import SortedLineFile, sortToFile
 from WMCore.MicroService.MSUnmerged.MSUnmerged import MSUnmerged, MSUnmergedRSE
 
 
@@ -67,3 +70,23 @@ class MSUnmergedRSETest(unittest.TestCase):
         rse.readRSEFromMongoDB(self.msUnmergedColl)
         rse.pop('_id', None)
         self.assertDictEqual(rse, self.expectedRSE)
+
+    def testRSEWriteStreamedFiles(self):
+        """
+        Test a streamed listing of the unmerged files is not dumped to the database
+        """
+        testDir = tempfile.mkdtemp()
+        try:
+            fileName = os.path.join(testDir, "unmerged.txt")
+            sortToFile(["/store/unmerged/file%i.root" % i for i in range(10)], fileName)
+            rse = MSUnmergedRSE('T2_US_Wisconsin')
+            rse['files']['allUnmerged'] = SortedLineFile(fileName)
+            rse['files']['deletedSuccess'] = {"/store/unmerged/file0.root"}
+            self.assertTrue(rse.writeRSEToMongoDB(self.msUnmergedColl, fullRSEToDB=True))
+            rse['files']['allUnmerged'].close()
+
+            record = self.msUnmergedColl.find_one({'name': 'T2_US_Wisconsin'})
+            self.assertEqual(record['files']['allUnmerged'], [])
+            self.assertEqual(record['files']['deletedSuccess'], ["/store/unmerged/file0.root"])
+        finally:
+            shutil.rmtree(testDir)
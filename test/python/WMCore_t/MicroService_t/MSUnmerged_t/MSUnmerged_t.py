@@ -12,7 +12,8 @@ from future.utils import viewkeys
 from mock import mock
 
 from Utils.PythonVersion import PY3
-from WMCore.MicroService.MSUnmerged.MSUnmerged import MSUnmerged, MSUnmergedRSE
+from Utils.SortedFile import SortedLineFile
+from WMCore.MicroService.MSUnmerged.MSUnmerged import MSUnmerged, MSUnmergedRSE, filesUnderDir
 from WMCore.Services.Rucio import Rucio
 
 
@@ -53,6 +54,13 @@ class RucioConMonEmul(object):
         """
         return self.rseUnmergedDump
 
+    def iterRSEUnmerged(self, rseName):
+        """
+        Emulates streaming the list of all unmerged files in an RSE
+        In reality it returns it from a file.
+        """
+        return iter(self.rseUnmergedDump)
+
 
 def getBasicRSEData():
     """Provide a very basic rse directory structure"""
@@ -218,6 +226,27 @@ class MSUnmergedTest(unittest.TestCase):
                        }
         self.assertDictEqual(rse, expectedRSE)
 
+    def testStreamUnmergedFiles(self):
+        """Test the unmerged files streamed into a sorted file on disk"""
+        self.msUnmerged.protectedLFNs = set(self.msUnmerged.wmstatsSvc.getProtectedLFNs())
+        rse = self.msUnmerged.getUnmergedFiles(MSUnmergedRSE('T2_US_Wisconsin'))
+        rse = self.msUnmerged.filterUnmergedFiles(rse)
+
+        self.msUnmerged.msConfig['streamUnmergedFiles'] = True
+        rseStream = self.msUnmerged.getUnmergedFiles(MSUnmergedRSE('T2_US_Wisconsin'))
+        self.assertTrue(isinstance(rseStream['files']['allUnmerged'], SortedLineFile))
+        self.assertEqual(list(rseStream['files']['allUnmerged']), sorted(rse['files']['allUnmerged']))
+        rseStream = self.msUnmerged.filterUnmergedFiles(rseStream)
+
+        self.assertEqual(rseStream['counters'], rse['counters'])
+        self.assertEqual(rseStream['dirs'], rse['dirs'])
+        self.assertItemsEqual(viewkeys(rseStream['files']['toDelete']), viewkeys(rse['files']['toDelete']))
+        for dirName, files in rse['files']['toDelete'].items():
+            self.assertEqual(list(rseStream['files']['toDelete'][dirName]), list(files))
+
+        self.msUnmerged.purgeRseObj(rseStream)
+        self.assertEqual(rseStream, {})
+
     def testCutPath(self):
         filePath = '/store/unmerged/SAM/testSRM/SAM-cmssrm.hep.wisc.edu/lcg-util/testfile-put-nospacetoken-1502337521-08cc70247c3f.txt'
         expectedFilePath = '/store/unmerged/SAM/testSRM/SAM-cmssrm.hep.wisc.edu/lcg-util'
@@ -231,6 +260,22 @@ class MSUnmergedTest(unittest.TestCase):
         expectedFilePath = '/store/unmerged/RunIIAutumn18FSPremix/PMSSM_set_1_prompt_1_TuneCP2_13TeV-pythia8/AODSIM/GridpackScan_102X_upgrade2018_realistic_v15-v1'
         self.assertEqual(self.msUnmerged._cutPath(filePath), expectedFilePath)
 
+        filePath = '/store/unmerged/SAM/testSRM/SAM-cmssrm.hep.wisc.edu'
+        self.assertEqual(self.msUnmerged._cutPath(filePath), filePath)
+
+    def testFilesUnderDir(self):
+        "Test the files under a directory are found in a sorted list of files"
+        lfns = sorted(getBasicRSEData()['files']['allUnmerged'])
+        self.assertEqual(list(filesUnderDir("/store/unmerged/logs/prod/2018", lfns)),
+                         ["/store/unmerged/logs/prod/2018/1/12/log1.tar"])
+        self.assertEqual(list(filesUnderDir("/store/unmerged/express/prod/2020/1/12", lfns)),
+                         ["/store/unmerged/express/prod/2020/1/12/log8.tar",
+                          "/store/unmerged/express/prod/2020/1/12/log9.tar"])
+        self.assertEqual(len(list(filesUnderDir("/store/unmerged/logs", lfns))), 5)
+        self.assertEqual(len(list(filesUnderDir("/store/unmerged/", lfns))), len(lfns))
+        self.assertEqual(list(filesUnderDir("/store/unmerged/zzz", lfns)), [])
+        self.assertEqual(list(filesUnderDir("/store/unmerged/logs", [])), [])
+
     def testFilterInclDirectories(self):
         "Test MSUnmerged with including directories filter"
         toDeleteDict = {"/store/unmerged/data/prod/2018/1/12": ["/store/unmerged/data/prod/2018/1/12/log6.tar"],
@@ -4,11 +4,17 @@ _ProcessPool_t
 Unit tests for the ProcessPool class.
 """
 
+from __future__ import print_function
+
 from builtins import range
+import logging
+import pickle
+import time
 import unittest
 import nose
+from nose.plugins.attrib import attr
 
-from WMCore.ProcessPool.ProcessPool import ProcessPool
+from WMCore.ProcessPool.ProcessPool import ProcessPool, pickleEncode, pickleDecode
 from WMQuality.TestInit import TestInit
 
 class ProcessPoolTest(unittest.TestCase):
@@ -123,8 +129,132 @@ class ProcessPoolTest(unittest.TestCase):
             self.assertEqual(len(result), len(input),
                              "Error: Wrong number of results returned.")
 
+    def testD_PickleTransport(self):
+        """
+        _testPickleTransport_
+
+        Run a test with batches of pickled work over ipc sockets
+        """
+        raise nose.SkipTest
+        config = self.testInit.getConfiguration()
+        config.Agent.useHeartbeat = False
+        self.testInit.generateWorkDir(config)
+
+        processPool = ProcessPool("ProcessPool_t.ProcessPoolTestWorker",
+                                  totalSlaves = 2,
+                                  componentDir = config.General.workDir,
+                                  namespace = "WMCore_t",
+                                  config = config,
+                                  transport = "pickle",
+                                  batchSize = 7)
+
+        input = [{"id": i, "data": b"x" * i} for i in range(100)]
+        processPool.enqueue(input)
+        result = processPool.dequeue(10)
+        result.extend(processPool.iterDequeue())
+        self.assertEqual(processPool.runningWork, 0)
+        self.assertEqual(sorted(result, key=lambda x: x["id"]), input)
+
+        # nothing running, nothing to wait for
+        self.assertEqual(list(processPool.iterDequeue(timeout=0)), [])
+        processPool.enqueue(["One", "Two"])
+        self.assertEqual(sorted(processPool.iterDequeue(timeout=30)), ["One", "Two"])
+        processPool.close()
+        return
+
+    def testE_Autoscaling(self):
+        """
+        _testAutoscaling_
+
+        Test the number of slaves follows the amount of work
+        """
+        raise nose.SkipTest
+        config = self.testInit.getConfiguration()
+        config.Agent.useHeartbeat = False
+        self.testInit.generateWorkDir(config)
+
+        processPool = ProcessPool("ProcessPool_t.ProcessPoolTestWorker",
+                                  totalSlaves = 1,
+                                  componentDir = config.General.workDir,
+                                  namespace = "WMCore_t",
+                                  config = config,
+                                  transport = "pickle",
+                                  minSlaves = 1,
+                                  maxSlaves = 3,
+                                  slaveQueueDepth = 10,
+                                  idleTimeout = 0)
+        self.assertEqual(processPool.nSlaves, 1)
+
+        processPool.enqueue(list(range(25)))
+        self.assertEqual(processPool.nSlaves, 3)
+        self.assertEqual(processPool.connectedSlaves, 3)
+        self.assertEqual(sorted(processPool.iterDequeue()), list(range(25)))
+
+        processPool.enqueue(list(range(100)))
+        self.assertEqual(processPool.nSlaves, 3)
+        self.assertEqual(len(processPool.dequeue(100)), 100)
+
+        # idle slaves are stopped
+        processPool.enqueue(list(range(5)))
+        self.assertEqual(processPool.nSlaves, 1)
+        self.assertEqual(processPool.connectedSlaves, 1)
+        self.assertEqual(sorted(processPool.iterDequeue()), list(range(5)))
+        processPool.close()
+        return
+
+    @attr('performance', 'integration')
+    def testF_Performance(self):
+        """
+        _testPerformance_
+
+        Compare the throughput of the JSON over TCP and the pickle over ipc transports
+        """
+        config = self.testInit.getConfiguration()
+        config.Agent.useHeartbeat = False
+        self.testInit.generateWorkDir(config)
+
+        input = [{"id": i, "name": "job%d" % i, "lfns": ["/store/data/file%d.root" % j for j in range(10)]}
+                 for i in range(20000)]
+        for transport in ("json", "pickle"):
+            processPool = ProcessPool("ProcessPool_t.ProcessPoolTestWorker",
+                                      totalSlaves = 1,
+                                      componentDir = config.General.workDir,
+                                      namespace = "WMCore_t",
+                                      config = config,
+                                      transport = transport)
+            # wait for the slave to be up and running
+            processPool.enqueue(input[:1])
+            processPool.dequeue(1)
+
+            start = time.time()
+            processPool.enqueue(input)
+            result = processPool.dequeue(len(input))
+            logging.info("Transport %s: %d items in %.2f secs", transport, len(input), time.time() - start)
+            self.assertEqual(len(result), len(input))
+            processPool.close()
+        return
 
 
+class PickleCodecTest(unittest.TestCase):
+    """
+    Test the message encoding of the pickle transport, which needs no slaves
+    """
+
+    def testPickleCodec(self):
+        """
+        _testPickleCodec_
+
+        Test out-of-band buffers are sent as extra frames and decoded back
+        """
+        data = bytearray(b"x" * 1000)
+        frames = pickleEncode({"data": pickle.PickleBuffer(data), "name": "One"})
+        self.assertEqual(len(frames), 2)
+        self.assertEqual(pickleDecode(frames), {"data": data, "name": "One"})
+
+        frames = pickleEncode([{"id": i, "data": b"x" * i} for i in range(10)])
+        self.assertEqual(len(frames), 1)
+        self.assertEqual(pickleDecode(frames), [{"id": i, "data": b"x" * i} for i in range(10)])
+        return
 
 
 if __name__ == "__main__":
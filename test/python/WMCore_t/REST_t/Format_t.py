@@ -12,3 +12,77 @@ RawFormat()
 DigestETag('md5')
 MD5ETag()
 SHA1ETag()
+
+import json
+import time
+import unittest
+
+import cherrypy
+from nose.plugins.attrib import attr
+
+from WMCore.REST.Format import configure_json_format, json_encoders
+
+
+class JSONFormatTest(unittest.TestCase):
+    """Unit tests for the JSON output formatter"""
+
+    def setUp(self):
+        cherrypy.request.rest_generate_data = "result"
+        cherrypy.request.rest_generate_preamble = None
+        self.rows = [{"RequestName": "request_%d" % i, "Priority": i, "Sites": ["T1_US_FNAL", u"T2_CH_CERN_é"],
+                      "Path": "/store/unmerged/%d" % i, 10: None} for i in range(1000)]
+
+    def tearDown(self):
+        configure_json_format()
+
+    def formatRows(self, rows):
+        """Return the chunks and the ETag of the JSON output of `rows`"""
+        etag = SHA1ETag()
+        chunks = list(JSONFormat()(rows, etag))
+        return chunks, etag.value()
+
+    def testChunkSize(self):
+        """Test coalesced rows produce the same output and ETag"""
+        chunks, etagval = self.formatRows(self.rows)
+        self.assertEqual(len(chunks), len(self.rows) + 2)
+        reply = json.loads("".join(chunks))
+        self.assertEqual(len(reply["result"]), len(self.rows))
+
+        for chunkSize in (1, 1000, 64 * 1024):
+            configure_json_format(chunk_size=chunkSize)
+            newChunks, newEtagval = self.formatRows(self.rows)
+            self.assertEqual("".join(newChunks), "".join(chunks))
+            self.assertEqual(newEtagval, etagval)
+            self.assertTrue(all(x.endswith("\n") for x in newChunks))
+        self.assertTrue(len(newChunks) < 10)
+
+        # empty stream
+        self.assertEqual(json.loads("".join(self.formatRows([])[0])), {"result": []})
+
+    def testEncoders(self):
+        """Test all the available encoders keep the one row per line format"""
+        self.assertEqual(configure_json_format(encoder="nonExistingEncoder"), "json")
+        expected = json.loads("".join(self.formatRows(self.rows)[0]))
+        for encoder in json_encoders:
+            self.assertEqual(configure_json_format(encoder=encoder, chunk_size=4096), encoder)
+            chunks, _ = self.formatRows(self.rows + [2 ** 70])
+            lines = "".join(chunks).split("\n")
+            self.assertEqual(len(lines), len(self.rows) + 4)
+            self.assertEqual([json.loads(x[1:]) for x in lines[1:-3]], expected["result"])
+            self.assertEqual(json.loads(lines[-3][1:]), 2 ** 70)
+
+    @attr('performance', 'integration')
+    def testPerformance(self):
+        """Compare the time to format many rows with each configuration"""
+        rows = self.rows * 100
+        for encoder in json_encoders:
+            for chunkSize in (0, 64 * 1024):
+                configure_json_format(encoder=encoder, chunk_size=chunkSize)
+                start = time.time()
+                chunks, _ = self.formatRows(rows)
+                print("Encoder %s, chunk size %d: %d chunks in %.2f secs" %
+                      (encoder, chunkSize, len(chunks), time.time() - start))
+
+
+if __name__ == '__main__':
+    unittest.main()
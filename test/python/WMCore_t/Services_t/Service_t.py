@@ -60,6 +60,19 @@ class BackupServer(object):
     regular.exposed = True
 
 
+class EchoServer(object):
+    def __init__(self):
+        self.calls = 0
+
+    def echo(self, name, fail=None):
+        self.calls += 1
+        if fail:
+            raise cherrypy.HTTPError(404, "No such thing")
+        return '{"name": "%s"}' % name
+
+    echo.exposed = True
+
+
 class ServiceTest(unittest.TestCase):
     def setUp(self):
         """
@@ -375,6 +388,39 @@ class ServiceTest(unittest.TestCase):
         cherrypy.engine.exit()
         cherrypy.engine.stop()
 
+    def testGetDataMulti(self):
+        """
+        Fetch many urls concurrently, with and without the service cache
+        """
+        server = EchoServer()
+        cherrypy.tree.mount(server, "/multi")
+        cherrypy.engine.start()
+        try:
+            test_dict = {'logger': self.logger, 'endpoint': 'http://127.0.0.1:%i/multi' % self.port,
+                         'cacheduration': 1}
+            myService = Service(test_dict)
+            requests = [('echo', {'name': 'doc%d' % idx}, 'doc%d' % idx) for idx in range(20)]
+            results = list(myService.getDataMulti(requests, maxConcurrent=4))
+            self.assertEqual(len(results), 20)
+            self.assertEqual(server.calls, 20)
+            for url, inputdata, data in results:
+                self.assertEqual(url, 'echo')
+                self.assertEqual(data, '{"name": "%s"}' % inputdata['name'])
+
+            # now all of them come from the cache, but the ones without cache file
+            requests.append(('echo', {'name': 'nocache'}))
+            results = list(myService.getDataMulti(requests, maxConcurrent=4))
+            self.assertEqual(len(results), 21)
+            self.assertEqual(server.calls, 21)
+            self.assertEqual(sorted(data for _, _, data in results)[0], '{"name": "doc0"}')
+
+            # errors are raised, if no cache can be used instead
+            requests = [('echo', {'name': 'bad', 'fail': 1}, 'bad')]
+            self.assertRaises(HTTPException, list, myService.getDataMulti(requests))
+        finally:
+            cherrypy.engine.exit()
+            cherrypy.engine.stop()
+
     def testBadStatusLine(self):
         """
         _BadStatusLine_
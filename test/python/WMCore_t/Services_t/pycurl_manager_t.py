@@ -7,11 +7,38 @@ from __future__ import division
 import gzip
 import os
 import tempfile
+import threading
 import unittest
 import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
 from Utils.CertTools import getKeyCertFromEnv
 from WMCore.Services.pycurl_manager import \
-        RequestHandler, ResponseHeader, getdata, cern_sso_cookie, decompress
+        RequestHandler, ResponseHeader, getdata, cern_sso_cookie, decompress, CurlHandlePool
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    """
+    Minimal HTTP/1.1 handler replying with the requested path and the cookies
+    received, /setcookie sets a cookie
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.headers.get("Cookie"):
+            body = ('{"path": "%s", "cookie": "%s"}' % (self.path, self.headers["Cookie"])).encode()
+        else:
+            body = ('{"path": "%s"}' % self.path).encode()
+        self.send_response(200)
+        if self.path == "/setcookie":
+            self.send_header("Set-Cookie", "session=secret; Path=/")
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
 
 
 class PyCurlManager(unittest.TestCase):
@@ -312,5 +339,101 @@ class PyCurlManager(unittest.TestCase):
             pairs.add(pair)
         self.assertTrue(len(pairs), 100)
 
+
+class CurlHandlePoolTest(unittest.TestCase):
+    """Test the pool of curl handles against a local HTTP server"""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+        self.url = "http://127.0.0.1:%d" % self.server.server_port
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def testConnectionReuse(self):
+        """
+        Test sequential requests reuse the same handle and connection
+        """
+        pool = CurlHandlePool(maxPerHost=2)
+        mgr = RequestHandler(config={'curlpool': pool})
+        for idx in range(10):
+            _, data = mgr.request("%s/doc%d" % (self.url, idx), {}, decode=True)
+            self.assertEqual(data, {"path": "/doc%d" % idx})
+
+        stats = pool.stats()
+        self.assertEqual(stats['requests'], 10)
+        self.assertEqual(stats['handles_created'], 1)
+        self.assertEqual(stats['handles_reused'], 9)
+        self.assertEqual(stats['connections'], 1)
+        self.assertEqual(stats['reuse_ratio'], 0.9)
+        self.assertEqual(stats['idle_handles'], 1)
+        pool.close()
+        self.assertEqual(pool.stats()['idle_handles'], 0)
+
+    def testMaxPerHost(self):
+        """
+        Test the number of idle handles per host is limited
+        """
+        pool = CurlHandlePool(maxPerHost=2)
+        handles = [pool.acquire(self.url) for _ in range(4)]
+        for curl in handles:
+            pool.release(self.url, curl)
+        self.assertEqual(pool.stats()['idle_handles'], 2)
+        self.assertEqual(pool.stats()['handles_created'], 4)
+
+        # a discarded handle is not given back to the pool
+        curl = pool.acquire(self.url)
+        pool.release(self.url, curl, discard=True)
+        self.assertEqual(pool.stats()['idle_handles'], 1)
+        pool.close()
+
+    def testCookiesCleared(self):
+        """
+        Test the cookies of a request are not sent by the next user of the handle
+        """
+        pool = CurlHandlePool(maxPerHost=2)
+        mgr = RequestHandler(config={'curlpool': pool})
+        cookieFile = tempfile.NamedTemporaryFile(suffix=".cookie")
+        url = "%s/setcookie" % self.url
+        mgr.request(url, {}, cookie={url: cookieFile.name})
+        _, data = mgr.request(url, {}, decode=True, cookie={url: cookieFile.name})
+        self.assertEqual(data["cookie"], "session=secret")
+
+        _, data = mgr.request("%s/doc" % self.url, {}, decode=True)
+        self.assertEqual(data, {"path": "/doc"})
+        self.assertEqual(pool.stats()['handles_created'], 1)
+        # the cookies were still written to the cookie jar
+        with open(cookieFile.name) as fd:
+            self.assertIn("secret", fd.read())
+        cookieFile.close()
+        pool.close()
+
+    def testCredentialsKey(self):
+        """
+        Test handles are only reused with the same client credentials
+        """
+        pool = CurlHandlePool(maxPerHost=2)
+        curl = pool.acquire(self.url, ckey="/key1", cert="/cert1")
+        pool.release(self.url, curl, ckey="/key1", cert="/cert1")
+        self.assertIsNot(pool.acquire(self.url, ckey="/key2", cert="/cert2"), curl)
+        self.assertIsNot(pool.acquire(self.url), curl)
+        self.assertIs(pool.acquire(self.url, ckey="/key1", cert="/cert1"), curl)
+        self.assertEqual(pool.stats()['handles_created'], 3)
+        pool.close()
+
+    def testNoPool(self):
+        """
+        Test requests without the pool of handles
+        """
+        mgr = RequestHandler(config={'curlpool': False})
+        self.assertIsNone(mgr.curlPool)
+        _, data = mgr.request("%s/doc" % self.url, {}, decode=True)
+        self.assertEqual(data, {"path": "/doc"})
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -7,7 +7,6 @@
 
 import os
 import os.path
-import pickle
 import shutil
 import subprocess
 import tarfile
@@ -18,6 +17,7 @@ import WMCore_t.WMSpec_t.TestWorkloads as TestWorkloads
 
 import WMCore.WMRuntime.SandboxCreator as SandboxCreator
 import WMCore.WMSpec.WMTask as WMTask
+from WMCore.WMSpec.Persistency import loadSpecFile
 
 
 class SandboxCreator_t(unittest.TestCase):
@@ -60,8 +60,7 @@ class SandboxCreator_t(unittest.TestCase):
         self.assertIn(b'ZIPIMPORTTESTOK', output)
 
         # make sure the pickled file is the same
-        pickleHandle = open( extractDir + "/WMSandbox/WMWorkload.pkl", "rb")
-        pickledWorkload = pickle.load( pickleHandle )
+        pickledWorkload = loadSpecFile(extractDir + "/WMSandbox/WMWorkload.pkl")
         self.assertEqual( workload.data, pickledWorkload )
         self.assertEqual( pickledWorkload.sandbox, boxpath )
 
@@ -71,8 +70,6 @@ class SandboxCreator_t(unittest.TestCase):
                 t = WMTask.WMTaskHelper(t)
                 self.assertEqual(t.data.input.sandbox, boxpath)
 
-        pickleHandle.close()
-
         pickledWorkload.section_("test_section")
         self.assertNotEqual( workload.data, pickledWorkload )
         shutil.rmtree( extractDir )
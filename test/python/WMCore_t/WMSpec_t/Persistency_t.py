@@ -1,10 +1,48 @@
-from WMCore.WMSpec.Persistency import PersistencyHelper
+from __future__ import print_function
+
+import os
+import pickle
+import shutil
+import tempfile
+import time
 import unittest
+
+from nose.plugins.attrib import attr
+
+from WMCore.WMSpec.Persistency import PersistencyHelper, dumpSpecData, loadSpecData, loadSpecFile, SPEC_MAGIC
 from WMCore.WMSpec.WMStep import WMStep, makeWMStep
+from WMCore.WMSpec.WMWorkload import WMWorkloadHelper
+from WMCore_t.WMSpec_t.TestSpec import TestWorkloadFactory
+
+
+def largeWorkload(numTasks=50):
+    """
+    Build a TaskChain like workload with many chained tasks, each with
+    a few output modules and their merge tasks
+    """
+    factory = TestWorkloadFactory()
+    factory.emulation = False
+    workload = factory.createWorkload()
+    parentTask = None
+    for taskNum in range(numTasks):
+        taskName = "Task%d" % taskNum
+        task = workload.newTask(taskName) if parentTask is None else parentTask.addTask(taskName)
+        factory.setupProcessingTask(task)
+        factory.addLogCollectTask(task, taskName="%sLogCollect" % taskName)
+        for modNum in range(4):
+            factory.addOutputModule(task, "OutputModule%d" % modNum, "RECO", "Filter%d" % modNum)
+        parentTask = task
+    return workload
 
 
 class PersistencyTest(unittest.TestCase):
 
+    def setUp(self):
+        self.testDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.testDir)
+
     def testSplitUrl(self):
         helper = PersistencyHelper()
         url = 'https://cmsreqmgr.cern.ch/couchdb/mydb/doc/spec'
@@ -19,6 +57,52 @@ class PersistencyTest(unittest.TestCase):
         self.assertEqual(dbname, 'mydb')
         self.assertEqual(doc, 'doc/spec')
 
+    def testSaveLoad(self):
+        """
+        Test specs saved in the current and legacy formats are loaded back
+        """
+        workload = largeWorkload(numTasks=3)
+        specFile = os.path.join(self.testDir, "spec.pkl")
+        legacyFile = os.path.join(self.testDir, "legacy.pkl")
+        workload.save(specFile, legacy=False)
+        workload.save(legacyFile)
+
+        with open(specFile, 'rb') as handle:
+            self.assertTrue(handle.read().startswith(SPEC_MAGIC))
+        with open(legacyFile, 'rb') as handle:
+            self.assertEqual(pickle.load(handle), workload.data)
+
+        for fileName in (specFile, legacyFile):
+            newWorkload = WMWorkloadHelper()
+            newWorkload.load(fileName)
+            self.assertEqual(newWorkload.data, workload.data)
+            self.assertEqual(loadSpecFile(fileName), workload.data)
+            self.assertEqual(newWorkload.listAllTaskPathNames(), workload.listAllTaskPathNames())
+
+        step = makeWMStep("cmsRun1").data
+        self.assertEqual(loadSpecData(dumpSpecData(step)), step)
+        self.assertTrue(isinstance(loadSpecData(dumpSpecData(step)), WMStep))
+        self.assertRaises(ValueError, loadSpecData, SPEC_MAGIC + b"\x09\x01")
+
+    @attr('performance', 'integration')
+    def testPerformance(self):
+        """
+        Compare the save/load time and size of the legacy and current formats
+        """
+        workload = largeWorkload()
+        for legacy in (True, False):
+            specFile = os.path.join(self.testDir, "spec.pkl")
+            start = time.time()
+            for _ in range(10):
+                workload.save(specFile, legacy=legacy)
+            saveTime = (time.time() - start) / 10
+            start = time.time()
+            for _ in range(10):
+                loadSpecFile(specFile)
+            loadTime = (time.time() - start) / 10
+            print("%s format: %d bytes, save %.3f secs, load %.3f secs" %
+                  ("Legacy" if legacy else "Current", os.path.getsize(specFile), saveTime, loadTime))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+"""
+_SpecCache_t_
+
+Unit tests for the process-wide spec cache
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from nose.plugins.attrib import attr
+
+from WMComponent.JobCreator.JobCreatorPoller import retrieveJobSplitParams, retrieveWMSpec
+from WMCore.WMSpec.SpecCache import SpecCache, getSpecCache
+from WMCore.WMSpec.WMWorkload import WMWorkloadHelper
+from WMCore_t.WMSpec_t.Persistency_t import largeWorkload
+
+
+class SpecCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.testDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.testDir)
+
+    def saveWorkload(self, fileName, numTasks=2, campaign="Campaign1"):
+        """
+        Save a workload in the test directory and return its path
+        """
+        workload = largeWorkload(numTasks=numTasks)
+        workload.setCampaign(campaign)
+        specFile = os.path.join(self.testDir, fileName)
+        workload.save(specFile)
+        return specFile
+
+    def testGet(self):
+        """
+        Test specs are loaded once and then served from the cache
+        """
+        specFile = self.saveWorkload("spec.pkl")
+        cache = SpecCache()
+        workload = cache.get(specFile)
+        self.assertTrue(isinstance(workload, WMWorkloadHelper))
+        self.assertEqual(workload.getCampaign(), "Campaign1")
+        self.assertTrue(cache.get(specFile) is workload)
+        self.assertTrue(cache.get(os.path.join(self.testDir, ".", "spec.pkl")) is workload)
+        self.assertIn(specFile, cache)
+
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['entries'], 1)
+        self.assertTrue(stats['bytes'] > 0)
+
+        summary = cache.getSummary(specFile)
+        self.assertEqual(summary.name, workload.name())
+        self.assertEqual(summary.campaign, "Campaign1")
+        self.assertEqual(list(summary.taskPaths), workload.listAllTaskPathNames())
+        self.assertEqual(set(summary.prepIDs), set(t.getPathName() for t in workload.taskIterator()))
+        self.assertTrue(cache.getSummary(specFile) is summary)
+
+        cache.invalidate(specFile)
+        self.assertEqual(len(cache), 0)
+        self.assertFalse(cache.get(specFile) is workload)
+        self.assertEqual(cache.stats()['misses'], 2)
+
+        self.assertRaises(OSError, cache.get, os.path.join(self.testDir, "missing.pkl"))
+        self.assertTrue(getSpecCache() is getSpecCache())
+        return
+
+    def testInvalidation(self):
+        """
+        Test a spec rewritten on disk is loaded again
+        """
+        specFile = self.saveWorkload("spec.pkl")
+        cache = SpecCache()
+        workload = cache.get(specFile)
+        self.assertEqual(cache.getSummary(specFile).campaign, "Campaign1")
+
+        self.saveWorkload("spec.pkl", campaign="Campaign2")
+        stat = os.stat(specFile)
+        os.utime(specFile, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        newWorkload = cache.get(specFile)
+        self.assertFalse(newWorkload is workload)
+        self.assertEqual(newWorkload.getCampaign(), "Campaign2")
+        self.assertEqual(cache.getSummary(specFile).campaign, "Campaign2")
+        self.assertEqual(len(cache), 1)
+        return
+
+    def testEviction(self):
+        """
+        Test the least recently used specs are evicted
+        """
+        specFiles = [self.saveWorkload("spec%d.pkl" % i, numTasks=1) for i in range(4)]
+        cache = SpecCache(maxEntries=2)
+        for specFile in specFiles[:3]:
+            cache.get(specFile)
+        self.assertEqual(len(cache), 2)
+        self.assertNotIn(specFiles[0], cache)
+
+        cache.get(specFiles[1])
+        cache.get(specFiles[3])
+        self.assertEqual([f in cache for f in specFiles], [False, True, False, True])
+        self.assertEqual(cache.stats()['evictions'], 2)
+
+        # the memory bound still keeps the most recent spec
+        cache = SpecCache(maxBytes=1)
+        for specFile in specFiles:
+            cache.get(specFile)
+        self.assertEqual(len(cache), 1)
+        self.assertIn(specFiles[3], cache)
+        self.assertEqual(cache.stats()['bytes'], cache.entries[os.path.realpath(specFiles[3])].weight)
+
+        cache.invalidate()
+        self.assertEqual(cache.stats()['entries'], 0)
+        self.assertEqual(cache.stats()['bytes'], 0)
+        return
+
+    def testSharedWorkload(self):
+        """
+        Test the JobCreator doesn't hand over the lists of the shared
+        workload to the job splitting
+        """
+        specFile = self.saveWorkload("spec.pkl", numTasks=1)
+        workload = retrieveWMSpec(wmWorkloadURL=specFile)
+        self.assertTrue(retrieveWMSpec(wmWorkloadURL=specFile) is workload)
+        self.assertIsNone(retrieveWMSpec(wmWorkloadURL=os.path.join(self.testDir, "missing.pkl")))
+        task = workload.getTaskByPath("/TestWorkload/Task0")
+        task.setSiteWhitelist(["T1_US_FNAL"])
+        expected = task.jobSplittingParameters()
+
+        splitParams = retrieveJobSplitParams(workload, "/TestWorkload/Task0")
+        self.assertEqual(splitParams, expected)
+        splitParams["siteWhitelist"].append("T2_CH_CERN")
+        splitParams["files_per_job"] = 1000
+        self.assertEqual(task.siteWhitelist(), ["T1_US_FNAL"])
+        self.assertEqual(task.jobSplittingParameters(), expected)
+        getSpecCache().invalidate(specFile)
+        return
+
+    @attr('performance', 'integration')
+    def testPerformance(self):
+        """
+        Compare loading a spec from disk with fetching it from the cache
+        """
+        specFile = self.saveWorkload("spec.pkl", numTasks=50)
+        start = time.time()
+        for _ in range(20):
+            workload = WMWorkloadHelper()
+            workload.load(specFile)
+        loadTime = (time.time() - start) / 20
+
+        cache = SpecCache()
+        start = time.time()
+        for _ in range(20):
+            cache.get(specFile)
+        cacheTime = (time.time() - start) / 20
+        print("Spec load %.4f secs, cached %.6f secs, %s" % (loadTime, cacheTime, cache.stats()))
+        return
+
+
+if __name__ == '__main__':
+    unittest.main()
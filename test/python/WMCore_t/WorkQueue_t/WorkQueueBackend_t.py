@@ -2,13 +2,14 @@
 """
     CouchWorkQueueElement unit tests
 """
+import random
 import unittest
 
 import time
 
 from Utils.PythonVersion import PY3
 from WMQuality.TestInitCouchApp import TestInitCouchApp as TestInit
-from WMCore.WorkQueue.WorkQueueBackend import WorkQueueBackend, sortAvailableElements
+from WMCore.WorkQueue.WorkQueueBackend import WorkQueueBackend, SiteJobCounter, sortAvailableElements
 from WMCore.WorkQueue.DataStructs.CouchWorkQueueElement import CouchWorkQueueElement
 from WMCore.WorkQueue.DataStructs.WorkQueueElement import WorkQueueElement
 
@@ -130,6 +131,53 @@ class WorkQueueBackendTest(unittest.TestCase):
         self.assertEqual(len(elemList), 5)
         self.assertItemsEqual(elemList, expected)
 
+    def testSiteJobCounter(self):
+        """Test the jobs counted by SiteJobCounter match the sum over siteJobCounts"""
+        def countJobs(site, prio):
+            return sum(jobs for jobPrio, jobs in siteJobCounts.get(site, {}).items() if jobPrio >= prio)
+
+        siteJobCounts = {'T1_US_FNAL': {100000: 10, 90000: 20, 1: 5},
+                         'T2_CH_CERN': {},
+                         'T2_DE_DESY': {5000: 3}}
+        counter = SiteJobCounter(siteJobCounts, [90000, 120000])
+        for site in list(siteJobCounts) + ['T2_IT_Bari']:
+            for prio in (0, 1, 2, 5000, 90000, 95000, 100000, 200000):
+                self.assertEqual(counter.countJobs(site, prio), countJobs(site, prio))
+
+        random.seed(42)
+        for _ in range(500):
+            site = random.choice(['T1_US_FNAL', 'T2_CH_CERN', 'T2_IT_Bari'])
+            # mostly known priorities, and a few new ones
+            prio = random.choice([1, 5000, 90000, 100000, 120000, random.randint(1, 200000)])
+            counter.addJobs(site, prio, random.randint(1, 10) * 1.5)
+            queryPrio = random.randint(0, 200000)
+            self.assertEqual(counter.countJobs(site, queryPrio), countJobs(site, queryPrio))
+        self.assertEqual(counter.countJobs('T2_IT_Bari', 0), countJobs('T2_IT_Bari', 0))
+        self.assertTrue(counter.siteJobCounts is siteJobCounts)
+
+    def testAvailableWorkPaging(self):
+        """Elements are fetched across slices without gaps nor duplicates"""
+        elements = []
+        for i in range(25):
+            elements.append(WorkQueueElement(RequestName='backend_test_%02d' % i,
+                                             WMSpec=self.processingSpec,
+                                             Status='Available',
+                                             SiteWhitelist=["place"],
+                                             Jobs=1, Priority=i % 3,
+                                             Inputs={self.processingSpec.listInputDatasets()[0] + '#%d' % i: []}))
+        self.backend.insertElements(elements)
+        work, siteJobCounts = self.backend.availableWork({'place': 1000}, {}, numElems=100,
+                                                         rowsPerSlice=4, maxRows=100)
+        self.assertEqual(len(work), 25)
+        self.assertEqual(len(set(x.id for x in work)), 25)
+        self.assertEqual(siteJobCounts, {'place': {0: 9, 1: 8, 2: 8}})
+
+        # stop at the maximum number of rows
+        work, _ = self.backend.availableWork({'place': 1000}, {}, numElems=100,
+                                             rowsPerSlice=4, maxRows=8)
+        self.assertEqual(len(work), 8)
+        self.assertEqual(set(x['Priority'] for x in work), {2})
+
 
 if __name__ == '__main__':
     unittest.main()